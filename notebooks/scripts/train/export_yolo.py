@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Exporta o best.pt do treino para servir em CPU (ONNX ou OpenVINO), com
+quantizacao INT8 opcional, e mede latencia/vazao contra o modelo FP32.
+
+Entrada: notebooks/outputs/{roboflow|kaggle}/weights/best.pt (train_yolo.py).
+Saida, na mesma pasta weights/:
+  - ONNX: best.onnx (FP32, batch dinamico) e best_int8.onnx (quantizacao
+    estatica QDQ do onnxruntime, calibrada com imagens do split de validacao);
+  - OpenVINO: best_openvino_model/ e best_int8_openvino_model/ (NNCF do
+    ultralytics, calibrado com a fracao --calib-fraction do split de validacao);
+  - export_{formato}_report.json: tamanho dos arquivos, mAP50 / mAP50-95 de cada
+    modelo no split de validacao e a diferenca INT8 - FP32, e latencia (mediana
+    e p95, ms por lote) e vazao (imagens/s) para cada numero de threads e tamanho
+    de lote, com o ganho do INT8 sobre o FP32.
+
+O .onnx FP32 e o que o threat-analyzer carrega com DETECTION_MODEL_PATH (nomes
+das classes vem dos metadados do export).
+
+Uso:
+  python -m notebooks.scripts.train.export_yolo --dataset roboflow
+  python -m notebooks.scripts.train.export_yolo --dataset roboflow --int8 --threads 1 2 4 --batches 1 4 8
+  python -m notebooks.scripts.train.export_yolo --dataset kaggle --format openvino --int8
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+from PIL import Image
+from ultralytics import YOLO
+
+from notebooks.scripts.train import paths
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def dataset_paths(dataset_type: str) -> tuple[Path, Path]:
+    """(data.yaml, pasta de saida do treino) da fonte."""
+    if dataset_type == "roboflow":
+        return paths.DATASET_ROBOFLOW_DIR / "data.yaml", paths.OUTPUTS_ROBOFLOW_DIR
+    if dataset_type == "kaggle":
+        return paths.DATASET_KAGGLE_DIR / "data.yaml", paths.OUTPUTS_KAGGLE_DIR
+    raise ValueError("dataset_type deve ser 'roboflow' ou 'kaggle'")
+
+
+def val_images(data_yaml: Path, limit: int) -> list[Path]:
+    """Ate limit imagens do split de validacao do data.yaml (ordem estavel)."""
+    config = yaml.safe_load(data_yaml.read_text())
+    root = Path(config.get("path") or data_yaml.parent)
+    if not root.is_absolute():
+        root = data_yaml.parent / root
+    val = config.get("val")
+    entries = val if isinstance(val, list) else [val]
+    images: list[Path] = []
+    for entry in entries:
+        if not entry:
+            continue
+        source = Path(entry)
+        if not source.is_absolute():
+            # Roboflow usa caminhos relativos ao data.yaml (../valid/images)
+            source = root / source if (root / source).exists() else data_yaml.parent / source
+        if source.is_file() and source.suffix == ".txt":
+            images += [Path(line.strip()) for line in source.read_text().splitlines() if line.strip()]
+        elif source.is_dir():
+            images += sorted(p for p in source.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    return images[:limit]
+
+
+def letterbox(image_path: Path, imgsz: int) -> np.ndarray:
+    """Tensor float32 (3, imgsz, imgsz) em [0, 1], redimensionado com padding 114."""
+    image = Image.open(image_path).convert("RGB")
+    scale = min(imgsz / image.width, imgsz / image.height)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(image.resize(size, Image.Resampling.BILINEAR), ((imgsz - size[0]) // 2, (imgsz - size[1]) // 2))
+    return np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+
+def sample_tensors(data_yaml: Path, imgsz: int, count: int) -> list[np.ndarray]:
+    """Imagens de validacao pre-processadas (ruido se o split estiver vazio)."""
+    tensors = [letterbox(p, imgsz) for p in val_images(data_yaml, count)]
+    if not tensors:
+        print("Aviso: split de validacao vazio, usando tensores aleatorios")
+        rng = np.random.default_rng(0)
+        tensors = [rng.random((3, imgsz, imgsz), dtype=np.float32) for _ in range(count)]
+    return tensors
+
+
+def export_fp32(weights: Path, fmt: str, imgsz: int) -> Path:
+    """Export FP32 com batch dinamico (o batcher do analyzer agrupa requisicoes)."""
+    model = YOLO(str(weights))
+    kwargs = {"simplify": True} if fmt == "onnx" else {}
+    return Path(model.export(format=fmt, imgsz=imgsz, dynamic=True, device="cpu", **kwargs))
+
+
+def quantize_onnx(fp32_path: Path, data_yaml: Path, imgsz: int, calib_images: int) -> Path:
+    """Quantizacao estatica INT8 (QDQ, pesos por canal) calibrada com o split de validacao."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class ValReader(CalibrationDataReader):
+        def __init__(self, input_name: str):
+            self._feeds = iter([{input_name: t[None]} for t in sample_tensors(data_yaml, imgsz, calib_images)])
+
+        def get_next(self):
+            return next(self._feeds, None)
+
+    int8_path = fp32_path.with_name(f"{fp32_path.stem}_int8.onnx")
+    prepared = fp32_path.with_name(f"{fp32_path.stem}_prep.onnx")
+    quant_pre_process(str(fp32_path), str(prepared))
+    input_name = onnx.load(str(prepared)).graph.input[0].name
+    quantize_static(
+        str(prepared),
+        str(int8_path),
+        ValReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+    )
+    prepared.unlink(missing_ok=True)
+
+    # Metadados do export (names, stride, imgsz) para o ultralytics e o analyzer
+    fp32_model, int8_model = onnx.load(str(fp32_path)), onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    return int8_path
+
+
+def export_int8(weights: Path, fp32_path: Path, fmt: str, data_yaml: Path, imgsz: int, calib_images: int, calib_fraction: float) -> Path:
+    if fmt == "onnx":
+        return quantize_onnx(fp32_path, data_yaml, imgsz, calib_images)
+    model = YOLO(str(weights))
+    return Path(
+        model.export(
+            format="openvino",
+            imgsz=imgsz,
+            dynamic=True,
+            int8=True,
+            data=str(data_yaml),
+            fraction=calib_fraction,
+            device="cpu",
+        )
+    )
+
+
+def make_runner(model_path: Path, fmt: str, threads: int, batch: int, imgsz: int):
+    """Funcao que roda um lote (batch, 3, imgsz, imgsz) no runtime do formato."""
+    if fmt == "onnx":
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        session = onnxruntime.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        return lambda tensor: session.run(None, {input_name: tensor})
+
+    import openvino as ov
+
+    core = ov.Core()
+    model = core.read_model(str(next(model_path.glob("*.xml"))))
+    model.reshape([batch, 3, imgsz, imgsz])
+    compiled = core.compile_model(model, "CPU", {"INFERENCE_NUM_THREADS": threads, "PERFORMANCE_HINT": "LATENCY"})
+    request = compiled.create_infer_request()
+    return lambda tensor: request.infer({0: tensor})
+
+
+def benchmark(model_path: Path, fmt: str, tensors: list[np.ndarray], threads: int, batch: int, imgsz: int, warmup: int, repeat: int) -> dict:
+    """Latencia por lote (ms) e vazao (imagens/s) de model_path."""
+    run = make_runner(model_path, fmt, threads, batch, imgsz)
+    batch_tensor = np.stack([tensors[i % len(tensors)] for i in range(batch)])
+    for _ in range(warmup):
+        run(batch_tensor)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(batch_tensor)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "latency_ms": {
+            "median": round(median, 2),
+            "p95": round(samples[int(0.95 * (len(samples) - 1))], 2),
+        },
+        "throughput_ips": round(batch * 1000 / median, 2),
+    }
+
+
+def evaluate_map(model_path: Path, data_yaml: Path, imgsz: int) -> dict:
+    """mAP50 e mAP50-95 no split de validacao (model.val em CPU)."""
+    metrics = YOLO(str(model_path), task="detect").val(
+        data=str(data_yaml), imgsz=imgsz, batch=1, device="cpu", split="val", plots=False, verbose=False
+    )
+    return {"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)}
+
+
+def size_mb(path: Path) -> float:
+    files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file()]
+    return round(sum(p.stat().st_size for p in files) / 1024 / 1024, 2)
+
+
+def runtime_versions(fmt: str) -> dict:
+    import ultralytics
+
+    versions = {"ultralytics": ultralytics.__version__}
+    if fmt == "onnx":
+        import onnxruntime
+
+        versions["onnxruntime"] = onnxruntime.__version__
+    else:
+        import openvino
+
+        versions["openvino"] = openvino.__version__
+    return versions
+
+
+def export_yolo(
+    dataset_type: str,
+    fmt: str = "onnx",
+    int8: bool = False,
+    imgsz: int = 416,
+    threads: list[int] | None = None,
+    batches: list[int] | None = None,
+    calib_images: int = 200,
+    calib_fraction: float = 0.25,
+    warmup: int = 5,
+    repeat: int = 30,
+    evaluate: bool = True,
+):
+    data_yaml, out_dir = dataset_paths(dataset_type)
+    weights = out_dir / "weights" / "best.pt"
+    if not weights.exists():
+        print(f"Erro: best.pt nao encontrado em {weights} (rode train_yolo antes)")
+        return
+    if (int8 or evaluate) and not data_yaml.exists():
+        print(f"Erro: data.yaml nao encontrado em {data_yaml} (necessario para INT8 e mAP)")
+        return
+    threads = threads or [1, 2, 4]
+    batches = batches or [1, 4, 8]
+
+    print(f"Exportando {weights} para {fmt} (imgsz={imgsz}, INT8={int8})")
+    models = {"fp32": export_fp32(weights, fmt, imgsz)}
+    if int8:
+        models["int8"] = export_int8(weights, models["fp32"], fmt, data_yaml, imgsz, calib_images, calib_fraction)
+
+    report = {
+        "dataset": dataset_type,
+        "format": fmt,
+        "imgsz": imgsz,
+        "source": str(weights),
+        "host": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            **runtime_versions(fmt),
+        },
+        "models": {name: {"path": str(path), "size_mb": size_mb(path)} for name, path in models.items()},
+        "benchmark": [],
+    }
+
+    if evaluate:
+        for name, path in models.items():
+            print(f"Validando {name} ({path.name})...")
+            report["models"][name].update(evaluate_map(path, data_yaml, imgsz))
+        if int8:
+            fp32, quantized = report["models"]["fp32"], report["models"]["int8"]
+            report["map_delta"] = {
+                key: round(quantized[key] - fp32[key], 4) for key in ("map50", "map50_95")
+            }
+
+    tensors = sample_tensors(data_yaml, imgsz, max(batches)) if data_yaml.exists() else [
+        np.random.default_rng(0).random((3, imgsz, imgsz), dtype=np.float32)
+    ]
+    for thread_count in threads:
+        for batch in batches:
+            row = {"threads": thread_count, "batch": batch}
+            for name, path in models.items():
+                row[name] = benchmark(path, fmt, tensors, thread_count, batch, imgsz, warmup, repeat)
+            if int8:
+                row["int8_speedup"] = round(row["int8"]["throughput_ips"] / row["fp32"]["throughput_ips"], 2)
+            report["benchmark"].append(row)
+            summary = " | ".join(
+                f"{name}: {row[name]['latency_ms']['median']:.1f} ms, {row[name]['throughput_ips']:.1f} img/s"
+                for name in models
+            )
+            print(f"threads={thread_count} batch={batch} -> {summary}")
+
+    report_path = out_dir / "weights" / f"export_{fmt}_report.json"
+    report_path.write_text(json.dumps(report, indent=2))
+    if "map_delta" in report:
+        print(f"mAP INT8 - FP32: {report['map_delta']}")
+    print(f"Export concluido. Relatorio em {report_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta YOLO (ONNX/OpenVINO), quantiza INT8 e mede em CPU")
+    parser.add_argument("--dataset", type=str, default="roboflow", choices=["roboflow", "kaggle"])
+    parser.add_argument("--format", type=str, default="onnx", choices=["onnx", "openvino"])
+    parser.add_argument("--int8", action="store_true", help="Gera tambem o modelo INT8 calibrado no split de validacao")
+    parser.add_argument("--imgsz", type=int, default=416)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--calib-images", type=int, default=200, help="Imagens de calibracao (ONNX)")
+    parser.add_argument("--calib-fraction", type=float, default=0.25, help="Fracao do val para calibracao (OpenVINO)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--no-map", action="store_true", help="Nao calcula o mAP (mais rapido)")
+    args = parser.parse_args()
+    export_yolo(
+        dataset_type=args.dataset,
+        fmt=args.format,
+        int8=args.int8,
+        imgsz=args.imgsz,
+        threads=args.threads,
+        batches=args.batches,
+        calib_images=args.calib_images,
+        calib_fraction=args.calib_fraction,
+        warmup=args.warmup,
+        repeat=args.repeat,
+        evaluate=not args.no_map,
+    )
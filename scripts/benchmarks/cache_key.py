@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark do custo da chave de cache do diagrama (LLMCacheService).
+
+Compara a chave antiga (json.dumps de (prompt, image_bytes) com default=str, ou
+seja, o repr dos bytes, e sha256 do resultado) com a chave atual
+(prompt_digest + content_digest: um unico BLAKE2b sobre um memoryview).
+Nao requer Redis nem API rodando.
+
+Uso (na raiz do projeto):
+  python scripts/benchmarks/cache_key.py
+  python scripts/benchmarks/cache_key.py --sizes 1 5 10 --repeat 20
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(_PROJECT_ROOT / "threat-analyzer"))
+
+from app.threat_analysis.agents.diagram.agent import DIAGRAM_PROMPT  # noqa: E402
+from app.threat_analysis.llm.cache import (  # noqa: E402
+    content_digest,
+    prompt_digest,
+)
+
+
+def legacy_key(prefix: str, prompt: str, image_bytes: bytes) -> str:
+    """Chave como era calculada antes (repr dos bytes serializado em JSON)."""
+    content = json.dumps((prompt, image_bytes), default=str, sort_keys=True)
+    return f"llm:{prefix}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+def current_key(prefix: str, prompt: str, image_bytes: bytes) -> str:
+    """Chave atual: digest do prompt + digest do conteudo da imagem."""
+    content = json.dumps(
+        [prompt_digest(prompt), content_digest(image_bytes)], sort_keys=True
+    )
+    return f"llm:{prefix}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+def measure(fn, repeat: int, *args) -> float:
+    """Mediana (ms) de repeat execucoes de fn(*args)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Mede o custo da chave de cache para imagens de varios tamanhos."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[1, 5, 10],
+        help="Tamanhos de imagem em MB (default: 1 5 10).",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Repeticoes por medida (default: 10)."
+    )
+    args = parser.parse_args()
+
+    print(f"{'MB':>4} {'antiga (ms)':>12} {'atual (ms)':>11} {'ganho':>7}")
+    for size_mb in args.sizes:
+        image = os.urandom(size_mb * 1024 * 1024)
+        old = measure(legacy_key, args.repeat, "diagram", DIAGRAM_PROMPT, image)
+        new = measure(current_key, args.repeat, "diagram", DIAGRAM_PROMPT, image)
+        print(f"{size_mb:>4} {old:>12.2f} {new:>11.2f} {old / new:>6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark do micro-batching da deteccao local (DetectionBatcher).
+
+Dispara N requisicoes concorrentes de deteccao (mesma imagem) e mede a vazao
+(imagens/s) e a latencia por requisicao (mediana e p95, ms) com:
+  - sem batching: DETECTION_BATCH_MAX_SIZE=1 (uma inferencia por requisicao);
+  - com batching: lotes de ate --batch-size imagens, esperando ate --wait-ms.
+Imprime tambem o tamanho medio de lote e a espera media na fila do snapshot()
+do batcher. Com batching a vazao deve crescer com a concorrencia.
+
+Requer os pesos do detector (best.pt com ultralytics, ou o .onnx gerado por
+notebooks/scripts/train/export_yolo.py, com onnxruntime). Para ONNX, exporte com batch dinamico: um export de batch fixo
+roda uma imagem por vez. Nao requer Redis, LLMs nem a API rodando.
+
+Uso (na raiz do projeto):
+  python scripts/benchmarks/detection_batching.py --model outputs/roboflow/weights/best.onnx
+  python scripts/benchmarks/detection_batching.py --model best.onnx --concurrency 1 4 16 --batch-size 8
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(_PROJECT_ROOT / "threat-analyzer"))
+
+from app.config import get_settings  # noqa: E402
+from app.threat_analysis.detection import DetectionBatcher  # noqa: E402
+from app.threat_analysis.detection.detector import (  # noqa: E402
+    load_component_detector,
+)
+
+DEFAULT_IMAGE = _PROJECT_ROOT / "notebooks" / "assets" / "diagram01.png"
+
+
+async def run_load(
+    batcher: DetectionBatcher, image: bytes, concurrency: int, requests: int
+) -> tuple[float, list[float]]:
+    """Vazao (imagens/s) e latencias (ms) de requests chamadas, concurrency por vez."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await batcher.detect(image, (0.25, 0.7))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - start), latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Mede a vazao da deteccao com e sem micro-batching."
+    )
+    parser.add_argument("--model", required=True, help="Pesos (.pt ou .onnx).")
+    parser.add_argument(
+        "--image",
+        type=Path,
+        default=DEFAULT_IMAGE,
+        help="Imagem usada em todas as requisicoes (default: diagram01.png).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        nargs="+",
+        type=int,
+        default=[1, 4, 8, 16],
+        help="Requisicoes simultaneas (default: 1 4 8 16).",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=64, help="Requisicoes por medida."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=8, help="Maximo de imagens por lote."
+    )
+    parser.add_argument(
+        "--wait-ms", type=float, default=10.0, help="Espera maxima por lote (ms)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Threads coletoras (lotes ao mesmo tempo).",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=2, help="Threads por inferencia (ONNX)."
+    )
+    parser.add_argument("--imgsz", type=int, default=416, help="Tamanho de entrada.")
+    args = parser.parse_args()
+
+    settings = get_settings().model_copy(
+        update={
+            "detection_enabled": True,
+            "detection_model_path": args.model,
+            "detection_image_size": args.imgsz,
+            "detection_threads": args.threads,
+        }
+    )
+    detector = load_component_detector(settings)
+    if detector is None:
+        print(f"Nao foi possivel carregar o detector de {args.model}", file=sys.stderr)
+        return 1
+    image = args.image.read_bytes()
+
+    print(
+        f"{'modo':<10} {'conc':>5} {'img/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+        f"{'lote':>5} {'fila (ms)':>10}"
+    )
+    for concurrency in args.concurrency:
+        for mode, batch_size in (("sem lote", 1), ("com lote", args.batch_size)):
+            batcher = DetectionBatcher(
+                detector,
+                max_batch_size=batch_size,
+                max_wait=args.wait_ms / 1000 if batch_size > 1 else 0.0,
+                workers=args.workers,
+            )
+            # Aquecimento (threads, alocacoes do runtime)
+            asyncio.run(run_load(batcher, image, concurrency, concurrency))
+            throughput, latencies = asyncio.run(
+                run_load(batcher, image, concurrency, args.requests)
+            )
+            latencies.sort()
+            snapshot = batcher.snapshot()
+            print(
+                f"{mode:<10} {concurrency:>5} {throughput:>8.1f} "
+                f"{statistics.median(latencies):>9.1f} "
+                f"{latencies[int(0.95 * (len(latencies) - 1))]:>9.1f} "
+                f"{snapshot['batch_size']['mean']:>5.1f} "
+                f"{snapshot['queue_wait']['mean'] * 1000:>10.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
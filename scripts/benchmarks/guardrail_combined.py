@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark do guardrail + extracao do diagrama: uma chamada de visao vs. duas.
+
+Compara, para cada imagem, os fluxos:
+  - duas chamadas: GUARDRAIL_PROMPT e depois DIAGRAM_PROMPT (padrao);
+  - duas especulativas: as mesmas chamadas em paralelo (GUARDRAIL_SPECULATIVE);
+  - uma chamada: COMBINED_PROMPT com veredito + diagrama (GUARDRAIL_COMBINED).
+Mede latencia (mediana, s) e tokens de entrada/saida e custo somados de cada
+fluxo (uso reportado pelo provedor ou estimado; custo via LLM_TOKEN_COSTS).
+
+Chama os provedores de verdade (usa as chaves de configs/.env ou do ambiente,
+com a mesma cadeia de fallback Gemini -> OpenAI -> Ollama) e nunca usa o cache
+de respostas, para que toda repeticao pague as chamadas. Nao requer Redis nem
+a API rodando. Todas as medidas rodam num unico event loop, como na API (os
+singletons do fallback guardam um cliente async preso ao loop que o criou).
+
+Uso (na raiz do projeto):
+  python scripts/benchmarks/guardrail_combined.py
+  python scripts/benchmarks/guardrail_combined.py --images notebooks/assets/diagram01.png --repeat 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(_PROJECT_ROOT / "threat-analyzer"))
+
+from app.config import get_settings  # noqa: E402
+from app.threat_analysis.agents.diagram.agent import (  # noqa: E402
+    COMBINED_PROMPT,
+    CONNECTION_ORDER,
+    DIAGRAM_PROMPT,
+    _validate_combined_result,
+    _validate_diagram_result,
+)
+from app.threat_analysis.guardrails.architecture_diagram_validator import (  # noqa: E402
+    GUARDRAIL_PROMPT,
+    _validate_guardrail_result,
+)
+from app.threat_analysis.llm import run_vision_with_fallback  # noqa: E402
+from app.threat_analysis.llm.usage import track_usage  # noqa: E402
+
+DEFAULT_IMAGES = [
+    _PROJECT_ROOT / "notebooks" / "assets" / "diagram01.png",
+    _PROJECT_ROOT / "notebooks" / "assets" / "diagram02.png",
+]
+
+
+async def vision(settings, prompt: str, image_bytes: bytes, stage: str, validate):
+    """Uma chamada de visao com fallback, sem cache."""
+    return await run_vision_with_fallback(
+        connections=CONNECTION_ORDER,
+        settings=settings,
+        prompt=prompt,
+        image_bytes=image_bytes,
+        cache_key_prefix=stage,
+        validate=validate,
+    )
+
+
+async def two_calls(settings, image_bytes: bytes) -> list[dict]:
+    """Guardrail e depois diagrama (fluxo padrao)."""
+    verdict = await vision(
+        settings, GUARDRAIL_PROMPT, image_bytes, "guardrail", _validate_guardrail_result
+    )
+    diagram = await vision(
+        settings, DIAGRAM_PROMPT, image_bytes, "diagram", _validate_diagram_result
+    )
+    return [verdict, diagram]
+
+
+async def two_calls_speculative(settings, image_bytes: bytes) -> list[dict]:
+    """Guardrail e diagrama em paralelo."""
+    return list(
+        await asyncio.gather(
+            vision(
+                settings,
+                GUARDRAIL_PROMPT,
+                image_bytes,
+                "guardrail",
+                _validate_guardrail_result,
+            ),
+            vision(
+                settings,
+                DIAGRAM_PROMPT,
+                image_bytes,
+                "diagram",
+                _validate_diagram_result,
+            ),
+        )
+    )
+
+
+async def one_call(settings, image_bytes: bytes) -> list[dict]:
+    """Veredito + diagrama numa unica chamada."""
+    return [
+        await vision(
+            settings,
+            COMBINED_PROMPT,
+            image_bytes,
+            "guardrail_diagram",
+            _validate_combined_result,
+        )
+    ]
+
+
+async def measure(flow, settings, image_bytes: bytes, repeat: int) -> dict:
+    """Mediana da latencia e medias de tokens/custo de repeat execucoes do fluxo."""
+    latencies, inputs, outputs, costs, failures = [], [], [], [], 0
+    for _ in range(repeat):
+        with track_usage() as tracker:
+            start = time.perf_counter()
+            results = await flow(settings, image_bytes)
+            latencies.append(time.perf_counter() - start)
+        total = tracker.summary()["total"]
+        inputs.append(total["input_tokens"])
+        outputs.append(total["output_tokens"])
+        costs.append(total["cost"])
+        failures += sum(1 for r in results if "error" in r)
+    return {
+        "latency": statistics.median(latencies),
+        "input": statistics.mean(inputs),
+        "output": statistics.mean(outputs),
+        "cost": statistics.mean(costs),
+        "failures": failures,
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compara guardrail + diagrama em uma ou duas chamadas de visao."
+    )
+    parser.add_argument(
+        "--images",
+        nargs="+",
+        type=Path,
+        default=DEFAULT_IMAGES,
+        help="Imagens de diagrama (default: notebooks/assets/diagram0{1,2}.png).",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repeticoes por fluxo (default: 3)."
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    flows = (
+        ("duas chamadas", two_calls),
+        ("duas (especulativo)", two_calls_speculative),
+        ("uma chamada", one_call),
+    )
+    print(
+        f"{'imagem':>14} {'fluxo':>20} {'latencia (s)':>13} {'tokens in':>10} "
+        f"{'tokens out':>11} {'custo':>10} {'falhas':>7}"
+    )
+    for path in args.images:
+        image_bytes = path.read_bytes()
+        for label, flow in flows:
+            row = await measure(flow, settings, image_bytes, args.repeat)
+            print(
+                f"{path.name[:14]:>14} {label:>20} {row['latency']:>13.2f} "
+                f"{row['input']:>10.0f} {row['output']:>11.0f} {row['cost']:>10.5f} "
+                f"{row['failures']:>7}"
+            )
+    print("(falhas > 0: nenhum provedor respondeu; confira as chaves em configs/.env)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extracao de JSON das respostas dos LLMs (llm/json_extract.py).
+
+Compara os scanners antigos (GeminiConnection._parse_json, que chamava
+json.loads a cada fechamento no nivel zero, e o de BaseAgent) com o extrator
+atual (uma passada linear + orjson quando instalado). Usa respostas gravadas
+(arquivos .txt/.json em --responses, uma resposta bruta por arquivo) ou, sem
+elas, gera respostas sinteticas de varias centenas de KB no formato STRIDE:
+texto antes do JSON (com um {placeholder}), bloco ```json e chaves dentro de
+strings. Nao requer Redis, LLM nem API rodando.
+
+Uso (na raiz do projeto):
+  python scripts/benchmarks/json_extract.py
+  python scripts/benchmarks/json_extract.py --sizes 100 300 600 --repeat 5
+  python scripts/benchmarks/json_extract.py --responses caminho/para/respostas
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(_PROJECT_ROOT / "threat-analyzer"))
+
+from app.threat_analysis.llm import json_extract  # noqa: E402
+
+
+def legacy_gemini(text: str):
+    """Scanner antigo do GeminiConnection (json.loads em cada candidato)."""
+    text = text.strip()
+    for start, end in [("{", "}"), ("[", "]")]:
+        idx = text.find(start)
+        if idx != -1:
+            depth = 0
+            for i, c in enumerate(text[idx:], idx):
+                if c == start:
+                    depth += 1
+                elif c == end:
+                    depth -= 1
+                    if depth == 0:
+                        try:
+                            return json.loads(text[idx : i + 1])
+                        except json.JSONDecodeError:
+                            pass
+    match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text)
+    if match:
+        try:
+            return json.loads(match.group(1).strip())
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def legacy_agent(text: str):
+    """Scanner antigo do BaseAgent (regex de bloco + contagem de chaves)."""
+    content = text.strip()
+    match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
+    if match:
+        content = match.group(1).strip()
+    for start_char, end_char in [("{", "}"), ("[", "]")]:
+        start_idx = content.find(start_char)
+        if start_idx == -1:
+            continue
+        depth, in_string, escape_next = 0, False, False
+        for i, char in enumerate(content[start_idx:], start=start_idx):
+            if escape_next:
+                escape_next = False
+                continue
+            if char == "\\":
+                escape_next = True
+                continue
+            if char == '"':
+                in_string = not in_string
+                continue
+            if in_string:
+                continue
+            if char == start_char:
+                depth += 1
+            elif char == end_char:
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(content[start_idx : i + 1])
+                    except json.JSONDecodeError:
+                        return None
+    return None
+
+
+def synthetic_stride(size_kb: int) -> str:
+    """Resposta STRIDE (lista de ameacas em bloco ```json) com ~size_kb KB."""
+    threat = {
+        "component_id": "api-gateway",
+        "threat_type": "Tampering",
+        "description": "Attacker alters {payload} in transit; see [RFC 7519] " * 3,
+        "mitigation": 'Sign tokens and validate "aud"/"iss" claims {strictly}.',
+    }
+    count = max(1, size_kb * 1024 // (len(json.dumps(threat)) + 2))
+    body = json.dumps([threat] * count, indent=2)
+    return (
+        "Here is the analysis. Each {threat} follows the requested schema:\n\n"
+        f"```json\n{body}\n```\n\nLet me know if you need more detail."
+    )
+
+
+def synthetic_diagram(size_kb: int) -> str:
+    """Resposta de diagrama (objeto) com ~size_kb KB e '}' solto dentro de strings."""
+    component = {
+        "id": "svc",
+        "type": "Service",
+        "name": "Template renderer",
+        "description": 'Renders ${user} templates; a stray "}" ends the block.',
+    }
+    count = max(1, size_kb * 1024 // (len(json.dumps(component)) + 2))
+    body = json.dumps({"components": [component] * count, "connections": []})
+    return f"Extracted architecture:\n{body}\n"
+
+
+def load_responses(directory: Path) -> list[tuple[str, str]]:
+    """Respostas gravadas (nome, texto) de directory."""
+    return [
+        (path.name, path.read_text(encoding="utf-8"))
+        for path in sorted(directory.iterdir())
+        if path.suffix in (".txt", ".json")
+    ]
+
+
+def measure(fn, text: str, repeat: int) -> float:
+    """Mediana (ms) de repeat execucoes de fn(text)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Mede a extracao de JSON em respostas grandes de LLM."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[100, 300, 600],
+        help="Tamanhos das respostas sinteticas em KB (default: 100 300 600).",
+    )
+    parser.add_argument(
+        "--responses",
+        type=Path,
+        default=None,
+        help="Pasta com respostas gravadas (.txt/.json); substitui as sinteticas.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Repeticoes por medida (default: 5)."
+    )
+    args = parser.parse_args()
+
+    if args.responses:
+        cases = load_responses(args.responses)
+    else:
+        cases = [
+            (f"{kind} {kb}KB", build(kb))
+            for kb in args.sizes
+            for kind, build in (
+                ("stride", synthetic_stride),
+                ("diagram", synthetic_diagram),
+            )
+        ]
+    decoder = "orjson" if json_extract.orjson is not None else "json"
+    print(f"extrator atual: passada unica + {decoder}")
+    print(
+        f"{'resposta':>16} {'KB':>5} {'gemini (ms)':>14} {'agente (ms)':>14} "
+        f"{'atual (ms)':>11}"
+    )
+    print("(* = resultado diferente do extrator atual, ex.: so o primeiro objeto)")
+    for name, text in cases:
+        expected = json_extract.extract_json(text)
+        columns = []
+        for legacy in (legacy_gemini, legacy_agent):
+            elapsed = measure(legacy, text, args.repeat)
+            mark = " " if legacy(text) == expected else "*"
+            columns.append(f"{elapsed:>13.2f}{mark}")
+        current = measure(json_extract.extract_json, text, args.repeat)
+        print(
+            f"{name[:16]:>16} {len(text) // 1024:>5} {columns[0]} {columns[1]} "
+            f"{current:>11.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmark do caminho rapido por OCR do DiagramAgent: esboco em texto vs. visao.
+
+Compara, para cada imagem, os caminhos:
+  - visao: DIAGRAM_PROMPT com a imagem (modelos principais, padrao);
+  - esboco: OCR local (Tesseract) + deteccao de linhas/setas (sketch.py) e
+    SKETCH_PROMPT para o modelo de texto mais barato (FAST_MODEL no Gemini,
+    DIAGRAM_OCR_FALLBACK_MODEL no OpenAI), como em DiagramAgent.analyze_sketch.
+Mede latencia (mediana, s; no esboco inclui o OCR, cuja parte tambem e
+mostrada), tokens de entrada/saida e custo (uso reportado pelo provedor ou
+estimado; custo via LLM_TOKEN_COSTS) e o recall de componentes: fracao dos
+componentes de referencia encontrados (nomes parecidos, tiling.name_similarity).
+Sem --reference, a referencia e a resposta da visao. Mostra tambem a confianca
+do OCR e o caminho que o agente escolheria com DIAGRAM_OCR_MIN_CONFIDENCE.
+
+Requer pytesseract e o binario tesseract. Chama os provedores de verdade (usa
+as chaves de configs/.env ou do ambiente, com a mesma cadeia de fallback Gemini
+-> OpenAI -> Ollama) e nunca usa o cache de respostas. Nao requer Redis nem a
+API rodando. Todas as medidas rodam num unico event loop, como na API: o
+circuit breaker, o cache negativo, o single-flight e o rate limiter sao
+singletons com um cliente async (Redis quando REDIS_URL e compartilhado), preso
+ao loop em que foi criado.
+
+Uso (na raiz do projeto):
+  python scripts/benchmarks/ocr_fast_path.py
+  python scripts/benchmarks/ocr_fast_path.py --repeat 5 --reference referencia.json
+  (referencia.json: {"diagram01.png": ["API Gateway", "Orders DB", ...], ...})
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(_PROJECT_ROOT / "threat-analyzer"))
+
+from app.config import get_settings  # noqa: E402
+from app.threat_analysis.agents.diagram.agent import (  # noqa: E402
+    CONNECTION_ORDER,
+    DIAGRAM_PROMPT,
+    SKETCH_PROMPT,
+    _validate_diagram_result,
+    _validate_sketch_result,
+)
+from app.threat_analysis.agents.diagram.sketch import sketch_diagram  # noqa: E402
+from app.threat_analysis.agents.diagram.tiling import (  # noqa: E402
+    POSITION_NAME_SIMILARITY,
+    name_similarity,
+)
+from app.threat_analysis.llm import (  # noqa: E402
+    prepare_image,
+    run_text_with_fallback,
+    run_vision_with_fallback,
+)
+from app.threat_analysis.llm.usage import track_usage  # noqa: E402
+
+DEFAULT_IMAGES = [
+    _PROJECT_ROOT / "notebooks" / "assets" / "diagram01.png",
+    _PROJECT_ROOT / "notebooks" / "assets" / "diagram02.png",
+]
+
+
+async def vision_path(settings, image) -> dict:
+    """Extracao pela chamada de visao, sem cache."""
+    return await run_vision_with_fallback(
+        connections=CONNECTION_ORDER,
+        settings=settings,
+        prompt=DIAGRAM_PROMPT,
+        image_bytes=image,
+        cache_key_prefix="diagram",
+        validate=_validate_diagram_result,
+    )
+
+
+async def sketch_path(settings, sketch: str) -> dict:
+    """Extracao do esboco pelo modelo de texto mais barato, sem cache."""
+    text_settings = settings.model_copy(
+        update={
+            "primary_model": settings.fast_model,
+            "fallback_model": settings.diagram_ocr_fallback_model,
+        }
+    )
+    return await run_text_with_fallback(
+        connections=CONNECTION_ORDER,
+        settings=text_settings,
+        messages=[
+            {
+                "role": "user",
+                "content": SKETCH_PROMPT.format(sketch=sketch) + DIAGRAM_PROMPT,
+            }
+        ],
+        cache_key_prefix="diagram_sketch",
+        validate=_validate_sketch_result,
+    )
+
+
+def component_names(result: dict) -> list[str]:
+    return [
+        str(c.get("name") or c.get("id"))
+        for c in result.get("components") or ()
+        if isinstance(c, dict)
+    ]
+
+
+def recall(found: list[str], reference: list[str]) -> float | None:
+    """Fracao de reference com um nome parecido em found (cada um usado uma vez)."""
+    if not reference:
+        return None
+    available = list(found)
+    hits = 0
+    for name in reference:
+        best = max(available, key=lambda f: name_similarity(name, f), default=None)
+        if best is not None and name_similarity(name, best) >= POSITION_NAME_SIMILARITY:
+            available.remove(best)
+            hits += 1
+    return hits / len(reference)
+
+
+async def measure(run, repeat: int) -> dict:
+    """Mediana da latencia, medias de tokens/custo e a ultima resposta de run()."""
+    latencies, inputs, outputs, costs, failures = [], [], [], [], 0
+    result: dict = {}
+    for _ in range(repeat):
+        with track_usage() as tracker:
+            start = time.perf_counter()
+            result = await run()
+            latencies.append(time.perf_counter() - start)
+        total = tracker.summary()["total"]
+        inputs.append(total["input_tokens"])
+        outputs.append(total["output_tokens"])
+        costs.append(total["cost"])
+        failures += "error" in result
+    return {
+        "latency": statistics.median(latencies),
+        "input": statistics.mean(inputs),
+        "output": statistics.mean(outputs),
+        "cost": statistics.mean(costs),
+        "failures": failures,
+        "result": result,
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compara a extracao por esboco OCR + modelo de texto com a visao."
+    )
+    parser.add_argument(
+        "--images",
+        nargs="+",
+        type=Path,
+        default=DEFAULT_IMAGES,
+        help="Imagens de diagrama (default: notebooks/assets/diagram0{1,2}.png).",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repeticoes por caminho (default: 3)."
+    )
+    parser.add_argument(
+        "--reference",
+        type=Path,
+        help="JSON {nome do arquivo: [nomes dos componentes]} (default: a visao).",
+    )
+    parser.add_argument(
+        "--show-sketch", action="store_true", help="Imprime o esboco de cada imagem."
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    references = json.loads(args.reference.read_text()) if args.reference else {}
+    print(
+        f"{'imagem':>14} {'caminho':>8} {'latencia (s)':>13} {'ocr (s)':>8} "
+        f"{'tokens in':>10} {'tokens out':>11} {'custo':>10} {'recall':>7} "
+        f"{'falhas':>7}"
+    )
+    for path in args.images:
+        image = prepare_image(
+            path.read_bytes(),
+            settings.llm_image_max_side,
+            settings.llm_image_format,
+            settings.llm_image_quality,
+        )
+        try:
+            start = time.perf_counter()
+            sketch, confidence = await asyncio.to_thread(
+                sketch_diagram, image, settings.diagram_ocr_language
+            )
+            ocr_seconds = time.perf_counter() - start
+        except (RuntimeError, OSError) as e:
+            # RuntimeError: pytesseract ausente; OSError: binario tesseract ausente
+            print(
+                f"OCR indisponivel ({e}); instale pytesseract e tesseract",
+                file=sys.stderr,
+            )
+            return 1
+        if args.show_sketch:
+            print(sketch)
+
+        vision = await measure(
+            lambda image=image: vision_path(settings, image), args.repeat
+        )
+
+        async def sketch_run(image=image) -> dict:
+            # O OCR faz parte do caminho do esboco: repetido a cada medida
+            text_sketch, _ = await asyncio.to_thread(
+                sketch_diagram, image, settings.diagram_ocr_language
+            )
+            return await sketch_path(settings, text_sketch)
+
+        text = await measure(sketch_run, args.repeat)
+        reference = references.get(path.name) or component_names(vision["result"])
+        for label, row, ocr in (
+            ("visao", vision, None),
+            ("esboco", text, ocr_seconds),
+        ):
+            score = recall(component_names(row["result"]), reference)
+            print(
+                f"{path.name[:14]:>14} {label:>8} {row['latency']:>13.2f} "
+                f"{'-' if ocr is None else f'{ocr:.2f}':>8} "
+                f"{row['input']:>10.0f} {row['output']:>11.0f} {row['cost']:>10.5f} "
+                f"{'-' if score is None else f'{score:.2f}':>7} {row['failures']:>7}"
+            )
+        chosen = (
+            "esboco" if confidence >= settings.diagram_ocr_min_confidence else "visao"
+        )
+        print(
+            f"{'':>14} confianca do OCR {confidence:.2f} "
+            f"(minimo {settings.diagram_ocr_min_confidence:.2f}): agente usaria {chosen}"
+        )
+    print("(falhas > 0: nenhum provedor respondeu; confira as chaves em configs/.env)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
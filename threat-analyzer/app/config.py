@@ -2,6 +2,7 @@
 
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import Field, field_validator
 from threat_modeling_shared.config import BaseSettings
@@ -27,6 +28,131 @@ class Settings(BaseSettings):
     embedding_model: str = "models/embedding-001"
     llm_temperature: float = 0.0
 
+    # LLM Fallback Settings
+    # None = sequential chain; >= 0 = hedged: also start the next provider after N seconds
+    llm_hedge_delay_seconds: float | None = None
+    # Per-call timeout (None = wait indefinitely); timeouts count towards the breaker
+    llm_request_timeout_seconds: float | None = 120.0
+
+    # LLM Circuit Breaker (per provider/model); shared = state in Redis for all replicas
+    llm_circuit_breaker_enabled: bool = True
+    llm_circuit_breaker_threshold: int = 3
+    llm_circuit_breaker_cooldown_seconds: float = 30.0
+    llm_circuit_breaker_shared: bool = False
+
+    # Negative cache: after a provider-level failure (missing/invalid key, exhausted
+    # quota, unreachable host) skip the provider for N seconds (0 = off); shared = Redis
+    llm_negative_cache_ttl_seconds: float = 60.0
+    llm_negative_cache_shared: bool = False
+
+    # Adaptive provider ordering (EWMA of latency/success per stage and provider)
+    llm_adaptive_routing: bool = False
+    llm_adaptive_alpha: float = 0.2
+    llm_adaptive_exploration_rate: float = 0.05
+
+    # LLM response cache: in-process L1 of decoded responses, bounded by their JSON
+    # size in bytes (0 = off), in front of Redis; pub/sub invalidation evicts keys
+    # written by other replicas from the local L1
+    llm_cache_memory_max_json_bytes: int = 64 * 1024 * 1024
+    llm_cache_pubsub_invalidation: bool = False
+
+    # Single-flight: coalesce identical in-flight LLM calls (same cache key);
+    # shared = Redis lease so other replicas/workers wait for the leader's result
+    llm_single_flight_enabled: bool = True
+    llm_single_flight_shared: bool = False
+    llm_single_flight_lease_seconds: float = 600.0
+
+    # Token cost per model in USD per 1M tokens, e.g. (JSON in env)
+    # {"gemini-1.5-pro": {"input": 1.25, "output": 5.0}}; unknown models cost 0
+    llm_token_costs: dict[str, dict[str, float]] = Field(default_factory=dict)
+
+    # Per-provider rate limits, e.g. (JSON in env)
+    # {"Gemini": {"concurrency": 4, "rpm": 60, "tpm": 1000000}}; missing = unlimited.
+    # Calls queue up to llm_rate_limit_max_wait_seconds, then fail as rate_limited;
+    # shared = rpm/tpm counted in Redis across replicas (concurrency stays per process)
+    llm_rate_limits: dict[str, dict[str, float]] = Field(default_factory=dict)
+    llm_rate_limit_max_wait_seconds: float = 30.0
+    llm_rate_limit_shared: bool = False
+
+    # Truncated JSON answers: ask the same provider to continue (llm_json_continuation)
+    # before falling back to the next one. Opt-in llm_json_accept_partial accepts the
+    # salvaged complete elements instead when they are at least
+    # llm_json_salvage_min_ratio of the output; the response is then flagged partial
+    # (AnalysisResponse.partial, usage.partial) and the answer is not cached
+    llm_json_repair_enabled: bool = True
+    llm_json_accept_partial: bool = False
+    llm_json_salvage_min_ratio: float = 0.8
+    llm_json_continuation: bool = True
+
+    # Provider-native structured output: pass each stage's Pydantic schema as the
+    # response schema (Gemini response_json_schema, OpenAI response_format, Ollama
+    # format) and decode the answer directly instead of scanning the text for JSON
+    llm_structured_output: bool = False
+
+    # Vision input: downscale the upload to llm_image_max_side (longest edge, px) and
+    # re-encode it (llm_image_format / llm_image_quality) once per request; the base64
+    # payload is shared by every stage and fallback attempt. The original bytes are
+    # kept when they already fit and are smaller
+    llm_image_normalize: bool = True
+    llm_image_max_side: int = 2048
+    llm_image_format: Literal["jpeg", "png", "webp"] = "jpeg"
+    llm_image_quality: int = 90
+
+    # Guardrail: cache verdicts by image digest; speculative = start the diagram stage
+    # alongside the guardrail and cancel it if the image is rejected
+    guardrail_cache_enabled: bool = True
+    guardrail_speculative: bool = False
+    # One vision call for guardrail verdict + diagram extraction (merged prompt/schema)
+    guardrail_combined: bool = False
+    # Local pre-guardrail: images above guardrail_max_image_pixels are rejected from
+    # the header (never decoded); prefilter_enabled adds CPU heuristics that reject
+    # obvious non-diagrams (blank, photo, noise) below the confidence threshold
+    guardrail_max_image_pixels: int = 40_000_000
+    guardrail_prefilter_enabled: bool = False
+    guardrail_prefilter_reject_below: float = 0.05
+
+    # Local component detection (YOLO): weights from notebooks/scripts/train/train_yolo.py
+    # (.pt via ultralytics) or an ONNX export (onnxruntime), loaded once per process and
+    # run on the CPU; detections go to the diagram stage as hints. confidence/iou of the
+    # request override the defaults below. Concurrent requests are micro-batched: each
+    # of the detection_workers threads runs up to batch_max_size images per forward pass,
+    # waiting at most batch_max_wait_ms for the batch to fill (.pt weights run one batch
+    # at a time: ultralytics models are not thread-safe)
+    detection_enabled: bool = False
+    detection_model_path: str | None = None
+    detection_confidence: float = 0.25
+    detection_iou: float = 0.7
+    detection_image_size: int = 416
+    detection_workers: int = 2
+    detection_threads: int = 2
+    detection_max_hints: int = 50
+    detection_batch_max_size: int = 8
+    detection_batch_max_wait_ms: float = 10.0
+
+    # Tiled diagram extraction: uploads with a side above diagram_tiling_min_side are
+    # also analysed in regions of the original (crops around detections, else a grid
+    # of diagram_tile_size px tiles overlapping by diagram_tile_overlap), at most
+    # diagram_tiling_max_concurrency vision calls at once, merged with the overview
+    diagram_tiling_enabled: bool = False
+    diagram_tiling_min_side: int = 3000
+    diagram_tile_size: int = 1536
+    diagram_tile_overlap: float = 0.15
+    diagram_tiling_max_tiles: int = 12
+    diagram_tiling_max_concurrency: int = 4
+
+    # OCR fast path: local Tesseract OCR + line/arrow detection sketch the diagram as
+    # text; when the OCR confidence (0-1) reaches diagram_ocr_min_confidence the sketch
+    # goes to a cheaper text model (fast_model on Gemini, diagram_ocr_fallback_model
+    # on OpenAI) instead of the vision call; below it, or on failure, vision runs
+    diagram_ocr_enabled: bool = False
+    diagram_ocr_language: str = "eng"
+    diagram_ocr_min_confidence: float = 0.8
+    diagram_ocr_fallback_model: str = "gpt-4o-mini"
+
+    # DREAD scoring: threats per prompt (compact id records) and chunks scored at once
+    dread_chunk_size: int = 12
+    dread_max_parallel_chunks: int = 4
+
     # RAG Settings
     knowledge_base_path: Path | None = None
     rag_chunk_size: int = 800
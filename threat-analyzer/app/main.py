@@ -1,6 +1,8 @@
 """Threat Modeling AI - FastAPI Application."""
 
+import asyncio
 from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
@@ -9,22 +11,29 @@ from threat_modeling_shared.logging import get_logger, setup_logging
 
 from app.config import get_settings
 from app.routers import ROUTERS
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
+from app.threat_analysis.detection import load_detection_batcher
 from app.threat_analysis.exceptions import (
     ArchitectureDiagramValidationError,
     InvalidFileTypeError,
     ThreatModelingError,
 )
+from app.threat_analysis.llm import DEFAULT_CONNECTION_ORDER, get_connection_registry
 
 _settings = get_settings()
 logger = get_logger("main")
 
 
 async def _lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    """Startup: logging, warm RAG cache. Shutdown: log."""
+    """Startup: logging, warm RAG cache, LLM clients and detector. Shutdown: log."""
     setup_logging(_settings.log_level)
     logger.info("Starting %s v%s", _settings.app_name, _settings.app_version)
-    RAGService(_settings).get_retriever()
+    # Build (or load) the vector store off the event loop; StrideAgent reuses it
+    await asyncio.to_thread(get_rag_service().get_retriever)
+    get_connection_registry().warm(DEFAULT_CONNECTION_ORDER, _settings)
+    if _settings.detection_enabled:
+        # Load the weights in a thread now rather than on the first request
+        await load_detection_batcher()
     yield
     logger.info("Shutting down %s", _settings.app_name)
 
@@ -52,6 +61,7 @@ app = create_app(
     version=_settings.app_version,
     routers=ROUTERS,
     settings=_settings,
+    lifespan=asynccontextmanager(_lifespan),
     health_system_name=_settings.app_name,
     check_database=False,
     exception_handlers=[(Exception, _handle_exception)],
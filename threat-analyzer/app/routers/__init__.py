@@ -1,5 +1,6 @@
 """Routers - list of (router, options) for create_app."""
 
+from app.routers.metrics import router as metrics_router
 from app.routers.threat_model import router as threat_model_router
 
 ROUTERS = [
@@ -7,4 +8,8 @@ ROUTERS = [
         threat_model_router,
         {"prefix": "/api/v1/threat-model", "tags": ["Threat Modeling"]},
     ),
+    (
+        metrics_router,
+        {"prefix": "/api/v1/metrics", "tags": ["Metrics"]},
+    ),
 ]
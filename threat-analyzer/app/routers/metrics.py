@@ -0,0 +1,162 @@
+"""Metrics API router - runtime statistics of the analysis pipeline."""
+
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.config import get_settings
+from app.threat_analysis.detection import (
+    detection_batcher_loaded,
+    get_detection_batcher,
+)
+from app.threat_analysis.llm import (
+    get_circuit_breaker,
+    get_negative_cache,
+    get_provider_router,
+    get_provider_stats,
+)
+from app.threat_analysis.llm.cache import get_memory_cache
+from app.threat_analysis.llm.json_extract import get_json_repair_stats
+from app.threat_analysis.llm.memory_cache import get_cache_tier_stats
+from app.threat_analysis.llm.rate_limit import get_rate_limiter
+from app.threat_analysis.llm.single_flight import get_single_flight
+from app.threat_analysis.llm.usage import get_usage_stats
+
+router = APIRouter()
+
+
+@router.get(
+    "/llm",
+    summary="LLM Provider Statistics",
+    description="Per-provider win/loss/cancelled counters and latency percentiles (seconds).",
+)
+async def llm_provider_stats() -> dict[str, Any]:
+    """Return the process-wide LLM provider statistics."""
+    return {"providers": get_provider_stats().snapshot()}
+
+
+@router.get(
+    "/llm/circuit-breakers",
+    summary="LLM Circuit Breakers",
+    description="State (closed/open/half_open) and consecutive failures per provider/model.",
+)
+async def llm_circuit_breakers() -> dict[str, Any]:
+    """Return the circuit breaker state of every provider seen by this process."""
+    return {"breakers": await get_circuit_breaker().snapshot()}
+
+
+@router.get(
+    "/llm/negative-cache",
+    summary="LLM Negative Cache",
+    description=(
+        "Providers skipped after a provider-level failure (config, invalid_api_key, "
+        "quota_exhausted, unreachable): current entry and marked/skipped counters."
+    ),
+)
+async def llm_negative_cache() -> dict[str, Any]:
+    """Return the negative cache state of every provider seen by this process."""
+    negative_cache = get_negative_cache()
+    return {
+        "enabled": negative_cache.enabled,
+        "providers": await negative_cache.snapshot(),
+    }
+
+
+@router.get(
+    "/llm/ranking",
+    summary="LLM Provider Ranking",
+    description=(
+        "Adaptive provider ranking per stage (EWMA success rate, latency and "
+        "throughput score). Applied to the fallback chain when adaptive routing is on."
+    ),
+)
+async def llm_provider_ranking() -> dict[str, Any]:
+    """Return the adaptive router ranking per stage."""
+    provider_router = get_provider_router()
+    return {"enabled": provider_router.enabled, "stages": provider_router.ranking()}
+
+
+@router.get(
+    "/llm/single-flight",
+    summary="LLM Single-Flight",
+    description=(
+        "Coalesced LLM calls: leader executions, callers that joined an in-flight "
+        "call in this process, waits on another process and calls in flight."
+    ),
+)
+async def llm_single_flight() -> dict[str, Any]:
+    """Return the single-flight counters of this process."""
+    return get_single_flight().snapshot()
+
+
+@router.get(
+    "/llm/rate-limits",
+    summary="LLM Rate Limits",
+    description=(
+        "Configured concurrency/rpm/tpm per provider, calls in flight and queued, "
+        "rejected calls and queue-wait statistics (seconds)."
+    ),
+)
+async def llm_rate_limits() -> dict[str, Any]:
+    """Return the rate limiter state of this process."""
+    return {"providers": get_rate_limiter().snapshot()}
+
+
+@router.get(
+    "/llm/json-repair",
+    summary="LLM JSON Repair",
+    description=(
+        "Truncated JSON answers: salvaged, accepted as partial results, continued "
+        "by the same provider or rejected, and the mean salvage ratio."
+    ),
+)
+async def llm_json_repair() -> dict[str, Any]:
+    """Return the truncated-JSON repair counters of this process."""
+    return get_json_repair_stats().snapshot()
+
+
+@router.get(
+    "/detection",
+    summary="Detection Micro-Batching",
+    description=(
+        "Local component detection batches: configured batch size/wait, batches "
+        "and images run, batch size, queue depth, queue wait and inference time "
+        "(seconds). loaded is false until the model has been loaded."
+    ),
+)
+async def detection_batching() -> dict[str, Any]:
+    """Return the detection batcher state (never loads the model)."""
+    if not get_settings().detection_enabled:
+        return {"enabled": False}
+    if not detection_batcher_loaded():
+        return {"enabled": True, "loaded": False}
+    batcher = get_detection_batcher()
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, "loaded": True, **batcher.snapshot()}
+
+
+@router.get(
+    "/usage",
+    summary="LLM Token Usage",
+    description=(
+        "Running token, cost and latency totals since process start: overall, per "
+        "stage (guardrail, diagram, stride, dread) and per provider."
+    ),
+)
+async def llm_usage() -> dict[str, Any]:
+    """Return the process-wide LLM usage totals."""
+    return get_usage_stats().summary()
+
+
+@router.get(
+    "/cache",
+    summary="LLM Cache Statistics",
+    description="Hit/miss counters per cache tier (memory, redis) and in-memory tier usage.",
+)
+async def llm_cache_stats() -> dict[str, Any]:
+    """Return the LLM response cache statistics of this process."""
+    return {
+        "tiers": get_cache_tier_stats().snapshot(),
+        "memory": get_memory_cache().snapshot(),
+    }
@@ -1,11 +1,16 @@
 """Threat Analysis API router - views only, delegates to controller."""
 
-from typing import Annotated
+import json
+from collections.abc import AsyncIterator
+from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from threat_modeling_shared.logging import get_logger
 
 from app.dependencies import SettingsDep
 from app.threat_analysis.controllers import ThreatAnalysisController
+from app.threat_analysis.exceptions import ThreatModelingError
 from app.threat_analysis.schemas import (
     AnalysisRequest,
     AnalysisResponse,
@@ -13,6 +18,8 @@ from app.threat_analysis.schemas import (
 )
 from app.threat_analysis.service import ThreatModelService, get_threat_model_service
 
+logger = get_logger("routers.threat_model")
+
 router = APIRouter()
 
 ServiceDep = Annotated[ThreatModelService, Depends(get_threat_model_service)]
@@ -37,3 +44,55 @@ async def analyze_diagram(
         confidence=request.confidence,
         iou=request.iou,
     )
+
+
+def _sse(event: str, payload: Any) -> str:
+    """Format one Server-Sent Event."""
+    if isinstance(payload, AnalysisResponse):
+        payload = payload.model_dump(mode="json", by_alias=True)
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+async def _sse_stream(
+    first: tuple[str, Any], events: AsyncIterator[tuple[str, Any]]
+) -> AsyncIterator[str]:
+    """SSE body: the already computed first event, then the rest; errors become an error event."""
+    yield _sse(*first)
+    try:
+        async for event, payload in events:
+            yield _sse(event, payload)
+    except ThreatModelingError as e:
+        yield _sse("error", {"detail": e.message})
+    except Exception as e:
+        logger.error("Streaming analysis failed: %s", e)
+        yield _sse("error", {"detail": str(e)})
+
+
+@router.post(
+    "/analyze/stream",
+    response_class=StreamingResponse,
+    summary="Analyze Architecture Diagram (Server-Sent Events)",
+    description=(
+        "Same analysis as /analyze, streamed as Server-Sent Events: 'diagram' "
+        "(components and connections), one 'threat' per STRIDE threat as soon as "
+        "the model writes it, then 'result' with the full AnalysisResponse. "
+        "Failures after the stream started are sent as an 'error' event."
+    ),
+)
+async def analyze_diagram_stream(
+    service: ServiceDep,
+    settings: SettingsDep,
+    request: Annotated[AnalysisRequest, Depends(get_analysis_request)],
+) -> StreamingResponse:
+    """Analyze an architecture diagram, streaming threats as they are found."""
+    contents = await request.file.read()
+    events = ThreatAnalysisController(service, settings).analyze_stream(
+        contents,
+        content_type=request.file.content_type,
+        confidence=request.confidence,
+        iou=request.iou,
+    )
+    # Guardrail and diagram stage run before the response starts, so their
+    # errors keep the regular HTTP error responses
+    first = await anext(events)
+    return StreamingResponse(_sse_stream(first, events), media_type="text/event-stream")
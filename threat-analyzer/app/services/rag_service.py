@@ -1,5 +1,6 @@
 """RAG service — base de conhecimento em disco (Chroma persist) e retriever com cache por processo."""
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
@@ -9,7 +10,7 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from threat_modeling_shared.logging import get_logger
 
-from app.config import Settings
+from app.config import Settings, get_settings
 
 logger = get_logger("services.rag")
 
@@ -115,3 +116,9 @@ class RAGService:
             persist_directory=str(persist_dir),
         )
         return vectorstore
+
+
+@lru_cache
+def get_rag_service() -> RAGService:
+    """Get the process-wide RAGService (warmed at startup, shared by the agents)."""
+    return RAGService(get_settings())
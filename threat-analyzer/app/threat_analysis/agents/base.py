@@ -1,7 +1,5 @@
 """Base agent with common LLM utilities."""
 
-import json
-import re
 from abc import ABC, abstractmethod
 from typing import Any, TypeVar
 
@@ -9,6 +7,11 @@ from pydantic import BaseModel
 from threat_modeling_shared.logging import get_logger
 
 from app.threat_analysis.exceptions import JSONParsingError
+from app.threat_analysis.llm.json_extract import (
+    JSONExtractionError,
+    extract_json,
+    extract_json_text,
+)
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -56,75 +59,24 @@ class BaseAgent(ABC):
                 raise JSONParsingError("Empty content", "Content is empty or None")
             return default
 
-        # Try multiple extraction patterns
-        json_content = self._extract_json_content(content)
-
         try:
-            return json.loads(json_content)
-        except json.JSONDecodeError as e:
+            return extract_json(content)
+        except JSONExtractionError as e:
             logger.warning("JSON parsing failed: %s", str(e))
             if raise_on_error:
                 raise JSONParsingError(content, str(e)) from e
             return default
 
     def _extract_json_content(self, content: str) -> str:
-        """Extract JSON content from various formats.
+        """Extract JSON content from various formats (see llm.json_extract).
 
         Args:
             content: Raw content that may contain JSON.
 
         Returns:
-            Extracted JSON string.
+            Extracted JSON string (content stripped when none is found).
         """
-        content = content.strip()
-
-        # Pattern 1: ```json ... ```
-        match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-        if match:
-            return match.group(1).strip()
-
-        # Pattern 2: ``` ... ``` (generic code block)
-        match = re.search(r"```\s*([\s\S]*?)\s*```", content)
-        if match:
-            potential_json = match.group(1).strip()
-            if potential_json.startswith(("{", "[")):
-                return potential_json
-
-        # Pattern 3: Find JSON array or object directly
-        # Look for first { or [ and match to closing brace/bracket
-        for start_char, end_char in [("{", "}"), ("[", "]")]:
-            start_idx = content.find(start_char)
-            if start_idx != -1:
-                # Find matching closing bracket
-                depth = 0
-                in_string = False
-                escape_next = False
-
-                for i, char in enumerate(content[start_idx:], start=start_idx):
-                    if escape_next:
-                        escape_next = False
-                        continue
-
-                    if char == "\\":
-                        escape_next = True
-                        continue
-
-                    if char == '"' and not escape_next:
-                        in_string = not in_string
-                        continue
-
-                    if in_string:
-                        continue
-
-                    if char == start_char:
-                        depth += 1
-                    elif char == end_char:
-                        depth -= 1
-                        if depth == 0:
-                            return content[start_idx : i + 1]
-
-        # No extraction worked, return as-is
-        return content
+        return extract_json_text(content)
 
     def validate_with_schema(
         self,
@@ -1,18 +1,51 @@
-"""Diagram analysis agent using LLM connections with fallback."""
+"""Diagram analysis agent using LLM connections with fallback.
 
+analyze_with_guardrail folds the architecture guardrail into the extraction:
+one vision call returns the verdict (is_architecture_diagram, reason) together
+with components, connections and boundaries (settings.guardrail_combined).
+
+Both accept the detections of the local detector (see detection) and append
+them to the prompt as hints; they are part of the prompt, hence of the cache key.
+
+analyze_tiled extracts very large diagrams from the whole image plus regions of
+the original upload, analysed concurrently and merged (see tiling); analyze
+switches to it when given the upload and settings.diagram_tiling_enabled.
+
+analyze_sketch is the OCR fast path (settings.diagram_ocr_enabled): a local text
+sketch of the diagram (see sketch) goes to a cheaper text model, and analyze
+only makes the vision call when the OCR confidence is low or the text model
+fails. The combined guardrail call always needs the image and skips it.
+"""
+
+import asyncio
+import json
 from typing import Any
 
 from threat_modeling_shared.logging import get_logger
 
 from app.config import Settings
 from app.threat_analysis.agents.base import BaseAgent
+from app.threat_analysis.guardrails import GUARDRAIL_CRITERIA
+from app.threat_analysis.guardrails.image_prefilter import read_image_size
 from app.threat_analysis.llm import (
     GeminiConnection,
     LLMCacheService,
     OllamaConnection,
     OpenAIConnection,
+    PreparedImage,
+    as_prepared_image,
+    response_schema_for,
+    run_text_with_fallback,
     run_vision_with_fallback,
 )
+from app.threat_analysis.schemas import (
+    ArchitectureDiagramAnalysis,
+    DiagramData,
+    TileDiagramData,
+)
+
+from . import sketch
+from .tiling import crop_regions, merge_tile_results, plan_regions, tile_detections
 
 logger = get_logger("agents.diagram")
 
@@ -37,8 +70,88 @@ Important:
 - Include the communication protocol for each connection when visible
 """
 
+COMBINED_PROMPT = (
+    """
+First decide whether this image is an architecture diagram.
+
+"""
+    + GUARDRAIL_CRITERIA
+    + """
+
+If it is an architecture diagram:
+1. Identify all components (Users, Servers, Databases, Gateways, Load Balancers, etc.).
+2. Identify the connections and data flows between them.
+3. Identify trust boundaries (e.g., VPCs, Public/Private subnets, DMZs).
+
+If it is not, leave components, connections and boundaries empty.
+
+Return ONLY a valid JSON object structured as:
+{
+  "is_architecture_diagram": true/false,
+  "reason": "brief explanation in one sentence",
+  "model": "model_name",
+  "components": [{"id": "unique_id", "type": "ComponentType", "name": "Display Name"}],
+  "connections": [{"from": "source_id", "to": "target_id", "protocol": "HTTPS/HTTP/TCP/etc"}],
+  "boundaries": ["boundary name 1", "boundary name 2"]
+}
+
+Important:
+- Each component must have a unique id
+- Use descriptive component types (User, Server, Database, Gateway, LoadBalancer, Cache, Queue, API, Service)
+- Include the communication protocol for each connection when visible
+"""
+)
+
+# Tiled extraction: component boxes are needed to merge the tiles
+LOCATED_PROMPT = (
+    DIAGRAM_PROMPT
+    + """- For each component also return "box": [x1, y1, x2, y2], its bounding box in pixels of this image
+"""
+)
+
+TILE_PROMPT = (
+    LOCATED_PROMPT
+    + """
+This image is one region of a larger diagram. Include components cut by the
+region edges only if their label is readable, and connections only when both
+ends are visible in the region.
+"""
+)
+
+# OCR fast path: the text sketch replaces the image, followed by DIAGRAM_PROMPT
+SKETCH_PROMPT = """
+This is a text sketch of an architecture diagram, produced locally by OCR
+(labels with their bounding box in pixels) and line detection (lines linking
+two labels; "->" has an arrowhead at the second label, "--" no arrowhead).
+OCR may split labels or misread characters, and lines may be borders of
+boxes or boundaries: use the positions and common architecture naming to
+reconstruct the diagram.
+
+{sketch}
+"""
+
+DETECTION_HINTS_PROMPT = """
+A local object detector found these elements in the image (label, confidence
+0-1, box [x1, y1, x2, y2] in image pixels). Use them as hints: keep the real
+components, ignore false positives and add anything the detector missed.
+{detections}
+"""
+
 CONNECTION_ORDER = [GeminiConnection, OpenAIConnection, OllamaConnection]
 
+# Keys of the combined answer that belong to the verdict, not the diagram
+VERDICT_KEYS = ("is_architecture_diagram", "reason")
+
+
+def with_detection_hints(prompt: str, detections: list[dict[str, Any]] | None) -> str:
+    """prompt followed by the detections as hints (prompt itself when there are none)."""
+    if not detections:
+        return prompt
+    hints = "\n".join(
+        json.dumps(d, separators=(",", ":"), ensure_ascii=False) for d in detections
+    )
+    return prompt + DETECTION_HINTS_PROMPT.format(detections=hints)
+
 
 def _validate_diagram_result(result: dict[str, Any]) -> bool:
     """Validate diagram analysis result."""
@@ -50,26 +163,81 @@ def _validate_diagram_result(result: dict[str, Any]) -> bool:
     return True
 
 
+def _validate_sketch_result(result: dict[str, Any]) -> bool:
+    """Validate sketch result: a diagram with components (else vision runs)."""
+    return _validate_diagram_result(result) and bool(result.get("components"))
+
+
+def _validate_combined_result(result: dict[str, Any]) -> bool:
+    """Validate combined guardrail + diagram result (verdict and component list)."""
+    return _validate_diagram_result(result) and "is_architecture_diagram" in result
+
+
 class DiagramAgent(BaseAgent):
     """Agent for analyzing architecture diagrams using vision LLMs with fallback."""
 
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
         self._cache = LLMCacheService(redis_url=settings.redis_url)
+        # Cheaper models for the text-only sketch (Ollama keeps its model)
+        self._sketch_settings = settings.model_copy(
+            update={
+                "primary_model": settings.fast_model,
+                "fallback_model": settings.diagram_ocr_fallback_model,
+            }
+        )
+
+    async def analyze(
+        self,
+        image_bytes: bytes | PreparedImage,
+        image_digest: str | None = None,
+        detections: list[dict[str, Any]] | None = None,
+        source: bytes | None = None,
+    ) -> dict[str, Any]:
+        """Analyze an architecture diagram image.
 
-    async def analyze(self, image_bytes: bytes) -> dict[str, Any]:
-        """Analyze an architecture diagram image."""
+        Args:
+            image_bytes: Raw image content or the request's PreparedImage.
+            image_digest: content_digest(image_bytes) if already computed (cache key).
+            detections: Local detector output, added to the prompt as hints.
+            source: Original upload, when image_bytes was downscaled from it. With
+                settings.diagram_tiling_enabled, uploads with a side above
+                settings.diagram_tiling_min_side go to analyze_tiled.
+
+        With settings.diagram_ocr_enabled, analyze_sketch is tried first.
+        """
+        if self.settings.diagram_ocr_enabled:
+            result = await self.analyze_sketch(image_bytes, detections)
+            if result is not None:
+                return result
+        size = self._tiling_size(source)
+        if size is not None:
+            return await self.analyze_tiled(
+                source, size, image_bytes, image_digest, detections
+            )
+        return await self._analyze_vision(image_bytes, image_digest, detections)
+
+    async def _analyze_vision(
+        self,
+        image_bytes: bytes | PreparedImage,
+        image_digest: str | None = None,
+        detections: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        """Extract the diagram with a single vision call (no OCR, no tiling)."""
         logger.info("Starting diagram analysis")
 
         result = await run_vision_with_fallback(
             connections=CONNECTION_ORDER,
             settings=self.settings,
-            prompt=DIAGRAM_PROMPT,
+            prompt=with_detection_hints(DIAGRAM_PROMPT, detections),
             image_bytes=image_bytes,
-            cache_get=self._cache.get,
-            cache_set=self._cache.set,
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
             cache_key_prefix="diagram",
             validate=_validate_diagram_result,
+            hedge_delay=self.settings.llm_hedge_delay_seconds,
+            image_digest=image_digest,
+            response_schema=response_schema_for(self.settings, DiagramData),
         )
 
         if "error" in result:
@@ -83,6 +251,229 @@ class DiagramAgent(BaseAgent):
         )
         return result
 
+    async def analyze_with_guardrail(
+        self,
+        image_bytes: bytes | PreparedImage,
+        image_digest: str | None = None,
+        detections: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        """Classify and analyze an architecture diagram in one vision call.
+
+        Args and detections as in analyze.
+
+        Returns:
+            Diagram data plus is_architecture_diagram and reason (see
+            guardrails.check_architecture_verdict). If every provider fails the
+            fallback diagram data is returned without a verdict, so the image
+            is let through as the guardrail does.
+        """
+        logger.info("Starting combined guardrail + diagram analysis")
+
+        result = await run_vision_with_fallback(
+            connections=CONNECTION_ORDER,
+            settings=self.settings,
+            prompt=with_detection_hints(COMBINED_PROMPT, detections),
+            image_bytes=image_bytes,
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
+            cache_key_prefix="guardrail_diagram",
+            validate=_validate_combined_result,
+            hedge_delay=self.settings.llm_hedge_delay_seconds,
+            image_digest=image_digest,
+            response_schema=response_schema_for(
+                self.settings, ArchitectureDiagramAnalysis
+            ),
+        )
+
+        if "error" in result:
+            logger.error(
+                "Combined guardrail + diagram analysis failed, allowing through: %s",
+                result.get("error"),
+            )
+            return self._get_fallback_data()
+
+        logger.info(
+            "Combined analysis complete: architecture=%s, %d components, %d connections",
+            result.get("is_architecture_diagram"),
+            len(result.get("components", [])),
+            len(result.get("connections", [])),
+        )
+        return result
+
+    async def analyze_sketch(
+        self,
+        image_bytes: bytes | PreparedImage,
+        detections: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any] | None:
+        """Extract the diagram from its OCR sketch with the cheaper text model.
+
+        Returns:
+            Diagram data, or None when the OCR is unavailable or below
+            settings.diagram_ocr_min_confidence, or the text model fails, so
+            that the caller falls back to the vision call.
+        """
+        settings = self.settings
+        try:
+            text, confidence = await asyncio.to_thread(
+                sketch.sketch_diagram, image_bytes, settings.diagram_ocr_language
+            )
+        except Exception as e:
+            logger.warning("OCR sketch unavailable, using the vision model: %s", e)
+            return None
+        if confidence < settings.diagram_ocr_min_confidence:
+            logger.info(
+                "OCR confidence %.2f below %.2f, using the vision model",
+                confidence,
+                settings.diagram_ocr_min_confidence,
+            )
+            return None
+        logger.info("Starting diagram analysis from OCR sketch (%.2f)", confidence)
+        prompt = SKETCH_PROMPT.format(sketch=text) + DIAGRAM_PROMPT
+        result = await run_text_with_fallback(
+            connections=CONNECTION_ORDER,
+            settings=self._sketch_settings,
+            messages=[
+                {"role": "user", "content": with_detection_hints(prompt, detections)}
+            ],
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
+            cache_key_prefix="diagram_sketch",
+            validate=_validate_sketch_result,
+            hedge_delay=settings.llm_hedge_delay_seconds,
+            response_schema=response_schema_for(settings, DiagramData),
+        )
+        if "error" in result:
+            logger.warning(
+                "Sketch analysis failed, using the vision model: %s",
+                result.get("error"),
+            )
+            return None
+        logger.info(
+            "Sketch analysis complete: %d components, %d connections",
+            len(result.get("components", [])),
+            len(result.get("connections", [])),
+        )
+        return result
+
+    def _tiling_size(self, source: bytes | None) -> tuple[int, int] | None:
+        """Size of the upload if it is to be analysed in tiles, else None."""
+        if source is None or not self.settings.diagram_tiling_enabled:
+            return None
+        try:
+            size = read_image_size(source)
+        except Exception:
+            return None
+        if size is None or max(size) <= self.settings.diagram_tiling_min_side:
+            return None
+        return size
+
+    async def analyze_tiled(
+        self,
+        source: bytes,
+        size: tuple[int, int],
+        image_bytes: bytes | PreparedImage,
+        image_digest: str | None = None,
+        detections: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        """Analyze a large diagram as the whole image plus regions of the upload.
+
+        The overview (image_bytes) and every region (see tiling.plan_regions)
+        are extracted concurrently, at most settings.diagram_tiling_max_concurrency
+        calls at once, and merged by tiling.merge_tile_results. Regions whose
+        calls fail are left out; if the regions cannot be cropped the overview
+        is analysed alone.
+
+        Args:
+            source: Original upload.
+            size: (width, height) of source.
+            image_bytes, image_digest, detections: As in analyze (the overview).
+        """
+        settings = self.settings
+        overview = as_prepared_image(image_bytes)
+        # Detections and overview share pixels; both may be downscaled from the upload
+        overview_scale = size[0] / overview.size[0] if overview.size else 1.0
+        regions = plan_regions(
+            size,
+            settings.diagram_tile_size,
+            settings.diagram_tile_overlap,
+            settings.diagram_tiling_max_tiles,
+            detections,
+            overview_scale,
+        )
+        try:
+            tiles = await asyncio.to_thread(
+                crop_regions,
+                source,
+                regions,
+                settings.llm_image_max_side,
+                settings.llm_image_format,
+                settings.llm_image_quality,
+            )
+        except Exception as e:
+            logger.warning("Tiling skipped, analysing the whole image: %s", e)
+            return await self._analyze_vision(image_bytes, image_digest, detections)
+        logger.info(
+            "Starting tiled diagram analysis: %dx%d image, %d regions",
+            *size,
+            len(regions),
+        )
+        semaphore = asyncio.Semaphore(settings.diagram_tiling_max_concurrency)
+
+        async def extract(
+            prompt: str,
+            image: PreparedImage,
+            digest: str | None,
+            hints: list[dict[str, Any]] | None,
+        ) -> dict[str, Any]:
+            async with semaphore:
+                return await run_vision_with_fallback(
+                    connections=CONNECTION_ORDER,
+                    settings=settings,
+                    prompt=with_detection_hints(prompt, hints),
+                    image_bytes=image,
+                    cache_get=self._cache.aget,
+                    cache_set=self._cache.aset,
+                    cache_key_prefix="diagram_tile",
+                    validate=_validate_diagram_result,
+                    hedge_delay=settings.llm_hedge_delay_seconds,
+                    image_digest=digest,
+                    response_schema=response_schema_for(settings, TileDiagramData),
+                )
+
+        answers = await asyncio.gather(
+            extract(LOCATED_PROMPT, overview, image_digest, detections),
+            *(
+                extract(
+                    TILE_PROMPT,
+                    tile,
+                    None,
+                    tile_detections(detections, region, overview_scale, scale),
+                )
+                for region, (tile, scale) in zip(regions, tiles, strict=True)
+            ),
+        )
+        located = [((0, 0, *size), overview_scale)] + [
+            (region, scale)
+            for region, (_tile, scale) in zip(regions, tiles, strict=True)
+        ]
+        results = [
+            (region, scale, answer)
+            for (region, scale), answer in zip(located, answers, strict=True)
+            if "error" not in answer
+        ]
+        if not results:
+            logger.error("Tiled diagram analysis failed: every call failed")
+            return self._get_fallback_data()
+        merged = merge_tile_results(results)
+        logger.info(
+            "Tiled diagram analysis complete: %d/%d calls, %d components, %d connections",
+            len(results),
+            len(answers),
+            len(merged["components"]),
+            len(merged["connections"]),
+        )
+        return merged
+
     def _get_fallback_data(self) -> dict[str, Any]:
         """Get fallback data when analysis fails."""
         return {
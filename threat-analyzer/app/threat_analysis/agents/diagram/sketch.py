@@ -0,0 +1,419 @@
+"""Local OCR sketch of a diagram, the input of the text-only fast path.
+
+Label-heavy box-and-arrow diagrams can be described well enough in text for a
+cheaper text model to extract components and connections. The sketch is built
+on the CPU, without any LLM:
+
+- ocr_words: Tesseract (pytesseract, settings.diagram_ocr_language) reads the
+  words with their boxes and confidences (0-100);
+- group_words: words close to each other (same line, or stacked lines) are
+  joined into labels, each with its box and mean confidence;
+- detect_segments: long horizontal and vertical runs of dark pixels, outside
+  the labels, are the lines of the diagram (diagonal lines are not detected);
+- enclose_labels: four lines drawn around a label are its shape (box);
+- link_labels: a line, or two perpendicular lines meeting in an elbow, whose
+  ends lie near the shapes (else the text) of two different labels links
+  them; an arrowhead (dark pixels spreading across the line near one end)
+  gives the direction;
+- format_sketch: labels and links as text for the prompt.
+
+sketch_diagram returns the sketch with the OCR confidence (mean word
+confidence, 0-1, or 0 with fewer than MIN_LABELS labels); the diagram agent
+sends it to the text model only above settings.diagram_ocr_min_confidence.
+pytesseract and the tesseract binary are optional dependencies.
+"""
+
+from __future__ import annotations
+
+import io
+from typing import Any
+
+from app.threat_analysis.llm.image import PreparedImage, as_prepared_image
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    Image = None
+
+try:
+    import pytesseract
+except ImportError:  # pragma: no cover - optional dependency
+    pytesseract = None
+
+# (x1, y1, x2, y2) in pixels of the image
+Box = tuple[int, int, int, int]
+
+# Fewer labels than this is not a box-and-arrow diagram the sketch can describe
+MIN_LABELS = 2
+# Words below this Tesseract confidence (0-100) are noise (icons, arrows, lines)
+MIN_WORD_CONFIDENCE = 30
+# Grey level (0-255) below which a pixel is part of a line
+DARK_THRESHOLD = 128
+# Thicker runs are filled shapes, not lines
+MAX_LINE_THICKNESS = 8
+
+
+def available() -> bool:
+    """Whether the OCR dependencies are installed (the binary is checked on use)."""
+    return pytesseract is not None and np is not None and Image is not None
+
+
+def ocr_words(image: Any, language: str) -> list[dict[str, Any]]:
+    """Words read by Tesseract: {"text", "box", "confidence" (0-100)}.
+
+    Uses sparse-text segmentation (--psm 11): diagram labels are scattered
+    fragments, not paragraphs. Entries without text or confidence are dropped.
+    """
+    data = pytesseract.image_to_data(
+        image, lang=language, config="--psm 11", output_type=pytesseract.Output.DICT
+    )
+    words = []
+    for text, conf, left, top, width, height in zip(
+        data["text"],
+        data["conf"],
+        data["left"],
+        data["top"],
+        data["width"],
+        data["height"],
+        strict=True,
+    ):
+        text = str(text).strip()
+        confidence = float(conf)
+        if not text or confidence < 0:
+            continue
+        words.append(
+            {
+                "text": text,
+                "box": (int(left), int(top), int(left + width), int(top + height)),
+                "confidence": confidence,
+            }
+        )
+    return words
+
+
+def _near(a: Box, b: Box) -> bool:
+    """Whether two word boxes belong to the same label (same line or stacked)."""
+    height = max(a[3] - a[1], b[3] - b[1], 1)
+    overlap_y = min(a[3], b[3]) - max(a[1], b[1])
+    gap_x = max(a[0], b[0]) - min(a[2], b[2])
+    if overlap_y > 0.5 * min(a[3] - a[1], b[3] - b[1]) and gap_x <= height:
+        return True
+    overlap_x = min(a[2], b[2]) - max(a[0], b[0])
+    gap_y = max(a[1], b[1]) - min(a[3], b[3])
+    return overlap_x > 0 and gap_y <= 0.6 * height
+
+
+def _label_text(words: list[dict[str, Any]]) -> str:
+    """Words in reading order: lines top to bottom, words left to right."""
+    lines: list[list[dict[str, Any]]] = []
+    for word in sorted(words, key=lambda w: w["box"][1]):
+        center = (word["box"][1] + word["box"][3]) / 2
+        line = lines[-1] if lines else None
+        if line and min(w["box"][1] for w in line) <= center <= max(
+            w["box"][3] for w in line
+        ):
+            line.append(word)
+        else:
+            lines.append([word])
+    return " ".join(
+        w["text"] for line in lines for w in sorted(line, key=lambda w: w["box"][0])
+    )
+
+
+def group_words(
+    words: list[dict[str, Any]], min_word_confidence: float = MIN_WORD_CONFIDENCE
+) -> list[dict[str, Any]]:
+    """Join nearby words into labels, top to bottom.
+
+    Returns:
+        {"id": "L1", "text", "box", "confidence" (0-1)} per label.
+    """
+    words = [w for w in words if w["confidence"] >= min_word_confidence]
+    parent = list(range(len(words)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(words)):
+        for j in range(i + 1, len(words)):
+            if _near(words[i]["box"], words[j]["box"]):
+                parent[find(i)] = find(j)
+    groups: dict[int, list[dict[str, Any]]] = {}
+    for i, word in enumerate(words):
+        groups.setdefault(find(i), []).append(word)
+    labels = []
+    for members in groups.values():
+        boxes = [w["box"] for w in members]
+        labels.append(
+            {
+                "text": _label_text(members),
+                "box": (
+                    min(b[0] for b in boxes),
+                    min(b[1] for b in boxes),
+                    max(b[2] for b in boxes),
+                    max(b[3] for b in boxes),
+                ),
+                "confidence": round(
+                    sum(w["confidence"] for w in members) / len(members) / 100, 3
+                ),
+            }
+        )
+    labels.sort(key=lambda label: (label["box"][1], label["box"][0]))
+    for index, label in enumerate(labels, start=1):
+        label["id"] = f"L{index}"
+    return labels
+
+
+def _runs(dark: Any, min_length: int) -> list[tuple[int, int, int]]:
+    """(row, start, end) of the runs of dark pixels along rows, at least min_length."""
+    padded = np.pad(dark, ((0, 0), (1, 1))).astype(np.int8)
+    edges = np.diff(padded, axis=1)
+    # argwhere is row-major, so the k-th start and the k-th end are one run
+    starts, ends = np.argwhere(edges == 1), np.argwhere(edges == -1)
+    lengths = ends[:, 1] - starts[:, 1]
+    keep = lengths >= min_length
+    return [
+        (int(row), int(start), int(end))
+        for (row, start), end in zip(starts[keep], ends[keep, 1], strict=True)
+    ]
+
+
+def _horizontal_segments(dark: Any, min_length: int) -> list[tuple[int, ...]]:
+    """(x1, y, x2, y, thickness) of the horizontal lines (runs on adjacent rows merged)."""
+    merged: list[list[int]] = []  # [first row, last row, start, end]
+    open_: list[list[int]] = []
+    for row, start, end in _runs(dark, min_length):
+        for segment in open_:
+            if segment[1] == row - 1 and min(segment[3], end) - max(
+                segment[2], start
+            ) >= 0.5 * min(segment[3] - segment[2], end - start):
+                segment[1] = row
+                segment[2], segment[3] = min(segment[2], start), max(segment[3], end)
+                break
+        else:
+            segment = [row, row, start, end]
+            merged.append(segment)
+            open_.append(segment)
+        open_ = [s for s in open_ if s[1] >= row - 1]
+    return [
+        (start, (first + last) // 2, end - 1, (first + last) // 2, last - first + 1)
+        for first, last, start, end in merged
+        if last - first + 1 <= MAX_LINE_THICKNESS
+    ]
+
+
+def detect_segments(
+    dark: Any, min_length: int, labels: list[dict[str, Any]] | None = None
+) -> list[tuple[int, ...]]:
+    """Horizontal and vertical lines of a boolean (height, width) mask of dark pixels.
+
+    Pixels inside the label boxes are ignored, so text strokes are not lines.
+
+    Returns:
+        (x1, y1, x2, y2, thickness) per line.
+    """
+    dark = dark.copy()
+    for label in labels or ():
+        x1, y1, x2, y2 = label["box"]
+        dark[y1:y2, x1:x2] = False
+    horizontal = _horizontal_segments(dark, min_length)
+    vertical = [
+        (y1, x1, y2, x2, thickness)
+        for x1, y1, x2, y2, thickness in _horizontal_segments(dark.T, min_length)
+    ]
+    return horizontal + vertical
+
+
+def _head(dark: Any, segment: tuple[int, ...], at_end: bool) -> bool:
+    """Whether the line has an arrowhead at its end (else at its start).
+
+    Looks at the cross-section of the line a little before the tip (skipping
+    the last pixels, where the line may touch a box border): an arrowhead is
+    clearly wider than the line.
+    """
+    x1, y1, x2, y2, thickness = segment
+    horizontal = y1 == y2
+    mask = dark if horizontal else dark.T
+    if not horizontal:
+        x1, y1, x2, y2 = y1, x1, y2, x2
+    head = max(8, 4 * thickness)
+    skip = 2 * thickness + 1
+    if at_end:
+        columns = range(max(x1, x2 - head), max(x1, x2 - skip))
+    else:
+        columns = range(min(x2, x1 + skip), min(x2, x1 + head))
+    band = mask[max(0, y1 - head) : y1 + head + 1]
+    widths = [int(band[:, x].sum()) for x in columns if 0 <= x < mask.shape[1]]
+    return bool(widths) and max(widths) >= thickness + 4
+
+
+def _distance(point: tuple[int, int], box: Box) -> float:
+    dx = max(box[0] - point[0], 0, point[0] - box[2])
+    dy = max(box[1] - point[1], 0, point[1] - box[3])
+    return float((dx * dx + dy * dy) ** 0.5)
+
+
+def enclose_labels(
+    labels: list[dict[str, Any]], segments: list[tuple[int, ...]]
+) -> None:
+    """Set label["shape"] to the rectangle drawn around the label, if any.
+
+    The shape is made of the nearest lines above, below, left and right of the
+    label that span it; lines start at the border of the shape, not at the text.
+    """
+    horizontal = [s for s in segments if s[1] == s[3]]
+    vertical = [s for s in segments if s[0] == s[2]]
+    for label in labels:
+        x1, y1, x2, y2 = label["box"]
+        spans_x = [s for s in horizontal if s[0] <= x1 and s[2] >= x2]
+        spans_y = [s for s in vertical if s[1] <= y1 and s[3] >= y2]
+        top = max((s for s in spans_x if s[1] < y1), key=lambda s: s[1], default=None)
+        bottom = min(
+            (s for s in spans_x if s[1] > y2), key=lambda s: s[1], default=None
+        )
+        left = max((s for s in spans_y if s[0] < x1), key=lambda s: s[0], default=None)
+        right = min((s for s in spans_y if s[0] > x2), key=lambda s: s[0], default=None)
+        if None in (top, bottom, left, right):
+            continue
+        # The four sides must meet at the corners (not lines passing by)
+        tolerance = 2 * max(top[4], bottom[4], left[4], right[4]) + 2
+        if all(
+            s[0] <= left[0] + tolerance and s[2] >= right[0] - tolerance
+            for s in (top, bottom)
+        ) and all(
+            s[1] <= top[1] + tolerance and s[3] >= bottom[1] - tolerance
+            for s in (left, right)
+        ):
+            label["shape"] = (left[0], top[1], right[0], bottom[1])
+
+
+def _nearest(
+    point: tuple[int, int], labels: list[dict[str, Any]], max_gap: float
+) -> dict[str, Any] | None:
+    def distance(label: dict[str, Any]) -> float:
+        return _distance(point, label.get("shape") or label["box"])
+
+    best = min(labels, key=distance, default=None)
+    if best is None or distance(best) > max_gap:
+        return None
+    return best
+
+
+# One end of a line: (point, segment, whether it is the segment's end)
+End = tuple[tuple[int, int], tuple[int, ...], bool]
+
+
+def _ends(segment: tuple[int, ...]) -> tuple[End, End]:
+    return (
+        ((segment[0], segment[1]), segment, False),
+        ((segment[2], segment[3]), segment, True),
+    )
+
+
+def _paths(segments: list[tuple[int, ...]]) -> list[tuple[End, End]]:
+    """The two ends of every line and of every elbow (perpendicular lines meeting)."""
+    paths = [_ends(segment) for segment in segments]
+    for i, a in enumerate(segments):
+        for b in segments[i + 1 :]:
+            if (a[1] == a[3]) == (b[1] == b[3]):
+                continue
+            tolerance = max(a[4], b[4]) + 3
+            for index_a, end_a in enumerate(_ends(a)):
+                for index_b, end_b in enumerate(_ends(b)):
+                    if _distance(end_a[0], (*end_b[0], *end_b[0])) <= tolerance:
+                        paths.append((_ends(a)[1 - index_a], _ends(b)[1 - index_b]))
+    return paths
+
+
+def link_labels(
+    dark: Any,
+    segments: list[tuple[int, ...]],
+    labels: list[dict[str, Any]],
+    max_gap: float,
+) -> list[dict[str, Any]]:
+    """Links between labels from the lines whose ends are within max_gap of them.
+
+    Distances are measured to the label's shape (see enclose_labels) when
+    known, else to its text. Straight lines and single elbows are followed.
+
+    Returns:
+        {"from", "to", "arrow"} per pair of labels, arrow "->" (head at "to"),
+        "<->" or "--" (no arrowhead found).
+    """
+    links: dict[tuple[str, str], dict[str, Any]] = {}
+    for first, last in _paths(segments):
+        start = _nearest(first[0], labels, max_gap)
+        end = _nearest(last[0], labels, max_gap)
+        if start is None or end is None or start is end:
+            continue
+        head_start, head_end = _head(dark, *first[1:]), _head(dark, *last[1:])
+        if head_start and head_end:
+            arrow = "<->"
+        elif head_start or head_end:
+            arrow = "->"
+            if head_start:
+                start, end = end, start
+        else:
+            arrow = "--"
+        pair = (start["id"], end["id"])
+        existing = links.get(pair) or links.get(pair[::-1])
+        if existing is None:
+            links[pair] = {"from": pair[0], "to": pair[1], "arrow": arrow}
+        elif existing["arrow"] == "--":
+            # Another line between the same labels, this one with a direction
+            existing.update({"from": pair[0], "to": pair[1], "arrow": arrow})
+        elif arrow == "<->" or (arrow == "->" and existing["from"] != pair[0]):
+            existing["arrow"] = "<->"
+    return list(links.values())
+
+
+def format_sketch(
+    size: tuple[int, int], labels: list[dict[str, Any]], links: list[dict[str, Any]]
+) -> str:
+    """Text sketch: image size, labels with boxes, then links between labels."""
+    lines = [
+        f"Image: {size[0]}x{size[1]} px",
+        "Labels (id, box [x1, y1, x2, y2], text):",
+    ]
+    lines += [
+        f'{label["id"]} [{", ".join(str(v) for v in label["box"])}] "{label["text"]}"'
+        for label in labels
+    ]
+    lines.append(
+        'Lines between labels ("->" arrowhead at the second label, "--" none):'
+    )
+    lines += [f"{link['from']} {link['arrow']} {link['to']}" for link in links] or [
+        "(none found)"
+    ]
+    return "\n".join(lines)
+
+
+def sketch_diagram(
+    image: bytes | PreparedImage, language: str = "eng"
+) -> tuple[str, float]:
+    """Text sketch of a diagram image and the OCR confidence (0-1).
+
+    CPU-bound: call it from a worker thread in async code. Raises when
+    pytesseract is missing or the tesseract binary cannot be run.
+    """
+    if not available():
+        raise RuntimeError("OCR sketch needs pytesseract, Pillow and NumPy")
+    with Image.open(io.BytesIO(as_prepared_image(image).data)) as decoded:
+        gray = decoded.convert("L")
+    words = ocr_words(gray, language)
+    labels = group_words(words)
+    if len(labels) < MIN_LABELS:
+        return format_sketch(gray.size, labels, []), 0.0
+    # Confidence over every word read, including those too uncertain to keep
+    confidence = sum(w["confidence"] for w in words) / len(words) / 100
+    dark = np.asarray(gray) < DARK_THRESHOLD
+    longest = max(gray.size)
+    segments = detect_segments(dark, max(20, longest // 50), labels)
+    enclose_labels(labels, segments)
+    links = link_labels(dark, segments, labels, max(40, longest * 0.05))
+    return format_sketch(gray.size, labels, links), round(confidence, 3)
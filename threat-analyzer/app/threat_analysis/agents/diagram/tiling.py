@@ -0,0 +1,341 @@
+"""Tiled extraction of very large diagrams.
+
+Providers downsample big images (and the upload itself is capped at
+settings.llm_image_max_side), so the small labels of a high-resolution
+enterprise diagram are lost. In tiling mode the diagram agent also sends
+regions of the original upload at (close to) native resolution:
+
+- plan_regions: crops around clusters of local detections (detection) when
+  there are any, else a grid of overlapping tiles of
+  settings.diagram_tile_size px (tile_overlap of the size shared with the
+  neighbours), enlarged when needed to stay within diagram_tiling_max_tiles;
+- crop_regions: each region is cropped from the decoded upload once and
+  encoded as its own PreparedImage (own digest, so tiles are cached apart);
+- merge_tile_results: the answers of the overview (whole image) and of every
+  tile are merged. Every component carries its box (LocatedComponent), mapped
+  back to upload pixels; two components are the same when their names are
+  similar and their boxes overlap, or (without boxes) when the names are
+  near-identical or the ids match with similar names. Connections are remapped
+  to the merged ids and de-duplicated; boundaries are de-duplicated by name.
+
+The overview answer comes first, so its ids are kept and connections that
+cross tile borders come from it; tiles add what the overview missed.
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import re
+import warnings
+from difflib import SequenceMatcher
+from typing import Any
+
+from app.threat_analysis.llm.image import PreparedImage, encode_image
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+# (x1, y1, x2, y2) in pixels of the upload
+Box = tuple[int, int, int, int]
+
+# Name similarity (0-1) for a match when positions agree / when they are unknown
+POSITION_NAME_SIMILARITY = 0.6
+NAME_SIMILARITY = 0.85
+# Box overlap (intersection over the smaller box) for components at the same place
+BOX_OVERLAP = 0.3
+
+
+def _axis(length: int, tile: int, overlap: int) -> list[int]:
+    """Start offsets of tiles of size tile covering length with at least overlap."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / max(1, tile - overlap)) + 1
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def plan_grid(
+    size: tuple[int, int], tile_size: int, overlap: float, max_tiles: int
+) -> list[Box]:
+    """Overlapping grid over an image of size (width, height), at most max_tiles."""
+    width, height = size
+    tile = tile_size
+    while True:
+        shared = int(tile * overlap)
+        xs, ys = _axis(width, tile, shared), _axis(height, tile, shared)
+        if len(xs) * len(ys) <= max_tiles or tile >= max(width, height):
+            break
+        tile = int(tile * 1.25)
+    return [(x, y, min(width, x + tile), min(height, y + tile)) for y in ys for x in xs]
+
+
+def plan_clusters(
+    boxes: list[Box], size: tuple[int, int], tile_size: int, padding: int
+) -> list[Box]:
+    """Regions of at most tile_size px grouping nearby boxes, padded and clipped."""
+    regions: list[list[int]] = []
+    for x1, y1, x2, y2 in sorted(boxes, key=lambda b: (b[1], b[0])):
+        for region in regions:
+            ux1, uy1 = min(region[0], x1), min(region[1], y1)
+            ux2, uy2 = max(region[2], x2), max(region[3], y2)
+            if ux2 - ux1 <= tile_size and uy2 - uy1 <= tile_size:
+                region[:] = [ux1, uy1, ux2, uy2]
+                break
+        else:
+            regions.append([x1, y1, x2, y2])
+    width, height = size
+    return [
+        (
+            max(0, x1 - padding),
+            max(0, y1 - padding),
+            min(width, x2 + padding),
+            min(height, y2 + padding),
+        )
+        for x1, y1, x2, y2 in regions
+    ]
+
+
+def plan_regions(
+    size: tuple[int, int],
+    tile_size: int,
+    overlap: float,
+    max_tiles: int,
+    detections: list[dict[str, Any]] | None = None,
+    detection_scale: float = 1.0,
+) -> list[Box]:
+    """Crops around detection clusters, or the grid when they are absent or too many.
+
+    Args:
+        size: (width, height) of the upload.
+        tile_size: Longest side (px of the upload) of a tile.
+        overlap: Share of tile_size overlapping neighbours (padding of clusters).
+        max_tiles: Most regions returned.
+        detections: Local detections ({"box": [x1, y1, x2, y2], ...}).
+        detection_scale: Upload px per detection px (detections run on the
+            prepared, possibly downscaled, image).
+    """
+    boxes = [
+        tuple(round(v * detection_scale) for v in d["box"])
+        for d in detections or ()
+        if len(d.get("box") or ()) == 4
+    ]
+    if boxes:
+        regions = plan_clusters(boxes, size, tile_size, int(tile_size * overlap / 2))
+        if len(regions) <= max_tiles:
+            return regions
+    return plan_grid(size, tile_size, overlap, max_tiles)
+
+
+def crop_regions(
+    image_bytes: bytes,
+    regions: list[Box],
+    max_side: int,
+    image_format: str = "jpeg",
+    quality: int = 90,
+) -> list[tuple[PreparedImage, float]]:
+    """Crop and encode each region; returns (tile, upload px per tile px) pairs.
+
+    CPU-bound: call it from a worker thread in async code. Tiles above max_side
+    are downscaled (grid tiles enlarged to respect max_tiles).
+    """
+    with warnings.catch_warnings():
+        # Oversized uploads are rejected earlier by the guardrail pre-filter
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            source.load()
+            tiles = []
+            for region in regions:
+                crop = source.crop(region)
+                crop.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                tile = encode_image(crop, image_format, quality)
+                tiles.append((tile, (region[2] - region[0]) / crop.width))
+    return tiles
+
+
+def tile_detections(
+    detections: list[dict[str, Any]] | None,
+    region: Box,
+    detection_scale: float,
+    tile_scale: float,
+) -> list[dict[str, Any]]:
+    """Detections centred in region, with boxes in pixels of the tile."""
+    result = []
+    for detection in detections or ():
+        box = detection.get("box") or ()
+        if len(box) != 4:
+            continue
+        x1, y1, x2, y2 = (v * detection_scale for v in box)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        if not (region[0] <= cx < region[2] and region[1] <= cy < region[3]):
+            continue
+        result.append(
+            {
+                **detection,
+                "box": [
+                    round((x1 - region[0]) / tile_scale),
+                    round((y1 - region[1]) / tile_scale),
+                    round((x2 - region[0]) / tile_scale),
+                    round((y2 - region[1]) / tile_scale),
+                ],
+            }
+        )
+    return result
+
+
+def _normalize(name: Any) -> str:
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(name or "").lower()).split())
+
+
+def name_similarity(a: Any, b: Any) -> float:
+    """Similarity (0-1) of two component names, ignoring case and punctuation.
+
+    Names with different numbers ("web 1" / "web 2") are different components.
+    """
+    a, b = _normalize(a), _normalize(b)
+    if not a or not b or re.findall(r"\d+", a) != re.findall(r"\d+", b):
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _box_overlap(a: list[float], b: list[float]) -> float:
+    """Intersection over the smaller of the two boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return width * height / smaller if smaller > 0 else 0.0
+
+
+def _to_upload(box: Any, region: Box, scale: float) -> list[float] | None:
+    """Box in tile pixels -> pixels of the upload (None if missing or malformed)."""
+    if not isinstance(box, (list, tuple)) or len(box) != 4:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in box)
+    except (TypeError, ValueError):
+        return None
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return [
+        region[0] + x1 * scale,
+        region[1] + y1 * scale,
+        region[0] + x2 * scale,
+        region[1] + y2 * scale,
+    ]
+
+
+def _same_component(
+    merged: dict[str, Any], component: dict[str, Any], box: list[float] | None
+) -> bool:
+    similarity = name_similarity(merged.get("name"), component.get("name"))
+    if box is not None and merged.get("box") is not None:
+        # Both located: the same place and a compatible name
+        return (
+            similarity >= POSITION_NAME_SIMILARITY
+            and _box_overlap(merged["box"], box) >= BOX_OVERLAP
+        )
+    if similarity >= NAME_SIMILARITY:
+        return True
+    return (
+        str(merged["source_id"]) == str(component["id"])
+        and similarity >= POSITION_NAME_SIMILARITY
+    )
+
+
+def merge_tile_results(
+    results: list[tuple[Box, float, dict[str, Any]]],
+) -> dict[str, Any]:
+    """Merge the diagram data of the overview and the tiles (see module docstring).
+
+    Args:
+        results: (region in upload pixels, upload px per image px, diagram data)
+            of each call, overview first. Boxes of the returned components are
+            dropped.
+    """
+    components: list[dict[str, Any]] = []
+    used_ids: set[str] = set()
+    connections: dict[tuple[str, str], dict[str, Any]] = {}
+    boundaries: dict[str, Any] = {}
+    model = None
+    for index, (region, scale, data) in enumerate(results):
+        model = model or data.get("model")
+        id_map: dict[str, str] = {}
+        claimed: set[str] = set()
+        for component in data.get("components") or ():
+            if not isinstance(component, dict) or component.get("id") is None:
+                continue
+            box = _to_upload(component.get("box"), region, scale)
+            match = next(
+                (
+                    m
+                    for m in components
+                    # Components of one answer are distinct; match each at most once
+                    if m["tile"] != index
+                    and m["id"] not in claimed
+                    and _same_component(m, component, box)
+                ),
+                None,
+            )
+            if match is not None:
+                claimed.add(match["id"])
+                id_map[str(component["id"])] = match["id"]
+                for key, value in component.items():
+                    if key not in ("id", "box", "tile") and not match.get(key):
+                        match[key] = value
+                if match.get("box") is None:
+                    match["box"] = box
+                continue
+            base_id = new_id = str(component["id"])
+            suffix = 1
+            while new_id in used_ids:
+                # Same id for another component (ids are chosen per call)
+                new_id = f"{base_id}_t{index}" + (f"_{suffix}" if suffix > 1 else "")
+                suffix += 1
+            used_ids.add(new_id)
+            id_map[str(component["id"])] = new_id
+            components.append(
+                {
+                    **component,
+                    "id": new_id,
+                    "box": box,
+                    "source_id": component["id"],
+                    "tile": index,
+                }
+            )
+        for connection in data.get("connections") or ():
+            if not isinstance(connection, dict):
+                continue
+            source = id_map.get(str(connection.get("from")))
+            target = id_map.get(str(connection.get("to")))
+            if source is None or target is None or source == target:
+                continue
+            existing = connections.get((source, target))
+            if existing is None:
+                connections[(source, target)] = {
+                    **connection,
+                    "from": source,
+                    "to": target,
+                }
+            else:
+                for key, value in connection.items():
+                    if key not in ("from", "to") and not existing.get(key):
+                        existing[key] = value
+        for boundary in data.get("boundaries") or ():
+            key = _normalize(
+                boundary.get("name") if isinstance(boundary, dict) else boundary
+            )
+            if key and key not in boundaries:
+                boundaries[key] = boundary
+    return {
+        # AnalysisResponse.model_used is a str: tiles may all lack a model name
+        "model": model or "Unknown",
+        "components": [
+            {k: v for k, v in c.items() if k not in ("box", "source_id", "tile")}
+            for c in components
+        ],
+        "connections": list(connections.values()),
+        "boundaries": list(boundaries.values()),
+    }
@@ -1,8 +1,19 @@
-"""DREAD risk scoring agent with LLM fallback."""
+"""DREAD risk scoring agent with LLM fallback.
 
+Threats are sent as compact records (id, component, type, short description) in
+chunks of settings.dread_chunk_size, scored concurrently (at most
+settings.dread_max_parallel_chunks at once). The model answers only
+{id: [D, R, E, A, D]}; scores are clamped to 1-10 and merged back into the
+original threat dicts locally, so the model never echoes the threats. With
+settings.llm_structured_output the answer schema of a chunk lists its ids.
+"""
+
+import asyncio
 import json
-from typing import Any
+from functools import lru_cache
+from typing import Annotated, Any
 
+from pydantic import BaseModel, Field, create_model
 from threat_modeling_shared.logging import get_logger
 
 from app.config import Settings
@@ -12,6 +23,7 @@ from app.threat_analysis.llm import (
     LLMCacheService,
     OllamaConnection,
     OpenAIConnection,
+    response_schema_for,
     run_text_with_fallback,
 )
 
@@ -31,21 +43,80 @@ Be consistent and realistic in your scoring."""
 
 DREAD_USER_PROMPT = """Score the following threats using DREAD methodology.
 
-Threats to score:
+Threats to score (one JSON record per line: id, component, type, description):
 {threats}
 
-For each threat, return the original threat object with added DREAD scoring:
-- dread_score: the average of all 5 DREAD scores (rounded to 2 decimal places)
-- dread_details: object with individual scores (damage, reproducibility, exploitability, affected_users, discoverability)
-
-Return ONLY a JSON list with the scored threats."""
+Return ONLY a JSON object mapping each threat id to its 5 integer scores (1-10)
+in this order: [damage, reproducibility, exploitability, affected_users, discoverability].
+Example: {{"T1": [7, 5, 6, 8, 4], "T2": [3, 4, 2, 5, 6]}}"""
 
 CONNECTION_ORDER = [GeminiConnection, OpenAIConnection, OllamaConnection]
 
+DREAD_DIMENSIONS = (
+    "damage",
+    "reproducibility",
+    "exploitability",
+    "affected_users",
+    "discoverability",
+)
+
+# Descriptions are cut to this many characters in the scoring records
+DESCRIPTION_MAX_CHARS = 240
+
+# [damage, reproducibility, exploitability, affected_users, discoverability]
+DreadVector = Annotated[
+    list[Annotated[int, Field(ge=1, le=10)]],
+    Field(min_length=len(DREAD_DIMENSIONS), max_length=len(DREAD_DIMENSIONS)),
+]
+
+
+@lru_cache
+def _scores_model(count: int) -> type[BaseModel]:
+    """Answer model of a chunk of count threats: {"T1": DreadVector, ...}."""
+    return create_model(
+        "DreadChunkScores",
+        **{f"T{i}": (DreadVector, ...) for i in range(1, count + 1)},
+    )
+
+
+def _compact_record(threat_id: str, threat: dict[str, Any]) -> str:
+    """One-line JSON record of threat: id, component, type and short description."""
+    description = str(threat.get("description", ""))
+    if len(description) > DESCRIPTION_MAX_CHARS:
+        description = description[: DESCRIPTION_MAX_CHARS - 3] + "..."
+    return json.dumps(
+        {
+            "id": threat_id,
+            "component": threat.get("component_id"),
+            "type": threat.get("threat_type"),
+            "description": description,
+        },
+        ensure_ascii=False,
+    )
+
+
+def _parse_scores(value: Any) -> dict[str, int] | None:
+    """DREAD details from [D, R, E, A, D] (or a dict of dimensions), clamped to 1-10."""
+    if isinstance(value, dict):
+        value = [value.get(dim) for dim in DREAD_DIMENSIONS]
+    if not isinstance(value, list) or len(value) != len(DREAD_DIMENSIONS):
+        return None
+    try:
+        return {
+            dim: max(1, min(10, round(float(score))))
+            for dim, score in zip(DREAD_DIMENSIONS, value, strict=True)
+        }
+    except (TypeError, ValueError):
+        return None
+
 
 def _validate_dread_result(result: Any) -> bool:
-    """Validate DREAD result is a list of threats."""
-    return isinstance(result, list)
+    """Validate DREAD result is an {id: scores} object with at least one usable entry."""
+    return (
+        isinstance(result, dict)
+        and "error" not in result
+        and any(_parse_scores(v) is not None for v in result.values())
+    )
 
 
 class DreadAgent(BaseAgent):
@@ -56,30 +127,68 @@ class DreadAgent(BaseAgent):
         self._cache = LLMCacheService(redis_url=settings.redis_url)
 
     async def analyze(self, threats: list[dict[str, Any]]) -> list[dict[str, Any]]:
-        """Score threats using DREAD methodology."""
+        """Score threats using DREAD methodology.
+
+        Threats whose chunk failed (or that the model left out) are returned
+        unscored.
+        """
         if not threats:
             return []
-        logger.info("Starting DREAD scoring for %d threats", len(threats))
-        threats_str = json.dumps(threats, indent=2)
-        user_content = DREAD_USER_PROMPT.format(threats=threats_str)
+        size = max(1, self.settings.dread_chunk_size)
+        chunks = [threats[i : i + size] for i in range(0, len(threats), size)]
+        logger.info(
+            "Starting DREAD scoring for %d threats in %d chunks",
+            len(threats),
+            len(chunks),
+        )
+        limit = asyncio.Semaphore(max(1, self.settings.dread_max_parallel_chunks))
+
+        async def score(chunk: list[dict[str, Any]]) -> list[dict[str, Any]]:
+            async with limit:
+                return await self._score_chunk(chunk)
+
+        results = await asyncio.gather(*(score(chunk) for chunk in chunks))
+        return [threat for scored in results for threat in scored]
+
+    async def _score_chunk(self, threats: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Score one chunk and merge the scores into copies of its threats."""
+        ids = [f"T{i}" for i in range(1, len(threats) + 1)]
+        records = "\n".join(
+            _compact_record(threat_id, threat)
+            for threat_id, threat in zip(ids, threats, strict=True)
+        )
         messages = [
             {"role": "system", "content": DREAD_SYSTEM_PROMPT},
-            {"role": "user", "content": user_content},
+            {"role": "user", "content": DREAD_USER_PROMPT.format(threats=records)},
         ]
         result = await run_text_with_fallback(
             connections=CONNECTION_ORDER,
             settings=self.settings,
             messages=messages,
-            cache_get=self._cache.get,
-            cache_set=self._cache.set,
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
             cache_key_prefix="dread",
             validate=_validate_dread_result,
+            hedge_delay=self.settings.llm_hedge_delay_seconds,
+            response_schema=response_schema_for(
+                self.settings, _scores_model(len(threats))
+            ),
         )
         if "error" in result:
             logger.error("DREAD scoring failed: %s", result.get("error"))
             return threats  # Return original without scores
-        scored = result if isinstance(result, list) else threats
-        for t in scored:
-            if "dread_score" in t:
-                t["dread_score"] = max(1, min(10, t["dread_score"]))
+        scored = []
+        for threat_id, threat in zip(ids, threats, strict=True):
+            details = _parse_scores(result.get(threat_id))
+            if details is None:
+                logger.warning("DREAD scores missing for %s", threat_id)
+                scored.append(threat)
+                continue
+            scored.append(
+                {
+                    **threat,
+                    "dread_score": round(sum(details.values()) / len(details), 2),
+                    "dread_details": details,
+                }
+            )
         return scored
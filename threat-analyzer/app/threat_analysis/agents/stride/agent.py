@@ -1,19 +1,23 @@
 """STRIDE threat analysis agent with RAG support and LLM fallback."""
 
+from collections.abc import AsyncIterator
 from typing import Any
 
 from threat_modeling_shared.logging import get_logger
 
 from app.config import Settings
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
 from app.threat_analysis.agents.base import BaseAgent
 from app.threat_analysis.llm import (
     GeminiConnection,
     LLMCacheService,
     OllamaConnection,
     OpenAIConnection,
+    response_schema_for,
     run_text_with_fallback,
+    stream_text_with_fallback,
 )
+from app.threat_analysis.schemas import StrideThreat
 
 logger = get_logger("agents.stride")
 
@@ -70,7 +74,7 @@ class StrideAgent(BaseAgent):
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
         self._cache = LLMCacheService(redis_url=settings.redis_url)
-        self._rag_service = RAGService(settings)
+        self._rag_service = get_rag_service()
 
     @property
     def _retriever(self) -> Any | None:
@@ -80,6 +84,47 @@ class StrideAgent(BaseAgent):
     async def analyze(self, diagram_data: dict[str, Any]) -> list[dict[str, Any]]:
         """Analyze diagram for STRIDE threats."""
         logger.info("Starting STRIDE analysis")
+        result = await run_text_with_fallback(
+            connections=CONNECTION_ORDER,
+            settings=self.settings,
+            messages=self._build_messages(diagram_data),
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
+            cache_key_prefix="stride",
+            validate=_validate_stride_result,
+            hedge_delay=self.settings.llm_hedge_delay_seconds,
+            response_schema=response_schema_for(self.settings, list[StrideThreat]),
+        )
+        if "error" in result:
+            logger.error("STRIDE analysis failed: %s", result.get("error"))
+            return []
+        return result if isinstance(result, list) else []
+
+    async def astream(
+        self, diagram_data: dict[str, Any]
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Stream STRIDE threats one by one as the model writes them.
+
+        Shares the cache with analyze(); yields nothing if every provider failed.
+        """
+        logger.info("Starting STRIDE analysis (stream)")
+        count = 0
+        async for threat in stream_text_with_fallback(
+            connections=CONNECTION_ORDER,
+            settings=self.settings,
+            messages=self._build_messages(diagram_data),
+            cache_get=self._cache.aget,
+            cache_set=self._cache.aset,
+            cache_key_prefix="stride",
+            validate=_validate_stride_result,
+        ):
+            if isinstance(threat, dict):
+                count += 1
+                yield threat
+        logger.info("STRIDE stream complete: %d threats", count)
+
+    def _build_messages(self, diagram_data: dict[str, Any]) -> list[dict[str, str]]:
+        """System prompt (with RAG context when available) and user prompt."""
         context = ""
         retriever = self._retriever
         if retriever:
@@ -99,23 +144,10 @@ class StrideAgent(BaseAgent):
             boundaries=", ".join(diagram_data.get("boundaries", []))
             or "None identified",
         )
-        messages = [
+        return [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_content},
         ]
-        result = await run_text_with_fallback(
-            connections=CONNECTION_ORDER,
-            settings=self.settings,
-            messages=messages,
-            cache_get=self._cache.get,
-            cache_set=self._cache.set,
-            cache_key_prefix="stride",
-            validate=_validate_stride_result,
-        )
-        if "error" in result:
-            logger.error("STRIDE analysis failed: %s", result.get("error"))
-            return []
-        return result if isinstance(result, list) else []
 
     def _format_components(self, components: list[dict[str, Any]]) -> str:
         if not components:
@@ -1,5 +1,8 @@
 """Threat Analysis Controller - business logic for diagram analysis."""
 
+from collections.abc import AsyncIterator
+from typing import Any
+
 from threat_modeling_shared.logging import get_logger
 
 from app.config import Settings
@@ -29,8 +32,8 @@ class ThreatAnalysisController:
         Args:
             image_bytes: Raw image content.
             content_type: MIME type of the upload (e.g. image/png). Validated against allowed_image_types.
-            confidence: Optional detection confidence threshold (for future YOLO).
-            iou: Optional IoU threshold (for future YOLO).
+            confidence: Optional detection confidence threshold (settings.detection_enabled).
+            iou: Optional detection IoU threshold (NMS).
 
         Returns:
             Complete analysis response with components, threats, and risk.
@@ -48,9 +51,40 @@ class ThreatAnalysisController:
             iou,
         )
 
-        result = await self._service.run_full_analysis(image_bytes)
+        result = await self._service.run_full_analysis(
+            image_bytes, confidence=confidence, iou=iou
+        )
         return result
 
+    def analyze_stream(
+        self,
+        image_bytes: bytes,
+        content_type: str | None = None,
+        confidence: float | None = None,
+        iou: float | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Validate input and return the streaming analysis events.
+
+        Input errors are raised here, before any event is produced; see
+        ThreatModelService.stream_full_analysis for the events.
+
+        Raises:
+            InvalidFileTypeError: If content_type is not allowed.
+            ThreatModelingError: If the image is empty or too large.
+        """
+        self._validate_input(image_bytes, content_type)
+
+        logger.info(
+            "Running streaming analysis: size=%d bytes, confidence=%s, iou=%s",
+            len(image_bytes),
+            confidence,
+            iou,
+        )
+
+        return self._service.stream_full_analysis(
+            image_bytes, confidence=confidence, iou=iou
+        )
+
     def _validate_input(
         self, image_bytes: bytes, content_type: str | None = None
     ) -> None:
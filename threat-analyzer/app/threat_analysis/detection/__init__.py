@@ -0,0 +1,27 @@
+"""Local component detection (YOLO) used as hints for the LLM stages."""
+
+from .batcher import (
+    DetectionBatcher,
+    detect_components,
+    detection_batcher_loaded,
+    get_detection_batcher,
+    load_detection_batcher,
+)
+from .detector import (
+    ComponentDetector,
+    OnnxComponentDetector,
+    UltralyticsComponentDetector,
+    get_component_detector,
+)
+
+__all__ = [
+    "ComponentDetector",
+    "DetectionBatcher",
+    "OnnxComponentDetector",
+    "UltralyticsComponentDetector",
+    "detect_components",
+    "detection_batcher_loaded",
+    "get_component_detector",
+    "get_detection_batcher",
+    "load_detection_batcher",
+]
@@ -0,0 +1,286 @@
+"""Dynamic micro-batching of detection requests.
+
+Run one image at a time, the detector leaves most of the CPU's vector width
+unused: a batch of B letterboxed images goes through the convolutions as one
+(B, 3, S, S) tensor for little more than the cost of a single image. The
+batcher gathers the images of concurrent /analyze requests into such batches:
+
+- each call to detect() enqueues (image, confidence, iou) with a future;
+- settings.detection_workers collector threads take the oldest queued image,
+  then wait up to settings.detection_batch_max_wait_ms for more, stopping early
+  at settings.detection_batch_max_size images;
+- the batch is decoded and run with one ComponentDetector.detect_batch call
+  (one onnxruntime run, or one ultralytics predict per distinct thresholds),
+  and each future gets the detections of its own image.
+
+Under light load a request waits at most max_wait for company; under heavy
+load batches fill up immediately and throughput grows with the batch size
+instead of with the number of requests. The collectors are plain threads fed
+by a thread-safe queue, so every event loop of the process (and any sync
+caller) shares the same batches. Batch sizes, queue waits and queue depth are
+reported by snapshot() (GET /metrics/detection).
+
+Loading the weights takes seconds: async code gets the batcher through
+load_detection_batcher, which loads it once in a worker thread (the app
+lifespan does so at startup), never on the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.config import Settings, get_settings
+from app.threat_analysis.detection.detector import (
+    ComponentDetector,
+    decode_image,
+    detection_params,
+    get_component_detector,
+)
+from app.threat_analysis.llm.image import PreparedImage
+
+logger = get_logger("detection.batcher")
+
+# Batches kept (rolling window) for the size / wait / inference statistics
+STATS_WINDOW = 500
+
+_load_lock = threading.Lock()
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+    if not samples:
+        return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "mean": round(sum(samples) / len(samples), 4),
+        "p95": round(samples[int(0.95 * (len(samples) - 1))], 4),
+        "max": round(samples[-1], 4),
+    }
+
+
+class DetectionBatcher:
+    """Collects concurrent detection requests into batched detector calls."""
+
+    def __init__(
+        self,
+        detector: ComponentDetector,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        workers: int = 1,
+    ) -> None:
+        """Initialize the batcher (collector threads start on first use).
+
+        Args:
+            detector: Detector whose detect_batch runs each batch.
+            max_batch_size: Most images per batch.
+            max_wait: Longest (seconds) the oldest image waits for more to join.
+            workers: Collector threads, i.e. batches running at once.
+        """
+        self._detector = detector
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait)
+        self._workers = max(1, workers)
+        self._queue: queue.Queue[tuple[Any, tuple[float, float], float, Future]] = (
+            queue.Queue()
+        )
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._counters = {"batches": 0, "images": 0, "failed": 0, "max_queue_depth": 0}
+        self._sizes: deque[int] = deque(maxlen=STATS_WINDOW)
+        self._waits: deque[float] = deque(maxlen=STATS_WINDOW)
+        self._inference: deque[float] = deque(maxlen=STATS_WINDOW)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self._workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"detection-batcher-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self, image: bytes | PreparedImage, params: tuple[float, float]
+    ) -> Future:
+        """Queue image with its (confidence, iou); the future gets its detections."""
+        self._start()
+        future: Future = Future()
+        self._queue.put((image, params, time.monotonic(), future))
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self._counters["max_queue_depth"]:
+                self._counters["max_queue_depth"] = depth
+        return future
+
+    async def detect(
+        self, image: bytes | PreparedImage, params: tuple[float, float]
+    ) -> list[dict[str, Any]]:
+        """Detections of image, computed in the next batch.
+
+        A caller cancelled before its batch starts is dropped from the batch;
+        once the batch runs, its result is simply discarded.
+        """
+        return await asyncio.wrap_future(self.submit(image, params))
+
+    def _collect(self) -> list[tuple[Any, tuple[float, float], float, Future]]:
+        """Block for the oldest queued image, then gather more until full or max_wait."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # A dead collector would leave every later detect() waiting forever
+                logger.error("Detection batch of %d images failed: %s", len(batch), e)
+                with self._lock:
+                    self._counters["failed"] += 1
+                for *_item, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(
+        self, batch: list[tuple[Any, tuple[float, float], float, Future]]
+    ) -> None:
+        started = time.monotonic()
+        images, params, futures = [], [], []
+        for image, param, queued_at, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                images.append(decode_image(image))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            params.append(param)
+            futures.append(future)
+            with self._lock:
+                self._waits.append(started - queued_at)
+        if not images:
+            return
+        try:
+            results = self._detector.detect_batch(images, params)
+        except Exception as e:
+            logger.warning("Detection batch of %d images failed: %s", len(images), e)
+            with self._lock:
+                self._counters["failed"] += 1
+            for future in futures:
+                future.set_exception(e)
+            return
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["images"] += len(images)
+            self._sizes.append(len(images))
+            self._inference.append(elapsed)
+        logger.debug("Detection batch: %d images in %.3fs", len(images), elapsed)
+        for future, detections in zip(futures, results, strict=True):
+            future.set_result(detections)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Configuration, counters, batch sizes and timings (seconds)."""
+        with self._lock:
+            sizes = list(self._sizes)
+            return {
+                "max_batch_size": self._max_batch_size,
+                "max_wait_seconds": self._max_wait,
+                "workers": self._workers,
+                **self._counters,
+                "queue_depth": self._queue.qsize(),
+                "batch_size": {
+                    "samples": len(sizes),
+                    "mean": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                    "max": max(sizes, default=0),
+                },
+                "queue_wait": _summary(list(self._waits)),
+                "inference": _summary(list(self._inference)),
+            }
+
+
+@lru_cache
+def get_detection_batcher() -> DetectionBatcher | None:
+    """Get the process-wide batcher (None when no detector is available).
+
+    Loads the weights on first call (blocking): see load_detection_batcher.
+    """
+    detector = get_component_detector()
+    if detector is None:
+        return None
+    settings = get_settings()
+    return DetectionBatcher(
+        detector,
+        max_batch_size=settings.detection_batch_max_size,
+        max_wait=settings.detection_batch_max_wait_ms / 1000,
+        workers=settings.detection_workers,
+    )
+
+
+def _load_detection_batcher() -> DetectionBatcher | None:
+    # One load even when several threads ask before it is cached
+    with _load_lock:
+        return get_detection_batcher()
+
+
+async def load_detection_batcher() -> DetectionBatcher | None:
+    """Get the process-wide batcher, loading the weights in a worker thread."""
+    if detection_batcher_loaded():
+        return get_detection_batcher()
+    return await asyncio.to_thread(_load_detection_batcher)
+
+
+def detection_batcher_loaded() -> bool:
+    """Whether get_detection_batcher has loaded (it returns without blocking)."""
+    return bool(get_detection_batcher.cache_info().currsize)
+
+
+async def detect_components(
+    image: bytes | PreparedImage,
+    settings: Settings,
+    confidence: float | None = None,
+    iou: float | None = None,
+) -> list[dict[str, Any]]:
+    """Detect components in the next batch; [] when detection is off or fails.
+
+    Returns:
+        At most settings.detection_max_hints detections, best first.
+    """
+    batcher = await load_detection_batcher()
+    if batcher is None:
+        return []
+    params = detection_params(settings, confidence, iou)
+    try:
+        detections = await batcher.detect(image, params)
+    except Exception as e:
+        logger.warning("Detection failed, continuing without hints: %s", e)
+        return []
+    detections.sort(key=lambda d: d["confidence"], reverse=True)
+    logger.info(
+        "Detection: %d components (confidence=%.2f, iou=%.2f)",
+        len(detections),
+        *params,
+    )
+    return detections[: settings.detection_max_hints]
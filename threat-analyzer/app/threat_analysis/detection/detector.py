@@ -0,0 +1,314 @@
+"""Local component detection (YOLO) on CPU, used as hints for the diagram stage.
+
+The weights trained by notebooks/scripts/train/train_yolo.py
+(outputs/{roboflow|kaggle}/weights/best.pt), or an ONNX export of them, are
+loaded once per process from settings.detection_model_path:
+
+- .onnx: onnxruntime with the CPU provider. Letterboxing, box decoding and NMS
+  are done here with NumPy, so serving needs neither torch nor ultralytics.
+  The export must be the plain detection head (output (batch, 4 + classes,
+  anchors), no embedded NMS); class names come from the export metadata.
+- anything else (.pt): ultralytics YOLO on device="cpu".
+
+Inference runs in the collector threads of the batcher (detection.batcher),
+which groups concurrent requests into one detect_batch call: both runtimes
+release the GIL while computing, so threads keep the event loop free without
+the pickling cost of shipping images to worker processes. An onnxruntime
+session may be run from several threads at once; an ultralytics YOLO model
+may not (predict builds and mutates a shared predictor), so its batches are
+serialised by a lock whatever settings.detection_workers is.
+
+confidence and iou come from the request (AnalysisRequest) or default to
+settings.detection_confidence / settings.detection_iou. The runtimes are
+optional dependencies: without them, or without weights, detection is off and
+the pipeline runs as before.
+"""
+
+from __future__ import annotations
+
+import ast
+import io
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.config import Settings, get_settings
+from app.threat_analysis.llm.image import PreparedImage, as_prepared_image
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    Image = None
+
+logger = get_logger("detection")
+
+# Letterbox padding colour (same as ultralytics)
+_PAD_VALUE = 114
+
+
+def letterbox(image: Any, size: int) -> tuple[Any, float, tuple[float, float]]:
+    """Resize image (RGB PIL) to fit size x size keeping its ratio, padded.
+
+    Returns:
+        (tensor, scale, (pad_x, pad_y)): float32 CHW tensor in [0, 1], the
+        resize factor and the left/top padding, to map boxes back.
+    """
+    width, height = image.size
+    scale = min(size / width, size / height)
+    new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+    resized = image.resize((new_w, new_h), Image.Resampling.BILINEAR)
+    canvas = Image.new("RGB", (size, size), (_PAD_VALUE,) * 3)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas.paste(resized, (pad_x, pad_y))
+    tensor = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return tensor, scale, (float(pad_x), float(pad_y))
+
+
+def non_max_suppression(boxes: Any, scores: Any, classes: Any, iou: float) -> Any:
+    """Indices of the boxes kept by class-aware greedy NMS (best score first)."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Offset each class into its own region so boxes of different classes never overlap
+    offset = classes[:, None].astype(np.float32) * (boxes.max() + 1.0)
+    shifted = boxes + offset
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        inter_w = (
+            np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest])
+        ).clip(0)
+        inter_h = (
+            np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest])
+        ).clip(0)
+        inter = inter_w * inter_h
+        overlap = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def decode_predictions(
+    prediction: Any,
+    confidence: float,
+    iou: float,
+    scale: float,
+    pad: tuple[float, float],
+    image_size: tuple[int, int],
+    names: dict[int, str],
+) -> list[dict[str, Any]]:
+    """Detections of one image from a YOLO head output of shape (4 + classes, anchors).
+
+    Boxes (center x, center y, width, height in letterboxed pixels) are mapped
+    back to image_size, filtered by confidence and reduced by NMS at iou.
+    """
+    scores_per_class = prediction[4:]
+    classes = scores_per_class.argmax(axis=0)
+    scores = scores_per_class[classes, np.arange(prediction.shape[1])]
+    mask = scores >= confidence
+    if not mask.any():
+        return []
+    cx, cy, w, h = prediction[:4, mask]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / scale).clip(0, image_size[0])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / scale).clip(0, image_size[1])
+    scores, classes = scores[mask], classes[mask]
+    keep = non_max_suppression(boxes, scores, classes, iou)
+    return [_detection(names, classes[i], scores[i], boxes[i]) for i in keep]
+
+
+def _detection(names: dict[int, str], cls: Any, score: Any, box: Any) -> dict[str, Any]:
+    return {
+        "label": names.get(int(cls), str(int(cls))),
+        "confidence": round(float(score), 3),
+        "box": [int(round(float(v))) for v in box],
+    }
+
+
+class ComponentDetector(ABC):
+    """Detects diagram components in RGB images."""
+
+    @abstractmethod
+    def detect_batch(
+        self, images: list[Any], params: list[tuple[float, float]]
+    ) -> list[list[dict[str, Any]]]:
+        """Detections for each image, with its own (confidence, iou) thresholds.
+
+        Returns:
+            One list per image of {"label", "confidence", "box": [x1, y1, x2, y2]}
+            with boxes in pixels of that image.
+        """
+
+
+class OnnxComponentDetector(ComponentDetector):
+    """YOLO ONNX export run with onnxruntime (CPU)."""
+
+    def __init__(
+        self, session: Any, image_size: int, names: dict[int, str] | None = None
+    ) -> None:
+        """Initialize the detector.
+
+        Args:
+            session: onnxruntime.InferenceSession of the export.
+            image_size: Square input size of the export (imgsz at export time).
+            names: Class names; read from the export metadata when None.
+        """
+        self._session = session
+        self._image_size = image_size
+        model_input = session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Exports without dynamic=True take exactly one image per run
+        self._fixed_batch = model_input.shape[0] == 1
+        self.names = names if names is not None else _metadata_names(session)
+
+    @classmethod
+    def from_path(
+        cls, path: Path, image_size: int, threads: int
+    ) -> OnnxComponentDetector:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        session = onnxruntime.InferenceSession(
+            str(path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        return cls(session, image_size)
+
+    def detect_batch(
+        self, images: list[Any], params: list[tuple[float, float]]
+    ) -> list[list[dict[str, Any]]]:
+        boxed = [letterbox(image, self._image_size) for image in images]
+        tensors = np.stack([tensor for tensor, _, _ in boxed])
+        if self._fixed_batch:
+            outputs = np.concatenate(
+                [
+                    self._session.run(None, {self._input_name: tensors[i : i + 1]})[0]
+                    for i in range(len(images))
+                ]
+            )
+        else:
+            outputs = self._session.run(None, {self._input_name: tensors})[0]
+        return [
+            decode_predictions(
+                outputs[i], confidence, iou, scale, pad, images[i].size, self.names
+            )
+            for i, ((_, scale, pad), (confidence, iou)) in enumerate(
+                zip(boxed, params, strict=True)
+            )
+        ]
+
+
+class UltralyticsComponentDetector(ComponentDetector):
+    """YOLO weights (.pt) run with ultralytics on the CPU."""
+
+    def __init__(self, model: Any, image_size: int) -> None:
+        self._model = model
+        self._image_size = image_size
+        self.names = dict(model.names)
+        # YOLO.predict is not thread-safe: one batch at a time per model
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path: Path, image_size: int) -> UltralyticsComponentDetector:
+        from ultralytics import YOLO
+
+        return cls(YOLO(str(path)), image_size)
+
+    def detect_batch(
+        self, images: list[Any], params: list[tuple[float, float]]
+    ) -> list[list[dict[str, Any]]]:
+        results: list[list[dict[str, Any]]] = [[] for _ in images]
+        # One predict call per distinct (confidence, iou): NMS is applied inside it
+        groups: dict[tuple[float, float], list[int]] = {}
+        for index, param in enumerate(params):
+            groups.setdefault(param, []).append(index)
+        for (confidence, iou), indexes in groups.items():
+            with self._lock:
+                predictions = self._model.predict(
+                    source=[images[i] for i in indexes],
+                    conf=confidence,
+                    iou=iou,
+                    imgsz=self._image_size,
+                    device="cpu",
+                    verbose=False,
+                )
+            for index, prediction in zip(indexes, predictions, strict=True):
+                boxes = prediction.boxes
+                results[index] = [
+                    _detection(self.names, cls, score, box)
+                    for box, score, cls in zip(
+                        boxes.xyxy.tolist(), boxes.conf.tolist(), boxes.cls.tolist()
+                    )
+                ]
+        return results
+
+
+def _metadata_names(session: Any) -> dict[int, str]:
+    """Class names stored by the ultralytics export ("{0: 'a', 1: 'b'}")."""
+    raw = session.get_modelmeta().custom_metadata_map.get("names")
+    if not raw:
+        return {}
+    try:
+        return {int(k): str(v) for k, v in ast.literal_eval(raw).items()}
+    except (ValueError, SyntaxError, AttributeError):
+        return {}
+
+
+def load_component_detector(settings: Settings) -> ComponentDetector | None:
+    """Load the detector configured in settings (None if disabled or unavailable)."""
+    if not settings.detection_enabled or not settings.detection_model_path:
+        return None
+    if np is None or Image is None:
+        logger.warning("Detection disabled: Pillow/NumPy not installed")
+        return None
+    path = Path(settings.detection_model_path)
+    if not path.exists():
+        logger.warning("Detection disabled: weights not found at %s", path)
+        return None
+    try:
+        if path.suffix == ".onnx":
+            detector: ComponentDetector = OnnxComponentDetector.from_path(
+                path, settings.detection_image_size, settings.detection_threads
+            )
+        else:
+            detector = UltralyticsComponentDetector.from_path(
+                path, settings.detection_image_size
+            )
+    except Exception as e:
+        # ImportError (runtime not installed) or a corrupt/incompatible file
+        logger.warning("Detection disabled: could not load %s: %s", path, e)
+        return None
+    logger.info("Detection model loaded from %s", path)
+    return detector
+
+
+@lru_cache
+def get_component_detector() -> ComponentDetector | None:
+    """Get the process-wide detector (weights loaded once)."""
+    return load_component_detector(get_settings())
+
+
+def decode_image(image: bytes | PreparedImage) -> Any:
+    """RGB PIL image of raw or prepared image bytes."""
+    data = as_prepared_image(image).data
+    with Image.open(io.BytesIO(data)) as decoded:
+        return decoded.convert("RGB")
+
+
+def detection_params(
+    settings: Settings, confidence: float | None, iou: float | None
+) -> tuple[float, float]:
+    """(confidence, iou) of a request, defaulting to the settings."""
+    return (
+        settings.detection_confidence if confidence is None else confidence,
+        settings.detection_iou if iou is None else iou,
+    )
@@ -2,9 +2,18 @@
 
 from app.threat_analysis.exceptions import ArchitectureDiagramValidationError
 
-from .architecture_diagram_validator import validate_architecture_diagram
+from .architecture_diagram_validator import (
+    GUARDRAIL_CRITERIA,
+    check_architecture_verdict,
+    validate_architecture_diagram,
+)
+from .image_prefilter import prefilter_architecture_diagram, score_image
 
 __all__ = [
     "ArchitectureDiagramValidationError",
+    "GUARDRAIL_CRITERIA",
+    "check_architecture_verdict",
+    "prefilter_architecture_diagram",
+    "score_image",
     "validate_architecture_diagram",
 ]
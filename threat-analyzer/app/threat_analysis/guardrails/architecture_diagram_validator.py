@@ -1,11 +1,14 @@
 """Guardrail: validate that image is a valid architecture diagram.
 
 Rejects images that are not architecture diagrams (photos, sequence diagrams,
-flowcharts, random images, etc.) before running the full pipeline.
+flowcharts, random images, etc.) before running the full pipeline. Verdicts
+(accepted or rejected) are cached by prompt and image digest like the other
+stages, so re-submitting an image does not pay for another vision call.
 """
 
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Any
 
 from threat_modeling_shared.logging import get_logger
@@ -14,16 +17,19 @@ from app.config import Settings
 from app.threat_analysis.exceptions import ArchitectureDiagramValidationError
 from app.threat_analysis.llm import (
     GeminiConnection,
+    LLMCacheService,
     OllamaConnection,
     OpenAIConnection,
+    PreparedImage,
+    response_schema_for,
     run_vision_with_fallback,
 )
+from app.threat_analysis.schemas import ArchitectureDiagramVerdict
 
 logger = get_logger("guardrails.architecture")
 
-GUARDRAIL_PROMPT = """Analyze this image and determine if it is an architecture diagram.
-
-An architecture diagram shows:
+# What is (and is not) an architecture diagram; shared with the combined prompt
+GUARDRAIL_CRITERIA = """An architecture diagram shows:
 - System components (Users, Servers, Databases, Gateways, Load Balancers, APIs, etc.)
 - Connections and data flows between components
 - Trust boundaries (VPCs, networks, subnets)
@@ -33,7 +39,12 @@ NOT valid architecture diagrams:
 - Photos or screenshots of real environments
 - Flowcharts or process diagrams
 - Generic illustrations or clipart
-- Plain text or documents
+- Plain text or documents"""
+
+GUARDRAIL_PROMPT = (
+    "Analyze this image and determine if it is an architecture diagram.\n\n"
+    + GUARDRAIL_CRITERIA
+    + """
 
 Return ONLY a valid JSON object:
 {"is_architecture_diagram": true/false, "reason": "brief explanation in one sentence"}
@@ -42,10 +53,17 @@ Examples:
 - Valid: {"is_architecture_diagram": true, "reason": "Diagram shows web server, database, and load balancer with connections"}
 - Invalid: {"is_architecture_diagram": false, "reason": "This is a UML sequence diagram showing message flows, not architecture components"}
 """
+)
 
 CONNECTION_ORDER = [GeminiConnection, OpenAIConnection, OllamaConnection]
 
 
+@lru_cache
+def _get_guardrail_cache(redis_url: str) -> LLMCacheService:
+    """Verdict cache shared by all guardrail calls of the process."""
+    return LLMCacheService(redis_url=redis_url)
+
+
 def _validate_guardrail_result(result: dict[str, Any]) -> bool:
     """Check if guardrail LLM returned a valid structure."""
     if not isinstance(result, dict) or "error" in result:
@@ -56,8 +74,9 @@ def _validate_guardrail_result(result: dict[str, Any]) -> bool:
 
 
 async def validate_architecture_diagram(
-    image_bytes: bytes,
+    image_bytes: bytes | PreparedImage,
     settings: Settings,
+    image_digest: str | None = None,
 ) -> None:
     """Validate that the image is a valid architecture diagram.
 
@@ -65,23 +84,32 @@ async def validate_architecture_diagram(
     Raises ArchitectureDiagramValidationError if not valid.
 
     Args:
-        image_bytes: Raw image content.
+        image_bytes: Raw image content or the request's PreparedImage.
         settings: Application settings for LLM configuration.
+        image_digest: content_digest(image_bytes) if already computed by the caller.
 
     Raises:
         ArchitectureDiagramValidationError: If the image is not an architecture diagram.
     """
     logger.info("Guardrail: validating image is architecture diagram")
 
+    cache = (
+        _get_guardrail_cache(settings.redis_url)
+        if settings.guardrail_cache_enabled
+        else None
+    )
     result = await run_vision_with_fallback(
         connections=CONNECTION_ORDER,
         settings=settings,
         prompt=GUARDRAIL_PROMPT,
         image_bytes=image_bytes,
-        cache_get=None,
-        cache_set=None,
+        cache_get=cache.aget if cache else None,
+        cache_set=cache.aset if cache else None,
         cache_key_prefix="guardrail",
         validate=_validate_guardrail_result,
+        hedge_delay=settings.llm_hedge_delay_seconds,
+        image_digest=image_digest,
+        response_schema=response_schema_for(settings, ArchitectureDiagramVerdict),
     )
 
     if "error" in result:
@@ -91,6 +119,17 @@ async def validate_architecture_diagram(
         )
         return
 
+    check_architecture_verdict(result)
+
+
+def check_architecture_verdict(result: dict[str, Any]) -> None:
+    """Raise unless result holds a positive is_architecture_diagram verdict.
+
+    Shared by the guardrail and the combined guardrail + diagram call.
+
+    Raises:
+        ArchitectureDiagramValidationError: If the image is not an architecture diagram.
+    """
     raw_valid = result.get("is_architecture_diagram", False)
     is_valid = raw_valid is True or (
         isinstance(raw_valid, str) and raw_valid.lower() == "true"
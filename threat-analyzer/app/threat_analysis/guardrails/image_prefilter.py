@@ -0,0 +1,251 @@
+"""Local pre-guardrail: cheap image heuristics run before the LLM guardrail.
+
+Blank images, photos and noise cost a full vision round-trip before the LLM
+guardrail rejects them. This pre-filter looks at the image on the CPU first,
+with Pillow and NumPy only:
+
+1. Header (always): Image.open reads the dimensions without decoding the
+   pixels, so images above settings.guardrail_max_image_pixels (decompression
+   bombs) are rejected before any decode.
+2. Heuristics (settings.guardrail_prefilter_enabled): images with a side below
+   MIN_SIDE are rejected from the header too; otherwise, on a thumbnail of at
+   most THUMBNAIL_SIDE pixels (JPEG is decoded at reduced scale via draft),
+   image_features measures colour histogram entropy, the share of the dominant
+   colour, sharp edge density, edge sharpness and the ratio of text-like blocks.
+
+diagram_confidence turns the features into a probability that the image is a
+diagram: each feature adds evidence in log-odds units and a sigmoid maps the
+sum to [0, 1]. The weights put the sample diagrams of notebooks/assets above
+0.95 and blank, gradient, photo-like and noise images below 0.01, so the
+default threshold only rejects obvious non-diagrams. Anything above
+settings.guardrail_prefilter_reject_below goes on to the LLM guardrail: nothing
+is accepted locally, since flowcharts and sequence diagrams share every
+low-level statistic with architecture diagrams.
+
+Bytes Pillow cannot identify are left to the LLM guardrail (no opinion), and
+without Pillow/NumPy installed the pre-filter is a no-op.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import math
+import warnings
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.config import Settings
+from app.threat_analysis.exceptions import ArchitectureDiagramValidationError
+
+try:
+    import numpy as np
+    from PIL import Image, UnidentifiedImageError
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    Image = None
+
+logger = get_logger("guardrails.prefilter")
+
+# Smallest side (px) an architecture diagram can have
+MIN_SIDE = 32
+# Longest side (px) of the thumbnail the features are computed on
+THUMBNAIL_SIDE = 512
+# Gradient (0-255) above which an edge counts as sharp / below which it is flat
+_STRONG_EDGE = 32
+_WEAK_EDGE = 4
+# Blocks (px) for the text-like ratio, and their sharp-edge fraction thresholds
+_BLOCK = 16
+_TEXT_BLOCK_EDGES = 0.15
+_NONFLAT_BLOCK_EDGES = 0.02
+
+
+def read_image_size(image_bytes: bytes) -> tuple[int, int] | None:
+    """(width, height) from the image header, without decoding the pixels.
+
+    Returns:
+        None when Pillow is missing or cannot identify the bytes.
+
+    Raises:
+        PIL.Image.DecompressionBombError: Above twice Image.MAX_IMAGE_PIXELS,
+            where Pillow refuses to open the image at all.
+    """
+    if Image is None:
+        return None
+    try:
+        with warnings.catch_warnings():
+            # The caller enforces its own pixel limit
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                return image.size
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+
+def _thumbnail(image_bytes: bytes) -> Any:
+    """RGB thumbnail of the image (transparent areas composited on white)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft("RGB", (THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        image.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+    if "A" in image.getbands():
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image.convert("RGBA"))
+    return image.convert("RGB")
+
+
+def image_features(image_bytes: bytes) -> dict[str, float]:
+    """Low-level statistics of the image used by diagram_confidence.
+
+    - entropy: Shannon entropy (bits) of the 12-bit colour histogram; diagrams
+      use a few flat colours, photos and noise spread over thousands.
+    - dominant: share of the most frequent colour (the background of a diagram).
+    - edges: fraction of pixels with a sharp gradient (lines, box borders, text).
+    - sharpness: sharp edges / all edges; photos change intensity gradually.
+    - text_ratio: text-like blocks (dense sharp edges) / non-flat blocks; close
+      to 1 for pages of text, lower when boxes and lines are present.
+    """
+    rgb = np.asarray(_thumbnail(image_bytes))
+    quantized = (rgb >> 4).astype(np.int32)
+    colours = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+    histogram = np.bincount(colours.ravel(), minlength=4096)
+    probabilities = histogram[histogram > 0] / histogram.sum()
+    entropy = max(0.0, float(-(probabilities * np.log2(probabilities)).sum()))
+
+    gray = rgb.astype(np.int32) @ np.array([299, 587, 114], dtype=np.int32) // 1000
+    gradient = np.maximum(
+        np.abs(np.diff(gray, axis=1))[:-1, :], np.abs(np.diff(gray, axis=0))[:, :-1]
+    )
+    sharp = gradient > _STRONG_EDGE
+    edges = float(sharp.mean()) if sharp.size else 0.0
+    weak = float(((gradient > _WEAK_EDGE) & ~sharp).mean()) if sharp.size else 0.0
+
+    height = sharp.shape[0] - sharp.shape[0] % _BLOCK
+    width = sharp.shape[1] - sharp.shape[1] % _BLOCK
+    blocks = (
+        sharp[:height, :width]
+        .reshape(height // _BLOCK, _BLOCK, width // _BLOCK, _BLOCK)
+        .mean(axis=(1, 3))
+    )
+    nonflat = int((blocks > _NONFLAT_BLOCK_EDGES).sum())
+    text_like = int((blocks > _TEXT_BLOCK_EDGES).sum())
+    return {
+        "entropy": round(entropy, 3),
+        "dominant": round(float(histogram.max() / histogram.sum()), 4),
+        "edges": round(edges, 4),
+        "sharpness": round(edges / (edges + weak), 4) if edges + weak else 0.0,
+        "text_ratio": round(text_like / nonflat, 4) if nonflat else 0.0,
+    }
+
+
+def _ramp(value: float, start: float, end: float) -> float:
+    """0 at start, 1 at end, linear in between (either direction)."""
+    return min(1.0, max(0.0, (value - start) / (end - start)))
+
+
+def diagram_confidence(features: dict[str, float]) -> float:
+    """Probability (0-1) that an image with these features is a diagram."""
+    logit = (
+        4.0
+        - 8.0 * _ramp(features["entropy"], 6.0, 8.0)  # photo-like colour spread
+        - 6.0 * _ramp(features["dominant"], 0.15, 0.0)  # no background colour
+        - 9.0 * _ramp(features["edges"], 0.01, 0.0)  # blank or smooth
+        - 4.0 * _ramp(features["sharpness"], 0.35, 0.0)  # soft, photographic edges
+        - 4.0 * _ramp(features["text_ratio"], 0.8, 1.0)  # page of text
+    )
+    return round(1.0 / (1.0 + math.exp(-logit)), 4)
+
+
+def score_image(
+    image_bytes: bytes, max_pixels: int, heuristics: bool = True
+) -> tuple[float | None, str, dict[str, float]]:
+    """Diagram confidence of the image, why, and the features it came from.
+
+    Args:
+        image_bytes: Raw image content.
+        max_pixels: Largest width * height decoded (checked on the header).
+        heuristics: Compute the features; False runs the header checks only.
+
+    Returns:
+        (confidence, reason, features): confidence is 0.0 for header
+        rejections and None when there is no opinion (unreadable bytes,
+        heuristics off or Pillow/NumPy missing).
+    """
+    try:
+        size = read_image_size(image_bytes)
+    except Image.DecompressionBombError as e:
+        return 0.0, f"image rejected as a decompression bomb: {e}", {}
+    if size is None:
+        return None, "image header not readable", {}
+    width, height = size
+    if width * height > max_pixels:
+        return (
+            0.0,
+            f"image has {width * height} pixels, above the {max_pixels} limit",
+            {},
+        )
+    if not heuristics:
+        return None, "heuristics disabled", {}
+    if min(width, height) < MIN_SIDE:
+        return 0.0, f"image is {width}x{height}, too small for a diagram", {}
+    features = image_features(image_bytes)
+    confidence = diagram_confidence(features)
+    if features["edges"] < 0.01:
+        reason = "image is blank or has no sharp edges"
+    elif features["entropy"] > 6.0 and features["dominant"] < 0.15:
+        reason = "image looks like a photo (many colours, no background)"
+    elif features["text_ratio"] > 0.8:
+        reason = "image looks like a page of text"
+    else:
+        reason = "image statistics are compatible with a diagram"
+    return confidence, reason, features
+
+
+async def prefilter_architecture_diagram(
+    image_bytes: bytes, settings: Settings
+) -> float | None:
+    """Reject obvious non-diagrams on the CPU before the LLM guardrail.
+
+    Runs score_image in a worker thread so decoding does not block the loop.
+
+    Returns:
+        The diagram confidence, or None when the pre-filter had no opinion.
+
+    Raises:
+        ArchitectureDiagramValidationError: If the image is too large to decode
+            or its confidence is below settings.guardrail_prefilter_reject_below.
+    """
+    if Image is None or np is None:
+        return None
+    confidence, reason, features = await asyncio.to_thread(
+        score_image,
+        image_bytes,
+        settings.guardrail_max_image_pixels,
+        settings.guardrail_prefilter_enabled,
+    )
+    if confidence is None:
+        return None
+    if confidence < settings.guardrail_prefilter_reject_below:
+        logger.warning(
+            "Guardrail pre-filter: image rejected (confidence %.4f) - %s %s",
+            confidence,
+            reason,
+            features,
+        )
+        raise ArchitectureDiagramValidationError(
+            reason=f"Imagem não é um diagrama de arquitetura válido: {reason}",
+            details={
+                "prefilter_reason": reason,
+                "prefilter_confidence": confidence,
+                "features": features,
+            },
+        )
+    logger.info(
+        "Guardrail pre-filter: confidence %.4f, deferring to the LLM guardrail",
+        confidence,
+    )
+    return confidence
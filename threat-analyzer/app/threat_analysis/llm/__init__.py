@@ -1,18 +1,59 @@
 """LLM connection layer with fallback and cache."""
 
-from .base import LLMConnection
-from .cache import LLMCacheService
-from .fallback import run_text_with_fallback, run_vision_with_fallback
+from .base import LLMConnection, LLMStreamError
+from .cache import LLMCacheService, content_digest, prompt_digest
+from .circuit_breaker import CircuitBreaker, get_circuit_breaker
+from .fallback import (
+    run_text_with_fallback,
+    run_vision_with_fallback,
+    stream_text_with_fallback,
+)
 from .gemini_connection import GeminiConnection
+from .image import PreparedImage, as_prepared_image, prepare_image
+from .negative_cache import ProviderNegativeCache, get_negative_cache
 from .ollama_connection import OllamaConnection
 from .openai_connection import OpenAIConnection
+from .provider_router import AdaptiveProviderRouter, get_provider_router
+from .rate_limit import ProviderRateLimiter, RateLimitError, get_rate_limiter
+from .registry import (
+    DEFAULT_CONNECTION_ORDER,
+    ConnectionRegistry,
+    get_connection_registry,
+)
+from .stats import ProviderStats, get_provider_stats
+from .streaming import JSONArrayStreamParser
+from .structured import response_schema, response_schema_for
 
 __all__ = [
     "LLMConnection",
+    "LLMStreamError",
     "LLMCacheService",
+    "content_digest",
+    "prompt_digest",
+    "CircuitBreaker",
+    "get_circuit_breaker",
     "run_vision_with_fallback",
     "run_text_with_fallback",
+    "stream_text_with_fallback",
     "GeminiConnection",
+    "PreparedImage",
+    "as_prepared_image",
+    "prepare_image",
     "OpenAIConnection",
     "OllamaConnection",
+    "ProviderNegativeCache",
+    "get_negative_cache",
+    "AdaptiveProviderRouter",
+    "get_provider_router",
+    "ProviderRateLimiter",
+    "RateLimitError",
+    "get_rate_limiter",
+    "ConnectionRegistry",
+    "DEFAULT_CONNECTION_ORDER",
+    "get_connection_registry",
+    "ProviderStats",
+    "get_provider_stats",
+    "JSONArrayStreamParser",
+    "response_schema",
+    "response_schema_for",
 ]
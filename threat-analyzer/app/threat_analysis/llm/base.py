@@ -1,13 +1,38 @@
 """Base LLM connection interface."""
 
-import base64
+import asyncio
+import re
 import time
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from typing import Any
 
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from threat_modeling_shared.logging import get_logger
 
+from app.threat_analysis.llm.image import PreparedImage, as_prepared_image
+from app.threat_analysis.llm.json_extract import (
+    JSONExtractionError,
+    extract_json,
+    get_json_repair_stats,
+    loads,
+    repair_truncated_json,
+)
+from app.threat_analysis.llm.usage import extract_usage, record_partial, record_usage
+
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off. Continue it exactly from the last character, "
+    "without repeating anything and without commentary or code fences."
+)
+
+
+class LLMStreamError(Exception):
+    """Raised by LLMConnection.stream_text; result is the standard error dict."""
+
+    def __init__(self, result: dict[str, Any]) -> None:
+        self.result = result
+        super().__init__(result.get("error", "stream failed"))
+
 
 class LLMConnection(ABC):
     """Abstract base for LLM connection - proxy to a specific LLM service."""
@@ -18,6 +43,17 @@ class LLMConnection(ABC):
         """Display name for logging."""
         pass
 
+    @property
+    def model(self) -> str:
+        """Model identifier served by this connection (registry/breaker key)."""
+        return ""
+
+    @property
+    def request_timeout(self) -> float | None:
+        """Per-call timeout in seconds (settings.llm_request_timeout_seconds)."""
+        settings = getattr(self, "_settings", None)
+        return getattr(settings, "llm_request_timeout_seconds", None)
+
     @abstractmethod
     def is_configured(self) -> bool:
         """Check if this connection is properly configured (API key, etc.)."""
@@ -28,18 +64,70 @@ class LLMConnection(ABC):
         """Return the LLM client instance, or None if not available/configured."""
         pass
 
-    @abstractmethod
     def _parse_json(self, text: str) -> dict[str, Any]:
         """Parse LLM text response into a result dict (JSON or error structure)."""
-        pass
+        if not text:
+            return {
+                "error": "Empty response",
+                "error_type": "empty",
+                "service": self.name,
+            }
+        try:
+            return extract_json(text)
+        except JSONExtractionError:
+            return {
+                "error": "Invalid JSON response",
+                "error_type": "invalid_json",
+                "service": self.name,
+            }
+
+    def _bind_response_schema(self, llm: Any, schema: dict[str, Any]) -> Any | None:
+        """llm bound to answer JSON matching schema, or None if not supported."""
+        return None
+
+    def _structured_value(self, value: Any, schema: dict[str, Any]) -> Any:
+        """Undo any provider-specific wrapping of a structured answer."""
+        return value
+
+    def _parse_structured(self, text: str, schema: dict[str, Any]) -> Any:
+        """Decode a structured answer directly; scan it only if that fails."""
+        try:
+            return loads(text)
+        except (TypeError, ValueError):
+            return self._parse_json(text)
+
+    def _structured_llm(
+        self, llm: Any, response_schema: dict[str, Any] | None
+    ) -> tuple[Any, dict[str, Any] | None]:
+        """(runnable, schema in effect): llm bound to response_schema when supported."""
+        if response_schema is None:
+            return llm, None
+        bound = self._bind_response_schema(llm, response_schema)
+        if bound is None:
+            return llm, None
+        return bound, response_schema
+
+    async def _invoke(
+        self,
+        coro: Any,
+        prompt_text: str = "",
+        images: int = 0,
+        messages: list[BaseMessage] | None = None,
+        response_schema: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """Run the given coroutine (e.g. llm.ainvoke(messages)) and return parsed result dict.
 
-    async def _invoke(self, coro: Any) -> dict[str, Any]:
-        """Run the given coroutine (e.g. llm.ainvoke(messages)) and return parsed result dict."""
+        Token usage of the response is recorded (see usage); prompt_text and
+        images only feed the estimator when the provider reports no usage.
+        A truncated JSON answer goes through _repair_truncated; messages (the
+        request) are needed to ask for a continuation. response_schema is the
+        schema the call was bound to (structured output), if any.
+        """
         logger = get_logger(f"llm.{self.name.lower()}")
         try:
             logger.info("LLM %s: request sent, waiting for response...", self.name)
             start = time.perf_counter()
-            response = await coro
+            response = await asyncio.wait_for(coro, timeout=self.request_timeout)
             elapsed = time.perf_counter() - start
             text = getattr(response, "content", str(response))
             length = len(text) if text else 0
@@ -49,21 +137,175 @@ class LLMConnection(ABC):
                 elapsed,
                 length,
             )
-            return self._parse_json(text)
+            record_usage(
+                self.name,
+                self.model,
+                extract_usage(response),
+                prompt_text,
+                str(text or ""),
+                elapsed,
+                images=images,
+            )
+            if response_schema is None:
+                result = self._parse_json(text)
+            else:
+                result = self._parse_structured(text, response_schema)
+            if isinstance(result, dict) and result.get("error_type") == "invalid_json":
+                result = await self._repair_truncated(str(text), result, messages)
+            if response_schema is not None and not (
+                isinstance(result, dict) and "error_type" in result
+            ):
+                result = self._structured_value(result, response_schema)
+            return result
+        except asyncio.TimeoutError:
+            return self._timeout_result()
         except Exception as e:
-            err = str(e)
-            if "API key" in err or "401" in err or "invalid" in err.lower():
-                return {
-                    "error": err,
-                    "error_type": "invalid_api_key",
-                    "service": self.name,
-                }
-            logger.warning("LLM %s: invocation failed: %s", self.name, e)
+            return self._error_result(e)
+
+    async def _repair_truncated(
+        self,
+        text: str,
+        error: dict[str, Any],
+        messages: list[BaseMessage] | None,
+    ) -> Any:
+        """Salvage a truncated JSON answer instead of failing over to another provider.
+
+        With settings.llm_json_accept_partial (opt-in) the complete elements are
+        accepted when their salvage ratio reaches llm_json_salvage_min_ratio,
+        and recorded as a partial answer (record_partial). Otherwise, when
+        continuation is enabled, the same provider is asked once to continue
+        the answer. If neither works the invalid_json error is returned (with
+        the ratio).
+        """
+        settings = getattr(self, "_settings", None)
+        if not getattr(settings, "llm_json_repair_enabled", False):
+            return error
+        repaired = repair_truncated_json(text)
+        if repaired is None:
+            return error
+        logger = get_logger(f"llm.{self.name.lower()}")
+        stats = get_json_repair_stats()
+        value, ratio = repaired
+        stats.record("truncated", ratio)
+        min_ratio = getattr(settings, "llm_json_salvage_min_ratio", 1.0)
+        if getattr(settings, "llm_json_accept_partial", False) and ratio >= min_ratio:
+            logger.warning(
+                "LLM %s: truncated JSON, accepting salvaged elements (ratio %.2f)",
+                self.name,
+                ratio,
+            )
+            stats.record("accepted")
+            record_partial(self.name, ratio, _element_count(value))
+            return value
+        if messages and getattr(settings, "llm_json_continuation", False):
+            stats.record("continued")
+            logger.warning(
+                "LLM %s: truncated JSON (salvage ratio %.2f), requesting continuation",
+                self.name,
+                ratio,
+            )
+            continued = await self._continue(text, messages)
+            if continued is not None:
+                stats.record("continuation_ok")
+                return continued
+        stats.record("rejected")
+        return {**error, "salvage_ratio": ratio}
+
+    async def _continue(self, text: str, messages: list[BaseMessage]) -> Any | None:
+        """Ask for the rest of a truncated answer; parsed text + rest, or None."""
+        llm = self._ensure_llm()
+        if not llm:
+            return None
+        request = [
+            *messages,
+            AIMessage(content=text),
+            HumanMessage(CONTINUATION_PROMPT),
+        ]
+        try:
+            start = time.perf_counter()
+            response = await asyncio.wait_for(
+                llm.ainvoke(request), timeout=self.request_timeout
+            )
+            rest = str(getattr(response, "content", "") or "")
+            record_usage(
+                self.name,
+                self.model,
+                extract_usage(response),
+                CONTINUATION_PROMPT + text,
+                rest,
+                time.perf_counter() - start,
+            )
+        except Exception as e:
+            get_logger(f"llm.{self.name.lower()}").warning(
+                "LLM %s: continuation failed: %s", self.name, e
+            )
+            return None
+        if rest.lstrip().startswith("```"):
+            rest = rest.lstrip().split("\n", 1)[-1]
+        combined = text + rest
+        result = self._parse_json(combined)
+        if isinstance(result, dict) and result.get("error_type") == "invalid_json":
+            return None
+        return result
+
+    def _error_result(self, e: Exception) -> dict[str, Any]:
+        """Map a provider exception to the standard error dict."""
+        err = str(e)
+        if _is_quota_exhausted_error(err):
             return {
                 "error": err,
-                "error_type": "processing_error",
+                "error_type": "quota_exhausted",
                 "service": self.name,
             }
+        if _is_rate_limit_error(err):
+            get_logger(f"llm.{self.name.lower()}").warning(
+                "LLM %s: provider rate limit hit: %s", self.name, e
+            )
+            return {
+                "error": err,
+                "error_type": "rate_limited",
+                "service": self.name,
+            }
+        if _is_unreachable_error(e):
+            return {
+                "error": err or type(e).__name__,
+                "error_type": "unreachable",
+                "service": self.name,
+            }
+        if _is_auth_error(e):
+            return {
+                "error": err,
+                "error_type": "invalid_api_key",
+                "service": self.name,
+            }
+        if _is_bad_request_error(e):
+            # The request itself was rejected (payload, schema): the provider is fine
+            get_logger(f"llm.{self.name.lower()}").warning(
+                "LLM %s: request rejected: %s", self.name, e
+            )
+            return {
+                "error": err,
+                "error_type": "bad_request",
+                "service": self.name,
+            }
+        get_logger(f"llm.{self.name.lower()}").warning(
+            "LLM %s: invocation failed: %s", self.name, e
+        )
+        return {
+            "error": err,
+            "error_type": "processing_error",
+            "service": self.name,
+        }
+
+    def _timeout_result(self) -> dict[str, Any]:
+        get_logger(f"llm.{self.name.lower()}").warning(
+            "LLM %s: no response within %ss", self.name, self.request_timeout
+        )
+        return {
+            "error": f"{self.name} timed out after {self.request_timeout}s",
+            "error_type": "timeout",
+            "service": self.name,
+        }
 
     def _not_configured_response(self) -> dict[str, Any]:
         """Return standard error dict when this connection is not configured."""
@@ -74,39 +316,67 @@ class LLMConnection(ABC):
         }
 
     async def invoke_vision(
-        self, prompt: str, image_bytes: bytes, **kwargs: Any
+        self,
+        prompt: str,
+        image_bytes: bytes | PreparedImage,
+        response_schema: dict[str, Any] | None = None,
+        **kwargs: Any,
     ) -> dict[str, Any]:
         """Invoke LLM with image input (vision).
 
+        image_bytes: Raw image or a PreparedImage (its data URL is reused as-is).
+        response_schema: JSON schema the answer must follow (structured output).
+
         Returns:
             Parsed result dict or {"error": str, "error_type": str, "service": str}
         """
         llm = self._ensure_llm()
         if not llm:
             return self._not_configured_response()
-        img_b64 = base64.b64encode(image_bytes).decode("utf-8")
+        image = as_prepared_image(image_bytes)
         message = HumanMessage(
             content=[
                 {"type": "text", "text": prompt},
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"},
-                },
+                {"type": "image_url", "image_url": {"url": image.data_url}},
             ]
         )
-        return await self._invoke(llm.ainvoke([message]))
+        runnable, schema = self._structured_llm(llm, response_schema)
+        return await self._invoke(
+            runnable.ainvoke([message]),
+            prompt_text=prompt,
+            images=1,
+            messages=[message],
+            response_schema=schema,
+        )
 
     async def invoke_text(
-        self, messages: list[dict[str, str]], **kwargs: Any
+        self,
+        messages: list[dict[str, str]],
+        response_schema: dict[str, Any] | None = None,
+        **kwargs: Any,
     ) -> dict[str, Any]:
         """Invoke LLM with text messages only.
 
+        response_schema: JSON schema the answer must follow (structured output).
+
         Returns:
             Parsed result dict or {"error": str, "error_type": str, "service": str}
         """
         llm = self._ensure_llm()
         if not llm:
             return self._not_configured_response()
+        lc_messages = self._to_lc_messages(messages)
+        runnable, schema = self._structured_llm(llm, response_schema)
+        return await self._invoke(
+            runnable.ainvoke(lc_messages),
+            prompt_text="\n".join(m.get("content", "") for m in messages),
+            messages=lc_messages,
+            response_schema=schema,
+        )
+
+    @staticmethod
+    def _to_lc_messages(messages: list[dict[str, str]]) -> list[BaseMessage]:
+        """Convert {"role", "content"} dicts to LangChain messages."""
         lc_messages: list[BaseMessage] = []
         for m in messages:
             role = m.get("role", "user")
@@ -115,4 +385,185 @@ class LLMConnection(ABC):
                 lc_messages.append(SystemMessage(content=content))
             else:
                 lc_messages.append(HumanMessage(content=content))
-        return await self._invoke(llm.ainvoke(lc_messages))
+        return lc_messages
+
+    async def stream_text(
+        self, messages: list[dict[str, str]], stage: str | None = None
+    ) -> AsyncIterator[str]:
+        """Stream the text of a text-only invocation (llm.astream) chunk by chunk.
+
+        The whole stream shares request_timeout. Token usage (summed over the
+        chunks, or estimated) is recorded under stage when the stream completes.
+
+        Raises:
+            LLMStreamError: Not configured, timeout or provider failure (result
+                holds the same error dict invoke_text would return).
+        """
+        llm = self._ensure_llm()
+        if not llm:
+            raise LLMStreamError(self._not_configured_response())
+        logger = get_logger(f"llm.{self.name.lower()}")
+        logger.info("LLM %s: streaming request sent", self.name)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout if self.request_timeout else None
+        start = time.perf_counter()
+        stream = llm.astream(self._to_lc_messages(messages)).__aiter__()
+        pieces: list[str] = []
+        usage: dict[str, int] | None = None
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                chunk_usage = extract_usage(chunk)
+                if chunk_usage is not None:
+                    usage = {
+                        k: (usage or {}).get(k, 0) + v for k, v in chunk_usage.items()
+                    }
+                text = _chunk_text(getattr(chunk, "content", chunk))
+                if text:
+                    pieces.append(text)
+                    yield text
+        except asyncio.TimeoutError:
+            raise LLMStreamError(self._timeout_result()) from None
+        except LLMStreamError:
+            raise
+        except Exception as e:
+            raise LLMStreamError(self._error_result(e)) from e
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        record_usage(
+            self.name,
+            self.model,
+            usage,
+            "\n".join(m.get("content", "") for m in messages),
+            "".join(pieces),
+            time.perf_counter() - start,
+            stage=stage,
+        )
+
+
+# Messages of a quota that will not refill within minutes (billing, daily limits)
+_QUOTA_EXHAUSTED_MARKERS = (
+    "insufficient_quota",
+    "exceeded your current quota",
+    "perday",
+    "per day",
+)
+
+# Connection errors meaning the host cannot be resolved or reached at all
+_UNREACHABLE_MARKERS = (
+    "name or service not known",
+    "temporary failure in name resolution",
+    "nodename nor servname provided",
+    "getaddrinfo failed",
+    "failed to resolve",
+    "connection refused",
+    "all connection attempts failed",
+)
+
+
+# SDK exception classes of a rejected key (openai, google.api_core)
+_AUTH_ERROR_CLASSES = frozenset(
+    {
+        "AuthenticationError",
+        "PermissionDeniedError",
+        "Unauthenticated",
+        "PermissionDenied",
+    }
+)
+
+_AUTH_STATUS_RE = re.compile(r"\b(401|403)\b")
+_BAD_REQUEST_STATUS_RE = re.compile(r"\b(400|404|413|422)\b")
+
+
+def _status_code(e: BaseException) -> int | None:
+    """HTTP status carried by an SDK exception (status_code, or an int code)."""
+    for attr in ("status_code", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def _is_auth_error(e: BaseException) -> bool:
+    """Whether e is a rejected / missing API key (401/403), not a bad request."""
+    if type(e).__name__ in _AUTH_ERROR_CLASSES or _status_code(e) in (401, 403):
+        return True
+    err = str(e)
+    lowered = err.lower()
+    return (
+        "api key" in lowered
+        or "api_key" in lowered
+        or _AUTH_STATUS_RE.search(err) is not None
+    )
+
+
+def _is_bad_request_error(e: BaseException) -> bool:
+    """Whether the provider rejected this request (400-class), e.g. payload or schema."""
+    status = _status_code(e)
+    if status is not None and 400 <= status < 500:
+        return True
+    err = str(e)
+    return _BAD_REQUEST_STATUS_RE.search(err) is not None or "invalid" in err.lower()
+
+
+def _is_quota_exhausted_error(err: str) -> bool:
+    """Whether a provider error is an exhausted quota rather than a per-minute 429."""
+    lowered = err.lower()
+    return any(marker in lowered for marker in _QUOTA_EXHAUSTED_MARKERS)
+
+
+def _is_unreachable_error(e: BaseException) -> bool:
+    """Whether e (or an exception it wraps) is a DNS / connection-refused failure."""
+    seen: set[int] = set()
+    current: BaseException | None = e
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, ConnectionRefusedError):
+            return True
+        lowered = str(current).lower()
+        if any(marker in lowered for marker in _UNREACHABLE_MARKERS):
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+def _is_rate_limit_error(err: str) -> bool:
+    """Whether a provider error message is a 429 / quota exhaustion."""
+    lowered = err.lower()
+    return (
+        "429" in err
+        or "rate limit" in lowered
+        or "resource has been exhausted" in lowered
+        or "resourceexhausted" in lowered
+        or "quota" in lowered
+    )
+
+
+def _chunk_text(content: Any) -> str:
+    """Text of a streamed message chunk (str, or a list of content parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in content
+            if isinstance(part, str | dict)
+        )
+    return ""
+
+
+def _element_count(value: Any) -> int:
+    """Elements of a salvaged answer: array items, or the items of an object's arrays."""
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(v) for v in value.values() if isinstance(v, list))
+    return 0
@@ -1,42 +1,156 @@
-"""LLM response cache — uses shared CacheSystem (Redis or swapable backend)."""
+"""LLM response cache — uses shared CacheSystem (Redis or swapable backend).
 
+Two tiers: a process-wide in-memory LRU (L1, see memory_cache) in front of the
+shared backend (L2). Reads try L1 first and fill it from L2 on a hit; writes go
+to both and, when pub/sub invalidation is enabled, evict the key from the L1 of
+the other replicas.
+
+Keys are content-addressed: binary parts (image bytes) are reduced to a single
+BLAKE2b digest over a memoryview instead of being serialized, and the fallback
+runners key vision calls by prompt_digest(prompt) + content_digest(image).
+"""
+
+import asyncio
 import hashlib
 import json
+from functools import lru_cache
 from typing import Any
 
-from threat_modeling_shared import get_cache_backend
+from threat_modeling_shared import get_async_cache_backend, get_cache_backend
 from threat_modeling_shared.logging import get_logger
 
+from app.config import get_settings
+from app.threat_analysis.llm.memory_cache import (
+    CacheInvalidator,
+    MemoryLRUCache,
+    get_cache_tier_stats,
+)
+
 logger = get_logger("llm.cache")
 
 # TTL padrão: 2 horas (em segundos)
 CACHE_TTL_SECONDS = 2 * 60 * 60
 
 
+# Digest size (bytes) for content-addressed keys
+_DIGEST_SIZE = 32
+
+
+def content_digest(data: bytes | bytearray | memoryview) -> str:
+    """Content hash of binary data: one BLAKE2b pass over a memoryview, no copy.
+
+    Compute it once per request and pass it along (guardrail, diagram agent and
+    cache all accept the digest) instead of rehashing the image at each stage.
+    """
+    return (
+        "blake2b:"
+        + hashlib.blake2b(memoryview(data), digest_size=_DIGEST_SIZE).hexdigest()
+    )
+
+
+@lru_cache(maxsize=64)
+def prompt_digest(prompt: str) -> str:
+    """Version digest of a prompt template (changes whenever the prompt text changes)."""
+    return (
+        "prompt:"
+        + hashlib.blake2b(prompt.encode(), digest_size=_DIGEST_SIZE).hexdigest()
+    )
+
+
+def _key_part(part: Any) -> Any:
+    """Replace binary parts by their content digest so keys never serialize raw bytes."""
+    if isinstance(part, (bytes, bytearray, memoryview)):
+        return content_digest(part)
+    return part
+
+
+def cache_key(prefix: str, *parts: Any) -> str:
+    """Cache key for prefix and parts (binary parts keyed by content digest)."""
+    content = json.dumps(
+        [_key_part(part) for part in parts], default=str, sort_keys=True
+    )
+    h = hashlib.sha256(content.encode()).hexdigest()
+    return f"llm:{prefix}:{h}"
+
+
+@lru_cache
+def get_memory_cache() -> MemoryLRUCache:
+    """Get the process-wide L1 cache (JSON byte budget from settings, TTL = CACHE_TTL_SECONDS)."""
+    return MemoryLRUCache(
+        max_json_bytes=get_settings().llm_cache_memory_max_json_bytes,
+        ttl_seconds=CACHE_TTL_SECONDS,
+    )
+
+
+@lru_cache
+def get_cache_invalidator() -> CacheInvalidator | None:
+    """Get the started CacheInvalidator, or None when pub/sub invalidation is off."""
+    settings = get_settings()
+    memory = get_memory_cache()
+    if not settings.llm_cache_pubsub_invalidation or not memory.enabled:
+        return None
+    invalidator = CacheInvalidator(settings.redis_url, memory)
+    invalidator.start()
+    return invalidator
+
+
 class LLMCacheService:
-    """Cache for LLM responses using shared cache backend (e.g. Redis). TTL 2 hours."""
+    """Cache for LLM responses using shared cache backend (e.g. Redis). TTL 2 hours.
 
-    def __init__(self, redis_url: str = "redis://localhost:6379/0") -> None:
+    get/set use the synchronous backend; aget/aset use the asyncio backend
+    (redis.asyncio, pooled) and are the ones to use from async agent code so
+    cache round-trips do not block the event loop. Both share the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        memory_cache: MemoryLRUCache | None = None,
+        invalidator: CacheInvalidator | None = None,
+    ) -> None:
         """Initialize with cache backend from shared (Redis by default).
 
         Args:
             redis_url: Passed to shared get_cache_backend; change backend in shared to swap.
+            memory_cache: L1 tier; defaults to the process-wide get_memory_cache().
+            invalidator: Pub/sub invalidator; defaults to get_cache_invalidator().
         """
         self._backend = get_cache_backend(redis_url=redis_url)
+        self._async_backend = get_async_cache_backend(redis_url=redis_url)
+        self._memory = memory_cache if memory_cache is not None else get_memory_cache()
+        self._invalidator = (
+            invalidator if invalidator is not None else get_cache_invalidator()
+        )
 
     def _key(self, prefix: str, *parts: Any) -> str:
-        content = json.dumps(parts, default=str, sort_keys=True)
-        h = hashlib.sha256(content.encode()).hexdigest()
-        return f"llm:{prefix}:{h}"
+        return cache_key(prefix, *parts)
+
+    def _memory_get(self, key: str) -> Any | None:
+        value = self._memory.get(key)
+        if self._memory.enabled:
+            get_cache_tier_stats().record("memory", value is not None)
+        return value
+
+    def _memory_set(self, key: str, serialized: str) -> Any:
+        """Keep the decoded form of serialized in memory; return it."""
+        value = json.loads(serialized)
+        self._memory.set(key, value, len(serialized.encode()))
+        return value
+
+    def _backend_result(self, key: str, data: str | None) -> Any | None:
+        get_cache_tier_stats().record("redis", data is not None)
+        if data is None:
+            return None
+        return self._memory_set(key, data)
 
     def get(self, prefix: str, *parts: Any) -> Any | None:
-        """Get cached value if exists."""
+        """Get cached value if exists (memory first, then backend)."""
         key = self._key(prefix, *parts)
         try:
-            data = self._backend.get(key)
-            if data is None:
-                return None
-            return json.loads(data)
+            value = self._memory_get(key)
+            if value is not None:
+                return value
+            return self._backend_result(key, self._backend.get(key))
         except Exception as e:
             logger.warning("Cache get failed for %s: %s", key, e)
             return None
@@ -46,6 +160,38 @@ class LLMCacheService:
         key = self._key(prefix, *parts)
         try:
             serialized = json.dumps(value, default=str)
+            if self._memory.enabled:
+                # Decoded from the stored JSON so memory and Redis hits are identical
+                self._memory_set(key, serialized)
             self._backend.set(key, serialized, ttl_seconds=CACHE_TTL_SECONDS)
+            if self._invalidator is not None:
+                self._invalidator.publish(key)
+        except Exception as e:
+            logger.warning("Cache set failed for %s: %s", key, e)
+
+    async def aget(self, prefix: str, *parts: Any) -> Any | None:
+        """Get cached value if exists (non-blocking; memory first, then backend)."""
+        key = self._key(prefix, *parts)
+        try:
+            value = self._memory_get(key)
+            if value is not None:
+                return value
+            return self._backend_result(key, await self._async_backend.get(key))
+        except Exception as e:
+            logger.warning("Cache get failed for %s: %s", key, e)
+            return None
+
+    async def aset(self, prefix: str, value: Any, *parts: Any) -> None:
+        """Store value in cache with 2-hour TTL (non-blocking)."""
+        key = self._key(prefix, *parts)
+        try:
+            serialized = json.dumps(value, default=str)
+            if self._memory.enabled:
+                self._memory_set(key, serialized)
+            await self._async_backend.set(
+                key, serialized, ttl_seconds=CACHE_TTL_SECONDS
+            )
+            if self._invalidator is not None:
+                await asyncio.to_thread(self._invalidator.publish, key)
         except Exception as e:
             logger.warning("Cache set failed for %s: %s", key, e)
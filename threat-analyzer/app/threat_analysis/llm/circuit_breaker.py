@@ -0,0 +1,211 @@
+"""Per-provider circuit breaker for the LLM fallback chain.
+
+A breaker is kept per LLM connection (provider name + model). It trips after
+`failure_threshold` consecutive `processing_error`/`timeout` results; while open
+the provider is skipped instantly. After `cooldown_seconds` the breaker goes
+half-open and a single probe call is let through: success closes it, failure
+opens it again. allow() hands each call a ticket; only the probe's ticket
+(its owner token on the probe lease) may close the breaker or give the lease
+back, so a call admitted before the trip cannot. A probe abandoned without an
+outcome (cancelled by hedging, rate limited) hands its lease back via release()
+instead of blocking the provider until the lease expires.
+
+Open/half-open state lives in an AsyncCacheBackend (in-process by default,
+redis.asyncio when shared) so every analyzer replica learns about an outage
+together without blocking the event loop on Redis round-trips. Consecutive
+failure counts stay local to each replica.
+"""
+
+import threading
+import uuid
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared import AsyncMemoryCacheBackend, get_async_cache_backend
+from threat_modeling_shared.cache import AsyncCacheBackend
+from threat_modeling_shared.logging import get_logger
+
+from app.config import get_settings
+from app.threat_analysis.llm.base import LLMConnection
+
+logger = get_logger("llm.circuit_breaker")
+
+# Error types that count towards tripping the breaker (provider unhealthy)
+TRIPPING_ERROR_TYPES = frozenset({"processing_error", "timeout"})
+
+_KEY_PREFIX = "llm:breaker"
+
+# Ticket of a call admitted while the breaker was closed (probe tickets are uuids)
+_CLOSED_TICKET = "closed"
+
+
+class CircuitBreaker:
+    """Circuit breaker registry keyed by provider and model."""
+
+    def __init__(
+        self,
+        backend: AsyncCacheBackend | None = None,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 30.0,
+        probe_timeout_seconds: float = 120.0,
+        enabled: bool = True,
+    ) -> None:
+        self._backend = backend or AsyncMemoryCacheBackend()
+        self._failure_threshold = max(1, failure_threshold)
+        self._cooldown = cooldown_seconds
+        self._probe_timeout = probe_timeout_seconds
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._failures: dict[str, int] = {}
+        self._seen: set[str] = set()
+
+    @staticmethod
+    def breaker_key(conn: LLMConnection) -> str:
+        """Breaker id for a connection: '<provider>:<model>'."""
+        return f"{conn.name}:{conn.model}"
+
+    def _open_key(self, key: str) -> str:
+        return f"{_KEY_PREFIX}:open:{key}"
+
+    def _tripped_key(self, key: str) -> str:
+        return f"{_KEY_PREFIX}:tripped:{key}"
+
+    def _probe_key(self, key: str) -> str:
+        return f"{_KEY_PREFIX}:probe:{key}"
+
+    async def state(self, conn: LLMConnection) -> str:
+        """Current state: 'closed', 'open' or 'half_open'."""
+        return await self._state(self.breaker_key(conn))
+
+    async def _state(self, key: str) -> str:
+        if await self._backend.get(self._open_key(key)) is not None:
+            return "open"
+        if await self._backend.get(self._tripped_key(key)) is not None:
+            return "half_open"
+        return "closed"
+
+    async def allow(self, conn: LLMConnection) -> str | None:
+        """Admit a call: its ticket for release()/record(), or None to skip the provider.
+
+        The half-open probe gets a unique ticket stored as the probe lease value;
+        every call admitted while closed shares a plain ticket.
+        """
+        if not self._enabled:
+            return _CLOSED_TICKET
+        key = self.breaker_key(conn)
+        state = await self._state(key)
+        if state == "closed":
+            return _CLOSED_TICKET
+        ticket = uuid.uuid4().hex
+        if state == "half_open" and await self._backend.set_if_absent(
+            self._probe_key(key), ticket, ttl_seconds=self._probe_timeout
+        ):
+            logger.info("Circuit %s half-open: sending probe", key)
+            return ticket
+        return None
+
+    async def release(self, conn: LLMConnection, ticket: str) -> None:
+        """Give back the probe lease of a call abandoned before it had an outcome.
+
+        No-op unless ticket still owns the half-open probe for conn; the next
+        call may then probe right away instead of waiting for the lease to expire.
+        """
+        if ticket == _CLOSED_TICKET:
+            return
+        key = self.breaker_key(conn)
+        if await self._backend.delete_if_equal(self._probe_key(key), ticket):
+            logger.info("Circuit %s: probe abandoned, releasing it", key)
+
+    async def record(
+        self, conn: LLMConnection, ticket: str, ok: bool, result: dict[str, Any]
+    ) -> None:
+        """Update the breaker with the outcome of a call that allow() let through.
+
+        Only processing_error/timeout results count as failures; any other
+        outcome (success, invalid JSON, validation failure) resets the counter.
+        Only the probe's own ticket closes or re-opens a tripped breaker; calls
+        admitted before the trip are ignored once it has tripped.
+        """
+        if not self._enabled:
+            return
+        key = self.breaker_key(conn)
+        with self._lock:
+            self._seen.add(key)
+        # Any answer that is not a provider failure (even invalid JSON) proves health
+        healthy = ok or result.get("error_type") not in TRIPPING_ERROR_TYPES
+        if ticket != _CLOSED_TICKET:
+            if not await self._backend.delete_if_equal(self._probe_key(key), ticket):
+                # Lease expired and was taken over: that probe decides
+                return
+            if healthy:
+                logger.info("Circuit %s closed: probe succeeded", key)
+                with self._lock:
+                    self._failures.pop(key, None)
+                await self._backend.delete(self._tripped_key(key))
+            else:
+                await self._trip(key, self._failures.get(key, 0) + 1)
+            return
+        if healthy:
+            with self._lock:
+                self._failures.pop(key, None)
+            return
+        if await self._state(key) != "closed":
+            # Started before the trip: the breaker already knows
+            return
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+        if failures >= self._failure_threshold:
+            await self._trip(key, failures)
+
+    async def _trip(self, key: str, failures: int) -> None:
+        logger.warning(
+            "Circuit %s open for %.0fs after %d consecutive failures",
+            key,
+            self._cooldown,
+            failures,
+        )
+        await self._backend.set(self._open_key(key), "1", ttl_seconds=self._cooldown)
+        # Half-open marker outlives the open window until a probe succeeds
+        await self._backend.set(
+            self._tripped_key(key),
+            "1",
+            ttl_seconds=self._cooldown + self._probe_timeout * 10,
+        )
+        await self._backend.delete(self._probe_key(key))
+        with self._lock:
+            self._failures[key] = 0
+
+    async def snapshot(self) -> dict[str, dict[str, Any]]:
+        """State and local consecutive-failure count per breaker seen by this process."""
+        with self._lock:
+            seen = sorted(self._seen)
+            failures = dict(self._failures)
+        return {
+            key: {"state": await self._state(key), "failures": failures.get(key, 0)}
+            for key in seen
+        }
+
+    def reset(self) -> None:
+        """Clear local counters (shared state expires on its own)."""
+        with self._lock:
+            self._failures.clear()
+            self._seen.clear()
+
+
+@lru_cache
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the process-wide CircuitBreaker configured from settings."""
+    settings = get_settings()
+    backend = (
+        get_async_cache_backend(redis_url=settings.redis_url)
+        if settings.llm_circuit_breaker_shared
+        else AsyncMemoryCacheBackend()
+    )
+    return CircuitBreaker(
+        backend=backend,
+        failure_threshold=settings.llm_circuit_breaker_threshold,
+        cooldown_seconds=settings.llm_circuit_breaker_cooldown_seconds,
+        probe_timeout_seconds=settings.llm_request_timeout_seconds or 120.0,
+        enabled=settings.llm_circuit_breaker_enabled,
+    )
@@ -1,16 +1,68 @@
-"""Fallback runner - try LLMs in order, validate, return first success."""
+"""Fallback runner - try LLMs in order, validate, return first success.
 
+Two strategies are available:
+- sequential (default): providers are tried strictly one after another.
+- hedged (hedge_delay is not None): the next provider is also started when the
+  current one has not produced a valid result after hedge_delay seconds (0 = race
+  all at once) or as soon as it fails. The first result that passes the validator
+  wins and the remaining calls are cancelled.
+
+When caching is enabled, concurrent identical calls (same cache key) are
+coalesced by the SingleFlight layer: one call runs the chain, the others await
+its result (see single_flight).
+
+stream_text_with_fallback streams the elements of a JSON array answer (e.g.
+STRIDE threats) as soon as each one is complete.
+
+Providers whose circuit breaker is open are skipped without being called, as
+are providers in the negative cache after a provider-level failure (missing or
+invalid key, exhausted quota, unreachable host; see negative_cache) and
+providers with no rate-limit slot/budget within the maximum queue wait (see
+rate_limit; queue wait is reported apart from the model latency). When
+adaptive routing is enabled the chain is reordered per stage (cache_key_prefix)
+by the AdaptiveProviderRouter before running.
+"""
+
+import asyncio
+import inspect
 import json
 import time
-from collections.abc import Callable
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import aclosing
 from typing import Any
 
 from threat_modeling_shared.logging import get_logger
 
-from app.threat_analysis.llm.base import LLMConnection
+from app.threat_analysis.llm.base import LLMConnection, LLMStreamError
+from app.threat_analysis.llm.cache import cache_key, content_digest, prompt_digest
+from app.threat_analysis.llm.circuit_breaker import get_circuit_breaker
+from app.threat_analysis.llm.image import PreparedImage
+from app.threat_analysis.llm.negative_cache import get_negative_cache
+from app.threat_analysis.llm.provider_router import get_provider_router
+from app.threat_analysis.llm.rate_limit import RateLimitError, get_rate_limiter
+from app.threat_analysis.llm.registry import get_connection_registry
+from app.threat_analysis.llm.single_flight import get_single_flight
+from app.threat_analysis.llm.stats import Outcome, get_provider_stats
+from app.threat_analysis.llm.streaming import JSONArrayStreamParser
+from app.threat_analysis.llm.usage import (
+    IMAGE_TOKENS_ESTIMATE,
+    estimate_tokens,
+    record_queue_wait,
+    usage_stage,
+    watch_partial,
+)
 
 logger = get_logger("llm.fallback")
 
+Invoker = Callable[[LLMConnection], Awaitable[dict[str, Any]]]
+
+
+async def _maybe_await(value: Any) -> Any:
+    """Await value if it is awaitable (async cache callables), else return it."""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
 
 def is_error_result(result: dict[str, Any]) -> bool:
     """Check if result indicates an error."""
@@ -34,15 +86,268 @@ def _validation_check(
     return False, {"engine": conn_name, **err_info}
 
 
+async def _attempt(
+    conn: LLMConnection,
+    invoke: Invoker,
+    validator: Callable[[dict[str, Any]], bool],
+    mode: str,
+    stage: str,
+    tokens: int = 0,
+) -> tuple[Outcome, dict[str, Any], float | None]:
+    """Invoke one connection and validate (token usage is attributed to stage).
+
+    The call first waits for a rate-limit slot for conn charged tokens (the
+    estimated input tokens); elapsed covers the model call only.
+
+    Returns:
+        (outcome, value_or_err_info, elapsed); outcome is "win", "loss" or
+        "skipped" (negative cache, circuit open or rate limited: no call made,
+        elapsed None).
+    """
+    negative = get_negative_cache()
+    unavailable = await negative.check(conn)
+    if unavailable is not None:
+        return "skipped", _unavailable_info(conn, unavailable), None
+    breaker = get_circuit_breaker()
+    ticket = await breaker.allow(conn)
+    if ticket is None:
+        logger.info("LLM %s: circuit open, skipping", conn.name)
+        return (
+            "skipped",
+            {
+                "engine": conn.name,
+                "error": f"{conn.name} circuit open",
+                "error_type": "circuit_open",
+            },
+            None,
+        )
+    try:
+        async with get_rate_limiter().slot(conn.name, tokens) as queue_wait:
+            record_queue_wait(conn.name, queue_wait, stage)
+            logger.info("Trying LLM: %s (%s, waiting...)", conn.name, mode)
+            start = time.perf_counter()
+            try:
+                with usage_stage(stage):
+                    result = await invoke(conn)
+                ok, value = _validation_check(validator, result, conn.name)
+            except Exception as e:
+                logger.warning("LLM %s failed with exception: %s", conn.name, e)
+                ok, value = (
+                    False,
+                    {"engine": conn.name, "error": str(e), "error_type": "exception"},
+                )
+            elapsed = time.perf_counter() - start
+    except RateLimitError as e:
+        await breaker.release(conn, ticket)
+        return (
+            "skipped",
+            {"engine": conn.name, "error": str(e), "error_type": "rate_limited"},
+            None,
+        )
+    except asyncio.CancelledError:
+        # Cancelled by hedging (or the caller) before the call had an outcome
+        await breaker.release(conn, ticket)
+        raise
+    await breaker.record(conn, ticket, ok, value)
+    if not ok:
+        await negative.record(conn, value)
+    if ok:
+        logger.info("Success with %s in %.2fs", conn.name, elapsed)
+        return "win", value, elapsed
+    if value.get("error_type") != "exception":
+        logger.warning("LLM %s: validation failed after %.2fs", conn.name, elapsed)
+    return "loss", value, elapsed
+
+
+def _unavailable_info(conn: LLMConnection, error_type: str) -> dict[str, Any]:
+    """Error info of a provider skipped by the negative cache."""
+    return {
+        "engine": conn.name,
+        "error": f"{conn.name} unavailable ({error_type})",
+        "error_type": "provider_unavailable",
+    }
+
+
+def _record(
+    stage: str, conn: LLMConnection, outcome: Outcome, elapsed: float | None
+) -> None:
+    """Feed an attempt outcome to the provider stats and the adaptive router."""
+    get_provider_stats().record(conn.name, outcome, elapsed)
+    if outcome in ("win", "loss") and elapsed is not None:
+        get_provider_router().record(stage, conn.name, outcome == "win", elapsed)
+
+
+async def _run_sequential(
+    conns: list[LLMConnection],
+    invoke: Invoker,
+    validator: Callable[[dict[str, Any]], bool],
+    mode: str,
+    stage: str,
+    tokens: int = 0,
+) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+    """Try each connection in order; return (winning value or None, errors)."""
+    errors: list[dict[str, Any]] = []
+    for conn in conns:
+        outcome, value, elapsed = await _attempt(
+            conn, invoke, validator, mode, stage, tokens
+        )
+        _record(stage, conn, outcome, elapsed)
+        if outcome == "win":
+            return value, errors
+        errors.append(value)
+    return None, errors
+
+
+async def _run_hedged(
+    conns: list[LLMConnection],
+    invoke: Invoker,
+    validator: Callable[[dict[str, Any]], bool],
+    mode: str,
+    stage: str,
+    hedge_delay: float,
+    tokens: int = 0,
+) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+    """Race connections with staggered starts; return (winning value or None, errors)."""
+    errors: list[dict[str, Any]] = []
+    remaining = list(conns)
+    pending: dict[asyncio.Task, LLMConnection] = {}
+
+    def launch() -> None:
+        conn = remaining.pop(0)
+        pending[
+            asyncio.ensure_future(
+                _attempt(conn, invoke, validator, mode, stage, tokens)
+            )
+        ] = conn
+
+    if remaining:
+        launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if remaining else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                logger.info(
+                    "Hedging: no result after %.2fs, also starting %s",
+                    hedge_delay,
+                    remaining[0].name,
+                )
+                launch()
+                continue
+            # Resolve in chain order so ties favour the preferred provider
+            for task in sorted(done, key=lambda t: conns.index(pending[t])):
+                conn = pending.pop(task)
+                outcome, value, elapsed = task.result()
+                _record(stage, conn, outcome, elapsed)
+                if outcome == "win":
+                    return value, errors
+                errors.append(value)
+            if remaining:
+                launch()
+        return None, errors
+    finally:
+        for task, conn in pending.items():
+            task.cancel()
+            _record(stage, conn, "cancelled", None)
+            logger.info("Hedging: cancelled pending call to %s", conn.name)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _run_chain(
+    connections: list[type[LLMConnection]],
+    settings: Any,
+    invoke: Invoker,
+    validator: Callable[[dict[str, Any]], bool],
+    mode: str,
+    stage: str,
+    hedge_delay: float | None,
+    tokens: int = 0,
+) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+    """Resolve pooled connections, order them for stage and run the selected strategy.
+
+    tokens is the estimated input size charged against the providers' tpm budgets.
+    """
+    registry = get_connection_registry()
+    conns = get_provider_router().order(
+        stage, [registry.get(conn_class, settings) for conn_class in connections]
+    )
+    if hedge_delay is None:
+        return await _run_sequential(conns, invoke, validator, mode, stage, tokens)
+    return await _run_hedged(
+        conns, invoke, validator, mode, stage, max(0.0, hedge_delay), tokens
+    )
+
+
+async def _run_cached(
+    connections: list[type[LLMConnection]],
+    settings: Any,
+    invoke: Invoker,
+    validator: Callable[[dict[str, Any]], bool],
+    mode: str,
+    stage: str,
+    hedge_delay: float | None,
+    cache_get: Callable[..., Any] | None,
+    cache_set: Callable[..., Any] | None,
+    key_parts: tuple[Any, ...],
+    tokens: int = 0,
+) -> dict[str, Any]:
+    """Cache lookup, then the chain (coalesced per cache key), then cache store."""
+
+    async def lookup() -> dict[str, Any] | None:
+        cached = await _maybe_await(cache_get(stage, *key_parts))
+        if cached is not None and validator(cached):
+            return cached
+        return None
+
+    async def compute() -> dict[str, Any]:
+        with watch_partial() as partial:
+            value, errors = await _run_chain(
+                connections,
+                settings,
+                invoke,
+                validator,
+                mode,
+                stage,
+                hedge_delay,
+                tokens,
+            )
+        if value is None:
+            return {"error": "All LLM providers failed", "engine_errors": errors}
+        # An answer salvaged from truncated JSON is served once, never cached
+        if cache_set and not partial:
+            await _maybe_await(cache_set(stage, value, *key_parts))
+        return value
+
+    if not cache_get:
+        return await compute()
+    cached = await lookup()
+    if cached is not None:
+        logger.info("Returning cached LLM result")
+        return cached
+    return await get_single_flight().run(cache_key(stage, *key_parts), compute, lookup)
+
+
+def _messages_tokens(messages: list[dict[str, str]]) -> int:
+    """Estimated input tokens of chat messages (charged against tpm budgets)."""
+    return sum(estimate_tokens(m.get("content", "")) for m in messages)
+
+
 async def run_vision_with_fallback(
     connections: list[type[LLMConnection]],
     settings: Any,
     prompt: str,
-    image_bytes: bytes,
-    cache_get: Callable[[str, ...], Any | None] | None = None,
-    cache_set: Callable[[str, Any, ...], None] | None = None,
+    image_bytes: bytes | PreparedImage,
+    cache_get: Callable[..., Any | None | Awaitable[Any | None]] | None = None,
+    cache_set: Callable[..., None | Awaitable[None]] | None = None,
     cache_key_prefix: str = "diagram",
     validate: Callable[[dict[str, Any]], bool] | None = None,
+    hedge_delay: float | None = None,
+    image_digest: str | None = None,
+    response_schema: dict[str, Any] | None = None,
 ) -> dict[str, Any]:
     """Try each connection in order; return first valid result or aggregated errors.
 
@@ -50,93 +355,189 @@ async def run_vision_with_fallback(
         connections: List of LLMConnection classes (not instances).
         settings: Settings to pass to each connection.
         prompt: Vision prompt.
-        image_bytes: Image bytes.
-        cache_get: Optional cache getter (prefix, *args) -> value or None.
-        cache_set: Optional cache setter (prefix, value, *args).
-        cache_key_prefix: Prefix for cache key.
+        image_bytes: Image bytes, or a PreparedImage shared by every attempt
+            (encoded to base64 once).
+        cache_get: Optional cache getter (prefix, *args) -> value or None; may be
+            sync or async (e.g. LLMCacheService.aget).
+        cache_set: Optional cache setter (prefix, value, *args); sync or async.
+        cache_key_prefix: Prefix for cache key; also the stage name for adaptive routing.
         validate: Optional validator(result) -> bool. Default: not is_error_result.
+        hedge_delay: None = sequential; otherwise seconds to wait before also
+            starting the next provider (hedged strategy, 0 = race immediately).
+        image_digest: Precomputed content_digest(image_bytes); computed here if
+            missing and caching is enabled (PreparedImage.digest for a prepared image). Cache keys are (prompt_digest, image_digest).
+        response_schema: JSON schema for provider-native structured output
+            (see structured); None = plain text answer.
 
     Returns:
         Valid result dict or {"error": str, "engine_errors": list}.
     """
     validator = validate or (lambda r: not is_error_result(r))
-
-    # Check cache
-    if cache_get:
-        cached = cache_get(cache_key_prefix, prompt, image_bytes)
-        if cached is not None and validator(cached):
-            logger.info("Returning cached LLM result")
-            return cached
-
-    errors: list[dict[str, Any]] = []
-    for conn_class in connections:
-        conn = conn_class(settings)
-        logger.info("Trying LLM: %s (vision, waiting...)", conn.name)
-        try:
-            start = time.perf_counter()
-            result = await conn.invoke_vision(prompt, image_bytes)
-            elapsed = time.perf_counter() - start
-            ok, value = _validation_check(validator, result, conn.name)
-            if ok:
-                logger.info("Success with %s in %.2fs", conn.name, elapsed)
-                if cache_set:
-                    cache_set(cache_key_prefix, value, prompt, image_bytes)
-                return value
-            logger.warning("LLM %s: validation failed after %.2fs", conn.name, elapsed)
-            errors.append(value)
-        except Exception as e:
-            errors.append(
-                {"engine": conn.name, "error": str(e), "error_type": "exception"}
-            )
-            logger.warning("%s failed: %s", conn.name, e)
-
-    return {
-        "error": "All LLM providers failed",
-        "engine_errors": errors,
-    }
+    if (cache_get or cache_set) and image_digest is None:
+        image_digest = (
+            image_bytes.digest
+            if isinstance(image_bytes, PreparedImage)
+            else content_digest(image_bytes)
+        )
+    key_parts = (prompt_digest(prompt), image_digest)
+    return await _run_cached(
+        connections,
+        settings,
+        lambda conn: conn.invoke_vision(
+            prompt, image_bytes, response_schema=response_schema
+        ),
+        validator,
+        "vision",
+        cache_key_prefix,
+        hedge_delay,
+        cache_get,
+        cache_set,
+        key_parts,
+        estimate_tokens(prompt) + IMAGE_TOKENS_ESTIMATE,
+    )
 
 
 async def run_text_with_fallback(
     connections: list[type[LLMConnection]],
     settings: Any,
     messages: list[dict[str, str]],
-    cache_get: Callable[[str, ...], Any | None] | None = None,
-    cache_set: Callable[[str, Any, ...], None] | None = None,
+    cache_get: Callable[..., Any | None | Awaitable[Any | None]] | None = None,
+    cache_set: Callable[..., None | Awaitable[None]] | None = None,
     cache_key_prefix: str = "text",
     validate: Callable[[dict[str, Any]], bool] | None = None,
+    hedge_delay: float | None = None,
+    response_schema: dict[str, Any] | None = None,
 ) -> dict[str, Any]:
-    """Try each connection for text-only invocation."""
+    """Try each connection for text-only invocation (see run_vision_with_fallback)."""
     validator = validate or (lambda r: not is_error_result(r))
+    return await _run_cached(
+        connections,
+        settings,
+        lambda conn: conn.invoke_text(messages, response_schema=response_schema),
+        validator,
+        "text",
+        cache_key_prefix,
+        hedge_delay,
+        cache_get,
+        cache_set,
+        (json.dumps(messages, sort_keys=True),),
+        _messages_tokens(messages),
+    )
+
+
+async def stream_text_with_fallback(
+    connections: list[type[LLMConnection]],
+    settings: Any,
+    messages: list[dict[str, str]],
+    cache_get: Callable[..., Any | None | Awaitable[Any | None]] | None = None,
+    cache_set: Callable[..., None | Awaitable[None]] | None = None,
+    cache_key_prefix: str = "text",
+    validate: Callable[[Any], bool] | None = None,
+) -> AsyncIterator[Any]:
+    """Stream the elements of a JSON array answer as each one is complete.
+
+    Same cache key as run_text_with_fallback, so a streamed result is reused by
+    the non-streaming path and vice versa. Providers are tried in chain order
+    until one produces elements; once elements have been yielded the provider
+    cannot be switched, so a failure mid-stream ends the stream with a partial
+    result (not cached). The validator runs on the complete list. Streamed calls
+    are neither hedged nor coalesced, and always answer as plain text (no
+    structured output).
 
+    Yields:
+        Parsed array elements; nothing if every provider failed.
+    """
+    validator = validate or (lambda r: not is_error_result(r))
+    key = json.dumps(messages, sort_keys=True)
     if cache_get:
-        key = json.dumps(messages, sort_keys=True)
-        cached = cache_get(cache_key_prefix, key)
+        cached = await _maybe_await(cache_get(cache_key_prefix, key))
         if cached is not None and validator(cached):
-            logger.info("Returning cached LLM result")
-            return cached
+            logger.info("Returning cached LLM result (stream)")
+            for item in cached:
+                yield item
+            return
 
-    errors: list[dict[str, Any]] = []
-    for conn_class in connections:
-        conn = conn_class(settings)
-        logger.info("Trying LLM: %s (text, waiting...)", conn.name)
+    registry = get_connection_registry()
+    conns = get_provider_router().order(
+        cache_key_prefix,
+        [registry.get(conn_class, settings) for conn_class in connections],
+    )
+    breaker = get_circuit_breaker()
+    negative = get_negative_cache()
+    tokens = _messages_tokens(messages)
+    for conn in conns:
+        if await negative.check(conn) is not None:
+            _record(cache_key_prefix, conn, "skipped", None)
+            continue
+        ticket = await breaker.allow(conn)
+        if ticket is None:
+            logger.info("LLM %s: circuit open, skipping", conn.name)
+            _record(cache_key_prefix, conn, "skipped", None)
+            continue
+        parser = JSONArrayStreamParser()
+        items: list[Any] = []
+        error: dict[str, Any] | None = None
         try:
-            start = time.perf_counter()
-            result = await conn.invoke_text(messages)
-            elapsed = time.perf_counter() - start
-            ok, value = _validation_check(validator, result, conn.name)
-            if ok:
-                logger.info("Success with %s in %.2fs", conn.name, elapsed)
-                if cache_set:
-                    cache_set(
-                        cache_key_prefix, value, json.dumps(messages, sort_keys=True)
+            async with get_rate_limiter().slot(conn.name, tokens) as queue_wait:
+                record_queue_wait(conn.name, queue_wait, cache_key_prefix)
+                logger.info("Trying LLM: %s (stream)", conn.name)
+                start = time.perf_counter()
+                try:
+                    async with aclosing(
+                        conn.stream_text(messages, stage=cache_key_prefix)
+                    ) as chunks:
+                        async for chunk in chunks:
+                            for item in parser.feed(chunk):
+                                items.append(item)
+                                yield item
+                except LLMStreamError as e:
+                    error = {"engine": conn.name, **e.result}
+                except Exception as e:
+                    logger.warning(
+                        "LLM %s stream failed with exception: %s", conn.name, e
                     )
-                return value
-            logger.warning("LLM %s: validation failed after %.2fs", conn.name, elapsed)
-            errors.append(value)
-        except Exception as e:
-            errors.append(
-                {"engine": conn.name, "error": str(e), "error_type": "exception"}
+                    error = {
+                        "engine": conn.name,
+                        "error": str(e),
+                        "error_type": "exception",
+                    }
+                elapsed = time.perf_counter() - start
+        except RateLimitError:
+            await breaker.release(conn, ticket)
+            _record(cache_key_prefix, conn, "skipped", None)
+            continue
+        except (asyncio.CancelledError, GeneratorExit):
+            # Consumer went away mid-stream: the call has no outcome
+            await breaker.release(conn, ticket)
+            raise
+        ok = error is None and parser.done and validator(items)
+        if not ok and error is None:
+            error = {
+                "engine": conn.name,
+                "error": "Incomplete or invalid JSON array stream",
+                "error_type": "invalid_json",
+            }
+        await breaker.record(conn, ticket, ok, error or {})
+        if error is not None:
+            await negative.record(conn, error)
+        _record(cache_key_prefix, conn, "win" if ok else "loss", elapsed)
+        if ok:
+            logger.info(
+                "Success with %s in %.2fs (%d streamed items)",
+                conn.name,
+                elapsed,
+                len(items),
             )
-            logger.warning("LLM %s failed with exception: %s", conn.name, e)
-
-    return {"error": "All LLM providers failed", "engine_errors": errors}
+            if cache_set:
+                await _maybe_await(cache_set(cache_key_prefix, items, key))
+            return
+        if items:
+            logger.warning(
+                "LLM %s stream failed after %d items, returning partial result: %s",
+                conn.name,
+                len(items),
+                error.get("error"),
+            )
+            return
+        logger.warning("LLM %s stream failed: %s", conn.name, error.get("error"))
+    logger.error("All LLM providers failed (stream)")
@@ -1,7 +1,5 @@
 """Gemini LLM connection - lazy proxy to ChatGoogleGenerativeAI."""
 
-import json
-import re
 from typing import Any
 
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -24,6 +22,10 @@ class GeminiConnection(LLMConnection):
     def name(self) -> str:
         return "Gemini"
 
+    @property
+    def model(self) -> str:
+        return self._settings.primary_model
+
     def _ensure_llm(self) -> ChatGoogleGenerativeAI | None:
         """Lazy init - only create client when first used."""
         if self._llm is not None:
@@ -47,36 +49,7 @@ class GeminiConnection(LLMConnection):
     def is_configured(self) -> bool:
         return bool(self._settings.google_api_key)
 
-    def _parse_json(self, text: str) -> dict[str, Any]:
-        if not text:
-            return {
-                "error": "Empty response",
-                "error_type": "empty",
-                "service": self.name,
-            }
-        text = text.strip()
-        for start, end in [("{", "}"), ("[", "]")]:
-            idx = text.find(start)
-            if idx != -1:
-                depth = 0
-                for i, c in enumerate(text[idx:], idx):
-                    if c == start:
-                        depth += 1
-                    elif c == end:
-                        depth -= 1
-                        if depth == 0:
-                            try:
-                                return json.loads(text[idx : i + 1])
-                            except json.JSONDecodeError:
-                                pass
-        match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text)
-        if match:
-            try:
-                return json.loads(match.group(1).strip())
-            except json.JSONDecodeError:
-                pass
-        return {
-            "error": "Invalid JSON response",
-            "error_type": "invalid_json",
-            "service": self.name,
-        }
+    def _bind_response_schema(self, llm: Any, schema: dict[str, Any]) -> Any:
+        return llm.bind(
+            response_mime_type="application/json", response_json_schema=schema
+        )
@@ -0,0 +1,194 @@
+"""Vision input normalization: one prepared image per request.
+
+The upload used to be base64-encoded by every vision call (guardrail, diagram,
+and again on each fallback attempt), always labelled image/jpeg and sent at its
+original resolution. prepare_image decodes it once and:
+
+- caps the longest edge at settings.llm_image_max_side (default 2048 px: what
+  OpenAI scales high-detail images down to, and well within Gemini's limit, so
+  no provider loses detail it would have used);
+- composites transparency on white and re-encodes to settings.llm_image_format
+  (JPEG by default: a few ms to encode, and accepted by every provider);
+- keeps the original bytes instead when they already fit and are smaller.
+
+The resulting PreparedImage carries the bytes, their real MIME type and a
+lazily computed base64 data URL and digest, so every stage and fallback attempt
+of the request shares one payload. Raw bytes passed to a vision call are
+wrapped with as_prepared_image (MIME sniffed from the magic bytes, no decode).
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import warnings
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.threat_analysis.llm.cache import content_digest
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+logger = get_logger("llm.image")
+
+# settings.llm_image_format -> (Pillow format, MIME type)
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+# Formats every provider accepts as-is (sent without re-encoding when smaller)
+_PASSTHROUGH = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """MIME type from the magic bytes (image/jpeg when unknown, as before)."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/jpeg"
+
+
+class PreparedImage:
+    """Image payload sent to vision LLMs, shared by every stage of a request."""
+
+    __slots__ = ("data", "mime_type", "size", "_b64", "_digest")
+
+    def __init__(
+        self,
+        data: bytes,
+        mime_type: str,
+        size: tuple[int, int] | None = None,
+        digest: str | None = None,
+    ) -> None:
+        """Initialize the payload.
+
+        Args:
+            data: Encoded image bytes sent to the providers.
+            mime_type: MIME type of data (used in the data URL).
+            size: (width, height) of data, when known.
+            digest: content_digest(data) if already computed.
+        """
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self._b64: str | None = None
+        self._digest = digest
+
+    @classmethod
+    def from_bytes(cls, data: bytes, digest: str | None = None) -> PreparedImage:
+        """Wrap raw bytes as-is (no decode), with the MIME type sniffed from them."""
+        return cls(data, sniff_mime_type(data), digest=digest)
+
+    @property
+    def b64(self) -> str:
+        """Base64 of data, encoded on first use."""
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.data).decode("ascii")
+        return self._b64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.b64}"
+
+    @property
+    def digest(self) -> str:
+        """content_digest(data): the cache key part of vision calls."""
+        if self._digest is None:
+            self._digest = content_digest(self.data)
+        return self._digest
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def as_prepared_image(image: bytes | PreparedImage) -> PreparedImage:
+    """image itself if already prepared, else the raw bytes wrapped as-is."""
+    if isinstance(image, PreparedImage):
+        return image
+    return PreparedImage.from_bytes(bytes(image))
+
+
+def encode_image(
+    image: Any, image_format: str = "jpeg", quality: int = 90
+) -> PreparedImage:
+    """Encode a decoded PIL image (transparency composited on white).
+
+    Args:
+        image: PIL image, in any mode.
+        image_format: Key of IMAGE_FORMATS to encode to.
+        quality: Encoder quality for JPEG/WebP.
+    """
+    pil_format, mime_type = IMAGE_FORMATS[image_format]
+    if "A" in image.getbands():
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image.convert("RGBA"))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, pil_format, quality=quality)
+    return PreparedImage(buffer.getvalue(), mime_type, size=image.size)
+
+
+def prepare_image(
+    image_bytes: bytes,
+    max_side: int = 2048,
+    image_format: str = "jpeg",
+    quality: int = 90,
+) -> PreparedImage:
+    """Downscale and re-encode an upload for vision calls (see module docstring).
+
+    CPU-bound: call it from a worker thread in async code. Bytes Pillow cannot
+    decode (or a missing Pillow) are wrapped as-is.
+
+    Args:
+        image_bytes: Raw upload.
+        max_side: Longest edge (px) of the prepared image.
+        image_format: Key of IMAGE_FORMATS to re-encode to.
+        quality: Encoder quality for JPEG/WebP.
+    """
+    if Image is None:
+        return PreparedImage.from_bytes(image_bytes)
+    try:
+        with warnings.catch_warnings():
+            # Oversized uploads are rejected earlier by the guardrail pre-filter
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(image_bytes))
+            original_format, original_size = image.format, image.size
+            image.draft("RGB", (max_side, max_side))
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA")
+            image.thumbnail(
+                (max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+            image.load()
+    except Exception as e:
+        logger.warning("Image normalization skipped, sending as-is: %s", e)
+        return PreparedImage.from_bytes(image_bytes)
+
+    encoded = encode_image(image, image_format, quality)
+    if (
+        image.size == original_size
+        and original_format in _PASSTHROUGH
+        and len(image_bytes) <= len(encoded)
+    ):
+        prepared = PreparedImage(
+            image_bytes, _PASSTHROUGH[original_format], size=original_size
+        )
+    else:
+        prepared = encoded
+    logger.info(
+        "Image prepared: %dx%d %s (%d bytes) -> %dx%d %s (%d bytes)",
+        *original_size,
+        original_format,
+        len(image_bytes),
+        *prepared.size,
+        prepared.mime_type,
+        len(prepared.data),
+    )
+    return prepared
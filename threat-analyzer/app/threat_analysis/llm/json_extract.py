@@ -0,0 +1,249 @@
+"""JSON extraction from LLM responses, shared by all connections and agents.
+
+Models wrap their JSON in prose and/or ```json fences. extract_json finds the
+outermost JSON object or array in one pass over the text: a single regex walks
+string literals and brackets (strings are skipped whole, so braces inside them
+never count), keeping a stack of open brackets. Each complete top-level value
+is decoded once; when it is not valid JSON the scan resumes after it, so the
+total work stays linear in the response length.
+
+A fenced block whose body starts with '{' or '[' is tried first, and text that
+is nothing but a JSON value is decoded directly without scanning. Decoding uses
+orjson when it is installed and the standard json module otherwise.
+
+repair_truncated_json salvages the complete elements of a JSON value cut off
+mid-way (e.g. by the model's output limit) and reports the salvage ratio.
+"""
+
+import json
+import re
+import threading
+from collections import deque
+from collections.abc import Iterator
+from functools import lru_cache
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+# String literal (unrolled loop: linear, no backtracking) or a bracket
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]')
+# Same, plus commas; a lone '"' marks a string cut off by the end of the text
+_REPAIR_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|"|[{}\[\],]')
+_OPENER = re.compile(r"[{\[]")
+_FENCE = re.compile(r"```(?:json|JSON)?[ \t]*\n?([\s\S]*?)```")
+_CLOSER_FOR = {"{": "}", "[": "]"}
+
+
+class JSONExtractionError(ValueError):
+    """No decodable JSON object or array in the text."""
+
+
+def loads(text: str | bytes) -> Any:
+    """Decode JSON with orjson when available (raises json.JSONDecodeError)."""
+    if orjson is not None:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def iter_json_spans(text: str, start: int = 0) -> Iterator[tuple[int, int]]:
+    """Yield (start, end) of each complete top-level JSON object/array in text.
+
+    Brackets inside string literals are ignored; a closer that does not match
+    the innermost opener abandons the current candidate.
+    """
+    pos = start
+    length = len(text)
+    while pos < length:
+        opener = _OPENER.search(text, pos)
+        if opener is None:
+            return
+        begin = opener.start()
+        stack: list[str] = []
+        for match in _TOKEN.finditer(text, begin):
+            token = match.group()
+            if token[0] == '"':
+                continue
+            if token in _CLOSER_FOR:
+                stack.append(_CLOSER_FOR[token])
+            elif stack and token == stack[-1]:
+                stack.pop()
+                if not stack:
+                    yield begin, match.end()
+                    pos = match.end()
+                    break
+            else:
+                # Mismatched closer: restart from the next opener
+                pos = match.end()
+                break
+        else:
+            return
+
+
+def extract_json_text(text: str) -> str:
+    """Text of the first decodable JSON object/array in text (text itself if none)."""
+    try:
+        return _first_value(text)[1]
+    except JSONExtractionError:
+        return text.strip()
+
+
+def extract_json(text: str) -> Any:
+    """Decode the outermost JSON object or array found in text.
+
+    Raises:
+        JSONExtractionError: The text holds no decodable JSON object or array.
+    """
+    return _first_value(text)[0]
+
+
+def _first_value(text: str) -> tuple[Any, str]:
+    if not text:
+        raise JSONExtractionError("Empty response")
+    if "```" in text:
+        for fence in _FENCE.finditer(text):
+            body = fence.group(1).strip()
+            if body[:1] in _CLOSER_FOR:
+                try:
+                    return _decode_first(body)
+                except JSONExtractionError:
+                    continue
+    return _decode_first(text)
+
+
+def _decode_first(text: str) -> tuple[Any, str]:
+    error = "No JSON object or array found"
+    stripped = text.strip()
+    if stripped[:1] in _CLOSER_FOR and stripped[-1:] in "}]":
+        # Fast path: the whole text is the JSON value (one decode, no scan)
+        try:
+            return loads(stripped), stripped
+        except json.JSONDecodeError:
+            pass
+    for begin, end in iter_json_spans(text):
+        candidate = text[begin:end]
+        try:
+            return loads(candidate), candidate
+        except json.JSONDecodeError as e:
+            error = str(e)
+    raise JSONExtractionError(error)
+
+
+# Safe cut points kept while scanning a truncated value (most recent last)
+_REPAIR_CANDIDATES = 8
+
+
+def repair_truncated_json(text: str) -> tuple[Any, float] | None:
+    """Salvage the complete elements of a JSON object/array truncated at the end.
+
+    The value still open at the end of the text is cut at its last complete
+    element (array item, or key/value pair of the top-level object) and its
+    open brackets are closed. Elements cut mid-way are dropped whole: an
+    object inside an array is never kept with only some of its keys.
+
+    Returns:
+        (value, salvage_ratio) where salvage_ratio is the salvaged fraction of
+        the truncated JSON text, or None if nothing could be salvaged.
+    """
+    if not text:
+        return None
+    pos = 0
+    while True:
+        opener = _OPENER.search(text, pos)
+        if opener is None:
+            return None
+        begin = opener.start()
+        stack: list[str] = []
+        safe: deque[tuple[int, str]] = deque(maxlen=_REPAIR_CANDIDATES)
+        truncated = True
+        for match in _REPAIR_TOKEN.finditer(text, begin):
+            token = match.group()
+            if token == '"':
+                break  # unterminated string: truncated inside it
+            if token[0] == '"':
+                continue
+            if token in _CLOSER_FOR:
+                stack.append(_CLOSER_FOR[token])
+            elif token == ",":
+                if stack and (stack[-1] == "]" or len(stack) == 1):
+                    safe.append((match.start(), "".join(reversed(stack))))
+            elif stack and token == stack[-1]:
+                stack.pop()
+                if not stack:
+                    # Complete value: the truncated one (if any) comes later
+                    truncated = False
+                    pos = match.end()
+                    break
+                if stack[-1] == "]" or len(stack) == 1:
+                    safe.append((match.end(), "".join(reversed(stack))))
+            else:
+                truncated = False
+                pos = match.end()
+                break
+        if truncated:
+            return _salvage(text, begin, safe)
+
+
+def _salvage(
+    text: str, begin: int, safe: deque[tuple[int, str]]
+) -> tuple[Any, float] | None:
+    total = len(text[begin:].rstrip()) or 1
+    for cut, closers in reversed(safe):
+        candidate = text[begin:cut].rstrip().rstrip(",")
+        try:
+            value = loads(candidate + closers)
+        except json.JSONDecodeError:
+            continue
+        return value, round(min(1.0, len(candidate) / total), 4)
+    return None
+
+
+class JSONRepairStats:
+    """Process-wide counters of truncated responses and how they were handled.
+
+    - truncated: responses that were not valid JSON but looked cut off.
+    - accepted: partial results accepted (salvage ratio above the minimum).
+    - continued / continuation_ok: continuation requests sent / that fixed it.
+    - rejected: truncated responses left as invalid_json (fallback continues).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ("truncated", "accepted", "continued", "continuation_ok", "rejected"), 0
+        )
+        self._ratio_sum = 0.0
+        self._ratios = 0
+
+    def record(self, event: str, salvage_ratio: float | None = None) -> None:
+        """Count event; salvage_ratio feeds the mean salvage ratio."""
+        with self._lock:
+            self._counters[event] += 1
+            if salvage_ratio is not None:
+                self._ratio_sum += salvage_ratio
+                self._ratios += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "mean_salvage_ratio": round(self._ratio_sum / self._ratios, 4)
+                if self._ratios
+                else 0.0,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            for event in self._counters:
+                self._counters[event] = 0
+            self._ratio_sum = 0.0
+            self._ratios = 0
+
+
+@lru_cache
+def get_json_repair_stats() -> JSONRepairStats:
+    """Get the process-wide JSONRepairStats instance."""
+    return JSONRepairStats()
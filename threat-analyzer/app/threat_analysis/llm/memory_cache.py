@@ -0,0 +1,196 @@
+"""In-process L1 tier for the LLM response cache.
+
+MemoryLRUCache keeps decoded responses in memory, bounded by the total size of
+their JSON encoding in bytes (UTF-8) with LRU eviction and a per-entry TTL, in
+front of the shared backend (Redis). Hot diagrams re-analysed from the UI are
+answered without a network round-trip or a JSON decode. Hits return the stored
+object itself: callers treat cached results as read-only, as single-flight
+waiters already do with the leader's result.
+
+Replicas can optionally evict each other's L1 copies through Redis pub/sub
+(CacheInvalidator): every write publishes its key and every other replica drops
+that key from memory, so the next read goes to Redis.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Literal
+
+from threat_modeling_shared.logging import get_logger
+
+logger = get_logger("llm.memory_cache")
+
+Tier = Literal["memory", "redis"]
+
+INVALIDATION_CHANNEL = "llm:cache:invalidate"
+
+# Seconds to wait before resubscribing after the pub/sub connection drops
+_RESUBSCRIBE_DELAY = 5.0
+
+
+class MemoryLRUCache:
+    """Thread-safe LRU of decoded values, bounded by JSON bytes, with per-entry TTL."""
+
+    def __init__(self, max_json_bytes: int, ttl_seconds: float) -> None:
+        self._max_bytes = max(0, max_json_bytes)
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (value, JSON size in bytes, expiry)
+        self._entries: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()
+        self._size = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_bytes > 0
+
+    def get(self, key: str) -> Any | None:
+        """Return the stored value and mark it most recently used (None if missing/expired)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: int) -> None:
+        """Store value, evicting least recently used entries beyond max_json_bytes.
+
+        size is the length in bytes of value's UTF-8 JSON encoding. Values larger
+        than the whole budget are not kept in memory.
+        """
+        if not self.enabled or size > self._max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self._ttl)
+            self._size += size
+            while self._size > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def snapshot(self) -> dict[str, Any]:
+        """Entry count, JSON bytes held, JSON byte budget and evictions."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "json_bytes": self._size,
+                "max_json_bytes": self._max_bytes,
+                "evictions": self._evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._evictions = 0
+
+
+class CacheTierStats:
+    """Process-wide hit/miss counters per cache tier (memory, redis)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    def record(self, tier: Tier, hit: bool) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(tier, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Hits, misses and hit rate per tier."""
+        with self._lock:
+            return {
+                tier: {
+                    **counters,
+                    "hit_rate": round(
+                        counters["hits"] / (counters["hits"] + counters["misses"]), 4
+                    )
+                    if counters["hits"] + counters["misses"]
+                    else 0.0,
+                }
+                for tier, counters in self._counters.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+class CacheInvalidator:
+    """Redis pub/sub fan-out of written keys so other replicas drop their L1 copy."""
+
+    def __init__(self, redis_url: str, memory: MemoryLRUCache) -> None:
+        self._redis_url = redis_url
+        self._memory = memory
+        self._node_id = uuid.uuid4().hex
+        self._client: Any = None
+        self._thread: threading.Thread | None = None
+
+    def _get_client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.from_url(
+                self._redis_url, encoding="utf-8", decode_responses=True
+            )
+        return self._client
+
+    def publish(self, key: str) -> None:
+        """Announce that key was written by this replica."""
+        try:
+            self._get_client().publish(INVALIDATION_CHANNEL, f"{self._node_id}|{key}")
+        except Exception as e:
+            logger.warning("Cache invalidation publish failed for %s: %s", key, e)
+
+    def handle(self, message: str) -> None:
+        """Drop the announced key from memory unless this replica wrote it."""
+        node_id, _, key = message.partition("|")
+        if key and node_id != self._node_id:
+            self._memory.delete(key)
+
+    def start(self) -> None:
+        """Start the subscriber thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._listen, name="llm-cache-invalidator", daemon=True
+        )
+        self._thread.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.handle(message["data"])
+            except Exception as e:
+                logger.warning("Cache invalidation subscriber error: %s", e)
+            time.sleep(_RESUBSCRIBE_DELAY)
+
+
+@lru_cache
+def get_cache_tier_stats() -> CacheTierStats:
+    """Get the process-wide CacheTierStats instance."""
+    return CacheTierStats()
@@ -0,0 +1,138 @@
+"""Negative cache of provider-level failures for the LLM fallback chain.
+
+Some failures say nothing about the request and everything about the provider:
+missing configuration (no API key), rejected credentials, an exhausted quota
+(billing / daily limit) or a host that cannot be reached (DNS, connection
+refused). Retrying such a provider on every stage of every request only adds
+latency and log noise, so after one of these errors the provider (name + model)
+is remembered for ttl_seconds and skipped without being called. The entry
+expires on its own; the next call after that tries the provider again.
+
+Unlike the circuit breaker (which needs several consecutive processing errors
+or timeouts), one failure is enough here: these errors do not heal between two
+calls. Entries live in an AsyncCacheBackend (in-process by default,
+redis.asyncio when shared) so every replica skips the provider together
+without blocking the event loop on Redis.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared import AsyncMemoryCacheBackend, get_async_cache_backend
+from threat_modeling_shared.cache import AsyncCacheBackend
+from threat_modeling_shared.logging import get_logger
+
+from app.config import get_settings
+from app.threat_analysis.llm.base import LLMConnection
+
+logger = get_logger("llm.negative_cache")
+
+# Error types that take a provider out of the chain until the entry expires
+NEGATIVE_ERROR_TYPES = frozenset(
+    {"config", "invalid_api_key", "quota_exhausted", "unreachable"}
+)
+
+_KEY_PREFIX = "llm:negative"
+
+
+class ProviderNegativeCache:
+    """Providers known to be unusable for a short while, keyed by provider and model."""
+
+    def __init__(
+        self,
+        backend: AsyncCacheBackend | None = None,
+        ttl_seconds: float = 60.0,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            backend: Where entries live (None = in-process memory).
+            ttl_seconds: How long a failed provider is skipped (0 disables the cache).
+        """
+        self._backend = backend or AsyncMemoryCacheBackend()
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    @staticmethod
+    def provider_key(conn: LLMConnection) -> str:
+        """Entry id for a connection: '<provider>:<model>'."""
+        return f"{conn.name}:{conn.model}"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{_KEY_PREFIX}:{key}"
+
+    def _bump(self, key: str, name: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(key, {"marked": 0, "skipped": 0})
+            counters[name] += 1
+
+    async def check(self, conn: LLMConnection) -> str | None:
+        """Error type that put conn in the cache, or None if it may be called."""
+        if not self.enabled:
+            return None
+        key = self.provider_key(conn)
+        error_type = await self._backend.get(self._entry_key(key))
+        if error_type is None:
+            return None
+        self._bump(key, "skipped")
+        logger.info(
+            "LLM %s: skipped, provider unavailable (%s) in the negative cache",
+            key,
+            error_type,
+        )
+        return str(error_type)
+
+    async def record(self, conn: LLMConnection, result: dict[str, Any]) -> bool:
+        """Cache conn when result is a provider-level failure; True if it was cached."""
+        error_type = result.get("error_type")
+        if not self.enabled or error_type not in NEGATIVE_ERROR_TYPES:
+            return False
+        key = self.provider_key(conn)
+        await self._backend.set(self._entry_key(key), error_type, ttl_seconds=self._ttl)
+        self._bump(key, "marked")
+        logger.warning(
+            "LLM %s: %s, skipping provider for %.0fs: %s",
+            key,
+            error_type,
+            self._ttl,
+            result.get("error"),
+        )
+        return True
+
+    async def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Current entry (error type or None) and counters per provider seen here."""
+        with self._lock:
+            counters = {key: dict(value) for key, value in self._counters.items()}
+        return {
+            key: {"unavailable": await self._backend.get(self._entry_key(key)), **value}
+            for key, value in sorted(counters.items())
+        }
+
+    async def reset(self) -> None:
+        """Drop this process's entries and counters (shared entries expire on their own)."""
+        with self._lock:
+            keys = list(self._counters)
+            self._counters.clear()
+        if isinstance(self._backend, AsyncMemoryCacheBackend):
+            for key in keys:
+                await self._backend.delete(self._entry_key(key))
+
+
+@lru_cache
+def get_negative_cache() -> ProviderNegativeCache:
+    """Get the process-wide ProviderNegativeCache configured from settings."""
+    settings = get_settings()
+    backend = (
+        get_async_cache_backend(redis_url=settings.redis_url)
+        if settings.llm_negative_cache_shared
+        else AsyncMemoryCacheBackend()
+    )
+    return ProviderNegativeCache(
+        backend=backend, ttl_seconds=settings.llm_negative_cache_ttl_seconds
+    )
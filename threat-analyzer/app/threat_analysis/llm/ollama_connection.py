@@ -1,6 +1,5 @@
 """Ollama LLM connection - lazy proxy to ChatOllama."""
 
-import json
 from typing import Any
 
 from langchain_ollama import ChatOllama
@@ -23,6 +22,10 @@ class OllamaConnection(LLMConnection):
     def name(self) -> str:
         return "Ollama"
 
+    @property
+    def model(self) -> str:
+        return self._settings.ollama_model
+
     def _ensure_llm(self) -> ChatOllama | None:
         if self._llm is not None:
             return self._llm
@@ -42,30 +45,5 @@ class OllamaConnection(LLMConnection):
     def is_configured(self) -> bool:
         return True  # Ollama has no API key, assume configured
 
-    def _parse_json(self, text: str) -> dict[str, Any]:
-        if not text:
-            return {
-                "error": "Empty response",
-                "error_type": "empty",
-                "service": self.name,
-            }
-        text = text.strip().replace("```json", "").replace("```", "").strip()
-        for start, end in [("{", "}"), ("[", "]")]:
-            idx = text.find(start)
-            if idx != -1:
-                depth = 0
-                for i, c in enumerate(text[idx:], idx):
-                    if c == start:
-                        depth += 1
-                    elif c == end:
-                        depth -= 1
-                        if depth == 0:
-                            try:
-                                return json.loads(text[idx : i + 1])
-                            except json.JSONDecodeError:
-                                pass
-        return {
-            "error": "Invalid JSON response",
-            "error_type": "invalid_json",
-            "service": self.name,
-        }
+    def _bind_response_schema(self, llm: Any, schema: dict[str, Any]) -> Any:
+        return llm.bind(format=schema)
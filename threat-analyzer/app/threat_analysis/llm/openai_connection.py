@@ -1,6 +1,5 @@
 """OpenAI LLM connection - lazy proxy to ChatOpenAI."""
 
-import json
 from typing import Any
 
 from langchain_openai import ChatOpenAI
@@ -11,6 +10,9 @@ from app.threat_analysis.llm.base import LLMConnection
 
 logger = get_logger("llm.openai")
 
+# OpenAI requires an object at the root of a response schema
+_ARRAY_WRAPPER_KEY = "items"
+
 
 class OpenAIConnection(LLMConnection):
     """OpenAI connection - instantiated only when used."""
@@ -23,6 +25,10 @@ class OpenAIConnection(LLMConnection):
     def name(self) -> str:
         return "OpenAI"
 
+    @property
+    def model(self) -> str:
+        return self._settings.fallback_model
+
     def _ensure_llm(self) -> ChatOpenAI | None:
         if self._llm is not None:
             return self._llm
@@ -45,30 +51,32 @@ class OpenAIConnection(LLMConnection):
     def is_configured(self) -> bool:
         return bool(self._settings.openai_api_key)
 
-    def _parse_json(self, text: str) -> dict[str, Any]:
-        if not text:
-            return {
-                "error": "Empty response",
-                "error_type": "empty",
-                "service": self.name,
+    def _bind_response_schema(self, llm: Any, schema: dict[str, Any]) -> Any:
+        if schema.get("type") == "array":
+            # $defs stay at the root so "#/$defs/..." references still resolve
+            items = {k: v for k, v in schema.items() if k != "$defs"}
+            schema = {
+                "type": "object",
+                "properties": {_ARRAY_WRAPPER_KEY: items},
+                "required": [_ARRAY_WRAPPER_KEY],
+                **({"$defs": schema["$defs"]} if "$defs" in schema else {}),
             }
-        text = text.strip().replace("```json", "").replace("```", "").strip()
-        for start, end in [("{", "}"), ("[", "]")]:
-            idx = text.find(start)
-            if idx != -1:
-                depth = 0
-                for i, c in enumerate(text[idx:], idx):
-                    if c == start:
-                        depth += 1
-                    elif c == end:
-                        depth -= 1
-                        if depth == 0:
-                            try:
-                                return json.loads(text[idx : i + 1])
-                            except json.JSONDecodeError:
-                                pass
-        return {
-            "error": "Invalid JSON response",
-            "error_type": "invalid_json",
-            "service": self.name,
-        }
+        return llm.bind(
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "response",
+                    "schema": schema,
+                    "strict": False,
+                },
+            }
+        )
+
+    def _structured_value(self, value: Any, schema: dict[str, Any]) -> Any:
+        if (
+            schema.get("type") == "array"
+            and isinstance(value, dict)
+            and isinstance(value.get(_ARRAY_WRAPPER_KEY), list)
+        ):
+            return value[_ARRAY_WRAPPER_KEY]
+        return value
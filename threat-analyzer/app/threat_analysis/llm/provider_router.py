@@ -0,0 +1,145 @@
+"""Latency-aware adaptive ordering of the LLM fallback chain.
+
+For every (stage, provider) pair the router keeps an EWMA of the success rate
+of completed calls and of the latency of the successful ones. The chain is
+ordered by the expected time to a valid result,
+(latency_ewma + (1 - success_ewma) * failure penalty) / success_ewma, so a
+provider that is currently fast and reliable for a stage is tried first, and
+one that fails quickly does not look fast. A provider that has not succeeded
+in a stage yet ranks last there. With probability `exploration_rate`
+a random lower-ranked provider is promoted to the front, so rankings keep
+tracking providers whose latency changes over the day.
+
+Stages are the cache key prefixes used by the agents (diagram, stride, dread,
+guardrail). The agents' CONNECTION_ORDER remains the tie-breaker and the order
+used while a stage has no data.
+"""
+
+import random
+import threading
+from functools import lru_cache
+from typing import Any
+
+from app.config import get_settings
+from app.threat_analysis.llm.base import LLMConnection
+
+# Latency floor (seconds) so a handful of very fast answers cannot dominate the score
+_MIN_LATENCY = 0.05
+# Seconds charged per expected failure (falling back to the next provider)
+_FAILURE_PENALTY = 5.0
+# Success-rate floor so the expected time stays finite
+_MIN_SUCCESS = 0.01
+
+
+class _ProviderEstimate:
+    """EWMA of success rate and success latency for one provider in one stage."""
+
+    __slots__ = ("success", "latency", "samples")
+
+    def __init__(self) -> None:
+        self.success = 1.0
+        self.latency: float | None = None
+        self.samples = 0
+
+    def update(self, ok: bool, latency: float, alpha: float) -> None:
+        self.success += alpha * ((1.0 if ok else 0.0) - self.success)
+        # A failure's latency says nothing about how long a valid answer takes
+        if ok:
+            self.latency = (
+                latency
+                if self.latency is None
+                else self.latency + alpha * (latency - self.latency)
+            )
+        self.samples += 1
+
+    @property
+    def score(self) -> float:
+        """Inverse of the expected seconds to a valid result (0 = never succeeded)."""
+        if self.latency is None:
+            return 0.0
+        expected = (
+            max(self.latency, _MIN_LATENCY) + (1.0 - self.success) * _FAILURE_PENALTY
+        ) / max(self.success, _MIN_SUCCESS)
+        return 1.0 / expected
+
+
+class AdaptiveProviderRouter:
+    """Reorders connections per stage by EWMA throughput, with minimum exploration."""
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        exploration_rate: float = 0.05,
+        enabled: bool = True,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._alpha = alpha
+        self._exploration_rate = exploration_rate
+        self.enabled = enabled
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._estimates: dict[str, dict[str, _ProviderEstimate]] = {}
+
+    def record(self, stage: str, provider: str, ok: bool, latency: float) -> None:
+        """Feed the outcome of a completed call (skipped/cancelled calls are ignored)."""
+        with self._lock:
+            stage_estimates = self._estimates.setdefault(stage, {})
+            stage_estimates.setdefault(provider, _ProviderEstimate()).update(
+                ok, latency, self._alpha
+            )
+
+    def order(self, stage: str, conns: list[LLMConnection]) -> list[LLMConnection]:
+        """Return conns ordered for stage (unchanged when disabled or without data)."""
+        if not self.enabled or len(conns) < 2:
+            return list(conns)
+        with self._lock:
+            estimates = dict(self._estimates.get(stage, {}))
+        if not estimates:
+            return list(conns)
+        # Unseen providers get the best known score (stable sort keeps static order)
+        best = max(e.score for e in estimates.values())
+        ranked = sorted(
+            conns,
+            key=lambda c: -(estimates[c.name].score if c.name in estimates else best),
+        )
+        if self._rng.random() < self._exploration_rate:
+            explored = ranked.pop(self._rng.randrange(1, len(ranked)))
+            ranked.insert(0, explored)
+        return ranked
+
+    def ranking(self) -> dict[str, list[dict[str, Any]]]:
+        """Current ranking per stage, best first."""
+        with self._lock:
+            snapshot = {
+                stage: sorted(estimates.items(), key=lambda item: -item[1].score)
+                for stage, estimates in self._estimates.items()
+            }
+        return {
+            stage: [
+                {
+                    "provider": provider,
+                    "score": round(estimate.score, 4),
+                    "success_ewma": round(estimate.success, 4),
+                    "latency_ewma": round(estimate.latency or 0.0, 4),
+                    "samples": estimate.samples,
+                }
+                for provider, estimate in items
+            ]
+            for stage, items in snapshot.items()
+        }
+
+    def reset(self) -> None:
+        """Forget all estimates."""
+        with self._lock:
+            self._estimates.clear()
+
+
+@lru_cache
+def get_provider_router() -> AdaptiveProviderRouter:
+    """Get the process-wide AdaptiveProviderRouter configured from settings."""
+    settings = get_settings()
+    return AdaptiveProviderRouter(
+        alpha=settings.llm_adaptive_alpha,
+        exploration_rate=settings.llm_adaptive_exploration_rate,
+        enabled=settings.llm_adaptive_routing,
+    )
@@ -0,0 +1,314 @@
+"""Per-provider concurrency limits and request/token rate limiting.
+
+Each provider listed in settings.llm_rate_limits (keyed by connection name) may
+set:
+- concurrency: calls in flight at once in this process (asyncio.Semaphore);
+- rpm: requests per minute;
+- tpm: tokens per minute (a call is charged its estimated input tokens).
+
+rpm/tpm are token buckets refilled continuously. A call that finds no slot or
+budget queues until one frees up, up to max_wait seconds; if it would have to
+wait longer it fails fast with RateLimitError and the fallback chain moves on
+to the next provider without calling this one. Budget already taken for a
+call that then fails to get the rest (rpm granted, tpm rejected) or is
+cancelled while queued is given back. The time spent queued is
+reported separately from model latency (snapshot(), usage queue_wait_seconds).
+
+With shared=True the rpm/tpm budgets are fixed one-minute windows counted in
+Redis (INCRBY), so all replicas draw from the same provider quota. Concurrency
+is always per process.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared import get_async_cache_backend
+from threat_modeling_shared.cache import AsyncCacheBackend
+from threat_modeling_shared.logging import get_logger
+
+from app.config import get_settings
+
+logger = get_logger("llm.rate_limit")
+
+_KEY_PREFIX = "llm:ratelimit"
+
+# Length (seconds) of a shared rate-limit window
+WINDOW_SECONDS = 60
+
+# Queue-wait samples kept per provider (rolling window) for reporting
+QUEUE_WAIT_WINDOW = 500
+
+
+class RateLimitError(Exception):
+    """No slot or budget for the provider within the maximum queue wait."""
+
+    def __init__(self, provider: str, reason: str) -> None:
+        super().__init__(f"{provider} rate limited ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+class TokenBucket:
+    """Bucket of per_minute units refilled continuously (capacity = per_minute)."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self._rate = self.capacity / 60
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount (the level may go negative); return seconds until it is covered.
+
+        Amounts above the capacity are charged as the full capacity, so one
+        oversized call waits for a full bucket instead of forever.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(
+                self.capacity, self._level + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self._rate)
+
+    def refund(self, amount: float) -> None:
+        """Give back a reservation that was not used."""
+        with self._lock:
+            self._level = min(self.capacity, self._level + min(amount, self.capacity))
+
+    async def acquire(self, amount: float, deadline: float) -> bool:
+        """Wait for amount; False (nothing taken) if it would end after deadline."""
+        wait = self.reserve(amount)
+        if time.monotonic() + wait > deadline:
+            self.refund(amount)
+            return False
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund(amount)
+                raise
+        return True
+
+    async def release(self, amount: float, acquired_at: float) -> None:
+        """Give back amount granted by acquire() (the level refills continuously)."""
+        self.refund(amount)
+
+
+class SharedWindowBucket:
+    """Per-minute budget counted in a shared backend (fixed one-minute windows)."""
+
+    def __init__(self, backend: AsyncCacheBackend, key: str, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self._backend = backend
+        self._key = key
+
+    async def acquire(self, amount: float, deadline: float) -> bool:
+        """Wait for amount in the current or a later window; False past deadline."""
+        amount = int(min(amount, self.capacity))
+        while True:
+            now = time.time()
+            window = int(now // WINDOW_SECONDS)
+            key = f"{self._key}:{window}"
+            count = await self._backend.incr(
+                key, amount, ttl_seconds=2 * WINDOW_SECONDS
+            )
+            if count <= self.capacity:
+                return True
+            await self._backend.incr(key, -amount, ttl_seconds=2 * WINDOW_SECONDS)
+            wait = (window + 1) * WINDOW_SECONDS - now
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def release(self, amount: float, acquired_at: float) -> None:
+        """Give back amount granted by acquire() at acquired_at (time.time()).
+
+        Nothing to do once that window is over: its count no longer matters.
+        """
+        window = int(acquired_at // WINDOW_SECONDS)
+        if window != int(time.time() // WINDOW_SECONDS):
+            return
+        await self._backend.incr(
+            f"{self._key}:{window}",
+            -int(min(amount, self.capacity)),
+            ttl_seconds=2 * WINDOW_SECONDS,
+        )
+
+
+class ProviderRateLimiter:
+    """Concurrency slots and rpm/tpm budgets per provider, with queue-wait stats."""
+
+    def __init__(
+        self,
+        limits: dict[str, dict[str, float]] | None = None,
+        max_wait: float = 30.0,
+        backend: AsyncCacheBackend | None = None,
+    ) -> None:
+        """Initialize the limiter.
+
+        Args:
+            limits: Per provider name: concurrency, rpm and/or tpm (missing = unlimited).
+            max_wait: Longest a call may queue before failing with RateLimitError.
+            backend: Shared async backend for rpm/tpm across replicas (None = local).
+        """
+        self._limits = limits or {}
+        self._max_wait = max_wait
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._semaphores: dict[
+            str, tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]
+        ] = {}
+        self._buckets: dict[tuple[str, str], Any] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+        self._waits: dict[str, deque[float]] = {}
+
+    def _semaphore(self, provider: str, limit: int) -> asyncio.Semaphore:
+        """Semaphore of provider for the running loop (asyncio primitives are loop-bound)."""
+        loop = asyncio.get_running_loop()
+        entry = self._semaphores.get(provider)
+        if entry is None or entry[0] is not loop:
+            entry = (loop, asyncio.Semaphore(limit))
+            self._semaphores[provider] = entry
+        return entry[1]
+
+    def _bucket(self, provider: str, kind: str, per_minute: float) -> Any:
+        with self._lock:
+            bucket = self._buckets.get((provider, kind))
+            if bucket is None:
+                bucket = (
+                    SharedWindowBucket(
+                        self._backend, f"{_KEY_PREFIX}:{provider}:{kind}", per_minute
+                    )
+                    if self._backend is not None
+                    else TokenBucket(per_minute)
+                )
+                self._buckets[(provider, kind)] = bucket
+            return bucket
+
+    def _counter(self, provider: str) -> dict[str, int]:
+        return self._counters.setdefault(
+            provider, {"acquired": 0, "rejected": 0, "in_flight": 0, "waiting": 0}
+        )
+
+    def _bump(self, provider: str, name: str, delta: int = 1) -> None:
+        with self._lock:
+            self._counter(provider)[name] += delta
+
+    @asynccontextmanager
+    async def slot(self, provider: str, tokens: int = 0) -> AsyncIterator[float]:
+        """Hold a call slot for provider; yields the seconds spent queued.
+
+        Raises:
+            RateLimitError: No slot/budget within max_wait (nothing is held).
+        """
+        limits = self._limits.get(provider)
+        if not limits:
+            yield 0.0
+            return
+        start = time.monotonic()
+        deadline = start + self._max_wait
+        self._bump(provider, "waiting")
+        semaphore = None
+        # (bucket, amount, time.time()) granted so far, given back if the slot fails
+        granted: list[tuple[Any, float, float]] = []
+        try:
+            concurrency = int(limits.get("concurrency", 0))
+            if concurrency > 0:
+                semaphore = self._semaphore(provider, concurrency)
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), self._max_wait)
+                except asyncio.TimeoutError:
+                    semaphore = None
+                    raise self._reject(provider, "concurrency") from None
+            for kind, amount in (("rpm", 1), ("tpm", tokens)):
+                per_minute = limits.get(kind, 0)
+                if per_minute > 0 and amount > 0:
+                    bucket = self._bucket(provider, kind, per_minute)
+                    if not await bucket.acquire(amount, deadline):
+                        raise self._reject(provider, kind)
+                    granted.append((bucket, amount, time.time()))
+        except BaseException:
+            self._bump(provider, "waiting", -1)
+            if semaphore is not None:
+                semaphore.release()
+            for bucket, amount, acquired_at in granted:
+                await bucket.release(amount, acquired_at)
+            raise
+        waited = time.monotonic() - start
+        with self._lock:
+            counters = self._counter(provider)
+            counters["waiting"] -= 1
+            counters["acquired"] += 1
+            counters["in_flight"] += 1
+            self._waits.setdefault(provider, deque(maxlen=QUEUE_WAIT_WINDOW)).append(
+                waited
+            )
+        if waited >= 0.01:
+            logger.info("LLM %s: queued %.2fs for a rate-limit slot", provider, waited)
+        try:
+            yield waited
+        finally:
+            self._bump(provider, "in_flight", -1)
+            if semaphore is not None:
+                semaphore.release()
+
+    def _reject(self, provider: str, reason: str) -> RateLimitError:
+        self._bump(provider, "rejected")
+        logger.warning(
+            "LLM %s: no %s budget within %.1fs, skipping",
+            provider,
+            reason,
+            self._max_wait,
+        )
+        return RateLimitError(provider, reason)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Limits, counters and queue-wait statistics (seconds) per provider."""
+        with self._lock:
+            result: dict[str, dict[str, Any]] = {}
+            for provider, counters in self._counters.items():
+                waits = sorted(self._waits.get(provider, ()))
+                result[provider] = {
+                    "limits": dict(self._limits.get(provider, {})),
+                    **counters,
+                    "queue_wait": {
+                        "samples": len(waits),
+                        "mean": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                        "p95": round(waits[int(0.95 * (len(waits) - 1))], 4)
+                        if waits
+                        else 0.0,
+                        "max": round(waits[-1], 4) if waits else 0.0,
+                    },
+                }
+            return result
+
+    def reset(self) -> None:
+        """Clear counters and queue-wait samples (limits and buckets are kept)."""
+        with self._lock:
+            for counters in self._counters.values():
+                counters["acquired"] = 0
+                counters["rejected"] = 0
+            self._waits.clear()
+
+
+@lru_cache
+def get_rate_limiter() -> ProviderRateLimiter:
+    """Get the process-wide ProviderRateLimiter configured from settings."""
+    settings = get_settings()
+    return ProviderRateLimiter(
+        limits=settings.llm_rate_limits,
+        max_wait=settings.llm_rate_limit_max_wait_seconds,
+        backend=get_async_cache_backend(redis_url=settings.redis_url)
+        if settings.llm_rate_limit_shared
+        else None,
+    )
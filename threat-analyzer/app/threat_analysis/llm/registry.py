@@ -0,0 +1,76 @@
+"""Process-wide pool of LLM connections (one warmed client per provider/model).
+
+Each LLMConnection lazily builds its LangChain chat client (ChatGoogleGenerativeAI,
+ChatOpenAI, ChatOllama), which owns the HTTP connection pool. Reusing the same
+connection instance for the life of the process keeps those pools (and their
+TLS sessions) alive instead of rebuilding them on every fallback attempt.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.threat_analysis.llm.base import LLMConnection
+from app.threat_analysis.llm.gemini_connection import GeminiConnection
+from app.threat_analysis.llm.ollama_connection import OllamaConnection
+from app.threat_analysis.llm.openai_connection import OpenAIConnection
+
+logger = get_logger("llm.registry")
+
+DEFAULT_CONNECTION_ORDER: list[type[LLMConnection]] = [
+    GeminiConnection,
+    OpenAIConnection,
+    OllamaConnection,
+]
+
+
+class ConnectionRegistry:
+    """Keeps one LLMConnection per (connection class, model) for the process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._connections: dict[tuple[type[LLMConnection], str], LLMConnection] = {}
+
+    def get(self, conn_class: type[LLMConnection], settings: Any) -> LLMConnection:
+        """Return the pooled connection for conn_class, creating it on first use.
+
+        Building the connection proxy is cheap (the chat client is created lazily
+        by _ensure_llm), so it is used to resolve the model part of the key.
+        """
+        candidate = conn_class(settings)
+        key = (conn_class, candidate.model)
+        with self._lock:
+            return self._connections.setdefault(key, candidate)
+
+    def warm(self, connections: list[type[LLMConnection]], settings: Any) -> list[str]:
+        """Build the chat clients of all configured connections ahead of traffic.
+
+        Providers where is_configured() is False are skipped without building
+        their client.
+
+        Returns:
+            Names of the connections whose client is ready.
+        """
+        warmed: list[str] = []
+        for conn_class in connections:
+            conn = self.get(conn_class, settings)
+            if not conn.is_configured():
+                logger.info("LLM %s not configured, skipping warm-up", conn.name)
+                continue
+            if conn._ensure_llm() is not None:
+                warmed.append(conn.name)
+        logger.info("LLM connections warmed: %s", ", ".join(warmed) or "none")
+        return warmed
+
+    def clear(self) -> None:
+        """Drop all pooled connections (tests / settings reload)."""
+        with self._lock:
+            self._connections.clear()
+
+
+@lru_cache
+def get_connection_registry() -> ConnectionRegistry:
+    """Get the process-wide ConnectionRegistry instance."""
+    return ConnectionRegistry()
@@ -0,0 +1,192 @@
+"""Single-flight coalescing of identical in-flight LLM calls.
+
+Calls are keyed by their cache key. Within a process, concurrent identical
+calls await one shared task. Across processes (API replicas, Celery retries),
+the leader holds a Redis lease while it runs the provider chain. Other processes
+poll the cache for the leader's result while the lease exists, and run the
+chain themselves only if the lease goes away without a cached result (leader
+failed or crashed). The lease holds a token unique to its leader and is
+released with a compare-and-delete, so a leader that outlived its lease never
+removes the lease another process took over. A shared call is cancelled only
+when every local caller has been cancelled.
+
+Usage accounting: the shared task runs in the context of the caller that
+started it, so its token usage is charged to that caller's UsageTracker (and,
+once, to the process-wide UsageStats). Callers that join an in-flight call, or
+read the result another process cached, are charged nothing, like cache hits.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from typing import Any
+
+from threat_modeling_shared import get_async_cache_backend
+from threat_modeling_shared.cache import AsyncCacheBackend
+from threat_modeling_shared.logging import get_logger
+
+from app.config import get_settings
+
+logger = get_logger("llm.single_flight")
+
+_LEASE_PREFIX = "llm:inflight"
+
+# Seconds between cache polls while another process holds the lease
+POLL_INTERVAL_SECONDS = 0.5
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution."""
+
+    def __init__(
+        self,
+        backend: AsyncCacheBackend | None = None,
+        lease_seconds: float = 600.0,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        enabled: bool = True,
+    ) -> None:
+        """Initialize the coalescer.
+
+        Args:
+            backend: Shared async backend for cross-process leases (None = in-process only).
+            lease_seconds: Lease TTL; bounds how long others wait for a crashed leader.
+            poll_interval: Seconds between cache polls while another process leads.
+            enabled: When False every call runs independently.
+        """
+        self._backend = backend
+        self._lease_seconds = lease_seconds
+        self._poll_interval = poll_interval
+        self.enabled = enabled
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._callers: dict[asyncio.Task, int] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "local_waiters": 0, "remote_waiters": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[dict[str, Any]]],
+        lookup: Callable[[], Awaitable[dict[str, Any] | None]],
+    ) -> dict[str, Any]:
+        """Return compute() for key, sharing one execution among concurrent callers.
+
+        The usage of the shared execution is recorded for the first caller only
+        (see module docstring).
+
+        Args:
+            key: Cache key of the call.
+            compute: Runs the provider chain and stores a valid result in the cache.
+            lookup: Returns the validated cached result or None.
+        """
+        if not self.enabled:
+            return await compute()
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            self._count("local_waiters")
+            logger.info("Single-flight: joining in-flight call for %s", key)
+        else:
+            task = loop.create_task(self._lead(key, compute, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        self._callers[task] = self._callers.get(task, 0) + 1
+        cancelled = False
+        try:
+            # Shield so a cancelled caller does not cancel the call other callers await
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            remaining = self._leave(task)
+            if cancelled and remaining == 0 and not task.done():
+                # Nobody is waiting any more (e.g. a cancelled speculative stage)
+                logger.info("Single-flight: every caller left %s, cancelling", key)
+                task.cancel()
+
+    def _leave(self, task: asyncio.Task) -> int:
+        """Drop one caller of task; return how many are still waiting."""
+        remaining = self._callers.get(task, 1) - 1
+        if remaining > 0:
+            self._callers[task] = remaining
+        else:
+            self._callers.pop(task, None)
+        return remaining
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _lead(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[dict[str, Any]]],
+        lookup: Callable[[], Awaitable[dict[str, Any] | None]],
+    ) -> dict[str, Any]:
+        if self._backend is None:
+            self._count("leaders")
+            return await compute()
+        lease_key = f"{_LEASE_PREFIX}:{key}"
+        owner = uuid.uuid4().hex
+        while not await self._backend.set_if_absent(
+            lease_key, owner, ttl_seconds=self._lease_seconds
+        ):
+            self._count("remote_waiters")
+            logger.info("Single-flight: %s in flight elsewhere, polling cache", key)
+            cached = await self._wait_remote(lease_key, lookup)
+            if cached is not None:
+                return cached
+        try:
+            # The previous holder may have finished between our cache miss and the lease
+            cached = await lookup()
+            if cached is not None:
+                return cached
+            self._count("leaders")
+            return await compute()
+        finally:
+            # Only our own lease: it may have expired and been taken by another leader
+            await self._backend.delete_if_equal(lease_key, owner)
+
+    async def _wait_remote(
+        self,
+        lease_key: str,
+        lookup: Callable[[], Awaitable[dict[str, Any] | None]],
+    ) -> dict[str, Any] | None:
+        """Poll the cache until a result appears or the lease is released."""
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            cached = await lookup()
+            if cached is not None:
+                return cached
+            if await self._backend.get(lease_key) is None:
+                return await lookup()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Leader executions, joined local callers, remote waits and calls in flight."""
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._inflight)}
+
+    def reset(self) -> None:
+        """Clear counters."""
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+
+@lru_cache
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide SingleFlight configured from settings."""
+    settings = get_settings()
+    return SingleFlight(
+        backend=get_async_cache_backend(redis_url=settings.redis_url)
+        if settings.llm_single_flight_shared
+        else None,
+        lease_seconds=settings.llm_single_flight_lease_seconds,
+        enabled=settings.llm_single_flight_enabled,
+    )
@@ -0,0 +1,87 @@
+"""Per-provider outcome and latency statistics for the fallback chain."""
+
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Literal
+
+Outcome = Literal["win", "loss", "cancelled", "skipped"]
+
+# Latency samples kept per provider (rolling window) for percentile reporting
+LATENCY_WINDOW = 500
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    idx = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return samples[idx]
+
+
+class ProviderStats:
+    """Process-wide win/loss counters and latency samples per LLM provider.
+
+    - win: the provider returned the result used by the caller.
+    - loss: the provider failed, raised or did not pass the stage validator.
+    - cancelled: a hedged call was cancelled because another provider won first.
+    - skipped: the provider was not called (e.g. circuit breaker open).
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+        self._latencies: dict[str, deque[float]] = {}
+
+    def record(self, provider: str, outcome: Outcome, elapsed: float | None) -> None:
+        """Record one attempt outcome and (for completed attempts) its latency."""
+        with self._lock:
+            counters = self._counters.setdefault(
+                provider, {"win": 0, "loss": 0, "cancelled": 0, "skipped": 0}
+            )
+            counters[outcome] += 1
+            if elapsed is not None and outcome in ("win", "loss"):
+                samples = self._latencies.setdefault(
+                    provider, deque(maxlen=self._window)
+                )
+                samples.append(elapsed)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Return counters and latency percentiles (seconds) per provider."""
+        with self._lock:
+            result: dict[str, dict[str, Any]] = {}
+            for provider, counters in self._counters.items():
+                samples = sorted(self._latencies.get(provider, ()))
+                completed = counters["win"] + counters["loss"]
+                result[provider] = {
+                    "wins": counters["win"],
+                    "losses": counters["loss"],
+                    "cancelled": counters["cancelled"],
+                    "skipped": counters["skipped"],
+                    "win_rate": round(counters["win"] / completed, 4)
+                    if completed
+                    else 0.0,
+                    "latency": {
+                        "samples": len(samples),
+                        "mean": round(sum(samples) / len(samples), 4)
+                        if samples
+                        else 0.0,
+                        "p50": round(_percentile(samples, 50), 4),
+                        "p95": round(_percentile(samples, 95), 4),
+                        "p99": round(_percentile(samples, 99), 4),
+                    },
+                }
+            return result
+
+    def reset(self) -> None:
+        """Clear all counters and samples."""
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+
+@lru_cache
+def get_provider_stats() -> ProviderStats:
+    """Get the process-wide ProviderStats instance."""
+    return ProviderStats()
@@ -0,0 +1,90 @@
+"""Incremental JSON array parsing for streamed LLM output.
+
+JSONArrayStreamParser is fed the text chunks of a streamed response and
+returns each top-level array element as soon as its closing brace arrives, so
+consumers can start on the first threat while the model is still writing the
+rest. Each character is scanned once; only the element being read is buffered.
+The array starts at the first '[' followed (after optional whitespace) by
+'{' or ']', so brackets in leading prose ("the threats [STRIDE]: ...") and
+```json fences are skipped; text after the closing ']' is ignored.
+"""
+
+import json
+from typing import Any
+
+from threat_modeling_shared.logging import get_logger
+
+from app.threat_analysis.llm.json_extract import loads
+
+logger = get_logger("llm.streaming")
+
+_OPENERS = "{["
+_CLOSERS = "}]"
+
+
+class JSONArrayStreamParser:
+    """Push parser that yields the object elements of a streamed JSON array."""
+
+    def __init__(self) -> None:
+        self.started = False
+        self.done = False
+        self.items_parsed = 0
+        # Saw a '[' at top level, waiting for the first value to confirm the array
+        self._opened = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pieces: list[str] = []
+
+    def feed(self, chunk: str) -> list[Any]:
+        """Consume the next chunk; return the elements completed by it (in order)."""
+        items: list[Any] = []
+        if self.done or not chunk:
+            return items
+        start = 0 if self._depth else None
+        for i, c in enumerate(chunk):
+            if self._depth == 0:
+                if not self.started:
+                    if self._opened and not c.isspace():
+                        # A '[' opens the answer only when an element (or ']') follows
+                        self.started = c in "{]"
+                        self._opened = False
+                    if not self.started:
+                        self._opened = self._opened or c == "["
+                        continue
+                if c == "{":
+                    self._depth = 1
+                    start = i
+                elif c == "]":
+                    self.done = True
+                    break
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in _OPENERS:
+                self._depth += 1
+            elif c in _CLOSERS:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pieces.append(chunk[start : i + 1])
+                    start = None
+                    self._emit(items)
+        if start is not None and self._depth:
+            self._pieces.append(chunk[start:])
+        return items
+
+    def _emit(self, items: list[Any]) -> None:
+        text = "".join(self._pieces)
+        self._pieces.clear()
+        try:
+            items.append(loads(text))
+            self.items_parsed += 1
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed streamed element: %s", e)
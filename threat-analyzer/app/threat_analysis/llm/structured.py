@@ -0,0 +1,35 @@
+"""Provider-native structured output (settings.llm_structured_output).
+
+When enabled, agents pass the JSON schema of the Pydantic model they expect
+(see schemas) as response_schema, and each connection binds it with its
+provider's native parameter:
+- Gemini: response_mime_type="application/json" + response_json_schema;
+- OpenAI: response_format of type json_schema (array roots are wrapped in an
+  {"items": [...]} object, which OpenAI requires, and unwrapped again);
+- Ollama: format.
+
+The answer is then decoded directly, without scanning the text for JSON; the
+shared extractor (json_extract) only runs if that fails, e.g. when a model
+ignored the schema. Connections that do not support it answer as plain text.
+"""
+
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+
+
+@lru_cache
+def response_schema(tp: Any) -> dict[str, Any]:
+    """JSON schema (by alias) of a Pydantic model or type such as list[Model].
+
+    The returned dict is shared between calls and must not be mutated.
+    """
+    return TypeAdapter(tp).json_schema(by_alias=True)
+
+
+def response_schema_for(settings: Any, tp: Any) -> dict[str, Any] | None:
+    """response_schema(tp) when settings.llm_structured_output is on, else None."""
+    if not getattr(settings, "llm_structured_output", False):
+        return None
+    return response_schema(tp)
@@ -0,0 +1,305 @@
+"""Token and cost accounting for LLM calls.
+
+Every completed provider call records its prompt/completion tokens, taken from
+the LangChain response (usage_metadata, or the provider's token_usage in
+response_metadata). When the provider omits them they are estimated from the
+text length (~4 characters per token) and the record is flagged as estimated.
+
+Records are attributed to the stage set by the fallback runner (usage_stage)
+and added to:
+- the UsageTracker of the current analysis (track_usage, a ContextVar), which
+  ThreatModelService returns in AnalysisResponse.usage;
+- the process-wide UsageStats (running totals per stage and provider).
+
+Costs come from settings.llm_token_costs (USD per 1M tokens, per model).
+Time spent queued for a rate-limit slot (record_queue_wait) is kept apart from
+call latency as queue_wait_seconds. Answers accepted from the complete elements
+of a truncated JSON (record_partial) are counted per stage under "partial", so
+the analysis response can say its result may be missing items.
+"""
+
+import math
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any
+
+from app.config import get_settings
+
+# Rough characters-per-token ratio used when the provider reports no usage
+CHARS_PER_TOKEN = 4
+# Rough token cost of one image input for the estimator
+IMAGE_TOKENS_ESTIMATE = 258
+
+_current_stage: ContextVar[str] = ContextVar("llm_usage_stage", default="unknown")
+_current_tracker: ContextVar["UsageTracker | None"] = ContextVar(
+    "llm_usage_tracker", default=None
+)
+_current_partial: ContextVar[list[dict[str, Any]] | None] = ContextVar(
+    "llm_partial_answers", default=None
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text (~4 characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def extract_usage(response: Any) -> dict[str, int] | None:
+    """Token usage reported by a LangChain message, or None if absent."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return {
+            "input_tokens": int(usage.get("input_tokens", 0) or 0),
+            "output_tokens": int(usage.get("output_tokens", 0) or 0),
+        }
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage") or metadata.get("usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        return {
+            "input_tokens": int(token_usage.get("prompt_tokens") or 0),
+            "output_tokens": int(token_usage.get("completion_tokens") or 0),
+        }
+    # Ollama reports eval counts
+    if metadata.get("prompt_eval_count") is not None:
+        return {
+            "input_tokens": int(metadata.get("prompt_eval_count") or 0),
+            "output_tokens": int(metadata.get("eval_count") or 0),
+        }
+    return None
+
+
+def token_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Cost in USD from settings.llm_token_costs (0.0 for unknown models)."""
+    prices = get_settings().llm_token_costs.get(model)
+    if not prices:
+        return 0.0
+    return (
+        input_tokens * prices.get("input", 0.0)
+        + output_tokens * prices.get("output", 0.0)
+    ) / 1_000_000
+
+
+class _Totals:
+    """Token, cost, call and latency accumulator."""
+
+    __slots__ = (
+        "input_tokens",
+        "output_tokens",
+        "cost",
+        "calls",
+        "estimated_calls",
+        "latency",
+        "queue_wait",
+    )
+
+    def __init__(self) -> None:
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.calls = 0
+        self.estimated_calls = 0
+        self.latency = 0.0
+        self.queue_wait = 0.0
+
+    def add(self, record: dict[str, Any]) -> None:
+        self.input_tokens += record["input_tokens"]
+        self.output_tokens += record["output_tokens"]
+        self.cost += record["cost"]
+        self.calls += 1
+        self.estimated_calls += int(record["estimated"])
+        self.latency += record["latency"]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.input_tokens + self.output_tokens,
+            "cost": round(self.cost, 6),
+            "calls": self.calls,
+            "estimated_calls": self.estimated_calls,
+            "latency_seconds": round(self.latency, 4),
+            "queue_wait_seconds": round(self.queue_wait, 4),
+            # Seconds per 1k generated tokens (latency per token by stage/provider)
+            "seconds_per_1k_output_tokens": round(
+                self.latency / self.output_tokens * 1000, 4
+            )
+            if self.output_tokens
+            else 0.0,
+        }
+
+
+class UsageTracker:
+    """Usage totals of one unit of work (e.g. one analysis), by stage and provider."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._total = _Totals()
+        self._by_stage: dict[str, _Totals] = {}
+        self._by_provider: dict[str, _Totals] = {}
+        self._partial: dict[str, dict[str, Any]] = {}
+
+    def add(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._total.add(record)
+            self._by_stage.setdefault(record["stage"], _Totals()).add(record)
+            self._by_provider.setdefault(record["provider"], _Totals()).add(record)
+
+    def add_queue_wait(self, stage: str, provider: str, seconds: float) -> None:
+        with self._lock:
+            for totals in (
+                self._total,
+                self._by_stage.setdefault(stage, _Totals()),
+                self._by_provider.setdefault(provider, _Totals()),
+            ):
+                totals.queue_wait += seconds
+
+    def add_partial(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            partial = self._partial.setdefault(
+                record["stage"],
+                {"calls": 0, "elements": 0, "min_salvage_ratio": 1.0},
+            )
+            partial["calls"] += 1
+            partial["elements"] += record["elements"]
+            partial["min_salvage_ratio"] = min(
+                partial["min_salvage_ratio"], record["salvage_ratio"]
+            )
+
+    def summary(self) -> dict[str, Any]:
+        """Totals overall, per stage and per provider, and partial answers per stage."""
+        with self._lock:
+            return {
+                "total": self._total.as_dict(),
+                "by_stage": {k: v.as_dict() for k, v in self._by_stage.items()},
+                "by_provider": {k: v.as_dict() for k, v in self._by_provider.items()},
+                "partial": {k: dict(v) for k, v in self._partial.items()},
+            }
+
+
+class UsageStats(UsageTracker):
+    """Process-wide running usage totals (GET /api/v1/metrics/usage)."""
+
+    def reset(self) -> None:
+        """Clear all totals."""
+        with self._lock:
+            self._total = _Totals()
+            self._by_stage.clear()
+            self._by_provider.clear()
+            self._partial.clear()
+
+
+@lru_cache
+def get_usage_stats() -> UsageStats:
+    """Get the process-wide UsageStats instance."""
+    return UsageStats()
+
+
+@contextmanager
+def usage_stage(stage: str) -> Iterator[None]:
+    """Attribute LLM calls made inside the block to stage."""
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+@contextmanager
+def track_usage(tracker: UsageTracker | None = None) -> Iterator[UsageTracker]:
+    """Collect the usage of LLM calls made inside the block (including child tasks).
+
+    Pass the same tracker to several blocks to accumulate them (e.g. around
+    each step of an async generator).
+    """
+    tracker = tracker or UsageTracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+def record_usage(
+    provider: str,
+    model: str,
+    usage: dict[str, int] | None,
+    prompt_text: str,
+    completion_text: str,
+    latency: float,
+    images: int = 0,
+    stage: str | None = None,
+) -> dict[str, Any]:
+    """Record one completed call; estimate tokens when usage is None.
+
+    stage defaults to the one set by usage_stage (streamed calls pass it
+    explicitly, since a ContextVar cannot be held across async generator steps).
+
+    Returns:
+        The usage record (stage, provider, model, tokens, cost, estimated, latency).
+    """
+    estimated = usage is None
+    if usage is None:
+        usage = {
+            "input_tokens": estimate_tokens(prompt_text)
+            + images * IMAGE_TOKENS_ESTIMATE,
+            "output_tokens": estimate_tokens(completion_text),
+        }
+    record = {
+        "stage": stage or _current_stage.get(),
+        "provider": provider,
+        "model": model,
+        "input_tokens": usage["input_tokens"],
+        "output_tokens": usage["output_tokens"],
+        "cost": token_cost(model, usage["input_tokens"], usage["output_tokens"]),
+        "estimated": estimated,
+        "latency": latency,
+    }
+    get_usage_stats().add(record)
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.add(record)
+    return record
+
+
+def record_queue_wait(provider: str, seconds: float, stage: str | None = None) -> None:
+    """Record time a call spent queued for a rate-limit slot (not call latency)."""
+    if seconds <= 0:
+        return
+    stage = stage or _current_stage.get()
+    get_usage_stats().add_queue_wait(stage, provider, seconds)
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.add_queue_wait(stage, provider, seconds)
+
+
+def record_partial(
+    provider: str, salvage_ratio: float, elements: int, stage: str | None = None
+) -> None:
+    """Record an answer accepted from the complete elements of a truncated JSON."""
+    record = {
+        "stage": stage or _current_stage.get(),
+        "provider": provider,
+        "salvage_ratio": salvage_ratio,
+        "elements": elements,
+    }
+    get_usage_stats().add_partial(record)
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.add_partial(record)
+    watched = _current_partial.get()
+    if watched is not None:
+        watched.append(record)
+
+
+@contextmanager
+def watch_partial() -> Iterator[list[dict[str, Any]]]:
+    """Collect the partial answers recorded inside the block (including child tasks)."""
+    watched: list[dict[str, Any]] = []
+    token = _current_partial.set(watched)
+    try:
+        yield watched
+    finally:
+        _current_partial.reset(token)
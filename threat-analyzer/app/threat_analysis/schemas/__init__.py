@@ -2,33 +2,51 @@
 
 This package defines:
 - base: BaseSchema and Pydantic config shared by all schemas.
-- component: Diagram structure (Component, Connection, TrustBoundary, DiagramData).
+- component: Diagram structure (Component, Connection, TrustBoundary, DiagramData;
+  LocatedComponent and TileDiagramData for tiled extraction).
+- guardrail: ArchitectureDiagramVerdict (and the combined ArchitectureDiagramAnalysis).
 - request: AnalysisRequest and get_analysis_request for the /analyze endpoint.
-- response: AnalysisResponse and RiskLevel for the API response.
-- threat: STRIDE categories, DreadScore, and Threat for threat modelling output.
+- response: AnalysisResponse, RiskLevel and LLM usage (TokenUsage, UsageSummary).
+- threat: STRIDE categories, DreadScore, StrideThreat and Threat for threat modelling output.
 """
 
 from .base import BaseSchema
-from .component import Component, Connection, DiagramData, TrustBoundary
+from .component import (
+    Component,
+    Connection,
+    DiagramData,
+    LocatedComponent,
+    TileDiagramData,
+    TrustBoundary,
+)
+from .guardrail import ArchitectureDiagramAnalysis, ArchitectureDiagramVerdict
 from .request import AnalysisRequest, get_analysis_request
-from .response import AnalysisResponse, RiskLevel
+from .response import AnalysisResponse, RiskLevel, TokenUsage, UsageSummary
 from .threat import (
     DreadScore,
     StrideCategory,
+    StrideThreat,
     Threat,
 )
 
 __all__ = [
     "AnalysisRequest",
     "AnalysisResponse",
+    "ArchitectureDiagramAnalysis",
+    "ArchitectureDiagramVerdict",
     "BaseSchema",
     "Component",
     "Connection",
     "DiagramData",
     "DreadScore",
+    "LocatedComponent",
     "RiskLevel",
     "StrideCategory",
+    "StrideThreat",
     "Threat",
+    "TileDiagramData",
+    "TokenUsage",
     "TrustBoundary",
+    "UsageSummary",
     "get_analysis_request",
 ]
@@ -131,3 +131,25 @@ class DiagramData(BaseSchema):
         default_factory=list,
         description="Names of trust boundaries detected in the diagram.",
     )
+
+
+class LocatedComponent(Component):
+    """Component with its position in the analysed image (tiled extraction).
+
+    Used to merge the components seen in overlapping tiles of a large diagram;
+    the box is dropped once the tiles are merged.
+    """
+
+    box: list[int] | None = Field(
+        default=None,
+        description="Bounding box [x1, y1, x2, y2] in pixels of the analysed image.",
+    )
+
+
+class TileDiagramData(DiagramData):
+    """Diagram structure extracted from one tile, with component positions."""
+
+    components: list[LocatedComponent] = Field(
+        default_factory=list,
+        description="Components visible in the tile, with their bounding boxes.",
+    )
@@ -0,0 +1,38 @@
+"""Guardrail schemas: the verdict on whether an image is an architecture diagram.
+
+ArchitectureDiagramVerdict is returned by the guardrail LLM call before the
+pipeline runs (see guardrails.architecture_diagram_validator);
+ArchitectureDiagramAnalysis is the combined guardrail + diagram extraction
+answer of a single vision call (settings.guardrail_combined). Both are also
+response schemas when structured output is enabled.
+"""
+
+from pydantic import Field
+
+from .base import BaseSchema
+from .component import DiagramData
+
+
+class ArchitectureDiagramVerdict(BaseSchema):
+    """Classification of an uploaded image as architecture diagram or not.
+
+    Sequence diagrams, flowcharts, photos and other images are rejected with a
+    short reason that is reported back to the client.
+    """
+
+    is_architecture_diagram: bool = Field(
+        ...,
+        description="Whether the image is a system architecture diagram.",
+    )
+    reason: str = Field(
+        ...,
+        description="One-sentence explanation of the verdict.",
+    )
+
+
+class ArchitectureDiagramAnalysis(ArchitectureDiagramVerdict, DiagramData):
+    """Verdict and extracted diagram structure from one vision call.
+
+    When the image is not an architecture diagram the structure is left empty
+    and only the verdict matters.
+    """
@@ -16,8 +16,8 @@ class AnalysisRequest(BaseSchema):
     """Request payload for POST /analyze (diagram threat analysis).
 
     The client sends an image of an architecture diagram (PNG, JPEG, WebP, or GIF).
-    Optional fields confidence and iou are reserved for future use (e.g. when
-    adding object-detection or diagram-element detection with configurable thresholds).
+    Optional fields confidence and iou are the thresholds of the local component
+    detection (settings.detection_enabled); when omitted the settings defaults apply.
     """
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -37,8 +37,8 @@ class AnalysisRequest(BaseSchema):
         Field(
             default=None,
             description=(
-                "Optional confidence threshold (0.1–0.9) for detection. Reserved for "
-                "future use (e.g. minimum confidence for diagram element detection)."
+                "Optional confidence threshold (0.1–0.9) for detection: minimum "
+                "confidence of the diagram components detected locally (YOLO)."
             ),
             examples=[0.5],
         ),
@@ -48,8 +48,8 @@ class AnalysisRequest(BaseSchema):
         Field(
             default=None,
             description=(
-                "Optional Intersection over Union (IoU) threshold (0.1–0.9). Reserved for "
-                "future use (e.g. overlap threshold for bounding boxes in detection)."
+                "Optional Intersection over Union (IoU) threshold (0.1–0.9): overlap "
+                "above which detected boxes are merged by NMS."
             ),
             examples=[0.5],
         ),
@@ -65,11 +65,11 @@ def get_analysis_request(
     ),
     confidence: float | None = Form(
         None,
-        description="Optional confidence threshold (0.1–0.9). Reserved for future use.",
+        description="Optional detection confidence threshold (0.1–0.9).",
     ),
     iou: float | None = Form(
         None,
-        description="Optional IoU threshold (0.1–0.9). Reserved for future use.",
+        description="Optional detection IoU threshold (0.1–0.9).",
     ),
 ) -> AnalysisRequest:
     """Build AnalysisRequest from multipart file and form fields (FastAPI dependency)."""
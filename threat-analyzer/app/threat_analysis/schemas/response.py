@@ -40,6 +40,66 @@ class RiskLevel(str, Enum):
         return cls.CRITICAL
 
 
+class TokenUsage(BaseSchema):
+    """Token, cost and latency totals of a group of LLM calls.
+
+    Token counts come from the provider when reported; otherwise they are
+    estimated from text length (estimated_calls counts those calls).
+    """
+
+    input_tokens: int = Field(default=0, description="Prompt tokens.")
+    output_tokens: int = Field(default=0, description="Completion tokens.")
+    total_tokens: int = Field(default=0, description="Prompt + completion tokens.")
+    cost: float = Field(
+        default=0.0,
+        description="Cost in USD from LLM_TOKEN_COSTS (0 for models without a price).",
+    )
+    calls: int = Field(default=0, description="Completed LLM calls.")
+    estimated_calls: int = Field(
+        default=0, description="Calls whose token counts were estimated."
+    )
+    latency_seconds: float = Field(
+        default=0.0, description="Sum of call latencies in seconds."
+    )
+    queue_wait_seconds: float = Field(
+        default=0.0,
+        description="Time spent queued for provider rate limits (not in latency).",
+    )
+    seconds_per_1k_output_tokens: float = Field(
+        default=0.0, description="Latency per 1k completion tokens."
+    )
+
+
+class PartialAnswers(BaseSchema):
+    """Answers of one stage accepted from the complete elements of truncated JSON."""
+
+    calls: int = Field(default=0, description="Truncated answers accepted.")
+    elements: int = Field(
+        default=0, description="Complete elements salvaged from those answers."
+    )
+    min_salvage_ratio: float = Field(
+        default=1.0,
+        description="Smallest salvaged fraction of a truncated answer's text.",
+    )
+
+
+class UsageSummary(BaseSchema):
+    """LLM usage of one analysis: overall, per stage and per provider."""
+
+    total: TokenUsage = Field(default_factory=TokenUsage)
+    by_stage: dict[str, TokenUsage] = Field(
+        default_factory=dict,
+        description="Usage per pipeline stage (guardrail, diagram, stride, dread).",
+    )
+    by_provider: dict[str, TokenUsage] = Field(
+        default_factory=dict, description="Usage per LLM provider."
+    )
+    partial: dict[str, PartialAnswers] = Field(
+        default_factory=dict,
+        description="Stages answered from truncated JSON (LLM_JSON_ACCEPT_PARTIAL).",
+    )
+
+
 class AnalysisResponse(BaseSchema):
     """Full response from POST /analyze: diagram structure, threats, and risk.
 
@@ -79,6 +139,14 @@ class AnalysisResponse(BaseSchema):
         default=None,
         description="Total analysis processing time in seconds, if measured.",
     )
+    usage: UsageSummary | None = Field(
+        default=None,
+        description="LLM token usage and cost of this analysis (cache hits and joined in-flight calls cost nothing).",
+    )
+    partial: bool = Field(
+        default=False,
+        description="True when a stage used a truncated LLM answer and may miss items (see usage.partial).",
+    )
 
     @computed_field
     @property
@@ -76,12 +76,11 @@ class DreadScore(BaseSchema):
         ) / 5
 
 
-class Threat(BaseSchema):
-    """A single identified threat: STRIDE type, description, mitigation, and DREAD.
+class StrideThreat(BaseSchema):
+    """A threat as identified by the STRIDE stage, before DREAD scoring.
 
-    Links to a component via component_id. threat_type is a STRIDE category;
-    dread_score is the average DREAD (or from dread_details), and dread_details
-    holds the full per-dimension scores when available.
+    This is what the model is asked to return for each threat; it is also the
+    response schema of the STRIDE stage when structured output is enabled.
     """
 
     component_id: str = Field(
@@ -100,6 +99,16 @@ class Threat(BaseSchema):
         ...,
         description="Recommended mitigation or control to reduce the threat.",
     )
+
+
+class Threat(StrideThreat):
+    """A single identified threat: STRIDE type, description, mitigation, and DREAD.
+
+    Links to a component via component_id. threat_type is a STRIDE category;
+    dread_score is the average DREAD (or from dread_details), and dread_details
+    holds the full per-dimension scores when available.
+    """
+
     dread_score: float | None = Field(
         default=None,
         ge=0,
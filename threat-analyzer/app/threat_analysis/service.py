@@ -1,6 +1,8 @@
 """Threat Analysis service orchestrating the analysis pipeline."""
 
+import asyncio
 import time
+from collections.abc import AsyncIterator
 from functools import lru_cache
 from typing import Any
 
@@ -9,8 +11,23 @@ from threat_modeling_shared.logging import get_logger
 from app.config import Settings, get_settings
 
 from .agents import DiagramAgent, DreadAgent, StrideAgent
-from .guardrails import validate_architecture_diagram
-from .schemas import AnalysisResponse, Component, Connection, RiskLevel, Threat
+from .agents.diagram.agent import VERDICT_KEYS
+from .detection import detect_components
+from .guardrails import (
+    check_architecture_verdict,
+    prefilter_architecture_diagram,
+    validate_architecture_diagram,
+)
+from .llm import PreparedImage, prepare_image
+from .llm.usage import UsageTracker, track_usage
+from .schemas import (
+    AnalysisResponse,
+    Component,
+    Connection,
+    RiskLevel,
+    Threat,
+    UsageSummary,
+)
 
 logger = get_logger("service")
 
@@ -50,16 +67,34 @@ class ThreatModelService:
             self._dread_agent = DreadAgent(self._settings)
         return self._dread_agent
 
-    async def run_full_analysis(self, image_bytes: bytes) -> AnalysisResponse:
-        """Run the complete threat analysis pipeline: guardrail, then Diagram → STRIDE → DREAD."""
-        await validate_architecture_diagram(image_bytes, self._settings)
+    async def run_full_analysis(
+        self,
+        image_bytes: bytes,
+        confidence: float | None = None,
+        iou: float | None = None,
+    ) -> AnalysisResponse:
+        """Run the complete threat analysis pipeline: guardrail, then Diagram → STRIDE → DREAD.
 
+        confidence and iou are the detection thresholds (settings.detection_enabled).
+        """
+        with track_usage() as usage:
+            return await self._run_pipeline(image_bytes, usage, confidence, iou)
+
+    async def _run_pipeline(
+        self,
+        image_bytes: bytes,
+        usage: UsageTracker,
+        confidence: float | None = None,
+        iou: float | None = None,
+    ) -> AnalysisResponse:
+        """Pipeline body of run_full_analysis (LLM usage collected into usage)."""
         start_time = time.time()
 
-        # Stage 1: Diagram Analysis
+        # Guardrail, then Stage 1: Diagram Analysis (overlapped when speculative)
         stage1_start = time.time()
-        logger.info("Stage 1: Diagram Analysis started")
-        diagram_data = await self.diagram_agent.analyze(image_bytes)
+        diagram_data = await self._validate_and_analyze_diagram(
+            image_bytes, confidence, iou
+        )
         stage1_elapsed = round(time.time() - stage1_start, 2)
         logger.info(
             "Stage 1: Diagram Analysis complete in %.2fs (%d components, %d connections)",
@@ -86,11 +121,191 @@ class ThreatModelService:
         stage3_elapsed = round(time.time() - stage3_start, 2)
         logger.info("Stage 3: DREAD Scoring complete in %.2fs", stage3_elapsed)
 
-        # Calculate overall risk
+        return self._build_response(diagram_data, scored_threats, start_time, usage)
+
+    async def stream_full_analysis(
+        self,
+        image_bytes: bytes,
+        confidence: float | None = None,
+        iou: float | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Run the pipeline, yielding events as soon as each piece is available.
+
+        confidence and iou are the detection thresholds, as in run_full_analysis.
+
+        Yields:
+            ("diagram", diagram_data) after stage 1, ("threat", threat) for each
+            STRIDE threat as the model streams it, then ("result", AnalysisResponse)
+            once DREAD scoring is done.
+
+        Raises:
+            ArchitectureDiagramValidationError: From the guardrail, before any event.
+        """
+        # Usage is tracked per step: a ContextVar cannot stay set across yields
+        usage = UsageTracker()
+        start_time = time.time()
+        with track_usage(usage):
+            diagram_data = await self._validate_and_analyze_diagram(
+                image_bytes, confidence, iou
+            )
+        yield "diagram", diagram_data
+
+        logger.info("Stage 2: STRIDE Analysis started (stream)")
+        threats: list[dict[str, Any]] = []
+        stride_stream = self.stride_agent.astream(diagram_data)
+        while True:
+            with track_usage(usage):
+                try:
+                    threat = await anext(stride_stream)
+                except StopAsyncIteration:
+                    break
+            threats.append(threat)
+            yield "threat", threat
+
+        logger.info("Stage 3: DREAD Scoring started (stream)")
+        with track_usage(usage):
+            scored_threats = await self.dread_agent.analyze(threats)
+        yield (
+            "result",
+            self._build_response(diagram_data, scored_threats, start_time, usage),
+        )
+
+    async def _prepare_image(self, image_bytes: bytes) -> PreparedImage:
+        """Normalize the upload once for every vision call of the request."""
+        if not self._settings.llm_image_normalize:
+            return PreparedImage.from_bytes(image_bytes)
+        return await asyncio.to_thread(
+            prepare_image,
+            image_bytes,
+            self._settings.llm_image_max_side,
+            self._settings.llm_image_format,
+            self._settings.llm_image_quality,
+        )
+
+    async def _detect(
+        self, image: PreparedImage, confidence: float | None, iou: float | None
+    ) -> list[dict[str, Any]]:
+        """Local component detections used as hints ([] when detection is off)."""
+        if not self._settings.detection_enabled:
+            return []
+        return await detect_components(image, self._settings, confidence, iou)
+
+    async def _analyze_diagram(
+        self,
+        image: PreparedImage,
+        image_digest: str,
+        detection: asyncio.Task[list[dict[str, Any]]],
+        source: bytes | None = None,
+        combined: bool = False,
+    ) -> dict[str, Any]:
+        """Diagram stage (or the combined call) once the detection hints are ready.
+
+        source is the original upload, used by the tiled extraction of large
+        diagrams (settings.diagram_tiling_enabled; not in combined mode).
+        """
+        detections = await detection
+        if combined:
+            return await self.diagram_agent.analyze_with_guardrail(
+                image, image_digest=image_digest, detections=detections
+            )
+        return await self.diagram_agent.analyze(
+            image, image_digest=image_digest, detections=detections, source=source
+        )
+
+    async def _validate_and_analyze_diagram(
+        self,
+        image_bytes: bytes,
+        confidence: float | None = None,
+        iou: float | None = None,
+    ) -> dict[str, Any]:
+        """Run the guardrail and the diagram stage; return the diagram data.
+
+        The local pre-filter runs first, so images it rejects (decompression
+        bombs, and with settings.guardrail_prefilter_enabled blank images,
+        photos and noise) never reach an LLM. The upload is then prepared
+        once (see llm.image): guardrail, diagram stage and every fallback
+        attempt share its base64 payload and digest. With
+        settings.detection_enabled the local detector (confidence / iou
+        thresholds) runs alongside the guardrail and its detections are
+        handed to the diagram stage as hints.
+
+        With settings.guardrail_combined guardrail and diagram stage come from
+        a single vision call (DiagramAgent.analyze_with_guardrail). Otherwise, with
+        settings.guardrail_speculative the diagram stage starts alongside the
+        guardrail instead of after it, and is cancelled if the guardrail
+        rejects the image (or fails), so a valid diagram saves one vision
+        round-trip.
+
+        Raises:
+            ArchitectureDiagramValidationError: From the pre-filter or the guardrail.
+        """
+        await prefilter_architecture_diagram(image_bytes, self._settings)
+        image = await self._prepare_image(image_bytes)
+        image_digest = image.digest
+        detection = asyncio.create_task(self._detect(image, confidence, iou))
+        try:
+            return await self._run_guardrail_and_diagram(
+                image, image_digest, detection, image_bytes
+            )
+        finally:
+            if not detection.done():
+                detection.cancel()
+                await asyncio.gather(detection, return_exceptions=True)
+
+    async def _run_guardrail_and_diagram(
+        self,
+        image: PreparedImage,
+        image_digest: str,
+        detection: asyncio.Task[list[dict[str, Any]]],
+        source: bytes,
+    ) -> dict[str, Any]:
+        """Guardrail + diagram stage in the mode chosen by the settings."""
+        if self._settings.guardrail_combined:
+            logger.info("Stage 1: Diagram Analysis started (combined with guardrail)")
+            result = await self._analyze_diagram(
+                image, image_digest, detection, combined=True
+            )
+            if "is_architecture_diagram" in result:
+                check_architecture_verdict(result)
+            return {k: v for k, v in result.items() if k not in VERDICT_KEYS}
+        if not self._settings.guardrail_speculative:
+            await validate_architecture_diagram(
+                image, self._settings, image_digest=image_digest
+            )
+            logger.info("Stage 1: Diagram Analysis started")
+            return await self._analyze_diagram(image, image_digest, detection, source)
+        logger.info("Stage 1: Diagram Analysis started (speculative, with guardrail)")
+        diagram_task = asyncio.create_task(
+            self._analyze_diagram(image, image_digest, detection, source)
+        )
+        try:
+            await validate_architecture_diagram(
+                image, self._settings, image_digest=image_digest
+            )
+        except BaseException:
+            diagram_task.cancel()
+            logger.info("Stage 1: speculative Diagram Analysis cancelled")
+            await asyncio.gather(diagram_task, return_exceptions=True)
+            raise
+        return await diagram_task
+
+    def _build_response(
+        self,
+        diagram_data: dict[str, Any],
+        scored_threats: list[dict[str, Any]],
+        start_time: float,
+        usage: UsageTracker,
+    ) -> AnalysisResponse:
+        """Compute the overall risk and assemble the AnalysisResponse."""
         risk_score = self._calculate_risk_score(scored_threats)
         risk_level = RiskLevel.from_score(risk_score)
 
         processing_time = round(time.time() - start_time, 2)
+        summary = usage.summary()
+        if summary["partial"]:
+            logger.warning(
+                "Analysis used truncated LLM answers: %s", ", ".join(summary["partial"])
+            )
         logger.info(
             "Analysis complete: %d components, %d threats, risk=%s (%.2f) in %.2fs",
             len(diagram_data.get("components", [])),
@@ -101,13 +316,15 @@ class ThreatModelService:
         )
 
         return AnalysisResponse(
-            model_used=diagram_data.get("model", "Unknown"),
+            model_used=diagram_data.get("model") or "Unknown",
             components=self._parse_components(diagram_data.get("components", [])),
             connections=self._parse_connections(diagram_data.get("connections", [])),
             threats=self._parse_threats(scored_threats),
             risk_score=round(risk_score, 2),
             risk_level=risk_level,
             processing_time=processing_time,
+            usage=UsageSummary.model_validate(summary),
+            partial=bool(summary["partial"]),
         )
 
     def _calculate_risk_score(self, threats: list[dict[str, Any]]) -> float:
@@ -0,0 +1,101 @@
+"""Unit tests for app.routers.metrics."""
+
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.main import app
+from app.threat_analysis.detection import DetectionBatcher
+from app.threat_analysis.llm import get_provider_router, get_provider_stats
+
+
+class TestMetricsRouter:
+    def test_llm_provider_stats(self):
+        stats = get_provider_stats()
+        stats.reset()
+        stats.record("Gemini", "win", 0.25)
+        r = TestClient(app).get("/api/v1/metrics/llm")
+        assert r.status_code == 200
+        assert r.json()["providers"]["Gemini"]["wins"] == 1
+        stats.reset()
+
+    def test_llm_provider_ranking(self):
+        provider_router = get_provider_router()
+        provider_router.reset()
+        provider_router.record("stride", "OpenAI", True, 1.5)
+        r = TestClient(app).get("/api/v1/metrics/llm/ranking")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["stages"]["stride"][0]["provider"] == "OpenAI"
+        assert "enabled" in body
+        provider_router.reset()
+
+    def test_llm_circuit_breakers(self):
+        r = TestClient(app).get("/api/v1/metrics/llm/circuit-breakers")
+        assert r.status_code == 200
+        assert "breakers" in r.json()
+
+    def test_llm_negative_cache(self):
+        r = TestClient(app).get("/api/v1/metrics/llm/negative-cache")
+        assert r.status_code == 200
+        assert {"enabled", "providers"} <= r.json().keys()
+
+    def test_llm_cache_stats(self):
+        r = TestClient(app).get("/api/v1/metrics/cache")
+        assert r.status_code == 200
+        body = r.json()
+        assert "tiers" in body
+        assert body["memory"]["max_json_bytes"] > 0
+
+    def test_llm_single_flight(self):
+        r = TestClient(app).get("/api/v1/metrics/llm/single-flight")
+        assert r.status_code == 200
+        assert {"leaders", "local_waiters", "remote_waiters"} <= r.json().keys()
+
+    def test_llm_usage(self):
+        r = TestClient(app).get("/api/v1/metrics/usage")
+        assert r.status_code == 200
+        assert {"total", "by_stage", "by_provider"} <= r.json().keys()
+
+    def test_llm_rate_limits(self):
+        r = TestClient(app).get("/api/v1/metrics/llm/rate-limits")
+        assert r.status_code == 200
+        assert "providers" in r.json()
+
+    def test_llm_json_repair(self):
+        r = TestClient(app).get("/api/v1/metrics/llm/json-repair")
+        assert r.status_code == 200
+        assert {"truncated", "accepted", "mean_salvage_ratio"} <= r.json().keys()
+
+    def test_detection_disabled(self):
+        r = TestClient(app).get("/api/v1/metrics/detection")
+        assert r.status_code == 200
+        assert r.json() == {"enabled": False}
+
+    def test_detection_not_loaded_does_not_load(self):
+        settings = get_settings().model_copy(update={"detection_enabled": True})
+        with (
+            patch("app.routers.metrics.get_settings", return_value=settings),
+            patch("app.routers.metrics.detection_batcher_loaded", return_value=False),
+            patch("app.routers.metrics.get_detection_batcher") as get_batcher,
+        ):
+            r = TestClient(app).get("/api/v1/metrics/detection")
+        assert r.json() == {"enabled": True, "loaded": False}
+        get_batcher.assert_not_called()
+
+    def test_detection_batching(self):
+        batcher = DetectionBatcher(detector=None, max_batch_size=4)
+        settings = get_settings().model_copy(update={"detection_enabled": True})
+        with (
+            patch("app.routers.metrics.get_settings", return_value=settings),
+            patch("app.routers.metrics.detection_batcher_loaded", return_value=True),
+            patch("app.routers.metrics.get_detection_batcher", return_value=batcher),
+        ):
+            r = TestClient(app).get("/api/v1/metrics/detection")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["enabled"] is True
+        assert body["loaded"] is True
+        assert body["max_batch_size"] == 4
+        assert {"batch_size", "queue_depth", "queue_wait", "inference"} <= body.keys()
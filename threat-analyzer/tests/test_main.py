@@ -29,12 +29,14 @@ class TestLifespan:
         with (
             patch("app.main.setup_logging") as setup_logging,
             patch("app.main.logger") as logger,
-            patch("app.main.RAGService") as RAGService,
+            patch("app.main.get_rag_service") as get_rag_service,
+            patch("app.main.get_connection_registry") as get_registry,
         ):
             asyncio.run(_consume_lifespan(app))
             setup_logging.assert_called_once()
             logger.info.assert_called()
-            RAGService.assert_called_once()
+            get_rag_service.return_value.get_retriever.assert_called_once()
+            get_registry.return_value.warm.assert_called_once()
             assert logger.info.call_count >= 2
 
 
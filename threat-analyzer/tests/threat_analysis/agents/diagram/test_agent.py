@@ -1,12 +1,23 @@
 """Unit tests for app.threat_analysis.agents.diagram.agent."""
 
 import asyncio
+import io
 from unittest.mock import AsyncMock, patch
 
+from PIL import Image
+
 from app.config import get_settings
 from app.threat_analysis.agents.diagram.agent import (
+    COMBINED_PROMPT,
+    DIAGRAM_PROMPT,
+    LOCATED_PROMPT,
+    SKETCH_PROMPT,
+    TILE_PROMPT,
     DiagramAgent,
+    _validate_combined_result,
     _validate_diagram_result,
+    _validate_sketch_result,
+    with_detection_hints,
 )
 
 
@@ -66,3 +77,274 @@ def test_validate_diagram_result_valid():
         )
         is True
     )
+
+
+def test_validate_combined_result_requires_verdict():
+    assert _validate_combined_result({"components": []}) is False
+    assert (
+        _validate_combined_result({"is_architecture_diagram": False, "components": []})
+        is True
+    )
+
+
+def test_analyze_with_guardrail_uses_combined_prompt_and_stage():
+    combined = {
+        "is_architecture_diagram": True,
+        "reason": "servers and a database",
+        "model": "Gemini",
+        "components": [{"id": "c1", "type": "Server", "name": "Web"}],
+        "connections": [],
+        "boundaries": [],
+    }
+    mock_run = AsyncMock(return_value=combined)
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback", mock_run
+    ):
+        agent = DiagramAgent(get_settings())
+        result = asyncio.run(
+            agent.analyze_with_guardrail(b"fake image", image_digest="blake2b:x")
+        )
+    assert result == combined
+    kwargs = mock_run.call_args.kwargs
+    assert kwargs["prompt"] == COMBINED_PROMPT
+    assert kwargs["cache_key_prefix"] == "guardrail_diagram"
+    assert kwargs["image_digest"] == "blake2b:x"
+
+
+def test_analyze_with_guardrail_error_returns_fallback_without_verdict():
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+        new_callable=AsyncMock,
+        return_value={"error": "All LLM providers failed"},
+    ):
+        result = asyncio.run(
+            DiagramAgent(get_settings()).analyze_with_guardrail(b"fake image")
+        )
+    assert result["model"] == "Fallback/Error"
+    assert "is_architecture_diagram" not in result
+
+
+def test_with_detection_hints_appends_detections():
+    detections = [{"label": "database", "confidence": 0.91, "box": [1, 2, 30, 40]}]
+    prompt = with_detection_hints(DIAGRAM_PROMPT, detections)
+    assert prompt.startswith(DIAGRAM_PROMPT)
+    assert '{"label":"database","confidence":0.91,"box":[1,2,30,40]}' in prompt
+    assert with_detection_hints(DIAGRAM_PROMPT, []) == DIAGRAM_PROMPT
+
+
+def test_analyze_sends_detection_hints_in_prompt():
+    mock_run = AsyncMock(return_value={"model": "Gemini", "components": []})
+    detections = [{"label": "server", "confidence": 0.8, "box": [0, 0, 10, 10]}]
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback", mock_run
+    ):
+        asyncio.run(
+            DiagramAgent(get_settings()).analyze(b"fake image", detections=detections)
+        )
+    assert mock_run.call_args.kwargs["prompt"] == with_detection_hints(
+        DIAGRAM_PROMPT, detections
+    )
+
+
+def _large_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4000, 3000), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_analyze_small_upload_is_not_tiled():
+    settings = get_settings().model_copy(update={"diagram_tiling_enabled": True})
+    mock_run = AsyncMock(return_value={"model": "Gemini", "components": []})
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback", mock_run
+    ):
+        asyncio.run(DiagramAgent(settings).analyze(b"fake image", source=b"fake image"))
+    mock_run.assert_awaited_once()
+    assert mock_run.call_args.kwargs["prompt"] == DIAGRAM_PROMPT
+
+
+def test_analyze_large_upload_merges_overview_and_tiles_under_cap():
+    settings = get_settings().model_copy(
+        update={
+            "diagram_tiling_enabled": True,
+            "diagram_tiling_max_concurrency": 2,
+            "diagram_tile_size": 2048,
+        }
+    )
+    running, peak = 0, 0
+
+    async def fake_run(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if kwargs["prompt"] == LOCATED_PROMPT:
+            return {
+                "model": "Gemini",
+                "components": [{"id": "c1", "type": "API", "name": "API"}],
+                "connections": [],
+            }
+        return {
+            "model": "Gemini",
+            "components": [{"id": "t1", "type": "Cache", "name": "Tiny Redis label"}],
+            "connections": [],
+        }
+
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+        side_effect=fake_run,
+    ) as mock_run:
+        result = asyncio.run(
+            DiagramAgent(settings).analyze(b"overview", source=_large_png())
+        )
+    prompts = [call.kwargs["prompt"] for call in mock_run.call_args_list]
+    assert prompts.count(LOCATED_PROMPT) == 1
+    assert prompts.count(TILE_PROMPT) == 6
+    assert {call.kwargs["cache_key_prefix"] for call in mock_run.call_args_list} == {
+        "diagram_tile"
+    }
+    assert peak == 2
+    assert [c["name"] for c in result["components"]] == ["API", "Tiny Redis label"]
+
+
+def test_analyze_tiled_all_calls_failing_returns_fallback():
+    settings = get_settings().model_copy(update={"diagram_tiling_enabled": True})
+    with patch(
+        "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+        new_callable=AsyncMock,
+        return_value={"error": "All LLM providers failed"},
+    ):
+        result = asyncio.run(
+            DiagramAgent(settings).analyze(b"overview", source=_large_png())
+        )
+    assert result["model"] == "Fallback/Error"
+
+
+SKETCH = 'Image: 800x400 px\nL1 [0, 0, 10, 10] "Web"'
+VISION = {
+    "model": "Gemini",
+    "components": [{"id": "c1", "type": "Server", "name": "Web"}],
+}
+
+
+def _ocr_settings(**update):
+    return get_settings().model_copy(
+        update={
+            "diagram_ocr_enabled": True,
+            "diagram_ocr_min_confidence": 0.8,
+            "fast_model": "gemini-flash",
+            **update,
+        }
+    )
+
+
+def test_validate_sketch_result_requires_components():
+    assert _validate_sketch_result({"components": []}) is False
+    assert _validate_sketch_result(VISION) is True
+
+
+def test_analyze_confident_ocr_uses_text_model_only():
+    sketch_result = {
+        "model": "Gemini",
+        "components": [{"id": "L1", "type": "Server", "name": "Web"}],
+    }
+    mock_text = AsyncMock(return_value=sketch_result)
+    mock_vision = AsyncMock(return_value=VISION)
+    with (
+        patch(
+            "app.threat_analysis.agents.diagram.agent.sketch.sketch_diagram",
+            return_value=(SKETCH, 0.92),
+        ),
+        patch(
+            "app.threat_analysis.agents.diagram.agent.run_text_with_fallback",
+            mock_text,
+        ),
+        patch(
+            "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+            mock_vision,
+        ),
+    ):
+        result = asyncio.run(DiagramAgent(_ocr_settings()).analyze(b"fake image"))
+    assert result == sketch_result
+    mock_vision.assert_not_awaited()
+    kwargs = mock_text.call_args.kwargs
+    assert kwargs["cache_key_prefix"] == "diagram_sketch"
+    assert kwargs["settings"].primary_model == "gemini-flash"
+    assert kwargs["messages"][0]["content"] == (
+        SKETCH_PROMPT.format(sketch=SKETCH) + DIAGRAM_PROMPT
+    )
+
+
+def test_analyze_low_ocr_confidence_uses_vision():
+    mock_text = AsyncMock()
+    with (
+        patch(
+            "app.threat_analysis.agents.diagram.agent.sketch.sketch_diagram",
+            return_value=(SKETCH, 0.5),
+        ),
+        patch(
+            "app.threat_analysis.agents.diagram.agent.run_text_with_fallback",
+            mock_text,
+        ),
+        patch(
+            "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+            new_callable=AsyncMock,
+            return_value=VISION,
+        ),
+    ):
+        result = asyncio.run(DiagramAgent(_ocr_settings()).analyze(b"fake image"))
+    assert result == VISION
+    mock_text.assert_not_awaited()
+
+
+def test_analyze_ocr_or_text_model_failure_uses_vision():
+    for sketch_kwargs, text_result in (
+        ({"side_effect": RuntimeError("tesseract not found")}, None),
+        ({"return_value": (SKETCH, 0.95)}, {"error": "All LLM providers failed"}),
+    ):
+        with (
+            patch(
+                "app.threat_analysis.agents.diagram.agent.sketch.sketch_diagram",
+                **sketch_kwargs,
+            ),
+            patch(
+                "app.threat_analysis.agents.diagram.agent.run_text_with_fallback",
+                new_callable=AsyncMock,
+                return_value=text_result,
+            ),
+            patch(
+                "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+                new_callable=AsyncMock,
+                return_value=VISION,
+            ) as mock_vision,
+        ):
+            result = asyncio.run(DiagramAgent(_ocr_settings()).analyze(b"fake image"))
+        assert result == VISION
+        mock_vision.assert_awaited_once()
+
+
+def test_analyze_tiled_crop_failure_runs_ocr_only_once():
+    settings = _ocr_settings(diagram_tiling_enabled=True)
+    with (
+        patch(
+            "app.threat_analysis.agents.diagram.agent.sketch.sketch_diagram",
+            return_value=(SKETCH, 0.5),
+        ) as mock_sketch,
+        patch(
+            "app.threat_analysis.agents.diagram.agent.crop_regions",
+            side_effect=OSError("truncated image"),
+        ),
+        patch(
+            "app.threat_analysis.agents.diagram.agent.run_vision_with_fallback",
+            new_callable=AsyncMock,
+            return_value=VISION,
+        ) as mock_vision,
+    ):
+        result = asyncio.run(
+            DiagramAgent(settings).analyze(b"overview", source=_large_png())
+        )
+    assert result == VISION
+    mock_sketch.assert_called_once()
+    mock_vision.assert_awaited_once()
+    assert mock_vision.call_args.kwargs["prompt"] == DIAGRAM_PROMPT
@@ -0,0 +1,160 @@
+"""Unit tests for app.threat_analysis.agents.diagram.sketch."""
+
+import io
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.threat_analysis.agents.diagram import sketch
+from app.threat_analysis.agents.diagram.sketch import (
+    detect_segments,
+    enclose_labels,
+    format_sketch,
+    group_words,
+    link_labels,
+    sketch_diagram,
+)
+
+
+def _word(text, box, confidence=90.0):
+    return {"text": text, "box": box, "confidence": confidence}
+
+
+def _diagram():
+    """Web -> DB (straight arrow), Web -> Queue (elbow arrow) and labels."""
+    image = Image.new("L", (800, 400), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((50, 150, 250, 250), outline=0, width=3)
+    draw.rectangle((550, 150, 750, 250), outline=0, width=3)
+    draw.rectangle((300, 320, 500, 390), outline=0, width=3)
+    draw.line((252, 200, 548, 200), fill=0, width=3)
+    draw.polygon([(548, 200), (530, 190), (530, 210)], fill=0)
+    draw.line((150, 252, 150, 355), fill=0, width=2)
+    draw.line((150, 355, 298, 355), fill=0, width=2)
+    draw.polygon([(298, 355), (285, 347), (285, 363)], fill=0)
+    labels = [
+        {"id": "L1", "text": "Web", "box": (120, 190, 180, 210)},
+        {"id": "L2", "text": "DB", "box": (620, 190, 680, 210)},
+        {"id": "L3", "text": "Queue", "box": (370, 345, 430, 365)},
+    ]
+    return image, labels
+
+
+class TestGroupWords:
+    def test_joins_words_of_a_label_and_drops_noise(self):
+        labels = group_words(
+            [
+                _word("API", (100, 100, 130, 115)),
+                _word("Gateway", (135, 100, 200, 115), 80.0),
+                _word("Orders", (500, 100, 560, 115)),
+                _word("Service", (500, 118, 570, 133)),
+                _word("~", (300, 300, 310, 310), 10.0),
+            ]
+        )
+        assert [(label["id"], label["text"]) for label in labels] == [
+            ("L1", "API Gateway"),
+            ("L2", "Orders Service"),
+        ]
+        assert labels[0]["box"] == (100, 100, 200, 115)
+        assert labels[0]["confidence"] == 0.85
+
+    def test_distant_words_are_separate_labels(self):
+        labels = group_words(
+            [_word("Web", (0, 0, 30, 15)), _word("DB", (300, 0, 320, 15))]
+        )
+        assert [label["text"] for label in labels] == ["Web", "DB"]
+
+
+class TestLines:
+    def test_detects_lines_and_box_shapes(self):
+        image, labels = _diagram()
+        dark = np.asarray(image) < 128
+        segments = detect_segments(dark, 20, labels)
+        assert (252, 200, 548, 200, 3) in segments
+        enclose_labels(labels, segments)
+        assert labels[0]["shape"] == (51, 151, 249, 249)
+
+    def test_links_straight_and_elbow_arrows(self):
+        image, labels = _diagram()
+        dark = np.asarray(image) < 128
+        segments = detect_segments(dark, 20, labels)
+        enclose_labels(labels, segments)
+        links = link_labels(dark, segments, labels, 40)
+        assert {"from": "L1", "to": "L2", "arrow": "->"} in links
+        assert {"from": "L1", "to": "L3", "arrow": "->"} in links
+        assert len(links) == 2
+
+    def test_arrowhead_at_line_start_reverses_direction(self):
+        image, labels = _diagram()
+        draw = ImageDraw.Draw(image)
+        # Cover the head at DB and draw one at Web
+        draw.polygon([(548, 200), (530, 190), (530, 210)], fill=255)
+        draw.line((252, 200, 548, 200), fill=0, width=3)
+        draw.polygon([(252, 200), (270, 190), (270, 210)], fill=0)
+        dark = np.asarray(image) < 128
+        segments = detect_segments(dark, 20, labels)
+        enclose_labels(labels, segments)
+        links = link_labels(dark, segments, labels, 40)
+        assert {"from": "L2", "to": "L1", "arrow": "->"} in links
+
+    def test_format_sketch(self):
+        text = format_sketch(
+            (800, 400),
+            [{"id": "L1", "text": "Web", "box": (1, 2, 3, 4)}],
+            [{"from": "L1", "to": "L2", "arrow": "--"}],
+        )
+        assert "Image: 800x400 px" in text
+        assert 'L1 [1, 2, 3, 4] "Web"' in text
+        assert text.endswith("L1 -- L2")
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _tesseract(words):
+    """pytesseract stand-in whose image_to_data returns words (text, conf, box)."""
+    module = MagicMock()
+    module.image_to_data.return_value = {
+        "text": [w[0] for w in words],
+        "conf": [w[1] for w in words],
+        "left": [w[2][0] for w in words],
+        "top": [w[2][1] for w in words],
+        "width": [w[2][2] - w[2][0] for w in words],
+        "height": [w[2][3] - w[2][1] for w in words],
+    }
+    return module
+
+
+class TestSketchDiagram:
+    def test_sketch_and_confidence(self):
+        image, _ = _diagram()
+        words = [
+            ("", "-1", (0, 0, 800, 400)),
+            ("Web", "96", (120, 190, 180, 210)),
+            ("DB", "90", (620, 190, 680, 210)),
+            ("Queue", "84", (370, 345, 430, 365)),
+        ]
+        with patch.object(sketch, "pytesseract", _tesseract(words)):
+            text, confidence = sketch_diagram(_png(image))
+        assert confidence == 0.9
+        assert 'L1 [120, 190, 180, 210] "Web"' in text
+        assert "L1 -> L2" in text
+        assert "L1 -> L3" in text
+
+    def test_too_few_labels_has_zero_confidence(self):
+        image, _ = _diagram()
+        with patch.object(
+            sketch, "pytesseract", _tesseract([("Web", "96", (120, 190, 180, 210))])
+        ):
+            _text, confidence = sketch_diagram(_png(image))
+        assert confidence == 0.0
+
+    def test_missing_pytesseract_raises(self):
+        with patch.object(sketch, "pytesseract", None):
+            with pytest.raises(RuntimeError):
+                sketch_diagram(b"image")
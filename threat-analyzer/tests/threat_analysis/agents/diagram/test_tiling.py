@@ -0,0 +1,192 @@
+"""Unit tests for app.threat_analysis.agents.diagram.tiling."""
+
+import io
+
+from PIL import Image
+
+from app.threat_analysis.agents.diagram.tiling import (
+    crop_regions,
+    merge_tile_results,
+    name_similarity,
+    plan_grid,
+    plan_regions,
+    tile_detections,
+)
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TestPlanRegions:
+    def test_grid_covers_image_with_overlap(self):
+        tiles = plan_grid((4000, 3000), 1536, 0.15, 12)
+        assert len(tiles) == 9
+        assert {t[0] for t in tiles} == {0, 1232, 2464}
+        assert {t[1] for t in tiles} == {0, 732, 1464}
+        assert max(t[2] for t in tiles) == 4000
+        assert max(t[3] for t in tiles) == 3000
+        # Horizontal neighbours share at least 15% of a tile
+        assert 1536 - 1232 >= int(1536 * 0.15)
+
+    def test_grid_tiles_enlarged_to_respect_max_tiles(self):
+        tiles = plan_grid((8000, 6000), 1536, 0.15, 6)
+        assert len(tiles) <= 6
+        assert tiles[0][2] - tiles[0][0] > 1536
+
+    def test_small_image_is_one_tile(self):
+        assert plan_grid((1000, 800), 1536, 0.15, 12) == [(0, 0, 1000, 800)]
+
+    def test_detections_grouped_into_padded_clusters(self):
+        detections = [
+            {"label": "a", "box": [10, 10, 50, 50]},
+            {"label": "b", "box": [60, 20, 100, 60]},
+            {"label": "c", "box": [900, 700, 950, 750]},
+        ]
+        regions = plan_regions((4000, 3000), 1000, 0.2, 12, detections, 4.0)
+        assert regions == [(0, 0, 500, 340), (3500, 2700, 3900, 3000)]
+
+    def test_without_detections_uses_grid(self):
+        assert plan_regions((4000, 3000), 1536, 0.15, 12) == plan_grid(
+            (4000, 3000), 1536, 0.15, 12
+        )
+
+
+class TestCropRegions:
+    def test_crops_at_native_resolution_below_max_side(self):
+        tiles = crop_regions(
+            _png(4000, 3000), [(0, 0, 1536, 1536), (2000, 1000, 4000, 3000)], 1536
+        )
+        (first, first_scale), (second, second_scale) = tiles
+        assert first.size == (1536, 1536) and first_scale == 1.0
+        assert first.mime_type == "image/jpeg"
+        assert second.size == (1536, 1536)
+        assert round(second_scale, 3) == round(2000 / 1536, 3)
+
+
+class TestTileDetections:
+    def test_keeps_centred_detections_in_tile_pixels(self):
+        detections = [
+            {"label": "in", "box": [110, 110, 130, 130]},
+            {"label": "out", "box": [0, 0, 10, 10]},
+        ]
+        result = tile_detections(detections, (400, 400, 800, 800), 4.0, 2.0)
+        assert result == [{"label": "in", "box": [20, 20, 60, 60]}]
+
+
+class TestNameSimilarity:
+    def test_ignores_case_and_punctuation(self):
+        assert name_similarity("API-Gateway", "api gateway") == 1.0
+
+    def test_different_numbers_are_different_components(self):
+        assert name_similarity("Web Server 1", "Web Server 2") == 0.0
+
+
+class TestMergeTileResults:
+    def test_merges_overview_and_tiles(self):
+        overview = {
+            "model": "Gemini",
+            "components": [
+                {
+                    "id": "c1",
+                    "type": "Gateway",
+                    "name": "API Gateway",
+                    "box": [0, 0, 50, 25],
+                },
+                {
+                    "id": "c2",
+                    "type": "Database",
+                    "name": "Orders DB",
+                    "box": [400, 300, 450, 350],
+                },
+            ],
+            "connections": [{"from": "c1", "to": "c2", "protocol": None}],
+            "boundaries": ["VPC"],
+        }
+        tile = {
+            "model": "Gemini",
+            "components": [
+                # Same gateway, seen at full resolution (tile at offset 0, scale 1)
+                {
+                    "id": "c1",
+                    "type": "Gateway",
+                    "name": "API Gateway (Kong)",
+                    "box": [0, 0, 200, 100],
+                    "description": "Kong",
+                },
+                # Different component that reuses the id "c2"
+                {
+                    "id": "c2",
+                    "type": "Cache",
+                    "name": "Session cache",
+                    "box": [300, 0, 400, 100],
+                },
+            ],
+            "connections": [
+                {"from": "c1", "to": "c2", "protocol": "TCP"},
+            ],
+            "boundaries": ["vpc", "Public subnet"],
+        }
+        merged = merge_tile_results(
+            [((0, 0, 2000, 1500), 4.0, overview), ((0, 0, 1000, 1000), 1.0, tile)]
+        )
+        assert merged["model"] == "Gemini"
+        assert [(c["id"], c["name"]) for c in merged["components"]] == [
+            ("c1", "API Gateway"),
+            ("c2", "Orders DB"),
+            ("c2_t1", "Session cache"),
+        ]
+        assert merged["components"][0]["description"] == "Kong"
+        assert all("box" not in c for c in merged["components"])
+        assert merged["connections"] == [
+            {"from": "c1", "to": "c2", "protocol": None},
+            {"from": "c1", "to": "c2_t1", "protocol": "TCP"},
+        ]
+        assert merged["boundaries"] == ["VPC", "Public subnet"]
+
+    def test_same_name_far_apart_stays_separate(self):
+        overview = {
+            "components": [{"id": "a", "name": "Worker", "box": [0, 0, 10, 10]}]
+        }
+        tile = {
+            "components": [{"id": "b", "name": "Worker", "box": [500, 500, 600, 600]}]
+        }
+        merged = merge_tile_results(
+            [((0, 0, 1000, 1000), 1.0, overview), ((0, 0, 1000, 1000), 1.0, tile)]
+        )
+        assert [c["id"] for c in merged["components"]] == ["a", "b"]
+
+    def test_without_boxes_merges_by_name_and_keeps_one_answer_distinct(self):
+        first = {
+            "components": [
+                {"id": "x", "name": "Load Balancer"},
+                {"id": "y", "name": "Load balancer"},
+            ]
+        }
+        second = {
+            "components": [{"id": "lb", "name": "load-balancer"}],
+            "connections": [{"from": "lb", "to": "lb"}],
+        }
+        merged = merge_tile_results(
+            [((0, 0, 10, 10), 1.0, first), ((0, 0, 10, 10), 1.0, second)]
+        )
+        assert [c["id"] for c in merged["components"]] == ["x", "y"]
+        assert merged["connections"] == []
+
+    def test_model_falls_back_to_unknown_without_model_names(self):
+        tile = {"components": [{"id": "a", "name": "API"}]}
+        merged = merge_tile_results(
+            [((0, 0, 10, 10), 1.0, tile), ((0, 0, 10, 10), 1.0, {"model": None})]
+        )
+        assert merged["model"] == "Unknown"
+
+    def test_model_taken_from_first_result_that_has_one(self):
+        merged = merge_tile_results(
+            [
+                ((0, 0, 10, 10), 1.0, {"components": []}),
+                ((0, 0, 10, 10), 1.0, {"model": "gemini-x", "components": []}),
+            ]
+        )
+        assert merged["model"] == "gemini-x"
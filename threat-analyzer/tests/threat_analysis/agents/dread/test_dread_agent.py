@@ -1,15 +1,58 @@
 """Unit tests for app.threat_analysis.agents.dread.agent."""
 
 import asyncio
+import json
 from unittest.mock import AsyncMock, patch
 
 from app.config import get_settings
-from app.threat_analysis.agents.dread.agent import DreadAgent, _validate_dread_result
+from app.threat_analysis.agents.dread.agent import (
+    DESCRIPTION_MAX_CHARS,
+    DreadAgent,
+    _parse_scores,
+    _validate_dread_result,
+)
+
+
+def _threats(n: int) -> list[dict]:
+    return [
+        {
+            "component_id": f"c{i}",
+            "threat_type": "Spoofing",
+            "description": "d",
+            "mitigation": "m",
+        }
+        for i in range(n)
+    ]
 
 
 def test_validate_dread_result():
-    assert _validate_dread_result([1, 2]) is True
-    assert _validate_dread_result("not list") is False
+    assert _validate_dread_result({"T1": [5, 5, 5, 5, 5]}) is True
+    assert _validate_dread_result({"T1": "high"}) is False
+    assert _validate_dread_result({"error": "x"}) is False
+    assert _validate_dread_result([1, 2]) is False
+
+
+def test_parse_scores_accepts_list_or_dict_and_clamps():
+    assert _parse_scores([0, 11, 5.4, "7", 3]) == {
+        "damage": 1,
+        "reproducibility": 10,
+        "exploitability": 5,
+        "affected_users": 7,
+        "discoverability": 3,
+    }
+    named = dict.fromkeys(
+        (
+            "damage",
+            "reproducibility",
+            "exploitability",
+            "affected_users",
+            "discoverability",
+        ),
+        4,
+    )
+    assert _parse_scores(named) == named
+    assert _parse_scores([1, 2]) is None
+    assert _parse_scores([1, 2, "x", 4, 5]) is None
 
 
 def test_analyze_empty_threats_returns_empty():
@@ -19,47 +62,81 @@ def test_analyze_empty_threats_returns_empty():
     assert result == []
 
 
-def test_analyze_success_returns_scored_threats():
-    threats = [
-        {
-            "component_id": "c1",
-            "threat_type": "Spoofing",
-            "description": "d",
-            "mitigation": "m",
-        }
-    ]
-    scored = [
-        {
-            "component_id": "c1",
-            "threat_type": "Spoofing",
-            "description": "d",
-            "mitigation": "m",
-            "dread_score": 5.0,
-        }
-    ]
+def test_analyze_success_merges_scores_by_id():
+    threats = _threats(1)
     with (
         patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
         patch(
             "app.threat_analysis.agents.dread.agent.run_text_with_fallback",
             new_callable=AsyncMock,
-            return_value=scored,
+            return_value={"T1": [6, 5, 4, 5, 5]},
         ),
     ):
         agent = DreadAgent(get_settings())
         result = asyncio.run(agent.analyze(threats))
-    assert result == scored
+    assert result[0]["component_id"] == "c0"
+    assert result[0]["mitigation"] == "m"
     assert result[0]["dread_score"] == 5.0
+    assert result[0]["dread_details"]["damage"] == 6
+    # The input threats are not mutated
+    assert "dread_score" not in threats[0]
+
+
+def test_analyze_sends_compact_records_and_no_mitigation():
+    long_description = "x" * (DESCRIPTION_MAX_CHARS * 2)
+    threats = [{**_threats(1)[0], "description": long_description}]
+    mock_run = AsyncMock(return_value={"T1": [5, 5, 5, 5, 5]})
+    with (
+        patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
+        patch(
+            "app.threat_analysis.agents.dread.agent.run_text_with_fallback", mock_run
+        ),
+    ):
+        asyncio.run(DreadAgent(get_settings()).analyze(threats))
+    user_content = mock_run.call_args.kwargs["messages"][1]["content"]
+    record = json.loads(
+        next(line for line in user_content.splitlines() if line.startswith("{"))
+    )
+    assert record["id"] == "T1"
+    assert record["component"] == "c0"
+    assert len(record["description"]) == DESCRIPTION_MAX_CHARS
+    assert "mitigation" not in user_content
+
+
+def test_analyze_scores_chunks_concurrently_and_keeps_order():
+    settings = get_settings().model_copy(
+        update={"dread_chunk_size": 2, "dread_max_parallel_chunks": 3}
+    )
+    active = []
+    peak = []
+
+    async def fake_run(**kwargs):
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.pop()
+        content = kwargs["messages"][1]["content"]
+        ids = [
+            json.loads(line)["id"] for line in content.splitlines() if line[:1] == "{"
+        ]
+        return {threat_id: [3, 3, 3, 3, 3] for threat_id in ids}
+
+    with (
+        patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
+        patch(
+            "app.threat_analysis.agents.dread.agent.run_text_with_fallback",
+            side_effect=fake_run,
+        ) as mock_run,
+    ):
+        result = asyncio.run(DreadAgent(settings).analyze(_threats(5)))
+    assert mock_run.call_count == 3
+    assert max(peak) == 3
+    assert [t["component_id"] for t in result] == [f"c{i}" for i in range(5)]
+    assert all(t["dread_score"] == 3.0 for t in result)
 
 
 def test_analyze_error_returns_original_threats():
-    threats = [
-        {
-            "component_id": "c1",
-            "threat_type": "Spoofing",
-            "description": "d",
-            "mitigation": "m",
-        }
-    ]
+    threats = _threats(1)
     with (
         patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
         patch(
@@ -73,32 +150,56 @@ def test_analyze_error_returns_original_threats():
     assert result == threats
 
 
+def test_analyze_missing_id_leaves_threat_unscored():
+    with (
+        patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
+        patch(
+            "app.threat_analysis.agents.dread.agent.run_text_with_fallback",
+            new_callable=AsyncMock,
+            return_value={"T2": [10, 10, 10, 10, 10]},
+        ),
+    ):
+        result = asyncio.run(DreadAgent(get_settings()).analyze(_threats(2)))
+    assert "dread_score" not in result[0]
+    assert result[1]["dread_score"] == 10.0
+
+
 def test_analyze_clamps_dread_score():
-    threats = [
-        {
-            "component_id": "c1",
-            "threat_type": "S",
-            "description": "d",
-            "mitigation": "m",
-        }
-    ]
-    scored = [
-        {
-            "component_id": "c1",
-            "threat_type": "S",
-            "description": "d",
-            "mitigation": "m",
-            "dread_score": 99,
-        }
-    ]
     with (
         patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
         patch(
             "app.threat_analysis.agents.dread.agent.run_text_with_fallback",
             new_callable=AsyncMock,
-            return_value=scored,
+            return_value={"T1": [99, 99, 99, 99, 99]},
         ),
     ):
         agent = DreadAgent(get_settings())
-        result = asyncio.run(agent.analyze(threats))
+        result = asyncio.run(agent.analyze(_threats(1)))
     assert result[0]["dread_score"] == 10
+
+
+def test_structured_output_sends_schema_listing_chunk_ids():
+    settings = get_settings().model_copy(update={"llm_structured_output": True})
+    mock_run = AsyncMock(return_value={"T1": [5, 5, 5, 5, 5]})
+    with (
+        patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
+        patch(
+            "app.threat_analysis.agents.dread.agent.run_text_with_fallback", mock_run
+        ),
+    ):
+        asyncio.run(DreadAgent(settings).analyze(_threats(2)))
+    schema = mock_run.call_args.kwargs["response_schema"]
+    assert schema["required"] == ["T1", "T2"]
+    assert schema["properties"]["T1"]["minItems"] == 5
+
+
+def test_structured_output_off_by_default():
+    mock_run = AsyncMock(return_value={"T1": [5, 5, 5, 5, 5]})
+    with (
+        patch("app.threat_analysis.agents.dread.agent.LLMCacheService"),
+        patch(
+            "app.threat_analysis.agents.dread.agent.run_text_with_fallback", mock_run
+        ),
+    ):
+        asyncio.run(DreadAgent(get_settings()).analyze(_threats(1)))
+    assert mock_run.call_args.kwargs["response_schema"] is None
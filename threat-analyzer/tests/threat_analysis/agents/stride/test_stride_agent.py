@@ -41,7 +41,7 @@ def test_analyze_success_returns_threats():
     ]
     with (
         patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
-        patch("app.threat_analysis.agents.stride.agent.RAGService") as mock_rag,
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
         patch(
             "app.threat_analysis.agents.stride.agent.run_text_with_fallback",
             new_callable=AsyncMock,
@@ -58,7 +58,7 @@ def test_analyze_error_returns_empty_list():
     diagram_data = {"components": [], "connections": [], "boundaries": []}
     with (
         patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
-        patch("app.threat_analysis.agents.stride.agent.RAGService") as mock_rag,
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
         patch(
             "app.threat_analysis.agents.stride.agent.run_text_with_fallback",
             new_callable=AsyncMock,
@@ -79,7 +79,7 @@ def test_analyze_with_retriever_uses_rag_context():
     ]
     with (
         patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
-        patch("app.threat_analysis.agents.stride.agent.RAGService") as mock_rag,
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
         patch(
             "app.threat_analysis.agents.stride.agent.run_text_with_fallback",
             new_callable=AsyncMock,
@@ -95,7 +95,7 @@ def test_analyze_with_retriever_uses_rag_context():
 def test_format_components():
     with (
         patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
-        patch("app.threat_analysis.agents.stride.agent.RAGService") as mock_rag,
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
     ):
         mock_rag.return_value.get_retriever.return_value = None
         agent = StrideAgent(get_settings())
@@ -107,10 +107,34 @@ def test_format_components():
 def test_format_connections():
     with (
         patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
-        patch("app.threat_analysis.agents.stride.agent.RAGService") as mock_rag,
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
     ):
         mock_rag.return_value.get_retriever.return_value = None
         agent = StrideAgent(get_settings())
     out = agent._format_connections([{"from": "a", "to": "b", "protocol": "HTTPS"}])
     assert "a" in out and "b" in out
     assert agent._format_connections([]) == "None identified"
+
+
+def test_astream_yields_threats_from_stream():
+    threats = [{"component_id": "c1"}, {"component_id": "c2"}]
+
+    async def fake_stream(**kwargs):
+        assert kwargs["cache_key_prefix"] == "stride"
+        for threat in threats + ["not a threat"]:
+            yield threat
+
+    async def collect(agent):
+        return [t async for t in agent.astream({"components": [], "connections": []})]
+
+    with (
+        patch("app.threat_analysis.agents.stride.agent.LLMCacheService"),
+        patch("app.threat_analysis.agents.stride.agent.get_rag_service") as mock_rag,
+        patch(
+            "app.threat_analysis.agents.stride.agent.stream_text_with_fallback",
+            side_effect=fake_stream,
+        ),
+    ):
+        mock_rag.return_value.get_retriever.return_value = None
+        agent = StrideAgent(get_settings())
+        assert asyncio.run(collect(agent)) == threats
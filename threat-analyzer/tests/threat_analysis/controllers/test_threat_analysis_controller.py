@@ -39,9 +39,12 @@ class TestThreatAnalysisController:
         service = MagicMock(spec=ThreatModelService)
         service.run_full_analysis = AsyncMock(return_value=mock_response)
         controller = ThreatAnalysisController(service, settings)
-        result = asyncio.run(controller.analyze(sample_png))
+        result = asyncio.run(controller.analyze(sample_png, confidence=0.4, iou=0.6))
         assert result.model_used == "test"
         assert result.risk_level is not None
+        service.run_full_analysis.assert_awaited_once_with(
+            sample_png, confidence=0.4, iou=0.6
+        )
 
     def test_analyze_empty_raises(self):
         import asyncio
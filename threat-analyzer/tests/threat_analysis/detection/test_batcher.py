@@ -0,0 +1,256 @@
+"""Unit tests for app.threat_analysis.detection.batcher."""
+
+import asyncio
+import io
+import threading
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+from app.config import get_settings
+from app.threat_analysis.detection.batcher import (
+    DetectionBatcher,
+    detect_components,
+    detection_batcher_loaded,
+    get_detection_batcher,
+    load_detection_batcher,
+)
+from app.threat_analysis.detection.detector import (
+    ComponentDetector,
+    UltralyticsComponentDetector,
+)
+from app.threat_analysis.llm import PreparedImage
+
+
+def _png(width: int = 200, height: int = 100) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class _RecordingDetector(ComponentDetector):
+    """Returns one detection per image labelled with its width; records batches."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self._fail = fail
+
+    def detect_batch(self, images, params):
+        self.batches.append([image.size for image in images])
+        if self._fail:
+            raise RuntimeError("boom")
+        return [
+            [{"label": str(image.width), "confidence": conf, "box": [0, 0, 1, 1]}]
+            for image, (conf, _iou) in zip(images, params, strict=True)
+        ]
+
+
+def _gather(batcher, images):
+    async def run():
+        return await asyncio.gather(
+            *(batcher.detect(image, (0.5, 0.7)) for image in images),
+            return_exceptions=True,
+        )
+
+    return asyncio.run(run())
+
+
+class TestDetectionBatcher:
+    def test_concurrent_requests_share_one_batch(self):
+        detector = _RecordingDetector()
+        batcher = DetectionBatcher(detector, max_batch_size=8, max_wait=0.2)
+        images = [_png(100 + i, 50) for i in range(4)]
+        results = _gather(batcher, images)
+        assert detector.batches == [[(100, 50), (101, 50), (102, 50), (103, 50)]]
+        assert [r[0]["label"] for r in results] == ["100", "101", "102", "103"]
+        snapshot = batcher.snapshot()
+        assert snapshot["batches"] == 1
+        assert snapshot["images"] == 4
+        assert snapshot["batch_size"] == {"samples": 1, "mean": 4.0, "max": 4}
+        assert snapshot["max_queue_depth"] >= 1
+        assert snapshot["queue_depth"] == 0
+
+    def test_batches_capped_at_max_size(self):
+        detector = _RecordingDetector()
+        batcher = DetectionBatcher(detector, max_batch_size=2, max_wait=0.2)
+        _gather(batcher, [_png() for _ in range(5)])
+        assert sorted(len(batch) for batch in detector.batches) == [1, 2, 2]
+
+    def test_sync_submit_from_several_threads(self):
+        detector = _RecordingDetector()
+        batcher = DetectionBatcher(detector, max_batch_size=3, max_wait=0.2)
+        futures = []
+        threads = [
+            threading.Thread(
+                target=lambda: futures.append(batcher.submit(_png(), (0.5, 0.7)))
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(future.result(timeout=5) for future in futures)
+        assert detector.batches == [[(200, 100)] * 3]
+
+    def test_undecodable_image_fails_alone(self):
+        detector = _RecordingDetector()
+        batcher = DetectionBatcher(detector, max_batch_size=4, max_wait=0.2)
+        good, bad = _gather(batcher, [_png(), b"not an image"])
+        assert good[0]["label"] == "200"
+        assert isinstance(bad, Exception)
+        assert detector.batches == [[(200, 100)]]
+
+    def test_detector_failure_fails_the_batch(self):
+        batcher = DetectionBatcher(_RecordingDetector(fail=True), max_wait=0.05)
+        results = _gather(batcher, [_png(), _png()])
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert batcher.snapshot()["failed"] == 1
+
+    def test_wrong_result_count_fails_the_batch_and_keeps_collecting(self):
+        class _ShortDetector(_RecordingDetector):
+            def detect_batch(self, images, params):
+                return super().detect_batch(images, params)[:-1]
+
+        detector = _ShortDetector()
+        batcher = DetectionBatcher(detector, max_batch_size=2, max_wait=0.2)
+        results = _gather(batcher, [_png(), _png()])
+        assert any(isinstance(r, ValueError) for r in results)
+        assert batcher.snapshot()["failed"] == 1
+        # The collector survived: a single image (1 result of 1) still completes
+        detector.detect_batch = _RecordingDetector().detect_batch
+        assert _gather(batcher, [_png(150, 50)])[0][0]["label"] == "150"
+
+
+class _NonReentrantYolo:
+    """YOLO stand-in that fails if predict is entered by two threads at once."""
+
+    names = {0: "server"}
+
+    def __init__(self):
+        self._busy = threading.Lock()
+        self.calls = 0
+
+    def predict(self, source, **_kwargs):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("predict entered concurrently")
+        try:
+            time.sleep(0.05)
+            self.calls += 1
+            return [_Prediction() for _ in source]
+        finally:
+            self._busy.release()
+
+
+class _Prediction:
+    class boxes:  # noqa: N801 - mirrors the ultralytics Results attribute
+        class xyxy:  # noqa: N801
+            @staticmethod
+            def tolist():
+                return [[0.0, 0.0, 1.0, 1.0]]
+
+        class conf:  # noqa: N801
+            @staticmethod
+            def tolist():
+                return [0.9]
+
+        class cls:  # noqa: N801
+            @staticmethod
+            def tolist():
+                return [0.0]
+
+
+def test_ultralytics_batches_of_two_workers_do_not_overlap():
+    model = _NonReentrantYolo()
+    batcher = DetectionBatcher(
+        UltralyticsComponentDetector(model, 416),
+        max_batch_size=1,
+        max_wait=0.0,
+        workers=2,
+    )
+    results = _gather(batcher, [_png(), _png()])
+    assert model.calls == 2
+    assert all(
+        r == [{"label": "server", "confidence": 0.9, "box": [0, 0, 1, 1]}]
+        for r in results
+    )
+
+
+def test_load_detection_batcher_loads_once_off_the_event_loop():
+    threads = []
+
+    def load():
+        threads.append(threading.current_thread())
+        return _RecordingDetector()
+
+    get_detection_batcher.cache_clear()
+    try:
+        with patch(
+            "app.threat_analysis.detection.batcher.get_component_detector",
+            side_effect=load,
+        ):
+            assert not detection_batcher_loaded()
+
+            async def run():
+                return await asyncio.gather(
+                    load_detection_batcher(), load_detection_batcher()
+                )
+
+            first, second = asyncio.run(run())
+        assert first is second
+        assert detection_batcher_loaded()
+        assert len(threads) == 1
+        assert threads[0] is not threading.main_thread()
+    finally:
+        get_detection_batcher.cache_clear()
+
+
+class TestDetectComponents:
+    def _batcher(self, detections):
+        class _Static(ComponentDetector):
+            def __init__(self):
+                self.params = []
+
+            def detect_batch(self, images, params):
+                self.params.extend(params)
+                return [list(detections) for _ in images]
+
+        detector = _Static()
+        return detector, DetectionBatcher(detector, max_wait=0.0)
+
+    def test_uses_request_thresholds_and_caps_hints(self):
+        detector, batcher = self._batcher(
+            [
+                {"label": "a", "confidence": 0.3, "box": [0, 0, 1, 1]},
+                {"label": "b", "confidence": 0.9, "box": [0, 0, 1, 1]},
+                {"label": "c", "confidence": 0.6, "box": [0, 0, 1, 1]},
+            ]
+        )
+        settings = get_settings().model_copy(update={"detection_max_hints": 2})
+        with patch(
+            "app.threat_analysis.detection.batcher.load_detection_batcher",
+            return_value=batcher,
+        ):
+            result = asyncio.run(
+                detect_components(
+                    PreparedImage.from_bytes(_png()), settings, confidence=0.4
+                )
+            )
+        assert [d["label"] for d in result] == ["b", "c"]
+        assert detector.params == [(0.4, settings.detection_iou)]
+
+    def test_no_detector_returns_empty(self):
+        with patch(
+            "app.threat_analysis.detection.batcher.load_detection_batcher",
+            return_value=None,
+        ):
+            assert asyncio.run(detect_components(_png(), get_settings())) == []
+
+    def test_failure_returns_empty(self):
+        _detector, batcher = self._batcher([])
+        with patch(
+            "app.threat_analysis.detection.batcher.load_detection_batcher",
+            return_value=batcher,
+        ):
+            assert asyncio.run(detect_components(b"not an image", get_settings())) == []
@@ -0,0 +1,130 @@
+"""Unit tests for app.threat_analysis.detection.detector."""
+
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.threat_analysis.detection.detector import (
+    OnnxComponentDetector,
+    decode_predictions,
+    letterbox,
+    load_component_detector,
+    non_max_suppression,
+)
+
+
+def _head(*anchors) -> np.ndarray:
+    """YOLO head output (4 + 2 classes, anchors) from (cx, cy, w, h, s0, s1) rows."""
+    return np.asarray(anchors, dtype=np.float32).T
+
+
+class _FakeSession:
+    """onnxruntime.InferenceSession stand-in returning one fixed anchor per image."""
+
+    def __init__(self, batch=None):
+        self.batches = []
+        self._batch = batch
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="images", shape=[self._batch, 3, 64, 64])]
+
+    def get_modelmeta(self):
+        return SimpleNamespace(custom_metadata_map={"names": "{0: 'server', 1: 'db'}"})
+
+    def run(self, _outputs, feeds):
+        images = feeds["images"]
+        self.batches.append(len(images))
+        head = _head((32, 32, 32, 16, 0.1, 0.9))
+        return [np.stack([head] * len(images))]
+
+
+class TestLetterbox:
+    def test_keeps_ratio_and_pads_to_square(self):
+        tensor, scale, pad = letterbox(Image.new("RGB", (200, 100), "white"), 64)
+        assert tensor.shape == (3, 64, 64)
+        assert tensor.dtype == np.float32
+        assert scale == 0.32
+        assert pad == (0.0, 16.0)
+        assert np.allclose(tensor[:, 0, 0], 114 / 255)
+        assert np.allclose(tensor[:, 32, 32], 1.0)
+
+
+class TestNonMaxSuppression:
+    def test_suppresses_overlaps_of_the_same_class_only(self):
+        boxes = np.array(
+            [[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10], [50, 50, 60, 60]],
+            dtype=np.float32,
+        )
+        scores = np.array([0.9, 0.8, 0.7, 0.6])
+        classes = np.array([0, 0, 1, 0])
+        keep = non_max_suppression(boxes, scores, classes, iou=0.5)
+        assert keep.tolist() == [0, 2, 3]
+
+    def test_empty(self):
+        empty = np.empty((0, 4), dtype=np.float32)
+        assert non_max_suppression(empty, np.empty(0), np.empty(0), 0.5).size == 0
+
+
+class TestDecodePredictions:
+    def test_maps_boxes_back_and_filters_by_confidence(self):
+        prediction = _head(
+            (32, 32, 32, 16, 0.1, 0.9),
+            (33, 32, 32, 16, 0.1, 0.8),  # duplicate, removed by NMS
+            (10, 10, 4, 4, 0.2, 0.1),  # below confidence
+        )
+        detections = decode_predictions(
+            prediction, 0.25, 0.7, 0.32, (0.0, 16.0), (200, 100), {1: "db"}
+        )
+        assert detections == [
+            {"label": "db", "confidence": 0.9, "box": [50, 25, 150, 75]}
+        ]
+
+    def test_nothing_above_confidence(self):
+        prediction = _head((32, 32, 32, 16, 0.1, 0.2))
+        assert decode_predictions(prediction, 0.5, 0.7, 1.0, (0, 0), (64, 64), {}) == []
+
+
+class TestOnnxComponentDetector:
+    def test_dynamic_batch_runs_once_with_names_from_metadata(self):
+        session = _FakeSession()
+        detector = OnnxComponentDetector(session, 64)
+        images = [Image.new("RGB", (200, 100)), Image.new("RGB", (64, 64))]
+        results = detector.detect_batch(images, [(0.25, 0.7), (0.95, 0.7)])
+        assert session.batches == [2]
+        assert detector.names == {0: "server", 1: "db"}
+        assert results[0] == [
+            {"label": "db", "confidence": 0.9, "box": [50, 25, 150, 75]}
+        ]
+        assert results[1] == []
+
+    def test_fixed_batch_runs_one_image_at_a_time(self):
+        session = _FakeSession(batch=1)
+        detector = OnnxComponentDetector(session, 64, names={})
+        images = [Image.new("RGB", (64, 64))] * 3
+        results = detector.detect_batch(images, [(0.25, 0.7)] * 3)
+        assert session.batches == [1, 1, 1]
+        assert [d["label"] for d in results[0]] == ["1"]
+
+
+class TestLoadComponentDetector:
+    def test_disabled_by_default(self):
+        assert load_component_detector(get_settings()) is None
+
+    def test_missing_weights(self, tmp_path):
+        settings = get_settings().model_copy(
+            update={
+                "detection_enabled": True,
+                "detection_model_path": str(tmp_path / "best.onnx"),
+            }
+        )
+        assert load_component_detector(settings) is None
+
+    def test_unloadable_weights(self, tmp_path):
+        weights = tmp_path / "best.onnx"
+        weights.write_bytes(b"not a model")
+        settings = get_settings().model_copy(
+            update={"detection_enabled": True, "detection_model_path": str(weights)}
+        )
+        assert load_component_detector(settings) is None
@@ -88,3 +88,34 @@ class TestValidateArchitectureDiagram:
             settings = get_settings()
             asyncio.run(validate_architecture_diagram(b"fake_image", settings))
         assert "LLM validation failed" in caplog.text or "timeout" in caplog.text
+
+    def test_verdicts_cached_by_image_digest(self):
+        from app.config import get_settings
+
+        mock_run = AsyncMock(return_value={"is_architecture_diagram": True})
+        with patch(
+            "app.threat_analysis.guardrails.architecture_diagram_validator.run_vision_with_fallback",
+            mock_run,
+        ):
+            asyncio.run(
+                validate_architecture_diagram(
+                    b"fake_image", get_settings(), image_digest="blake2b:abc"
+                )
+            )
+        kwargs = mock_run.call_args.kwargs
+        assert kwargs["cache_get"] is not None
+        assert kwargs["cache_set"] is not None
+        assert kwargs["cache_key_prefix"] == "guardrail"
+        assert kwargs["image_digest"] == "blake2b:abc"
+
+    def test_cache_can_be_disabled(self):
+        from app.config import get_settings
+
+        settings = get_settings().model_copy(update={"guardrail_cache_enabled": False})
+        mock_run = AsyncMock(return_value={"is_architecture_diagram": True})
+        with patch(
+            "app.threat_analysis.guardrails.architecture_diagram_validator.run_vision_with_fallback",
+            mock_run,
+        ):
+            asyncio.run(validate_architecture_diagram(b"fake_image", settings))
+        assert mock_run.call_args.kwargs["cache_get"] is None
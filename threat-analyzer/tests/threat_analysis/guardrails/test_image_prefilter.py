@@ -0,0 +1,180 @@
+"""Unit tests for app.threat_analysis.guardrails.image_prefilter."""
+
+import asyncio
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.config import get_settings
+from app.threat_analysis.exceptions import ArchitectureDiagramValidationError
+from app.threat_analysis.guardrails.image_prefilter import (
+    diagram_confidence,
+    prefilter_architecture_diagram,
+    read_image_size,
+    score_image,
+)
+
+MAX_PIXELS = 40_000_000
+
+
+def _encode(image, fmt: str = "PNG") -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _diagram() -> bytes:
+    """Boxes with labels joined by arrows on a white background."""
+    image = Image.new("RGB", (900, 600), "white")
+    draw = ImageDraw.Draw(image)
+    boxes = [(60, 80), (360, 80), (660, 80), (360, 380)]
+    for x, y in boxes:
+        draw.rectangle((x, y, x + 180, y + 110), outline="black", width=3)
+        draw.text((x + 20, y + 45), "API Gateway", fill="black")
+    draw.line((240, 135, 360, 135), fill="black", width=3)
+    draw.line((540, 135, 660, 135), fill="black", width=3)
+    draw.line((450, 190, 450, 380), fill="black", width=3)
+    draw.rectangle((30, 40, 870, 560), outline=(0, 90, 200), width=2)
+    return _encode(image)
+
+
+def _photo() -> bytes:
+    """Smooth colour field with sensor-like noise (no flat background)."""
+    rng = np.random.default_rng(0)
+    field = rng.normal(size=(60, 80, 3))
+    field = (field - field.min()) / (field.max() - field.min()) * 255
+    image = Image.fromarray(np.uint8(field)).resize((800, 600), Image.BICUBIC)
+    noisy = np.asarray(image, dtype=float) + rng.normal(0, 8, (600, 800, 3))
+    return _encode(Image.fromarray(np.uint8(np.clip(noisy, 0, 255))), "JPEG")
+
+
+def _bomb_png(width: int, height: int) -> bytes:
+    """Tiny PNG whose header declares width x height pixels."""
+    png = bytearray(_encode(Image.new("L", (1, 1))))
+    ihdr = bytearray(png[12:29])
+    ihdr[4:12] = struct.pack(">II", width, height)
+    png[12:29] = ihdr
+    png[29:33] = struct.pack(">I", zlib.crc32(bytes(ihdr)))
+    return bytes(png)
+
+
+class TestScoreImage:
+    def test_diagram_passes_with_high_confidence(self):
+        confidence, _reason, features = score_image(_diagram(), MAX_PIXELS)
+        assert confidence > 0.9
+        assert features["dominant"] > 0.5
+
+    def test_blank_image_rejected(self):
+        confidence, reason, _features = score_image(
+            _encode(Image.new("RGB", (800, 600), "white")), MAX_PIXELS
+        )
+        assert confidence < 0.01
+        assert "blank" in reason
+
+    def test_photo_rejected(self):
+        confidence, _reason, features = score_image(_photo(), MAX_PIXELS)
+        assert confidence < 0.01
+        assert features["entropy"] > 6.0
+
+    def test_noise_rejected(self):
+        rng = np.random.default_rng(1)
+        noise = Image.fromarray(rng.integers(0, 256, (400, 400, 3), dtype=np.uint8))
+        confidence, reason, _features = score_image(_encode(noise), MAX_PIXELS)
+        assert confidence < 0.01
+        assert "photo" in reason
+
+    def test_transparent_background_counts_as_white(self):
+        image = Image.open(io.BytesIO(_diagram())).convert("RGBA")
+        pixels = np.asarray(image).copy()
+        white = (pixels[..., :3] == 255).all(axis=-1)
+        pixels[white] = (0, 0, 0, 0)
+        confidence, _reason, _features = score_image(
+            _encode(Image.fromarray(pixels, "RGBA")), MAX_PIXELS
+        )
+        assert confidence > 0.9
+
+    def test_image_above_pixel_limit_rejected_from_header(self):
+        large = _bomb_png(12_000, 12_000)
+        assert read_image_size(large) == (12_000, 12_000)
+        confidence, reason, features = score_image(large, MAX_PIXELS)
+        assert confidence == 0.0
+        assert "limit" in reason
+        assert features == {}
+
+    def test_image_pillow_refuses_to_open_rejected(self):
+        confidence, reason, _features = score_image(
+            _bomb_png(50_000, 50_000), MAX_PIXELS
+        )
+        assert confidence == 0.0
+        assert "decompression bomb" in reason
+
+    def test_pixel_limit_checked_without_heuristics(self):
+        confidence, _reason, _features = score_image(
+            _bomb_png(8_000, 8_000), MAX_PIXELS, heuristics=False
+        )
+        assert confidence == 0.0
+
+    def test_no_opinion_without_heuristics(self):
+        assert score_image(_diagram(), MAX_PIXELS, heuristics=False)[0] is None
+
+    def test_tiny_image_rejected(self):
+        confidence, reason, _features = score_image(
+            _encode(Image.new("RGB", (8, 8), "white")), MAX_PIXELS
+        )
+        assert confidence == 0.0
+        assert "too small" in reason
+
+    def test_unreadable_bytes_have_no_opinion(self):
+        assert score_image(b"not an image", MAX_PIXELS) == (
+            None,
+            "image header not readable",
+            {},
+        )
+
+
+class TestDiagramConfidence:
+    def test_page_of_text_is_uncertain(self):
+        features = {
+            "entropy": 1.0,
+            "dominant": 0.87,
+            "edges": 0.14,
+            "sharpness": 0.74,
+            "text_ratio": 1.0,
+        }
+        assert 0.3 < diagram_confidence(features) < 0.7
+
+
+class TestPrefilterArchitectureDiagram:
+    def _settings(self, **update):
+        return get_settings().model_copy(
+            update={"guardrail_prefilter_enabled": True, **update}
+        )
+
+    def test_rejects_blank_image(self):
+        blank = _encode(Image.new("RGB", (800, 600), "white"))
+        with pytest.raises(ArchitectureDiagramValidationError) as exc_info:
+            asyncio.run(prefilter_architecture_diagram(blank, self._settings()))
+        assert exc_info.value.details["prefilter_confidence"] < 0.01
+        assert "features" in exc_info.value.details
+
+    def test_returns_confidence_for_diagram(self):
+        confidence = asyncio.run(
+            prefilter_architecture_diagram(_diagram(), self._settings())
+        )
+        assert confidence > 0.9
+
+    def test_disabled_heuristics_let_blank_image_through(self):
+        blank = _encode(Image.new("RGB", (800, 600), "white"))
+        settings = self._settings(guardrail_prefilter_enabled=False)
+        assert asyncio.run(prefilter_architecture_diagram(blank, settings)) is None
+
+    def test_bomb_rejected_even_when_heuristics_disabled(self):
+        settings = self._settings(guardrail_prefilter_enabled=False)
+        with pytest.raises(ArchitectureDiagramValidationError):
+            asyncio.run(
+                prefilter_architecture_diagram(_bomb_png(50_000, 50_000), settings)
+            )
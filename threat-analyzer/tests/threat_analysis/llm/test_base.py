@@ -0,0 +1,378 @@
+"""Unit tests for app.threat_analysis.llm.base."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.threat_analysis.llm.base import LLMConnection, LLMStreamError
+from app.threat_analysis.llm.image import PreparedImage
+from app.threat_analysis.llm.usage import track_usage, usage_stage
+
+
+class _Conn(LLMConnection):
+    def __init__(self, timeout, llm=None):
+        self._settings = SimpleNamespace(llm_request_timeout_seconds=timeout)
+        self._llm = llm
+
+    @property
+    def name(self) -> str:
+        return "Test"
+
+    def is_configured(self) -> bool:
+        return True
+
+    def _ensure_llm(self):
+        return self._llm
+
+    def _parse_json(self, text: str) -> dict:
+        return {"text": text}
+
+
+def test_invoke_returns_timeout_error():
+    async def slow():
+        await asyncio.sleep(1)
+
+    result = asyncio.run(_Conn(timeout=0.01)._invoke(slow()))
+    assert result["error_type"] == "timeout"
+    assert result["service"] == "Test"
+
+
+def test_invoke_parses_response_content():
+    async def fast():
+        return SimpleNamespace(content='{"a": 1}')
+
+    assert asyncio.run(_Conn(timeout=None)._invoke(fast())) == {"text": '{"a": 1}'}
+
+
+def test_invoke_records_reported_usage():
+    async def fast():
+        return SimpleNamespace(
+            content="{}", usage_metadata={"input_tokens": 12, "output_tokens": 3}
+        )
+
+    async def run():
+        with track_usage() as tracker, usage_stage("diagram"):
+            await _Conn(timeout=None)._invoke(fast(), prompt_text="p")
+        return tracker.summary()
+
+    summary = asyncio.run(run())
+    assert summary["by_stage"]["diagram"]["input_tokens"] == 12
+    assert summary["by_provider"]["Test"]["estimated_calls"] == 0
+
+
+class _StreamingLLM:
+    def __init__(self, chunks, delay=0.0, error=None):
+        self._chunks = chunks
+        self._delay = delay
+        self._error = error
+
+    async def astream(self, messages):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield SimpleNamespace(content=chunk)
+        if self._error:
+            raise self._error
+
+
+async def _collect(conn):
+    return [c async for c in conn.stream_text([{"role": "user", "content": "hi"}])]
+
+
+def test_stream_text_yields_chunks():
+    llm = _StreamingLLM(["[{", "}]", [{"type": "text", "text": "!"}]])
+    assert asyncio.run(_collect(_Conn(timeout=None, llm=llm))) == ["[{", "}]", "!"]
+
+
+def test_stream_text_not_configured():
+    with pytest.raises(LLMStreamError) as exc_info:
+        asyncio.run(_collect(_Conn(timeout=None)))
+    assert exc_info.value.result["error_type"] == "config"
+
+
+def test_stream_text_timeout_covers_whole_stream():
+    llm = _StreamingLLM(["a", "b", "c"], delay=0.02)
+    with pytest.raises(LLMStreamError) as exc_info:
+        asyncio.run(_collect(_Conn(timeout=0.03, llm=llm)))
+    assert exc_info.value.result["error_type"] == "timeout"
+
+
+def test_stream_text_maps_provider_errors():
+    llm = _StreamingLLM(["a"], error=RuntimeError("upstream 503"))
+    with pytest.raises(LLMStreamError) as exc_info:
+        asyncio.run(_collect(_Conn(timeout=None, llm=llm)))
+    assert exc_info.value.result["error_type"] == "processing_error"
+
+
+def test_stream_text_records_estimated_usage_under_stage():
+    llm = _StreamingLLM(["abcd", "efgh"])
+
+    async def run():
+        with track_usage() as tracker:
+            async for _ in _Conn(timeout=None, llm=llm).stream_text(
+                [{"role": "user", "content": "hi"}], stage="stride"
+            ):
+                pass
+        return tracker.summary()
+
+    summary = asyncio.run(run())
+    assert summary["by_stage"]["stride"]["output_tokens"] == 2
+    assert summary["by_stage"]["stride"]["estimated_calls"] == 1
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Error code: 429 - Rate limit reached for requests",
+        "Resource has been exhausted (e.g. check quota).",
+    ],
+)
+def test_invoke_maps_provider_rate_limits(message):
+    async def limited():
+        raise RuntimeError(message)
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(limited()))
+    assert result["error_type"] == "rate_limited"
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Error code: 429 - You exceeded your current quota (insufficient_quota)",
+        "429 Quota exceeded for metric: generate_content_free_tier_requests PerDay",
+    ],
+)
+def test_invoke_maps_exhausted_quota(message):
+    async def exhausted():
+        raise RuntimeError(message)
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(exhausted()))
+    assert result["error_type"] == "quota_exhausted"
+
+
+def test_invoke_maps_wrapped_dns_failure_to_unreachable():
+    async def unresolvable():
+        try:
+            raise OSError("[Errno -2] Name or service not known")
+        except OSError as e:
+            raise RuntimeError("Connection error.") from e
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(unresolvable()))
+    assert result["error_type"] == "unreachable"
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Error code: 401 - Incorrect API key provided",
+        "403 Permission denied on resource project",
+        "400 API key not valid. Please pass a valid API key.",
+    ],
+)
+def test_invoke_maps_auth_failures_to_invalid_api_key(message):
+    async def rejected():
+        raise RuntimeError(message)
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(rejected()))
+    assert result["error_type"] == "invalid_api_key"
+
+
+def test_invoke_maps_sdk_authentication_class_to_invalid_api_key():
+    class AuthenticationError(Exception):
+        pass
+
+    async def rejected():
+        raise AuthenticationError("no credentials")
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(rejected()))
+    assert result["error_type"] == "invalid_api_key"
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "400 Invalid argument: request payload size exceeds the limit",
+        'Invalid JSON payload received. Unknown name "additionalProperties"',
+    ],
+)
+def test_invoke_maps_rejected_request_to_bad_request(message):
+    async def rejected():
+        raise RuntimeError(message)
+
+    result = asyncio.run(_Conn(timeout=None)._invoke(rejected()))
+    assert result["error_type"] == "bad_request"
+
+
+class _DefaultParseConn(_Conn):
+    _parse_json = LLMConnection._parse_json
+
+
+def test_default_parse_json_uses_shared_extractor():
+    conn = _DefaultParseConn(timeout=None)
+    assert conn._parse_json('Sure:\n```json\n[{"a": 1}]\n```') == [{"a": 1}]
+    assert conn._parse_json("")["error_type"] == "empty"
+    assert conn._parse_json("no json")["error_type"] == "invalid_json"
+
+
+class _RepairConn(_DefaultParseConn):
+    def __init__(self, llm=None, min_ratio=0.8, continuation=True, accept=False):
+        self._settings = SimpleNamespace(
+            llm_request_timeout_seconds=None,
+            llm_json_repair_enabled=True,
+            llm_json_accept_partial=accept,
+            llm_json_salvage_min_ratio=min_ratio,
+            llm_json_continuation=continuation,
+        )
+        self._llm = llm
+
+
+class _ContinuingLLM:
+    def __init__(self, rest):
+        self.rest = rest
+        self.requests = []
+
+    async def ainvoke(self, messages):
+        self.requests.append(messages)
+        return SimpleNamespace(content=self.rest)
+
+
+def _respond(text):
+    async def response():
+        return SimpleNamespace(content=text)
+
+    return response()
+
+
+_TRUNCATED = '[{"id": 1}, {"id": 2}, {"id": 3, "description": "cut'
+
+
+def test_truncated_json_accepts_salvage_above_min_ratio_when_opted_in():
+    conn = _RepairConn(min_ratio=0.3, accept=True)
+    with track_usage() as tracker, usage_stage("stride"):
+        result = asyncio.run(conn._invoke(_respond(_TRUNCATED)))
+    assert result == [{"id": 1}, {"id": 2}]
+    partial = tracker.summary()["partial"]["stride"]
+    assert partial["calls"] == 1
+    assert partial["elements"] == 2
+    assert 0.3 <= partial["min_salvage_ratio"] < 1.0
+
+
+def test_truncated_json_salvage_not_accepted_by_default():
+    conn = _RepairConn(min_ratio=0.3, continuation=False)
+    with track_usage() as tracker:
+        result = asyncio.run(conn._invoke(_respond(_TRUNCATED)))
+    assert result["error_type"] == "invalid_json"
+    assert tracker.summary()["partial"] == {}
+
+
+def test_truncated_json_requests_continuation_from_same_provider():
+    llm = _ContinuingLLM(' off"}]')
+    conn = _RepairConn(llm=llm, min_ratio=0.99)
+    messages = [HumanMessage("list threats")]
+    result = asyncio.run(conn._invoke(_respond(_TRUNCATED), messages=messages))
+    assert result == [{"id": 1}, {"id": 2}, {"id": 3, "description": "cut off"}]
+    assert len(llm.requests) == 1
+    assert llm.requests[0][1].content == _TRUNCATED
+
+
+def test_truncated_json_rejected_when_continuation_fails():
+    llm = _ContinuingLLM("still not json")
+    conn = _RepairConn(llm=llm, min_ratio=0.99)
+    result = asyncio.run(
+        conn._invoke(_respond(_TRUNCATED), messages=[HumanMessage("x")])
+    )
+    assert result["error_type"] == "invalid_json"
+    assert 0 < result["salvage_ratio"] < 0.99
+
+
+def test_truncated_json_repair_disabled_by_default_settings():
+    result = asyncio.run(_DefaultParseConn(timeout=None)._invoke(_respond(_TRUNCATED)))
+    assert result["error_type"] == "invalid_json"
+
+
+class _RecordingLLM:
+    def __init__(self, content, bound=None):
+        self.content = content
+        self.bound = bound
+
+    def bind(self, **kwargs):
+        return _RecordingLLM(self.content, bound=kwargs)
+
+    async def ainvoke(self, messages):
+        return SimpleNamespace(content=self.content)
+
+
+class _StructuredConn(_DefaultParseConn):
+    def __init__(self, llm):
+        super().__init__(timeout=None, llm=llm)
+        self.bound = None
+
+    def _bind_response_schema(self, llm, schema):
+        self.bound = llm.bind(schema=schema)
+        return self.bound
+
+
+def test_invoke_text_binds_response_schema_and_decodes_directly():
+    schema = {"type": "object"}
+    conn = _StructuredConn(_RecordingLLM('{"a": "```json [1] ```"}'))
+    with patch("app.threat_analysis.llm.base.extract_json", side_effect=AssertionError):
+        result = asyncio.run(
+            conn.invoke_text([{"role": "user", "content": "x"}], response_schema=schema)
+        )
+    assert result == {"a": "```json [1] ```"}
+    assert conn.bound.bound == {"schema": schema}
+
+
+def test_structured_answer_that_is_not_pure_json_falls_back_to_scanner():
+    conn = _StructuredConn(_RecordingLLM('Here:\n```json\n{"a": 1}\n```'))
+    result = asyncio.run(
+        conn.invoke_text(
+            [{"role": "user", "content": "x"}], response_schema={"type": "object"}
+        )
+    )
+    assert result == {"a": 1}
+
+
+def test_response_schema_ignored_when_connection_does_not_support_it():
+    llm = _RecordingLLM('{"a": 1}')
+    conn = _DefaultParseConn(timeout=None, llm=llm)
+    assert conn._structured_llm(llm, {"type": "object"}) == (llm, None)
+    result = asyncio.run(
+        conn.invoke_vision("p", b"img", response_schema={"type": "object"})
+    )
+    assert result == {"a": 1}
+
+
+class _MessageLLM(_RecordingLLM):
+    def __init__(self, content):
+        super().__init__(content)
+        self.messages = []
+
+    async def ainvoke(self, messages):
+        self.messages.append(messages)
+        return SimpleNamespace(content=self.content)
+
+
+def test_invoke_vision_sends_real_mime_type_and_shared_payload():
+    llm = _MessageLLM('{"a": 1}')
+    conn = _DefaultParseConn(timeout=None, llm=llm)
+    image = PreparedImage(b"\x89PNG\r\n\x1a\nrest", "image/png")
+
+    async def run():
+        await conn.invoke_vision("p", image)
+        await conn.invoke_vision("q", image)
+
+    asyncio.run(run())
+    urls = [m[0].content[1]["image_url"]["url"] for m in llm.messages]
+    assert urls[0].startswith("data:image/png;base64,")
+    assert urls[0] == urls[1] == image.data_url
+
+
+def test_invoke_vision_sniffs_mime_type_of_raw_bytes():
+    llm = _MessageLLM('{"a": 1}')
+    conn = _DefaultParseConn(timeout=None, llm=llm)
+    asyncio.run(conn.invoke_vision("p", b"RIFF\x00\x00\x00\x00WEBPVP8 "))
+    url = llm.messages[0][0].content[1]["image_url"]["url"]
+    assert url.startswith("data:image/webp;base64,")
@@ -1,11 +1,19 @@
 """Unit tests for app.threat_analysis.llm.cache (Redis-backed)."""
 
+import asyncio
 import os
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from app.threat_analysis.llm.cache import CACHE_TTL_SECONDS, LLMCacheService
+from app.threat_analysis.llm.cache import (
+    CACHE_TTL_SECONDS,
+    LLMCacheService,
+    content_digest,
+    get_memory_cache,
+    prompt_digest,
+)
+from app.threat_analysis.llm.memory_cache import MemoryLRUCache, get_cache_tier_stats
 
 # Redis URL para testes (DB 1 para nao misturar com dev). Pode sobrescrever via env.
 TEST_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/1")
@@ -26,6 +34,15 @@ def _redis_available() -> bool:
         return False
 
 
+@pytest.fixture(autouse=True)
+def _clear_memory_tier():
+    """The in-memory tier is process-wide; start every test cold."""
+    get_memory_cache().clear()
+    get_cache_tier_stats().reset()
+    yield
+    get_memory_cache().clear()
+
+
 class _FakeBackend:
     """In-memory backend for tests (no Redis). Matches shared CacheBackend protocol."""
 
@@ -39,6 +56,16 @@ class _FakeBackend:
         self._store[key] = value
 
 
+class _FakeAsyncBackend(_FakeBackend):
+    """In-memory asyncio backend for tests. Matches shared AsyncCacheBackend."""
+
+    async def get(self, key: str) -> str | None:
+        return self._store.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
+        self._store[key] = value
+
+
 class TestLLMCacheServiceWithMockBackend:
     """Tests that run without Redis by using a fake in-memory backend."""
 
@@ -96,6 +123,168 @@ class TestLLMCacheServiceWithMockBackend:
         assert "Cache set failed" in caplog.text or "write failed" in caplog.text
 
 
+class TestLLMCacheServiceAsync:
+    """aget/aset use the asyncio backend and share keys with get/set."""
+
+    def test_aget_aset_roundtrip(self):
+        fake = _FakeAsyncBackend()
+        with patch(
+            "app.threat_analysis.llm.cache.get_async_cache_backend", return_value=fake
+        ):
+            cache = LLMCacheService(redis_url="redis://localhost:6379/0")
+
+            async def roundtrip():
+                await cache.aset("prefix", [{"a": 1}], "arg1")
+                return await cache.aget("prefix", "arg1")
+
+            assert asyncio.run(roundtrip()) == [{"a": 1}]
+            assert cache._key("prefix", "arg1") in fake._store
+
+    def test_aget_miss_returns_none(self):
+        with patch(
+            "app.threat_analysis.llm.cache.get_async_cache_backend",
+            return_value=_FakeAsyncBackend(),
+        ):
+            cache = LLMCacheService(redis_url="redis://localhost:6379/0")
+            assert asyncio.run(cache.aget("x", "y")) is None
+
+    def test_aget_logs_warning_on_backend_exception(self, caplog):
+        backend = MagicMock()
+        backend.get = AsyncMock(side_effect=RuntimeError("connection lost"))
+        with patch(
+            "app.threat_analysis.llm.cache.get_async_cache_backend",
+            return_value=backend,
+        ):
+            cache = LLMCacheService(redis_url="redis://localhost:6379/0")
+            assert asyncio.run(cache.aget("p", "a")) is None
+        assert "Cache get failed" in caplog.text
+
+    def test_aset_logs_warning_on_backend_exception(self, caplog):
+        backend = MagicMock()
+        backend.set = AsyncMock(side_effect=RuntimeError("write failed"))
+        with patch(
+            "app.threat_analysis.llm.cache.get_async_cache_backend",
+            return_value=backend,
+        ):
+            cache = LLMCacheService(redis_url="redis://localhost:6379/0")
+            asyncio.run(cache.aset("p", {"x": 1}, "a"))
+        assert "Cache set failed" in caplog.text
+
+
+class TestContentAddressedKeys:
+    """Binary parts are keyed by content digest, never by their repr."""
+
+    def test_content_digest_is_deterministic(self):
+        assert content_digest(b"abc") == content_digest(bytearray(b"abc"))
+        assert content_digest(b"abc") != content_digest(b"abd")
+        assert content_digest(b"abc").startswith("blake2b:")
+
+    def test_prompt_digest_changes_with_prompt(self):
+        assert prompt_digest("v1") == prompt_digest("v1")
+        assert prompt_digest("v1") != prompt_digest("v2")
+
+    def test_bytes_part_keyed_by_digest(self):
+        cache = LLMCacheService(memory_cache=MemoryLRUCache(0, 60))
+        image = b"\x89PNG" * 1000
+        assert cache._key("diagram", "p", image) == cache._key(
+            "diagram", "p", content_digest(image)
+        )
+
+    def test_bytes_part_not_serialized(self):
+        cache = LLMCacheService(memory_cache=MemoryLRUCache(0, 60))
+        with patch("app.threat_analysis.llm.cache.json.dumps") as dumps:
+            dumps.return_value = "[]"
+            cache._key("diagram", b"x" * 1024)
+        (serialized,), _ = dumps.call_args
+        assert serialized == [content_digest(b"x" * 1024)]
+
+
+class TestLLMCacheServiceMemoryTier:
+    """The in-memory tier answers before the backend and is filled on backend hits."""
+
+    def test_set_then_get_served_from_memory(self):
+        backend = MagicMock()
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend", return_value=backend
+        ):
+            cache = LLMCacheService(memory_cache=MemoryLRUCache(1024, 60))
+            cache.set("diagram", {"components": []}, "img")
+            assert cache.get("diagram", "img") == {"components": []}
+        backend.get.assert_not_called()
+        assert get_cache_tier_stats().snapshot()["memory"]["hits"] == 1
+
+    def test_backend_hit_fills_memory(self):
+        fake = _FakeBackend()
+        memory = MemoryLRUCache(1024, 60)
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend", return_value=fake
+        ):
+            cache = LLMCacheService(memory_cache=memory)
+            fake._store[cache._key("p", "a")] = '{"x": 1}'
+            assert cache.get("p", "a") == {"x": 1}
+            fake._store.clear()
+            assert cache.get("p", "a") == {"x": 1}
+        tiers = get_cache_tier_stats().snapshot()
+        assert tiers["memory"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert tiers["redis"]["hits"] == 1
+
+    def test_memory_budget_counts_utf8_json_bytes(self):
+        fake = _FakeBackend()
+        memory = MemoryLRUCache(1024, 60)
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend", return_value=fake
+        ):
+            cache = LLMCacheService(memory_cache=memory)
+            data = '{"name": "Serviço de autenticação"}'
+            fake._store[cache._key("p", "a")] = data
+            assert cache.get("p", "a") == {"name": "Serviço de autenticação"}
+        assert memory.snapshot()["json_bytes"] == len(data.encode()) > len(data)
+
+    def test_memory_hit_skips_json_decode(self):
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend",
+            return_value=_FakeBackend(),
+        ):
+            cache = LLMCacheService(memory_cache=MemoryLRUCache(1024, 60))
+            cache.set("p", {"x": 1}, "a")
+            with patch("app.threat_analysis.llm.cache.json.loads") as loads:
+                assert cache.get("p", "a") == {"x": 1}
+        loads.assert_not_called()
+
+    def test_aget_served_from_memory(self):
+        fake = _FakeAsyncBackend()
+        with patch(
+            "app.threat_analysis.llm.cache.get_async_cache_backend", return_value=fake
+        ):
+            cache = LLMCacheService(memory_cache=MemoryLRUCache(1024, 60))
+            asyncio.run(cache.aset("p", [1, 2], "a"))
+            fake._store.clear()
+            assert asyncio.run(cache.aget("p", "a")) == [1, 2]
+
+    def test_disabled_memory_tier_goes_to_backend(self):
+        fake = _FakeBackend()
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend", return_value=fake
+        ):
+            cache = LLMCacheService(memory_cache=MemoryLRUCache(0, 60))
+            cache.set("p", {"x": 1}, "a")
+            fake._store.clear()
+            assert cache.get("p", "a") is None
+        assert "memory" not in get_cache_tier_stats().snapshot()
+
+    def test_set_publishes_invalidation(self):
+        invalidator = MagicMock()
+        with patch(
+            "app.threat_analysis.llm.cache.get_cache_backend",
+            return_value=_FakeBackend(),
+        ):
+            cache = LLMCacheService(
+                memory_cache=MemoryLRUCache(1024, 60), invalidator=invalidator
+            )
+            cache.set("p", {"x": 1}, "a")
+        invalidator.publish.assert_called_once_with(cache._key("p", "a"))
+
+
 @pytest.mark.skipif(not _redis_available(), reason="Redis not available")
 class TestLLMCacheServiceRedis:
     """Integration tests requiring a real Redis instance."""
@@ -109,3 +298,12 @@ class TestLLMCacheServiceRedis:
     def test_get_miss_returns_none_redis(self):
         cache = LLMCacheService(redis_url=TEST_REDIS_URL)
         assert cache.get("x", "y") is None
+
+    def test_aget_aset_roundtrip_redis(self):
+        cache = LLMCacheService(redis_url=TEST_REDIS_URL)
+
+        async def roundtrip():
+            await cache.aset("prefix", {"a": 2}, "async")
+            return await cache.aget("prefix", "async")
+
+        assert asyncio.run(roundtrip()) == {"a": 2}
@@ -0,0 +1,228 @@
+"""Unit tests for app.threat_analysis.llm.circuit_breaker."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+from threat_modeling_shared import AsyncMemoryCacheBackend
+
+from app.threat_analysis.llm.circuit_breaker import (
+    CircuitBreaker,
+    get_circuit_breaker,
+)
+
+FAILURE = {"error": "503", "error_type": "processing_error"}
+TIMEOUT = {"error": "slow", "error_type": "timeout"}
+
+
+def _conn(name="Gemini", model="gemini-x"):
+    conn = MagicMock()
+    conn.name = name
+    conn.model = model
+    return conn
+
+
+async def _call(breaker, conn, ok=False, result=FAILURE):
+    """Admit a call and record its outcome."""
+    ticket = await breaker.allow(conn)
+    assert ticket is not None
+    await breaker.record(conn, ticket, ok, result)
+
+
+def test_trips_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    conn = _conn()
+
+    async def scenario():
+        await _call(breaker, conn)
+        assert await breaker.allow(conn) is not None
+        await _call(breaker, conn, result=TIMEOUT)
+        assert await breaker.state(conn) == "open"
+        assert await breaker.allow(conn) is None
+
+    asyncio.run(scenario())
+
+
+def test_non_provider_errors_reset_the_counter():
+    breaker = CircuitBreaker(failure_threshold=2)
+    conn = _conn()
+
+    async def scenario():
+        await _call(breaker, conn)
+        await _call(
+            breaker, conn, result={"error": "bad", "error_type": "invalid_json"}
+        )
+        await _call(breaker, conn)
+        assert await breaker.state(conn) == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_allows_single_probe_then_closes():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        assert await breaker.state(conn) == "half_open"
+        probe = await breaker.allow(conn)
+        assert probe is not None
+        assert await breaker.allow(conn) is None
+        await breaker.record(conn, probe, True, {"components": []})
+        assert await breaker.state(conn) == "closed"
+        assert await breaker.allow(conn) is not None
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        for _ in range(3):
+            await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        await _call(breaker, conn)
+        assert await breaker.state(conn) == "open"
+
+    asyncio.run(scenario())
+
+
+def test_released_probe_can_be_taken_again():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        probe = await breaker.allow(conn)
+        assert probe is not None
+        assert await breaker.allow(conn) is None
+        await breaker.release(conn, probe)
+        assert await breaker.allow(conn) is not None
+
+    asyncio.run(scenario())
+
+
+def test_release_by_another_replica_keeps_the_probe():
+    backend = AsyncMemoryCacheBackend()
+    holder = CircuitBreaker(backend=backend, failure_threshold=1, cooldown_seconds=0.01)
+    other = CircuitBreaker(backend=backend, failure_threshold=1, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        await _call(holder, conn)
+        await asyncio.sleep(0.02)
+        assert await holder.allow(conn) is not None
+        await other.release(conn, "not-the-probe")
+        assert await other.allow(conn) is None
+
+    asyncio.run(scenario())
+
+
+def test_call_admitted_before_trip_cannot_release_or_close_the_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        stale = await breaker.allow(conn)
+        await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        probe = await breaker.allow(conn)
+        assert probe is not None
+        # The earlier call is cancelled: the probe lease stays with the probe
+        await breaker.release(conn, stale)
+        assert await breaker.allow(conn) is None
+        # ... or succeeds: the breaker stays half-open until the probe answers
+        await breaker.record(conn, stale, True, {"components": []})
+        assert await breaker.state(conn) == "half_open"
+        assert await breaker.allow(conn) is None
+        await breaker.record(conn, probe, True, {"components": []})
+        assert await breaker.state(conn) == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_late_failure_of_call_admitted_before_trip_is_ignored():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+    conn = _conn()
+
+    async def scenario():
+        stale = await breaker.allow(conn)
+        await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        probe = await breaker.allow(conn)
+        await breaker.record(conn, stale, False, FAILURE)
+        assert await breaker.state(conn) == "half_open"
+        await breaker.record(conn, probe, True, {"components": []})
+        assert await breaker.state(conn) == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_expired_probe_cannot_close_the_breaker():
+    breaker = CircuitBreaker(
+        failure_threshold=1, cooldown_seconds=0.01, probe_timeout_seconds=0.02
+    )
+    conn = _conn()
+
+    async def scenario():
+        await _call(breaker, conn)
+        await asyncio.sleep(0.02)
+        slow_probe = await breaker.allow(conn)
+        await asyncio.sleep(0.03)
+        probe = await breaker.allow(conn)
+        assert probe is not None
+        await breaker.record(conn, slow_probe, True, {"components": []})
+        assert await breaker.state(conn) == "half_open"
+        assert await breaker.allow(conn) is None
+
+    asyncio.run(scenario())
+
+
+def test_breakers_are_keyed_by_provider_and_model():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+
+    async def scenario():
+        await _call(breaker, _conn(model="a"))
+        assert await breaker.allow(_conn(model="a")) is None
+        assert await breaker.allow(_conn(model="b")) is not None
+
+    asyncio.run(scenario())
+
+
+def test_shared_backend_propagates_open_state():
+    backend = AsyncMemoryCacheBackend()
+    replica_a = CircuitBreaker(backend=backend, failure_threshold=1)
+    replica_b = CircuitBreaker(backend=backend, failure_threshold=1)
+
+    async def scenario():
+        await _call(replica_a, _conn())
+        assert await replica_b.allow(_conn()) is None
+
+    asyncio.run(scenario())
+
+
+def test_disabled_always_allows():
+    breaker = CircuitBreaker(failure_threshold=1, enabled=False)
+
+    async def scenario():
+        await _call(breaker, _conn())
+        assert await breaker.allow(_conn()) is not None
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_reports_state():
+    breaker = CircuitBreaker(failure_threshold=2)
+    asyncio.run(_call(breaker, _conn()))
+    assert asyncio.run(breaker.snapshot()) == {
+        "Gemini:gemini-x": {"state": "closed", "failures": 1}
+    }
+    breaker.reset()
+    assert asyncio.run(breaker.snapshot()) == {}
+
+
+def test_get_circuit_breaker_is_singleton():
+    assert get_circuit_breaker() is get_circuit_breaker()
@@ -1,14 +1,24 @@
 """Unit tests for app.threat_analysis.llm.fallback."""
 
 import asyncio
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.threat_analysis.llm.base import LLMConnection
+import pytest
+
+from app.threat_analysis.llm.base import LLMConnection, LLMStreamError
+from app.threat_analysis.llm.cache import content_digest, prompt_digest
+from app.threat_analysis.llm.circuit_breaker import CircuitBreaker
 from app.threat_analysis.llm.fallback import (
     is_error_result,
     run_text_with_fallback,
     run_vision_with_fallback,
+    stream_text_with_fallback,
 )
+from app.threat_analysis.llm.image import PreparedImage
+from app.threat_analysis.llm.negative_cache import ProviderNegativeCache
+from app.threat_analysis.llm.rate_limit import ProviderRateLimiter
+from app.threat_analysis.llm.stats import get_provider_stats
+from app.threat_analysis.llm.usage import record_partial, record_usage, track_usage
 
 
 def test_is_error_result():
@@ -68,6 +78,178 @@ class TestRunVisionWithFallback:
         assert result == cached
         cache_get.assert_called_once()
 
+    def test_partial_answer_is_returned_but_not_cached(self):
+        salvaged = {"components": [{"id": "1"}], "connections": []}
+        cache_set = MagicMock()
+
+        class Truncated(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, result=salvaged)
+
+            async def invoke_vision(self, prompt, image_bytes, **kwargs):
+                record_partial(self.name, 0.9, 1)
+                return self._result
+
+        result = asyncio.run(
+            run_vision_with_fallback(
+                connections=[Truncated],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=b"x",
+                cache_get=MagicMock(return_value=None),
+                cache_set=cache_set,
+            )
+        )
+        assert result == salvaged
+        cache_set.assert_not_called()
+
+    def test_async_cache_callables(self):
+        valid = {"components": [{"id": "1"}], "connections": []}
+        cache_get = AsyncMock(return_value=None)
+        cache_set = AsyncMock()
+
+        class MockOk(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, result=valid)
+
+        result = asyncio.run(
+            run_vision_with_fallback(
+                connections=[MockOk],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=b"x",
+                cache_get=cache_get,
+                cache_set=cache_set,
+            )
+        )
+        assert result == valid
+        cache_get.assert_awaited_once()
+        cache_set.assert_awaited_once()
+
+    def test_cache_keyed_by_prompt_and_image_digest(self):
+        valid = {"components": [{"id": "1"}], "connections": []}
+        cache_get = MagicMock(return_value=None)
+        cache_set = MagicMock()
+
+        class MockOk(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, result=valid)
+
+        asyncio.run(
+            run_vision_with_fallback(
+                connections=[MockOk],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=b"x",
+                cache_get=cache_get,
+                cache_set=cache_set,
+            )
+        )
+        cache_get.assert_called_once_with(
+            "diagram", prompt_digest("p"), content_digest(b"x")
+        )
+        cache_set.assert_called_once_with(
+            "diagram", valid, prompt_digest("p"), content_digest(b"x")
+        )
+
+    def test_precomputed_image_digest_is_reused(self):
+        cache_get = MagicMock(return_value={"components": []})
+        with patch("app.threat_analysis.llm.fallback.content_digest") as digest:
+            asyncio.run(
+                run_vision_with_fallback(
+                    connections=[],
+                    settings=MagicMock(),
+                    prompt="p",
+                    image_bytes=b"x",
+                    cache_get=cache_get,
+                    image_digest="blake2b:precomputed",
+                )
+            )
+        digest.assert_not_called()
+        cache_get.assert_called_once_with(
+            "diagram", prompt_digest("p"), "blake2b:precomputed"
+        )
+
+    def test_prepared_image_shared_by_attempts_and_keyed_by_its_digest(self):
+        image = PreparedImage(b"x", "image/png")
+        received = []
+        cache_get = MagicMock(return_value=None)
+
+        class Failing(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Failing", result={"error": "boom"})
+
+            async def invoke_vision(self, prompt, image_bytes, **kwargs):
+                received.append(image_bytes)
+                return await super().invoke_vision(prompt, image_bytes, **kwargs)
+
+        class Ok(Failing):
+            def __init__(self, s):
+                MockConnection.__init__(self, s, name="Ok", result={"components": []})
+
+        asyncio.run(
+            run_vision_with_fallback(
+                connections=[Failing, Ok],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=image,
+                cache_get=cache_get,
+            )
+        )
+        assert len(received) == 2
+        assert all(r is image for r in received)
+        cache_get.assert_called_once_with("diagram", prompt_digest("p"), image.digest)
+
+    def test_concurrent_identical_calls_invoke_provider_once(self):
+        invocations = []
+
+        class CountingConnection(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Counting")
+
+            async def invoke_vision(self, prompt, image_bytes, **kwargs):
+                invocations.append(prompt)
+                await asyncio.sleep(0.01)
+                return {"components": [], "connections": []}
+
+        async def run_both():
+            return await asyncio.gather(
+                *(
+                    run_vision_with_fallback(
+                        connections=[CountingConnection],
+                        settings=MagicMock(),
+                        prompt="coalesce",
+                        image_bytes=b"same-image",
+                        cache_get=MagicMock(return_value=None),
+                        cache_set=MagicMock(),
+                    )
+                    for _ in range(2)
+                )
+            )
+
+        results = asyncio.run(run_both())
+        assert results[0] == results[1] == {"components": [], "connections": []}
+        assert len(invocations) == 1
+
+    def test_usage_attributed_to_stage(self):
+        class UsageConnection(MockConnection):
+            async def invoke_vision(self, prompt, image_bytes, **kwargs):
+                record_usage("Mock", "", None, prompt, "{}", 0.1)
+                return self._result
+
+        async def run():
+            with track_usage() as tracker:
+                await run_vision_with_fallback(
+                    connections=[UsageConnection],
+                    settings=MagicMock(),
+                    prompt="p",
+                    image_bytes=b"x",
+                    cache_key_prefix="guardrail",
+                )
+            return tracker.summary()
+
+        assert asyncio.run(run())["by_stage"]["guardrail"]["calls"] == 1
+
     def test_first_connection_succeeds(self):
         valid = {"components": [{"id": "1"}], "connections": []}
 
@@ -152,3 +334,431 @@ class TestRunTextWithFallback:
         assert "error" in result
         assert "All LLM providers failed" in result["error"]
         assert "engine_errors" in result
+
+
+class SlowConnection(MockConnection):
+    """Mock that sleeps before answering (to exercise hedging)."""
+
+    delay = 0.0
+
+    async def invoke_vision(self, prompt: str, image_bytes: bytes, **kwargs) -> dict:
+        await asyncio.sleep(self.delay)
+        return await super().invoke_vision(prompt, image_bytes, **kwargs)
+
+    async def invoke_text(self, messages: list, **kwargs) -> dict:
+        await asyncio.sleep(self.delay)
+        return await super().invoke_text(messages, **kwargs)
+
+
+class TestHedgedFallback:
+    def setup_method(self):
+        get_provider_stats().reset()
+
+    def test_hedged_returns_fastest_valid_and_cancels_slow(self):
+        class Slow(SlowConnection):
+            delay = 5.0
+
+            def __init__(self, s):
+                super().__init__(s, name="Slow", result={"components": ["slow"]})
+
+        class Fast(SlowConnection):
+            delay = 0.01
+
+            def __init__(self, s):
+                super().__init__(s, name="Fast", result={"components": ["fast"]})
+
+        result = asyncio.run(
+            run_vision_with_fallback(
+                connections=[Slow, Fast],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=b"x",
+                hedge_delay=0.05,
+            )
+        )
+        assert result == {"components": ["fast"]}
+        snapshot = get_provider_stats().snapshot()
+        assert snapshot["Fast"]["wins"] == 1
+        assert snapshot["Slow"]["cancelled"] == 1
+
+    def test_hedged_prefers_first_when_it_answers_before_delay(self):
+        class First(SlowConnection):
+            delay = 0.0
+
+            def __init__(self, s):
+                super().__init__(s, name="First", result=[{"id": 1}])
+
+        second = MagicMock()
+
+        result = asyncio.run(
+            run_text_with_fallback(
+                connections=[First, second],
+                settings=MagicMock(),
+                messages=[{"role": "user", "content": "x"}],
+                hedge_delay=1.0,
+            )
+        )
+        assert result == [{"id": 1}]
+        second.return_value.invoke_text.assert_not_called()
+
+    def test_hedged_failure_starts_next_immediately(self):
+        class Fail(SlowConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Fail", result={"error": "boom"})
+
+        class Ok(SlowConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Ok", result={"components": []})
+
+        result = asyncio.run(
+            run_vision_with_fallback(
+                connections=[Fail, Ok],
+                settings=MagicMock(),
+                prompt="p",
+                image_bytes=b"x",
+                hedge_delay=60.0,
+            )
+        )
+        assert result == {"components": []}
+        snapshot = get_provider_stats().snapshot()
+        assert snapshot["Fail"]["losses"] == 1
+        assert snapshot["Ok"]["wins"] == 1
+
+    def test_hedged_all_fail_returns_aggregated_errors(self):
+        class Fail(SlowConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Fail", result={"error": "boom"})
+
+        result = asyncio.run(
+            run_text_with_fallback(
+                connections=[Fail, Fail],
+                settings=MagicMock(),
+                messages=[{"role": "user", "content": "x"}],
+                hedge_delay=0,
+            )
+        )
+        assert result["error"] == "All LLM providers failed"
+        assert len(result["engine_errors"]) == 2
+
+
+class TestCircuitBreakerInFallback:
+    def test_open_breaker_skips_provider(self):
+        calls = []
+
+        class Down(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Down")
+
+            async def invoke_text(self, messages, **kwargs):
+                calls.append(self.name)
+                return {"error": "503", "error_type": "processing_error"}
+
+        class Up(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Up", result=[{"id": 1}])
+
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+        with patch(
+            "app.threat_analysis.llm.fallback.get_circuit_breaker",
+            return_value=breaker,
+        ):
+            for _ in range(2):
+                result = asyncio.run(
+                    run_text_with_fallback(
+                        connections=[Down, Up],
+                        settings=MagicMock(),
+                        messages=[{"role": "user", "content": "x"}],
+                    )
+                )
+                assert result == [{"id": 1}]
+        assert calls == ["Down"]
+
+    def test_cancelled_probe_releases_half_open_lease(self):
+        class Slow(SlowConnection):
+            delay = 5.0
+
+            def __init__(self, s):
+                super().__init__(s, name="Slow", result={"components": ["slow"]})
+
+        class Fast(SlowConnection):
+            delay = 0.01
+
+            def __init__(self, s):
+                super().__init__(s, name="Fast", result={"components": ["fast"]})
+
+        breaker = CircuitBreaker(
+            failure_threshold=1, cooldown_seconds=0.01, probe_timeout_seconds=120
+        )
+        slow = Slow(MagicMock())
+
+        async def scenario():
+            await breaker.record(
+                slow,
+                await breaker.allow(slow),
+                False,
+                {"error": "503", "error_type": "processing_error"},
+            )
+            await asyncio.sleep(0.02)
+            with patch(
+                "app.threat_analysis.llm.fallback.get_circuit_breaker",
+                return_value=breaker,
+            ):
+                result = await run_vision_with_fallback(
+                    connections=[Slow, Fast],
+                    settings=MagicMock(),
+                    prompt="p",
+                    image_bytes=b"x",
+                    hedge_delay=0.05,
+                )
+            assert result == {"components": ["fast"]}
+            # The hedged probe to Slow was cancelled: the next call may probe again
+            assert await breaker.state(slow) == "half_open"
+            assert await breaker.allow(slow) is not None
+
+        asyncio.run(scenario())
+
+
+class TestNegativeCacheInFallback:
+    def test_provider_failure_skips_provider_on_later_calls(self):
+        calls = []
+
+        class Unconfigured(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Unconfigured")
+
+            async def invoke_text(self, messages, **kwargs):
+                calls.append(self.name)
+                return self._not_configured_response()
+
+        class Up(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Up", result=[{"id": 1}])
+
+        negative_cache = ProviderNegativeCache(ttl_seconds=60)
+        with patch(
+            "app.threat_analysis.llm.fallback.get_negative_cache",
+            return_value=negative_cache,
+        ):
+            for _ in range(3):
+                result = asyncio.run(
+                    run_text_with_fallback(
+                        connections=[Unconfigured, Up],
+                        settings=MagicMock(),
+                        messages=[{"role": "user", "content": "x"}],
+                    )
+                )
+                assert result == [{"id": 1}]
+        assert calls == ["Unconfigured"]
+        assert asyncio.run(negative_cache.snapshot())["Unconfigured:"] == {
+            "unavailable": "config",
+            "marked": 1,
+            "skipped": 2,
+        }
+
+    def test_rejected_request_does_not_mark_provider(self):
+        calls = []
+
+        class Gemini(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Gemini")
+
+            async def invoke_text(self, messages, **kwargs):
+                calls.append(self.name)
+                return self._error_result(
+                    RuntimeError(
+                        "400 Invalid argument: request payload size exceeds the limit"
+                    )
+                )
+
+        negative_cache = ProviderNegativeCache(ttl_seconds=60)
+        with patch(
+            "app.threat_analysis.llm.fallback.get_negative_cache",
+            return_value=negative_cache,
+        ):
+            for _ in range(2):
+                result = asyncio.run(
+                    run_text_with_fallback(
+                        connections=[Gemini],
+                        settings=MagicMock(),
+                        messages=[{"role": "user", "content": "x"}],
+                    )
+                )
+        assert result["engine_errors"][0]["error_type"] == "bad_request"
+        assert calls == ["Gemini", "Gemini"]
+        assert asyncio.run(negative_cache.check(Gemini(None))) is None
+
+    def test_skipped_provider_reported_in_engine_errors(self):
+        class Unreachable(MockConnection):
+            def __init__(self, s):
+                super().__init__(
+                    s,
+                    name="Unreachable",
+                    result={"error": "refused", "error_type": "unreachable"},
+                )
+
+        negative_cache = ProviderNegativeCache(ttl_seconds=60)
+        with patch(
+            "app.threat_analysis.llm.fallback.get_negative_cache",
+            return_value=negative_cache,
+        ):
+            for _ in range(2):
+                result = asyncio.run(
+                    run_text_with_fallback(
+                        connections=[Unreachable],
+                        settings=MagicMock(),
+                        messages=[{"role": "user", "content": "x"}],
+                    )
+                )
+        assert result["engine_errors"][0]["error_type"] == "provider_unavailable"
+
+
+class StreamingConnection(MockConnection):
+    """Mock connection whose stream_text yields the given chunks, then raises error."""
+
+    chunks: list[str] = []
+    error: Exception | None = None
+
+    async def stream_text(self, messages, stage=None):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+def _streaming_conn(name, chunks, error=None):
+    return type(name, (StreamingConnection,), {"chunks": chunks, "error": error})
+
+
+def _collect_stream(**kwargs):
+    async def collect():
+        return [
+            item
+            async for item in stream_text_with_fallback(
+                settings=MagicMock(),
+                messages=[{"role": "user", "content": "stride"}],
+                **kwargs,
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+class TestStreamTextWithFallback:
+    def setup_method(self):
+        get_provider_stats().reset()
+
+    def test_streams_items_and_caches_full_list(self):
+        cache_set = MagicMock()
+        conn = _streaming_conn("StreamOk", ['[{"a": 1},', ' {"b": 2}]'])
+        items = _collect_stream(
+            connections=[conn],
+            cache_get=MagicMock(return_value=None),
+            cache_set=cache_set,
+            cache_key_prefix="stride",
+        )
+        assert items == [{"a": 1}, {"b": 2}]
+        prefix, value, _key = cache_set.call_args.args
+        assert (prefix, value) == ("stride", [{"a": 1}, {"b": 2}])
+        assert get_provider_stats().snapshot()["Mock"]["wins"] == 1
+
+    def test_cache_hit_yields_cached_items(self):
+        conn = _streaming_conn("StreamUnused", ["[]"])
+        items = _collect_stream(
+            connections=[conn], cache_get=MagicMock(return_value=[{"c": 3}])
+        )
+        assert items == [{"c": 3}]
+
+    def test_falls_back_when_first_provider_fails_before_items(self):
+        failing = _streaming_conn(
+            "StreamFail",
+            [],
+            error=LLMStreamError({"error": "down", "error_type": "processing_error"}),
+        )
+        ok = _streaming_conn("StreamOk", ['[{"a": 1}]'])
+        assert _collect_stream(connections=[failing, ok]) == [{"a": 1}]
+
+    def test_mid_stream_failure_returns_partial_and_does_not_cache(self):
+        cache_set = MagicMock()
+        partial = _streaming_conn(
+            "StreamPartial",
+            ['[{"a": 1}, {"b"'],
+            error=LLMStreamError({"error": "reset", "error_type": "processing_error"}),
+        )
+        never = _streaming_conn("StreamNever", ['[{"z": 0}]'])
+        items = _collect_stream(connections=[partial, never], cache_set=cache_set)
+        assert items == [{"a": 1}]
+        cache_set.assert_not_called()
+
+    def test_all_fail_yields_nothing(self):
+        bad = _streaming_conn("StreamBad", ["not json at all"])
+        assert _collect_stream(connections=[bad]) == []
+
+
+class TestRateLimitInFallback:
+    def test_rate_limited_provider_is_skipped_without_call(self):
+        calls = []
+
+        class Limited(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Limited")
+
+            async def invoke_text(self, messages, **kwargs):
+                calls.append(self.name)
+                return {"error": "unexpected"}
+
+        class Up(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Up", result=[{"id": 1}])
+
+        limiter = ProviderRateLimiter(limits={"Limited": {"rpm": 1}}, max_wait=0.01)
+        limiter._bucket("Limited", "rpm", 1).reserve(1)
+        with patch(
+            "app.threat_analysis.llm.fallback.get_rate_limiter",
+            return_value=limiter,
+        ):
+            result = asyncio.run(
+                run_text_with_fallback(
+                    connections=[Limited, Up],
+                    settings=MagicMock(),
+                    messages=[{"role": "user", "content": "x"}],
+                )
+            )
+        assert result == [{"id": 1}]
+        assert calls == []
+        assert limiter.snapshot()["Limited"]["rejected"] == 1
+
+    def test_queue_wait_reported_apart_from_latency(self):
+        class Slow(MockConnection):
+            def __init__(self, s):
+                super().__init__(s, name="Slow", result=[{"id": 1}])
+
+            async def invoke_text(self, messages, **kwargs):
+                await asyncio.sleep(0.02)
+                record_usage(self.name, "m", None, "x", "[]", 0.02)
+                return self._result
+
+        limiter = ProviderRateLimiter(limits={"Slow": {"concurrency": 1}}, max_wait=1)
+
+        async def run():
+            with track_usage() as tracker:
+                await asyncio.gather(
+                    *(
+                        run_text_with_fallback(
+                            connections=[Slow],
+                            settings=MagicMock(),
+                            messages=[{"role": "user", "content": str(i)}],
+                        )
+                        for i in range(2)
+                    )
+                )
+            return tracker.summary()
+
+        with patch(
+            "app.threat_analysis.llm.fallback.get_rate_limiter",
+            return_value=limiter,
+        ):
+            summary = asyncio.run(run())
+        slow = summary["by_provider"]["Slow"]
+        assert slow["calls"] == 2
+        assert slow["latency_seconds"] == pytest.approx(0.04)
+        assert slow["queue_wait_seconds"] >= 0.015
@@ -0,0 +1,111 @@
+"""Unit tests for app.threat_analysis.llm.image."""
+
+import base64
+import io
+from unittest.mock import patch
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.threat_analysis.llm.cache import content_digest
+from app.threat_analysis.llm.image import (
+    PreparedImage,
+    as_prepared_image,
+    encode_image,
+    prepare_image,
+    sniff_mime_type,
+)
+
+
+def _encode(image, fmt: str = "PNG", **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def _noisy_diagram(size: tuple[int, int]) -> Image.Image:
+    """Boxes on a textured background (large as PNG, compact as JPEG)."""
+    image = Image.effect_noise(size, 40).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for x in range(20, size[0] - 120, 200):
+        draw.rectangle((x, 40, x + 100, 120), outline="black", width=3)
+    return image
+
+
+class TestSniffMimeType:
+    @pytest.mark.parametrize(
+        ("fmt", "mime"),
+        [("PNG", "image/png"), ("WEBP", "image/webp"), ("GIF", "image/gif")],
+    )
+    def test_detects_format(self, fmt, mime):
+        assert sniff_mime_type(_encode(Image.new("RGB", (4, 4)), fmt)) == mime
+
+    def test_unknown_defaults_to_jpeg(self):
+        assert sniff_mime_type(b"\xff\xd8\xff\xe0 jpeg") == "image/jpeg"
+        assert sniff_mime_type(b"garbage") == "image/jpeg"
+
+
+class TestPreparedImage:
+    def test_base64_encoded_once(self):
+        image = PreparedImage(b"abc", "image/png")
+        with patch(
+            "app.threat_analysis.llm.image.base64.b64encode",
+            wraps=base64.b64encode,
+        ) as encode:
+            assert image.data_url == "data:image/png;base64,YWJj"
+            assert image.data_url == "data:image/png;base64,YWJj"
+        encode.assert_called_once()
+
+    def test_digest_is_content_digest(self):
+        assert PreparedImage(b"abc", "image/png").digest == content_digest(b"abc")
+
+    def test_as_prepared_image(self):
+        image = PreparedImage(b"abc", "image/png")
+        assert as_prepared_image(image) is image
+        wrapped = as_prepared_image(b"GIF89a...")
+        assert wrapped.data == b"GIF89a..."
+        assert wrapped.mime_type == "image/gif"
+
+
+class TestPrepareImage:
+    def test_downscales_longest_edge_and_reencodes(self):
+        raw = _encode(_noisy_diagram((3000, 1500)))
+        prepared = prepare_image(raw, max_side=1024)
+        assert prepared.size == (1024, 512)
+        assert prepared.mime_type == "image/jpeg"
+        assert len(prepared) < len(raw)
+        with Image.open(io.BytesIO(prepared.data)) as decoded:
+            assert decoded.format == "JPEG"
+            assert decoded.size == (1024, 512)
+
+    def test_keeps_original_when_it_fits_and_is_smaller(self):
+        raw = _encode(Image.new("RGB", (640, 480), "white"))
+        prepared = prepare_image(raw, max_side=1024)
+        assert prepared.data is raw
+        assert prepared.mime_type == "image/png"
+        assert prepared.digest == content_digest(raw)
+
+    def test_transparency_composited_on_white(self):
+        image = Image.new("RGBA", (3000, 200), (0, 0, 0, 0))
+        prepared = prepare_image(_encode(image), max_side=600, image_format="png")
+        assert prepared.mime_type == "image/png"
+        with Image.open(io.BytesIO(prepared.data)) as decoded:
+            assert decoded.convert("RGB").getpixel((10, 10)) == (255, 255, 255)
+
+    def test_gif_is_reencoded(self):
+        raw = _encode(_noisy_diagram((400, 300)).convert("P"), "GIF")
+        prepared = prepare_image(raw, max_side=2048, image_format="webp")
+        assert prepared.mime_type == "image/webp"
+
+    def test_undecodable_bytes_sent_as_is(self):
+        prepared = prepare_image(b"\x89PNG\r\n\x1a\nbroken")
+        assert prepared.data == b"\x89PNG\r\n\x1a\nbroken"
+        assert prepared.mime_type == "image/png"
+
+
+class TestEncodeImage:
+    def test_encodes_decoded_image_with_size_and_mime(self):
+        encoded = encode_image(Image.new("LA", (300, 200)), "webp", quality=80)
+        assert encoded.mime_type == "image/webp"
+        assert encoded.size == (300, 200)
+        assert sniff_mime_type(encoded.data) == "image/webp"
@@ -0,0 +1,130 @@
+"""Unit tests for app.threat_analysis.llm.json_extract."""
+
+import json
+
+import pytest
+
+from app.threat_analysis.llm.json_extract import (
+    JSONExtractionError,
+    JSONRepairStats,
+    extract_json,
+    extract_json_text,
+    iter_json_spans,
+    loads,
+    repair_truncated_json,
+)
+
+
+def test_raw_object_and_array():
+    assert extract_json('  {"a": 1}  ') == {"a": 1}
+    assert extract_json("[1, 2]") == [1, 2]
+
+
+def test_outermost_array_of_objects_is_returned_whole():
+    text = 'Threats:\n[{"id": 1}, {"id": 2}]\nDone.'
+    assert extract_json(text) == [{"id": 1}, {"id": 2}]
+
+
+def test_fenced_block_preferred():
+    text = 'Use {placeholder} here.\n```json\n{"x": 1}\n```\n'
+    assert extract_json(text) == {"x": 1}
+    assert extract_json('```\n[{"y": 2}]\n```') == [{"y": 2}]
+
+
+def test_brackets_inside_strings_are_ignored():
+    text = 'prefix {"msg": "say \\"}\\" and ]", "n": [1]} suffix'
+    assert extract_json(text) == {"msg": 'say "}" and ]', "n": [1]}
+
+
+def test_invalid_candidate_is_skipped():
+    text = 'Schema {component} then the answer: {"ok": true}'
+    assert extract_json(text) == {"ok": True}
+
+
+def test_mismatched_closer_restarts_scan():
+    assert extract_json('{"a": ] garbage [3]') == [3]
+
+
+def test_no_json_raises():
+    with pytest.raises(JSONExtractionError):
+        extract_json("no json here")
+    with pytest.raises(JSONExtractionError):
+        extract_json("")
+    with pytest.raises(JSONExtractionError):
+        extract_json('[{"truncated": 1}, {"b": ')
+
+
+def test_extract_json_text_falls_back_to_stripped_text():
+    assert extract_json_text('x {"a": 1} y') == '{"a": 1}'
+    assert extract_json_text("  nothing  ") == "nothing"
+
+
+def test_iter_json_spans_yields_disjoint_top_level_values():
+    text = 'a {"x": {"y": 1}} b [2] c'
+    spans = list(iter_json_spans(text))
+    assert [text[s:e] for s, e in spans] == ['{"x": {"y": 1}}', "[2]"]
+
+
+def test_loads_raises_standard_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        loads("{bad")
+
+
+def test_large_response_with_many_candidates():
+    items = [{"description": "closing } brace", "id": i} for i in range(5000)]
+    text = "Header {x}\n" + json.dumps(items)
+    assert extract_json(text) == items
+
+
+class TestRepairTruncatedJson:
+    def test_salvages_complete_array_elements(self):
+        text = '```json\n[{"a": 1}, {"b": [1, 2]}, {"c": "cut off'
+        value, ratio = repair_truncated_json(text)
+        assert value == [{"a": 1}, {"b": [1, 2]}]
+        assert 0 < ratio < 1
+
+    def test_closes_nested_containers(self):
+        text = '{"components": [{"id": "a"}, {"id": "b"}, {"id'
+        value, _ = repair_truncated_json(text)
+        assert value == {"components": [{"id": "a"}, {"id": "b"}]}
+
+    def test_drops_partial_scalar(self):
+        value, _ = repair_truncated_json("[1, 2, 3")
+        assert value == [1, 2]
+
+    def test_skips_complete_values_before_the_truncated_one(self):
+        value, _ = repair_truncated_json('Schema {x}. Answer: [{"a": 1}, {"b"')
+        assert value == [{"a": 1}]
+
+    def test_nothing_to_salvage(self):
+        assert repair_truncated_json('[{"a": 1}]') is None
+        assert repair_truncated_json('[{"a": ') is None
+        assert repair_truncated_json("no json") is None
+        assert repair_truncated_json("") is None
+
+    def test_ratio_close_to_one_when_little_is_lost(self):
+        items = [{"id": i} for i in range(100)]
+        text = json.dumps(items)[:-8]
+        value, ratio = repair_truncated_json(text)
+        assert value == items[:-1]
+        assert ratio > 0.95
+
+
+def test_json_repair_stats_snapshot():
+    stats = JSONRepairStats()
+    stats.record("truncated", 0.5)
+    stats.record("truncated", 1.0)
+    stats.record("accepted")
+    snap = stats.snapshot()
+    assert snap["truncated"] == 2
+    assert snap["accepted"] == 1
+    assert snap["mean_salvage_ratio"] == 0.75
+    stats.reset()
+    assert stats.snapshot()["truncated"] == 0
+
+
+def test_repair_never_keeps_half_an_object_inside_an_array():
+    value, _ = repair_truncated_json('{"c": [{"id": "a"}, {"id": "b", "name": "x", "t')
+    assert value == {"c": [{"id": "a"}]}
+    value, _ = repair_truncated_json('{"T1": [1, 2], "T2": [3')
+    assert value == {"T1": [1, 2]}
@@ -0,0 +1,104 @@
+"""Unit tests for app.threat_analysis.llm.memory_cache."""
+
+from unittest.mock import patch
+
+from app.threat_analysis.llm.memory_cache import (
+    INVALIDATION_CHANNEL,
+    CacheInvalidator,
+    CacheTierStats,
+    MemoryLRUCache,
+)
+
+
+class TestMemoryLRUCache:
+    def test_get_set(self):
+        cache = MemoryLRUCache(max_json_bytes=100, ttl_seconds=60)
+        value = {"components": []}
+        cache.set("a", value, 16)
+        # Hits return the decoded object itself (no copy, no json.loads)
+        assert cache.get("a") is value
+        assert cache.get("b") is None
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = MemoryLRUCache(max_json_bytes=10, ttl_seconds=60)
+        cache.set("a", "aa", 4)
+        cache.set("b", "bb", 4)
+        cache.get("a")
+        cache.set("c", "cc", 4)
+        assert cache.get("b") is None
+        assert cache.get("a") == "aa"
+        assert cache.get("c") == "cc"
+        snap = cache.snapshot()
+        assert snap["json_bytes"] == 8
+        assert snap["evictions"] == 1
+
+    def test_overwrite_updates_size(self):
+        cache = MemoryLRUCache(max_json_bytes=100, ttl_seconds=60)
+        cache.set("a", "x", 10)
+        cache.set("a", "x", 20)
+        assert cache.snapshot() == {
+            "entries": 1,
+            "json_bytes": 20,
+            "max_json_bytes": 100,
+            "evictions": 0,
+        }
+
+    def test_value_larger_than_budget_not_stored(self):
+        cache = MemoryLRUCache(max_json_bytes=4, ttl_seconds=60)
+        cache.set("a", "too long", 10)
+        assert cache.get("a") is None
+
+    def test_expired_entry_is_dropped(self):
+        cache = MemoryLRUCache(max_json_bytes=100, ttl_seconds=10)
+        with patch(
+            "app.threat_analysis.llm.memory_cache.time.monotonic", return_value=0.0
+        ):
+            cache.set("a", "v", 3)
+        with patch(
+            "app.threat_analysis.llm.memory_cache.time.monotonic", return_value=11.0
+        ):
+            assert cache.get("a") is None
+        assert cache.snapshot()["json_bytes"] == 0
+
+    def test_disabled_when_budget_is_zero(self):
+        cache = MemoryLRUCache(max_json_bytes=0, ttl_seconds=60)
+        cache.set("a", "v", 3)
+        assert not cache.enabled
+        assert cache.get("a") is None
+
+
+class TestCacheTierStats:
+    def test_hit_rate_per_tier(self):
+        stats = CacheTierStats()
+        stats.record("memory", True)
+        stats.record("memory", False)
+        stats.record("redis", False)
+        snap = stats.snapshot()
+        assert snap["memory"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert snap["redis"]["hit_rate"] == 0.0
+
+
+class TestCacheInvalidator:
+    def test_handle_drops_keys_written_by_other_replicas(self):
+        memory = MemoryLRUCache(max_json_bytes=100, ttl_seconds=60)
+        memory.set("llm:p:1", "v", 3)
+        invalidator = CacheInvalidator("redis://localhost:6379/0", memory)
+        invalidator.handle("other-node|llm:p:1")
+        assert memory.get("llm:p:1") is None
+
+    def test_handle_ignores_own_writes(self):
+        memory = MemoryLRUCache(max_json_bytes=100, ttl_seconds=60)
+        memory.set("llm:p:1", "v", 3)
+        invalidator = CacheInvalidator("redis://localhost:6379/0", memory)
+        invalidator.handle(f"{invalidator._node_id}|llm:p:1")
+        assert memory.get("llm:p:1") == "v"
+
+    def test_publish_sends_node_and_key(self):
+        invalidator = CacheInvalidator(
+            "redis://localhost:6379/0", MemoryLRUCache(100, 60)
+        )
+        with patch.object(invalidator, "_get_client") as get_client:
+            invalidator.publish("llm:p:1")
+        get_client.return_value.publish.assert_called_once_with(
+            INVALIDATION_CHANNEL, f"{invalidator._node_id}|llm:p:1"
+        )
@@ -0,0 +1,112 @@
+"""Unit tests for app.threat_analysis.llm.negative_cache."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+from threat_modeling_shared import AsyncMemoryCacheBackend
+
+from app.threat_analysis.llm.negative_cache import (
+    ProviderNegativeCache,
+    get_negative_cache,
+)
+
+AUTH = {"error": "401 bad key", "error_type": "invalid_api_key"}
+
+
+def _conn(name="OpenAI", model="gpt-x"):
+    conn = MagicMock()
+    conn.name = name
+    conn.model = model
+    return conn
+
+
+def test_provider_failure_skips_provider_until_ttl_expires():
+    cache = ProviderNegativeCache(ttl_seconds=0.05)
+    conn = _conn()
+
+    async def scenario():
+        assert await cache.check(conn) is None
+        assert await cache.record(conn, AUTH) is True
+        assert await cache.check(conn) == "invalid_api_key"
+        await asyncio.sleep(0.06)
+        assert await cache.check(conn) is None
+
+    asyncio.run(scenario())
+
+
+def test_only_provider_level_errors_are_cached():
+    cache = ProviderNegativeCache()
+    conn = _conn()
+
+    async def scenario():
+        for error_type in (
+            "processing_error",
+            "timeout",
+            "rate_limited",
+            "invalid_json",
+        ):
+            result = {"error": "x", "error_type": error_type}
+            assert await cache.record(conn, result) is False
+        assert await cache.check(conn) is None
+        for error_type in ("config", "quota_exhausted", "unreachable"):
+            assert await cache.record(
+                _conn(name=error_type), {"error_type": error_type}
+            )
+
+    asyncio.run(scenario())
+
+
+def test_entries_are_per_provider_and_model():
+    cache = ProviderNegativeCache()
+
+    async def scenario():
+        await cache.record(_conn(model="a"), AUTH)
+        assert await cache.check(_conn(model="b")) is None
+        assert await cache.check(_conn(name="Gemini", model="a")) is None
+
+    asyncio.run(scenario())
+
+
+def test_zero_ttl_disables_cache():
+    cache = ProviderNegativeCache(ttl_seconds=0)
+    conn = _conn()
+    assert cache.enabled is False
+    assert asyncio.run(cache.record(conn, AUTH)) is False
+    assert asyncio.run(cache.check(conn)) is None
+
+
+def test_shared_backend_visible_to_other_replicas():
+    backend = AsyncMemoryCacheBackend()
+
+    async def scenario():
+        await ProviderNegativeCache(backend=backend).record(_conn(), AUTH)
+        replica = ProviderNegativeCache(backend=backend)
+        assert await replica.check(_conn()) == "invalid_api_key"
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_reports_entry_and_counters():
+    cache = ProviderNegativeCache()
+    conn = _conn()
+
+    async def scenario():
+        await cache.record(conn, AUTH)
+        await cache.check(conn)
+        await cache.check(conn)
+        assert await cache.snapshot() == {
+            "OpenAI:gpt-x": {
+                "unavailable": "invalid_api_key",
+                "marked": 1,
+                "skipped": 2,
+            }
+        }
+        await cache.reset()
+        assert await cache.snapshot() == {}
+        assert await cache.check(conn) is None
+
+    asyncio.run(scenario())
+
+
+def test_get_negative_cache_is_singleton():
+    assert get_negative_cache() is get_negative_cache()
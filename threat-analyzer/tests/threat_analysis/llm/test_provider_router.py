@@ -0,0 +1,91 @@
+"""Unit tests for app.threat_analysis.llm.provider_router."""
+
+import random
+from unittest.mock import MagicMock
+
+from app.threat_analysis.llm.provider_router import (
+    AdaptiveProviderRouter,
+    get_provider_router,
+)
+
+
+def _conns(*names):
+    conns = []
+    for name in names:
+        conn = MagicMock()
+        conn.name = name
+        conns.append(conn)
+    return conns
+
+
+def _names(conns):
+    return [c.name for c in conns]
+
+
+def test_order_unchanged_without_data():
+    router = AdaptiveProviderRouter(exploration_rate=0)
+    conns = _conns("Gemini", "OpenAI", "Ollama")
+    assert router.order("stride", conns) == conns
+
+
+def test_order_prefers_faster_reliable_provider_per_stage():
+    router = AdaptiveProviderRouter(exploration_rate=0)
+    router.record("stride", "Gemini", True, 20.0)
+    router.record("stride", "OpenAI", True, 2.0)
+    conns = _conns("Gemini", "OpenAI", "Ollama")
+    assert _names(router.order("stride", conns))[0] == "OpenAI"
+    # Other stages keep the static order
+    assert _names(router.order("dread", conns)) == ["Gemini", "OpenAI", "Ollama"]
+
+
+def test_failures_lower_the_score():
+    router = AdaptiveProviderRouter(alpha=0.5, exploration_rate=0)
+    for _ in range(4):
+        router.record("diagram", "Gemini", False, 1.0)
+    router.record("diagram", "OpenAI", True, 3.0)
+    assert _names(router.order("diagram", _conns("Gemini", "OpenAI")))[0] == "OpenAI"
+
+
+def test_fast_failing_provider_ranks_below_slow_successful_one():
+    router = AdaptiveProviderRouter(exploration_rate=0)
+    for _ in range(3):
+        router.record("stride", "Gemini", False, 0.01)
+    router.record("stride", "OpenAI", True, 20.0)
+    conns = _conns("Gemini", "OpenAI")
+    assert _names(router.order("stride", conns)) == ["OpenAI", "Gemini"]
+    # Fast failures after a success do not shrink the latency estimate either
+    router.record("diagram", "Gemini", True, 2.0)
+    for _ in range(5):
+        router.record("diagram", "Gemini", False, 0.01)
+    router.record("diagram", "OpenAI", True, 10.0)
+    assert _names(router.order("diagram", conns)) == ["OpenAI", "Gemini"]
+    gemini = next(r for r in router.ranking()["diagram"] if r["provider"] == "Gemini")
+    assert gemini["latency_ewma"] == 2.0
+
+
+def test_exploration_promotes_lower_ranked_provider():
+    router = AdaptiveProviderRouter(exploration_rate=1.0, rng=random.Random(0))
+    router.record("stride", "Gemini", True, 1.0)
+    router.record("stride", "OpenAI", True, 10.0)
+    assert _names(router.order("stride", _conns("Gemini", "OpenAI")))[0] == "OpenAI"
+
+
+def test_disabled_keeps_order_but_still_ranks():
+    router = AdaptiveProviderRouter(enabled=False, exploration_rate=0)
+    router.record("stride", "OpenAI", True, 1.0)
+    conns = _conns("Gemini", "OpenAI")
+    assert router.order("stride", conns) == conns
+    ranking = router.ranking()["stride"]
+    assert ranking[0]["provider"] == "OpenAI"
+    assert ranking[0]["samples"] == 1
+
+
+def test_reset_clears_estimates():
+    router = AdaptiveProviderRouter()
+    router.record("stride", "Gemini", True, 1.0)
+    router.reset()
+    assert router.ranking() == {}
+
+
+def test_get_provider_router_is_singleton():
+    assert get_provider_router() is get_provider_router()
@@ -0,0 +1,223 @@
+"""Unit tests for app.threat_analysis.llm.rate_limit."""
+
+import asyncio
+import time
+
+import pytest
+from threat_modeling_shared.cache import MemoryCacheBackend
+
+from app.threat_analysis.llm.rate_limit import (
+    ProviderRateLimiter,
+    RateLimitError,
+    SharedWindowBucket,
+    TokenBucket,
+)
+
+
+class _AsyncMemoryBackend:
+    """Async facade over MemoryCacheBackend (same contract as the Redis backend)."""
+
+    def __init__(self) -> None:
+        self._memory = MemoryCacheBackend()
+
+    async def incr(self, key, amount=1, ttl_seconds=0):
+        return self._memory.incr(key, amount, ttl_seconds)
+
+
+def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    # One unit refills per second
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_refund_and_deadline():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+    acquired = asyncio.run(bucket.acquire(30, deadline=time.monotonic() + 1))
+    assert acquired is False
+    # The rejected reservation was refunded
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_refunds_when_cancelled_while_waiting():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+
+    async def run():
+        task = asyncio.create_task(bucket.acquire(30, deadline=time.monotonic() + 60))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # Only the first reservation is still charged
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_caps_oversized_requests():
+    bucket = TokenBucket(per_minute=10)
+    assert bucket.reserve(1000) == 0.0
+
+
+def test_unlimited_provider_does_not_queue():
+    limiter = ProviderRateLimiter(limits={})
+
+    async def run():
+        async with limiter.slot("Gemini", tokens=10_000) as waited:
+            return waited
+
+    assert asyncio.run(run()) == 0.0
+    assert limiter.snapshot() == {}
+
+
+def test_concurrency_limit_queues_callers():
+    limiter = ProviderRateLimiter(limits={"Gemini": {"concurrency": 1}}, max_wait=1)
+    active = []
+    peak = []
+
+    async def call():
+        async with limiter.slot("Gemini") as waited:
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.02)
+            active.pop()
+            return waited
+
+    async def run():
+        return await asyncio.gather(call(), call(), call())
+
+    waits = asyncio.run(run())
+    assert max(peak) == 1
+    assert max(waits) >= 0.03
+    snap = limiter.snapshot()["Gemini"]
+    assert snap["acquired"] == 3
+    assert snap["in_flight"] == 0
+    assert snap["waiting"] == 0
+    assert snap["queue_wait"]["samples"] == 3
+
+
+def test_concurrency_limit_rejects_after_max_wait():
+    limiter = ProviderRateLimiter(limits={"Gemini": {"concurrency": 1}}, max_wait=0.01)
+
+    async def hold():
+        async with limiter.slot("Gemini"):
+            await asyncio.sleep(0.1)
+
+    async def run():
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitError) as exc_info:
+            async with limiter.slot("Gemini"):
+                pass
+        await holder
+        return exc_info.value
+
+    error = asyncio.run(run())
+    assert error.reason == "concurrency"
+    snap = limiter.snapshot()["Gemini"]
+    assert snap["rejected"] == 1
+    assert snap["in_flight"] == 0
+
+
+def test_rpm_budget_rejects_without_holding_the_slot():
+    limiter = ProviderRateLimiter(
+        limits={"OpenAI": {"concurrency": 1, "rpm": 1}}, max_wait=0.05
+    )
+
+    async def run():
+        async with limiter.slot("OpenAI"):
+            pass
+        with pytest.raises(RateLimitError) as exc_info:
+            async with limiter.slot("OpenAI"):
+                pass
+        return exc_info.value.reason
+
+    assert asyncio.run(run()) == "rpm"
+
+
+def test_tpm_budget_charges_tokens():
+    limiter = ProviderRateLimiter(limits={"OpenAI": {"tpm": 1000}}, max_wait=0.05)
+
+    async def run():
+        async with limiter.slot("OpenAI", tokens=900):
+            pass
+        with pytest.raises(RateLimitError) as exc_info:
+            async with limiter.slot("OpenAI", tokens=500):
+                pass
+        async with limiter.slot("OpenAI", tokens=50):
+            pass
+        return exc_info.value.reason
+
+    assert asyncio.run(run()) == "tpm"
+
+
+def test_rpm_refunded_when_tpm_rejects():
+    limiter = ProviderRateLimiter(
+        limits={"OpenAI": {"rpm": 1, "tpm": 1000}}, max_wait=0.05
+    )
+    limiter._bucket("OpenAI", "tpm", 1000).reserve(1000)
+
+    async def run():
+        with pytest.raises(RateLimitError) as exc_info:
+            async with limiter.slot("OpenAI", tokens=500):
+                pass
+        return exc_info.value.reason
+
+    assert asyncio.run(run()) == "tpm"
+    # The request granted before the tpm rejection was given back
+    assert limiter._bucket("OpenAI", "rpm", 1).reserve(1) == 0.0
+
+
+def test_budget_refunded_when_cancelled_while_queued():
+    limiter = ProviderRateLimiter(limits={"OpenAI": {"rpm": 2, "tpm": 60}}, max_wait=60)
+    rpm = limiter._bucket("OpenAI", "rpm", 2)
+    tpm = limiter._bucket("OpenAI", "tpm", 60)
+
+    async def queued_call():
+        async with limiter.slot("OpenAI", tokens=30):
+            pass
+
+    async def run():
+        tpm.reserve(60)
+        # Takes one rpm unit, then queues ~30s for tpm until cancelled
+        task = asyncio.create_task(queued_call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert rpm.reserve(2) == 0.0
+    assert tpm.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert limiter.snapshot()["OpenAI"]["waiting"] == 0
+
+
+def test_shared_window_bucket_counts_across_limiters():
+    backend = _AsyncMemoryBackend()
+    first = SharedWindowBucket(backend, "llm:ratelimit:Gemini:rpm", per_minute=2)
+    second = SharedWindowBucket(backend, "llm:ratelimit:Gemini:rpm", per_minute=2)
+
+    async def run():
+        deadline = time.monotonic() + 0.01
+        return [
+            await first.acquire(1, deadline),
+            await second.acquire(1, deadline),
+            await second.acquire(1, deadline),
+        ]
+
+    assert asyncio.run(run()) == [True, True, False]
+
+
+def test_shared_window_bucket_release_gives_budget_back():
+    backend = _AsyncMemoryBackend()
+    bucket = SharedWindowBucket(backend, "llm:ratelimit:Gemini:tpm", per_minute=100)
+
+    async def run():
+        deadline = time.monotonic() + 0.01
+        assert await bucket.acquire(80, deadline) is True
+        await bucket.release(80, time.time())
+        return await bucket.acquire(80, deadline)
+
+    assert asyncio.run(run()) is True
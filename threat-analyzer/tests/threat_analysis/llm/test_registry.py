@@ -0,0 +1,59 @@
+"""Unit tests for app.threat_analysis.llm.registry."""
+
+from unittest.mock import MagicMock, patch
+
+from app.config import Settings
+from app.threat_analysis.llm.gemini_connection import GeminiConnection
+from app.threat_analysis.llm.ollama_connection import OllamaConnection
+from app.threat_analysis.llm.openai_connection import OpenAIConnection
+from app.threat_analysis.llm.registry import (
+    ConnectionRegistry,
+    get_connection_registry,
+)
+
+
+def test_get_returns_same_instance_per_class_and_model():
+    registry = ConnectionRegistry()
+    settings = Settings(google_api_key="k", primary_model="gemini-x")
+    first = registry.get(GeminiConnection, settings)
+    second = registry.get(GeminiConnection, settings)
+    assert first is second
+    assert first.model == "gemini-x"
+
+
+def test_get_distinguishes_models():
+    registry = ConnectionRegistry()
+    a = registry.get(OpenAIConnection, Settings(fallback_model="gpt-a"))
+    b = registry.get(OpenAIConnection, Settings(fallback_model="gpt-b"))
+    assert a is not b
+
+
+def test_warm_skips_unconfigured_without_building():
+    registry = ConnectionRegistry()
+    settings = Settings(google_api_key=None, openai_api_key=None)
+    with (
+        patch.object(GeminiConnection, "_ensure_llm") as gemini_llm,
+        patch.object(OpenAIConnection, "_ensure_llm") as openai_llm,
+        patch.object(
+            OllamaConnection, "_ensure_llm", return_value=MagicMock()
+        ) as ollama_llm,
+    ):
+        warmed = registry.warm(
+            [GeminiConnection, OpenAIConnection, OllamaConnection], settings
+        )
+    assert warmed == ["Ollama"]
+    gemini_llm.assert_not_called()
+    openai_llm.assert_not_called()
+    ollama_llm.assert_called_once()
+
+
+def test_clear_drops_connections():
+    registry = ConnectionRegistry()
+    settings = Settings()
+    first = registry.get(OllamaConnection, settings)
+    registry.clear()
+    assert registry.get(OllamaConnection, settings) is not first
+
+
+def test_get_connection_registry_is_singleton():
+    assert get_connection_registry() is get_connection_registry()
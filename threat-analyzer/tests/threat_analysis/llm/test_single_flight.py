@@ -0,0 +1,240 @@
+"""Unit tests for app.threat_analysis.llm.single_flight."""
+
+import asyncio
+
+from threat_modeling_shared import MemoryCacheBackend
+
+from app.threat_analysis.llm.single_flight import SingleFlight
+from app.threat_analysis.llm.usage import record_usage, track_usage
+
+
+class _AsyncMemoryBackend:
+    """Async wrapper over MemoryCacheBackend (stands in for Redis leases)."""
+
+    def __init__(self):
+        self._sync = MemoryCacheBackend()
+
+    async def get(self, key):
+        return self._sync.get(key)
+
+    async def set(self, key, value, ttl_seconds=0):
+        self._sync.set(key, value, ttl_seconds)
+
+    async def set_if_absent(self, key, value, ttl_seconds=0):
+        return self._sync.set_if_absent(key, value, ttl_seconds)
+
+    async def delete(self, key):
+        self._sync.delete(key)
+
+    async def delete_if_equal(self, key, value):
+        return self._sync.delete_if_equal(key, value)
+
+
+def _counting_compute(calls, result=None, delay=0.01):
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result or {"ok": True}
+
+    return compute
+
+
+async def _no_cache():
+    return None
+
+
+class TestSingleFlightLocal:
+    def test_concurrent_identical_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def run_all():
+            compute = _counting_compute(calls)
+            return await asyncio.gather(
+                *(flight.run("k", compute, _no_cache) for _ in range(3))
+            )
+
+        results = asyncio.run(run_all())
+        assert results == [{"ok": True}] * 3
+        assert len(calls) == 1
+        snap = flight.snapshot()
+        assert snap["leaders"] == 1
+        assert snap["local_waiters"] == 2
+        assert snap["in_flight"] == 0
+
+    def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def run_all():
+            compute = _counting_compute(calls)
+            await asyncio.gather(
+                flight.run("a", compute, _no_cache),
+                flight.run("b", compute, _no_cache),
+            )
+
+        asyncio.run(run_all())
+        assert len(calls) == 2
+
+    def test_disabled_runs_every_call(self):
+        flight = SingleFlight(enabled=False)
+        calls = []
+
+        async def run_all():
+            compute = _counting_compute(calls)
+            await asyncio.gather(
+                *(flight.run("k", compute, _no_cache) for _ in range(2))
+            )
+
+        asyncio.run(run_all())
+        assert len(calls) == 2
+
+    def test_exception_reaches_all_callers(self):
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def run_all():
+            return await asyncio.gather(
+                flight.run("k", failing, _no_cache),
+                flight.run("k", failing, _no_cache),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run_all())
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_cancelled_caller_does_not_cancel_shared_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def scenario():
+            compute = _counting_compute(calls, delay=0.05)
+            first = asyncio.ensure_future(flight.run("k", compute, _no_cache))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(flight.run("k", compute, _no_cache))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == {"ok": True}
+        assert len(calls) == 1
+
+    def test_shared_call_cancelled_when_every_caller_is_cancelled(self):
+        flight = SingleFlight()
+        finished = []
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+            return {"ok": True}
+
+        async def scenario():
+            callers = [
+                asyncio.ensure_future(flight.run("k", compute, _no_cache))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0.08)
+            return flight.snapshot()["in_flight"]
+
+        assert asyncio.run(scenario()) == 0
+        assert finished == []
+
+    def test_usage_charged_to_the_caller_that_started_the_call(self):
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            record_usage(
+                "Gemini", "m", {"input_tokens": 10, "output_tokens": 5}, "", "", 0.1
+            )
+            return {"ok": True}
+
+        async def caller():
+            with track_usage() as tracker:
+                await flight.run("k", compute, _no_cache)
+            return tracker.summary()["total"]["calls"]
+
+        async def run_all():
+            return await asyncio.gather(caller(), caller())
+
+        assert asyncio.run(run_all()) == [1, 0]
+
+
+class TestSingleFlightShared:
+    def test_waits_for_result_of_other_process(self):
+        backend = _AsyncMemoryBackend()
+        flight = SingleFlight(backend=backend, poll_interval=0.01)
+        cache = {}
+        calls = []
+
+        async def lookup():
+            return cache.get("result")
+
+        async def scenario():
+            # Another process holds the lease and stores its result shortly after
+            await backend.set_if_absent("llm:inflight:k", "1", ttl_seconds=5)
+
+            async def other_process():
+                await asyncio.sleep(0.03)
+                cache["result"] = {"from": "leader"}
+                await backend.delete("llm:inflight:k")
+
+            asyncio.ensure_future(other_process())
+            return await flight.run("k", _counting_compute(calls), lookup)
+
+        assert asyncio.run(scenario()) == {"from": "leader"}
+        assert calls == []
+        assert flight.snapshot()["remote_waiters"] == 1
+
+    def test_runs_itself_when_lease_released_without_result(self):
+        backend = _AsyncMemoryBackend()
+        flight = SingleFlight(backend=backend, poll_interval=0.01)
+        calls = []
+
+        async def scenario():
+            await backend.set_if_absent("llm:inflight:k", "1", ttl_seconds=0.03)
+            return await flight.run("k", _counting_compute(calls), _no_cache)
+
+        assert asyncio.run(scenario()) == {"ok": True}
+        assert len(calls) == 1
+
+    def test_lease_released_after_leader_finishes(self):
+        backend = _AsyncMemoryBackend()
+        flight = SingleFlight(backend=backend)
+
+        asyncio.run(flight.run("k", _counting_compute([]), _no_cache))
+        assert backend._sync.get("llm:inflight:k") is None
+
+    def test_expired_lease_taken_over_is_not_released_by_old_leader(self):
+        backend = _AsyncMemoryBackend()
+        flight = SingleFlight(backend=backend, lease_seconds=0.02)
+
+        async def scenario():
+            async def other_process():
+                # The slow leader's lease expires and another leader takes over
+                await asyncio.sleep(0.04)
+                assert await backend.set_if_absent("llm:inflight:k", "other", 5)
+
+            asyncio.ensure_future(other_process())
+            await flight.run("k", _counting_compute([], delay=0.08), _no_cache)
+
+        asyncio.run(scenario())
+        assert backend._sync.get("llm:inflight:k") == "other"
+
+    def test_leader_rechecks_cache_after_acquiring_lease(self):
+        flight = SingleFlight(backend=_AsyncMemoryBackend())
+        calls = []
+
+        async def lookup():
+            return {"cached": True}
+
+        result = asyncio.run(flight.run("k", _counting_compute(calls), lookup))
+        assert result == {"cached": True}
+        assert calls == []
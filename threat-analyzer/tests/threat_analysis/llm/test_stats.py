@@ -0,0 +1,38 @@
+"""Unit tests for app.threat_analysis.llm.stats."""
+
+from app.threat_analysis.llm.stats import ProviderStats, get_provider_stats
+
+
+def test_record_and_snapshot():
+    stats = ProviderStats()
+    stats.record("Gemini", "win", 1.0)
+    stats.record("Gemini", "loss", 3.0)
+    stats.record("Gemini", "cancelled", None)
+    snapshot = stats.snapshot()["Gemini"]
+    assert snapshot["wins"] == 1
+    assert snapshot["losses"] == 1
+    assert snapshot["cancelled"] == 1
+    assert snapshot["win_rate"] == 0.5
+    assert snapshot["latency"]["samples"] == 2
+    assert snapshot["latency"]["mean"] == 2.0
+    assert snapshot["latency"]["p99"] == 3.0
+
+
+def test_latency_window_is_bounded():
+    stats = ProviderStats(window=3)
+    for i in range(10):
+        stats.record("OpenAI", "win", float(i))
+    latency = stats.snapshot()["OpenAI"]["latency"]
+    assert latency["samples"] == 3
+    assert latency["p50"] == 8.0
+
+
+def test_reset_clears_everything():
+    stats = ProviderStats()
+    stats.record("Ollama", "loss", 0.5)
+    stats.reset()
+    assert stats.snapshot() == {}
+
+
+def test_get_provider_stats_is_singleton():
+    assert get_provider_stats() is get_provider_stats()
@@ -0,0 +1,70 @@
+"""Unit tests for app.threat_analysis.llm.streaming."""
+
+import json
+
+from app.threat_analysis.llm.streaming import JSONArrayStreamParser
+
+
+def _feed_all(parser, chunks):
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+class TestJSONArrayStreamParser:
+    def test_yields_each_element_when_complete(self):
+        parser = JSONArrayStreamParser()
+        assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+        assert parser.feed(": 2}") == [{"b": 2}]
+        assert not parser.done
+        assert parser.feed("]") == []
+        assert parser.done
+
+    def test_character_by_character(self):
+        threats = [
+            {"component_id": "c1", "threat_type": "Spoofing", "nested": {"x": [1]}},
+            {"component_id": "c2", "description": "uses } and { and ]"},
+        ]
+        text = json.dumps(threats)
+        assert _feed_all(JSONArrayStreamParser(), list(text)) == threats
+
+    def test_ignores_fences_and_prose(self):
+        chunks = ["Here you go:\n```json\n[", '{"a": 1}', "]\n```\nDone {x}"]
+        parser = JSONArrayStreamParser()
+        assert _feed_all(parser, chunks) == [{"a": 1}]
+        assert parser.done
+
+    def test_skips_brackets_in_prose_preamble(self):
+        chunks = ["Here are the threats [STRIDE", "]: [", "\n  ", '{"a": 1}', "]"]
+        parser = JSONArrayStreamParser()
+        assert _feed_all(parser, chunks) == [{"a": 1}]
+        assert parser.done
+
+    def test_empty_array_is_done(self):
+        parser = JSONArrayStreamParser()
+        assert _feed_all(parser, ["Note [1]: none found\n", "[ ", "]"]) == []
+        assert parser.done
+
+    def test_escaped_quotes_in_strings(self):
+        text = r'[{"d": "say \"}\" now"}, {"e": "back\\"}]'
+        assert _feed_all(JSONArrayStreamParser(), [text[:12], text[12:]]) == [
+            {"d": 'say "}" now'},
+            {"e": "back\\"},
+        ]
+
+    def test_malformed_element_is_skipped(self):
+        parser = JSONArrayStreamParser()
+        items = parser.feed('[{"a": 1,}, {"b": 2}]')
+        assert items == [{"b": 2}]
+        assert parser.items_parsed == 1
+
+    def test_not_done_when_truncated(self):
+        parser = JSONArrayStreamParser()
+        assert parser.feed('[{"a": 1}, {"b": ') == [{"a": 1}]
+        assert not parser.done
+
+    def test_feed_after_done_is_ignored(self):
+        parser = JSONArrayStreamParser()
+        parser.feed("[]")
+        assert parser.feed('[{"a": 1}]') == []
@@ -0,0 +1,79 @@
+"""Unit tests for app.threat_analysis.llm.structured and the provider bindings."""
+
+from types import SimpleNamespace
+
+from langchain_core.messages import HumanMessage
+
+from app.threat_analysis.llm import (
+    GeminiConnection,
+    OllamaConnection,
+    OpenAIConnection,
+    response_schema,
+    response_schema_for,
+)
+from app.threat_analysis.schemas import DiagramData, StrideThreat
+
+
+def _settings(**overrides):
+    values = {
+        "primary_model": "gemini-2.5-flash",
+        "fallback_model": "gpt-4o-mini",
+        "ollama_model": "llama3",
+        "ollama_base_url": "http://localhost:11434",
+        "llm_temperature": 0.0,
+        "google_api_key": "test-key",
+        "openai_api_key": "test-key",
+    }
+    return SimpleNamespace(**{**values, **overrides})
+
+
+def test_response_schema_uses_aliases_and_is_cached():
+    schema = response_schema(DiagramData)
+    connection = schema["$defs"]["Connection"]["properties"]
+    assert {"from", "to"} <= set(connection)
+    assert response_schema(DiagramData) is schema
+
+
+def test_response_schema_for_is_opt_in():
+    assert response_schema_for(_settings(), DiagramData) is None
+    assert response_schema_for(
+        _settings(llm_structured_output=True), DiagramData
+    ) == response_schema(DiagramData)
+
+
+def test_gemini_binds_json_mime_type_and_schema():
+    conn = GeminiConnection(_settings())
+    schema = response_schema(DiagramData)
+    bound = conn._bind_response_schema(conn._ensure_llm(), schema)
+    assert bound.kwargs == {
+        "response_mime_type": "application/json",
+        "response_json_schema": schema,
+    }
+
+
+def test_ollama_binds_format():
+    conn = OllamaConnection(_settings())
+    schema = response_schema(DiagramData)
+    bound = conn._bind_response_schema(conn._ensure_llm(), schema)
+    params = conn._ensure_llm()._chat_params([HumanMessage("x")], **bound.kwargs)
+    assert params["format"] == schema
+
+
+def test_openai_wraps_array_schema_in_object_and_unwraps_answer():
+    conn = OpenAIConnection(_settings())
+    schema = response_schema(list[StrideThreat])
+    bound = conn._bind_response_schema(conn._ensure_llm(), schema)
+    sent = bound.kwargs["response_format"]["json_schema"]["schema"]
+    assert sent["type"] == "object"
+    assert sent["properties"]["items"]["type"] == "array"
+    assert "$defs" in sent and "$defs" not in sent["properties"]["items"]
+    threats = [{"component_id": "api"}]
+    assert conn._structured_value({"items": threats}, schema) == threats
+
+
+def test_openai_keeps_object_schema_unwrapped():
+    conn = OpenAIConnection(_settings())
+    schema = response_schema(DiagramData)
+    bound = conn._bind_response_schema(conn._ensure_llm(), schema)
+    assert bound.kwargs["response_format"]["json_schema"]["schema"] is schema
+    assert conn._structured_value({"items": []}, schema) == {"items": []}
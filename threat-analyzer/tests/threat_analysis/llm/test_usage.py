@@ -0,0 +1,113 @@
+"""Unit tests for app.threat_analysis.llm.usage."""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.threat_analysis.llm.usage import (
+    IMAGE_TOKENS_ESTIMATE,
+    UsageTracker,
+    estimate_tokens,
+    extract_usage,
+    get_usage_stats,
+    record_partial,
+    record_usage,
+    token_cost,
+    track_usage,
+    usage_stage,
+    watch_partial,
+)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+class TestExtractUsage:
+    def test_usage_metadata(self):
+        msg = SimpleNamespace(
+            usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+        )
+        assert extract_usage(msg) == {"input_tokens": 10, "output_tokens": 5}
+
+    def test_openai_token_usage(self):
+        msg = SimpleNamespace(
+            usage_metadata=None,
+            response_metadata={
+                "token_usage": {"prompt_tokens": 7, "completion_tokens": 3}
+            },
+        )
+        assert extract_usage(msg) == {"input_tokens": 7, "output_tokens": 3}
+
+    def test_ollama_eval_counts(self):
+        msg = SimpleNamespace(
+            response_metadata={"prompt_eval_count": 4, "eval_count": 2}
+        )
+        assert extract_usage(msg) == {"input_tokens": 4, "output_tokens": 2}
+
+    def test_missing(self):
+        assert extract_usage(SimpleNamespace(content="x")) is None
+
+
+def test_token_cost_uses_configured_prices():
+    prices = {"m": {"input": 1.0, "output": 2.0}}
+    with patch("app.threat_analysis.llm.usage.get_settings") as get_settings:
+        get_settings.return_value.llm_token_costs = prices
+        assert token_cost("m", 1_000_000, 500_000) == 2.0
+        assert token_cost("other", 1_000_000, 0) == 0.0
+
+
+class TestRecordUsage:
+    def setup_method(self):
+        get_usage_stats().reset()
+
+    def test_estimates_when_usage_missing(self):
+        record = record_usage("Gemini", "m", None, "abcd" * 10, "xy", 0.5, images=1)
+        assert record["estimated"] is True
+        assert record["input_tokens"] == 10 + IMAGE_TOKENS_ESTIMATE
+        assert record["output_tokens"] == 1
+
+    def test_attributed_to_stage_and_tracker(self):
+        with track_usage() as tracker, usage_stage("stride"):
+            record_usage(
+                "OpenAI", "m", {"input_tokens": 100, "output_tokens": 50}, "", "", 2.0
+            )
+        record_usage(
+            "OpenAI", "m", {"input_tokens": 1, "output_tokens": 1}, "", "", 0.1
+        )
+        summary = tracker.summary()
+        assert summary["total"]["total_tokens"] == 150
+        assert summary["by_stage"]["stride"]["calls"] == 1
+        assert summary["by_provider"]["OpenAI"]["seconds_per_1k_output_tokens"] == 40.0
+        totals = get_usage_stats().summary()
+        assert totals["total"]["calls"] == 2
+        assert set(totals["by_stage"]) == {"stride", "unknown"}
+
+    def test_explicit_stage_overrides_context(self):
+        with usage_stage("diagram"):
+            record = record_usage("Gemini", "m", None, "", "", 0.0, stage="guardrail")
+        assert record["stage"] == "guardrail"
+
+
+def test_tracker_can_be_reused_across_blocks():
+    tracker = UsageTracker()
+    for _ in range(2):
+        with track_usage(tracker):
+            record_usage(
+                "Gemini", "m", {"input_tokens": 1, "output_tokens": 1}, "", "", 0.0
+            )
+    assert tracker.summary()["total"]["calls"] == 2
+
+
+def test_partial_answers_reported_per_stage():
+    get_usage_stats().reset()
+    with track_usage() as tracker, watch_partial() as watched, usage_stage("dread"):
+        record_partial("Gemini", 0.9, 8)
+        record_partial("OpenAI", 0.85, 5)
+    record_partial("Gemini", 0.5, 1)
+    assert tracker.summary()["partial"] == {
+        "dread": {"calls": 2, "elements": 13, "min_salvage_ratio": 0.85}
+    }
+    assert [r["provider"] for r in watched] == ["Gemini", "OpenAI"]
+    assert get_usage_stats().summary()["partial"]["unknown"]["calls"] == 1
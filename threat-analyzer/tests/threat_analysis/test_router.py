@@ -27,6 +27,13 @@ def override_service_with_mock():
     mock_service = ThreatModelService(get_settings())
     mock_service.run_full_analysis = AsyncMock(return_value=mock_response)
 
+    async def _stream(_image_bytes, **_kwargs):
+        yield "diagram", {"components": [], "connections": []}
+        yield "threat", {"component_id": "c1", "threat_type": "Spoofing"}
+        yield "result", mock_response
+
+    mock_service.stream_full_analysis = _stream
+
     def _get_service():
         return mock_service
 
@@ -77,3 +84,27 @@ class TestAnalyzeEndpoint:
         assert r.status_code == 400
         data = r.json()
         assert "Empty" in data.get("detail", "")
+
+
+class TestAnalyzeStreamEndpoint:
+    def test_streams_sse_events(self, client, sample_png):
+        r = client.post(
+            "/api/v1/threat-model/analyze/stream",
+            files={"file": ("diagram.png", BytesIO(sample_png), "image/png")},
+        )
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = [
+            line.removeprefix("event: ")
+            for line in r.text.splitlines()
+            if line.startswith("event: ")
+        ]
+        assert events == ["diagram", "threat", "result"]
+        assert '"risk_level": "LOW"' in r.text
+
+    def test_invalid_file_type_is_http_error(self, client, sample_png):
+        r = client.post(
+            "/api/v1/threat-model/analyze/stream",
+            files={"file": ("diagram.txt", BytesIO(sample_png), "text/plain")},
+        )
+        assert r.status_code == 400
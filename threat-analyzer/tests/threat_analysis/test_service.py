@@ -6,6 +6,14 @@ from unittest.mock import AsyncMock, patch
 import pytest
 
 from app.config import get_settings
+from app.threat_analysis.exceptions import ArchitectureDiagramValidationError
+from app.threat_analysis.llm import PreparedImage, content_digest
+from app.threat_analysis.llm.usage import (
+    UsageTracker,
+    record_partial,
+    track_usage,
+    usage_stage,
+)
 from app.threat_analysis.service import ThreatModelService
 
 
@@ -65,11 +73,256 @@ class TestThreatModelService:
             DreadCls.return_value.analyze = mock_dread
             result = asyncio.run(service.run_full_analysis(sample_png_bytes))
         assert result.model_used == "test-model"
+        assert result.usage is not None
+        mock_diagram.assert_awaited_once()
+        (image,), kwargs = mock_diagram.await_args
+        assert isinstance(image, PreparedImage)
+        assert image.data == sample_png_bytes
+        assert image.mime_type == "image/png"
+        assert kwargs == {
+            "image_digest": content_digest(sample_png_bytes),
+            "detections": [],
+            "source": sample_png_bytes,
+        }
         assert result.risk_score >= 0 and result.risk_score <= 10
         assert result.risk_level is not None
         assert result.threat_count == 1
         assert result.component_count == 1
 
+    def test_stream_full_analysis_events(self, sample_png_bytes):
+        service = ThreatModelService(get_settings())
+        diagram_data = {"model": "m", "components": [], "connections": []}
+        threats = [
+            {
+                "component_id": "c1",
+                "threat_type": "Spoofing",
+                "description": "d",
+                "mitigation": "m",
+                "dread_score": 6.0,
+            }
+        ]
+
+        async def fake_astream(_diagram):
+            for threat in threats:
+                yield threat
+
+        async def collect():
+            return [e async for e in service.stream_full_analysis(sample_png_bytes)]
+
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                new_callable=AsyncMock,
+            ),
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+            patch("app.threat_analysis.service.StrideAgent") as stride_cls,
+            patch("app.threat_analysis.service.DreadAgent") as dread_cls,
+        ):
+            diagram_cls.return_value.analyze = AsyncMock(return_value=diagram_data)
+            stride_cls.return_value.astream = fake_astream
+            dread_cls.return_value.analyze = AsyncMock(return_value=threats)
+            events = asyncio.run(collect())
+        assert [name for name, _ in events] == ["diagram", "threat", "result"]
+        assert events[1][1] == threats[0]
+        assert events[2][1].risk_score == 6.0
+
+    def test_speculative_mode_overlaps_guardrail_and_diagram(self, sample_png_bytes):
+        settings = get_settings().model_copy(update={"guardrail_speculative": True})
+        service = ThreatModelService(settings)
+        started = []
+
+        async def guardrail(*args, **kwargs):
+            started.append("guardrail")
+            await asyncio.sleep(0.02)
+            assert "diagram" in started
+
+        async def diagram(*args, **kwargs):
+            started.append("diagram")
+            return {"model": "m", "components": [], "connections": []}
+
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                side_effect=guardrail,
+            ),
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+            patch("app.threat_analysis.service.StrideAgent") as stride_cls,
+            patch("app.threat_analysis.service.DreadAgent") as dread_cls,
+        ):
+            diagram_cls.return_value.analyze = diagram
+            stride_cls.return_value.analyze = AsyncMock(return_value=[])
+            dread_cls.return_value.analyze = AsyncMock(return_value=[])
+            result = asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert result.model_used == "m"
+
+    def test_speculative_diagram_cancelled_when_guardrail_rejects(
+        self, sample_png_bytes
+    ):
+        settings = get_settings().model_copy(update={"guardrail_speculative": True})
+        service = ThreatModelService(settings)
+        diagram_states = []
+
+        async def guardrail(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            raise ArchitectureDiagramValidationError(reason="not a diagram")
+
+        async def diagram(*args, **kwargs):
+            diagram_states.append("started")
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                diagram_states.append("cancelled")
+                raise
+
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                side_effect=guardrail,
+            ),
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+        ):
+            diagram_cls.return_value.analyze = diagram
+            with pytest.raises(ArchitectureDiagramValidationError):
+                asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert diagram_states == ["started", "cancelled"]
+
+    def test_combined_mode_uses_one_call_and_strips_verdict(self, sample_png_bytes):
+        settings = get_settings().model_copy(update={"guardrail_combined": True})
+        service = ThreatModelService(settings)
+        combined = {
+            "is_architecture_diagram": True,
+            "reason": "servers",
+            "model": "m",
+            "components": [],
+            "connections": [],
+        }
+        guardrail = AsyncMock()
+        mock_stride = AsyncMock(return_value=[])
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram", guardrail
+            ),
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+            patch("app.threat_analysis.service.StrideAgent") as stride_cls,
+            patch("app.threat_analysis.service.DreadAgent") as dread_cls,
+        ):
+            diagram_cls.return_value.analyze_with_guardrail = AsyncMock(
+                return_value=combined
+            )
+            stride_cls.return_value.analyze = mock_stride
+            dread_cls.return_value.analyze = AsyncMock(return_value=[])
+            result = asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert result.model_used == "m"
+        guardrail.assert_not_awaited()
+        mock_stride.assert_awaited_once_with(
+            {"model": "m", "components": [], "connections": []}
+        )
+
+    def test_combined_mode_raises_when_verdict_rejects(self, sample_png_bytes):
+        settings = get_settings().model_copy(update={"guardrail_combined": True})
+        service = ThreatModelService(settings)
+        with patch("app.threat_analysis.service.DiagramAgent") as diagram_cls:
+            diagram_cls.return_value.analyze_with_guardrail = AsyncMock(
+                return_value={
+                    "is_architecture_diagram": False,
+                    "reason": "a photo",
+                    "components": [],
+                }
+            )
+            with pytest.raises(ArchitectureDiagramValidationError) as exc_info:
+                asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert "a photo" in exc_info.value.reason
+
+    def test_prefilter_rejection_skips_llm_guardrail(self, sample_png_bytes):
+        settings = get_settings().model_copy(
+            update={"guardrail_prefilter_enabled": True}
+        )
+        service = ThreatModelService(settings)
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                new_callable=AsyncMock,
+            ) as guardrail,
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+        ):
+            # 1x1 PNG: too small for a diagram
+            with pytest.raises(ArchitectureDiagramValidationError) as exc_info:
+                asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert "too small" in exc_info.value.reason
+        guardrail.assert_not_awaited()
+        diagram_cls.return_value.analyze.assert_not_called()
+
+    def test_detections_reach_the_diagram_stage(self, sample_png_bytes):
+        settings = get_settings().model_copy(update={"detection_enabled": True})
+        service = ThreatModelService(settings)
+        detections = [{"label": "db", "confidence": 0.9, "box": [0, 0, 1, 1]}]
+        mock_diagram = AsyncMock(
+            return_value={"model": "m", "components": [], "connections": []}
+        )
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                new_callable=AsyncMock,
+            ),
+            patch(
+                "app.threat_analysis.service.detect_components",
+                new_callable=AsyncMock,
+                return_value=detections,
+            ) as detect,
+            patch("app.threat_analysis.service.DiagramAgent") as diagram_cls,
+            patch("app.threat_analysis.service.StrideAgent") as stride_cls,
+            patch("app.threat_analysis.service.DreadAgent") as dread_cls,
+        ):
+            diagram_cls.return_value.analyze = mock_diagram
+            stride_cls.return_value.analyze = AsyncMock(return_value=[])
+            dread_cls.return_value.analyze = AsyncMock(return_value=[])
+            asyncio.run(
+                service.run_full_analysis(sample_png_bytes, confidence=0.4, iou=0.5)
+            )
+        (_image, _settings, confidence, iou), _ = detect.await_args
+        assert (confidence, iou) == (0.4, 0.5)
+        assert mock_diagram.await_args.kwargs["detections"] == detections
+
+    def test_detection_cancelled_when_guardrail_rejects(self, sample_png_bytes):
+        settings = get_settings().model_copy(update={"detection_enabled": True})
+        service = ThreatModelService(settings)
+        states = []
+
+        async def guardrail(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            raise ArchitectureDiagramValidationError(reason="not a diagram")
+
+        async def detect(*args, **kwargs):
+            states.append("started")
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                states.append("cancelled")
+                raise
+
+        with (
+            patch(
+                "app.threat_analysis.service.validate_architecture_diagram",
+                side_effect=guardrail,
+            ),
+            patch("app.threat_analysis.service.detect_components", side_effect=detect),
+            patch("app.threat_analysis.service.DiagramAgent"),
+        ):
+            with pytest.raises(ArchitectureDiagramValidationError):
+                asyncio.run(service.run_full_analysis(sample_png_bytes))
+        assert states == ["started", "cancelled"]
+
+    def test_response_flags_partial_answers(self):
+        service = ThreatModelService(get_settings())
+        usage = UsageTracker()
+        diagram = {"model": "m", "components": [], "connections": []}
+        assert service._build_response(diagram, [], 0.0, usage).partial is False
+        with track_usage(usage), usage_stage("stride"):
+            record_partial("Gemini", 0.85, 4)
+        response = service._build_response(diagram, [], 0.0, usage)
+        assert response.partial is True
+        assert response.usage.partial["stride"].elements == 4
+
     def test_calculate_risk_score_empty(self):
         settings = get_settings()
         service = ThreatModelService(settings)
@@ -1,6 +1,15 @@
 """Threat Modeling AI - Shared FastAPI utilities."""
 
-from threat_modeling_shared.cache import CacheBackend, RedisCacheBackend, get_cache_backend
+from threat_modeling_shared.cache import (
+    AsyncCacheBackend,
+    AsyncMemoryCacheBackend,
+    AsyncRedisCacheBackend,
+    CacheBackend,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    get_async_cache_backend,
+    get_cache_backend,
+)
 from threat_modeling_shared.config import BaseSettings, parse_cors_origins
 from threat_modeling_shared.database import (
     Base,
@@ -13,13 +22,18 @@ from threat_modeling_shared.exceptions import ConfigError
 from threat_modeling_shared.setup_api import create_app
 
 __all__ = [
+    "AsyncCacheBackend",
+    "AsyncMemoryCacheBackend",
+    "AsyncRedisCacheBackend",
     "Base",
     "BaseSettings",
     "CacheBackend",
     "ConfigError",
+    "MemoryCacheBackend",
     "RedisCacheBackend",
     "create_app",
     "db_check",
+    "get_async_cache_backend",
     "get_cache_backend",
     "get_db_generator",
     "get_engine",
@@ -1,7 +1,17 @@
 """Cache abstraction — backend-agnostic (e.g. Redis). Swap implementation without changing callers."""
 
+import asyncio
+import threading
+import time
 from typing import Any, Protocol
 
+# Compare-and-delete in one round-trip, so a lease that expired and was taken
+# by another owner is never removed by the previous one
+_DELETE_IF_EQUAL_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
 
 class CacheBackend(Protocol):
     """Protocol for cache backends (Redis, memory, etc.)."""
@@ -10,10 +20,54 @@ class CacheBackend(Protocol):
         """Return value for key or None if missing."""
         ...
 
-    def set(self, key: str, value: str, ttl_seconds: int = 0) -> None:
+    def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
+        """Store value for key. ttl_seconds=0 means no expiry."""
+        ...
+
+    def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        """Store value only if key is missing (lease/lock). Return True if stored."""
+        ...
+
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+        ...
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        """Remove key only if it holds value (release an owned lease). True if removed."""
+        ...
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        """Add amount to an integer counter (created at 0) and return the new value."""
+        ...
+
+
+class AsyncCacheBackend(Protocol):
+    """Protocol for asyncio-native cache backends (same contract, awaitable)."""
+
+    async def get(self, key: str) -> str | None:
+        """Return value for key or None if missing."""
+        ...
+
+    async def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
         """Store value for key. ttl_seconds=0 means no expiry."""
         ...
 
+    async def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        """Store value only if key is missing (lease/lock). Return True if stored."""
+        ...
+
+    async def delete(self, key: str) -> None:
+        """Remove key if present."""
+        ...
+
+    async def delete_if_equal(self, key: str, value: str) -> bool:
+        """Remove key only if it holds value (release an owned lease). True if removed."""
+        ...
+
+    async def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        """Add amount to an integer counter (created at 0) and return the new value."""
+        ...
+
 
 class RedisCacheBackend:
     """Redis-backed cache. Requires 'redis' package."""
@@ -39,17 +93,213 @@ class RedisCacheBackend:
         except Exception:
             return None
 
-    def set(self, key: str, value: str, ttl_seconds: int = 0) -> None:
+    def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
         try:
             client = self._get_client()
             if ttl_seconds > 0:
-                client.setex(key, ttl_seconds, value)
+                client.psetex(key, int(ttl_seconds * 1000), value)
             else:
                 client.set(key, value)
         except Exception:
             pass
 
+    def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        """SET NX (with PX expiry when ttl_seconds > 0). Fails open (True) if Redis is down."""
+        try:
+            px = int(ttl_seconds * 1000) if ttl_seconds > 0 else None
+            return bool(self._get_client().set(key, value, nx=True, px=px))
+        except Exception:
+            return True
+
+    def delete(self, key: str) -> None:
+        try:
+            self._get_client().delete(key)
+        except Exception:
+            pass
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        """Atomic GET + DEL (Lua). False if Redis is down (the key then expires)."""
+        try:
+            return bool(self._get_client().eval(_DELETE_IF_EQUAL_SCRIPT, 1, key, value))
+        except Exception:
+            return False
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        """INCRBY (+ PEXPIRE when ttl_seconds > 0). Fails open (0) if Redis is down."""
+        try:
+            pipe = self._get_client().pipeline()
+            pipe.incrby(key, amount)
+            if ttl_seconds > 0:
+                pipe.pexpire(key, int(ttl_seconds * 1000))
+            return int(pipe.execute()[0])
+        except Exception:
+            return 0
+
+
+class MemoryCacheBackend:
+    """In-process cache with per-key expiry. Same contract as RedisCacheBackend, not shared."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._store: dict[str, tuple[str, float | None]] = {}
+
+    def _alive(self, key: str, now: float) -> tuple[str, float | None] | None:
+        entry = self._store.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._store[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
+        with self._lock:
+            expires = time.monotonic() + ttl_seconds if ttl_seconds > 0 else None
+            self._store[key] = (value, expires)
+
+    def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._alive(key, now) is not None:
+                return False
+            self._store[key] = (value, now + ttl_seconds if ttl_seconds > 0 else None)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._store.pop(key, None)
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            if entry is None or entry[0] != value:
+                return False
+            del self._store[key]
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        with self._lock:
+            now = time.monotonic()
+            entry = self._alive(key, now)
+            value = int(entry[0]) + amount if entry else amount
+            expires = now + ttl_seconds if ttl_seconds > 0 else None
+            self._store[key] = (str(value), expires)
+            return value
+
+
+class AsyncMemoryCacheBackend:
+    """MemoryCacheBackend behind the AsyncCacheBackend interface (never blocks on I/O)."""
+
+    def __init__(self, backend: MemoryCacheBackend | None = None) -> None:
+        self._backend = backend or MemoryCacheBackend()
+
+    async def get(self, key: str) -> str | None:
+        return self._backend.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
+        self._backend.set(key, value, ttl_seconds=ttl_seconds)
+
+    async def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        return self._backend.set_if_absent(key, value, ttl_seconds=ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        self._backend.delete(key)
+
+    async def delete_if_equal(self, key: str, value: str) -> bool:
+        return self._backend.delete_if_equal(key, value)
+
+    async def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        return self._backend.incr(key, amount, ttl_seconds=ttl_seconds)
+
+
+class AsyncRedisCacheBackend:
+    """Redis-backed cache using redis.asyncio and a connection pool (non-blocking).
+
+    The pool is bound to the running event loop; it is rebuilt if the backend is
+    used from a different loop (e.g. successive asyncio.run calls).
+    """
+
+    def __init__(
+        self, redis_url: str = "redis://localhost:6379/0", max_connections: int = 50
+    ) -> None:
+        self._redis_url = redis_url
+        self._max_connections = max_connections
+        self._client: Any = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import redis.asyncio as aioredis
+
+            pool = aioredis.ConnectionPool.from_url(
+                self._redis_url,
+                encoding="utf-8",
+                decode_responses=True,
+                max_connections=self._max_connections,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+            self._loop = loop
+        return self._client
+
+    async def get(self, key: str) -> str | None:
+        try:
+            return await self._get_client().get(key)
+        except Exception:
+            return None
+
+    async def set(self, key: str, value: str, ttl_seconds: float = 0) -> None:
+        try:
+            client = self._get_client()
+            if ttl_seconds > 0:
+                await client.psetex(key, int(ttl_seconds * 1000), value)
+            else:
+                await client.set(key, value)
+        except Exception:
+            pass
+
+    async def set_if_absent(self, key: str, value: str, ttl_seconds: float = 0) -> bool:
+        try:
+            px = int(ttl_seconds * 1000) if ttl_seconds > 0 else None
+            return bool(await self._get_client().set(key, value, nx=True, px=px))
+        except Exception:
+            return True
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._get_client().delete(key)
+        except Exception:
+            pass
+
+    async def delete_if_equal(self, key: str, value: str) -> bool:
+        try:
+            return bool(
+                await self._get_client().eval(_DELETE_IF_EQUAL_SCRIPT, 1, key, value)
+            )
+        except Exception:
+            return False
+
+    async def incr(self, key: str, amount: int = 1, ttl_seconds: float = 0) -> int:
+        try:
+            pipe = self._get_client().pipeline()
+            pipe.incrby(key, amount)
+            if ttl_seconds > 0:
+                pipe.pexpire(key, int(ttl_seconds * 1000))
+            return int((await pipe.execute())[0])
+        except Exception:
+            return 0
+
 
 def get_cache_backend(redis_url: str = "redis://localhost:6379/0") -> CacheBackend:
     """Return a Redis cache backend. Swap here to use another implementation."""
     return RedisCacheBackend(redis_url=redis_url)
+
+
+def get_async_cache_backend(
+    redis_url: str = "redis://localhost:6379/0",
+) -> AsyncCacheBackend:
+    """Return an asyncio Redis cache backend. Swap here to use another implementation."""
+    return AsyncRedisCacheBackend(redis_url=redis_url)